@@ -13,34 +13,40 @@ jpirko@redhat.com (Jiri Pirko)
 
 import signal
 import logging
-import os, stat
+import os
+import shutil
 import sys
 import datetime
 import socket
-import ctypes
+import threading
 import multiprocessing
 import imp
 import types
 from time import sleep
+from contextlib import contextmanager
 from inspect import isclass
-from tempfile import NamedTemporaryFile
+from tempfile import NamedTemporaryFile, mkdtemp
 from lnst.Common.Logs import log_exc_traceback
-from lnst.Common.PacketCapture import PacketCapture
+from lnst.Common.PacketCapture import PacketCapture, CaptureWorker
+from lnst.Common.PacketCapture import PacketCaptureError
+from lnst.Common.PacketCapture import compile_filter, linktype_for_header_type
+from lnst.Common.CpuTopology import read_cpu_topology, read_device_locality
 from lnst.Common.Utils import die_when_parent_die
 from lnst.Common.ExecCmd import exec_cmd, ExecCmdFail
 from lnst.Common.ResourceCache import ResourceCache
 from lnst.Common.Utils import check_process_running
-from lnst.Common.Utils import is_installed
 from lnst.Common.ConnectionHandler import send_data
 from lnst.Common.ConnectionHandler import ConnectionHandler
+from lnst.Common.LoggingHandler import TransmitHandler
 from lnst.Common.DeviceRef import DeviceRef
 from lnst.Common.LnstError import LnstError
 from lnst.Common.DeviceError import DeviceDeleted, DeviceDisabled
 from lnst.Common.DeviceError import DeviceConfigValueError
 from lnst.Common.Parameters import Parameters
 from lnst.Common.Version import lnst_version
-from lnst.Agent.Job import Job, JobContext
-from lnst.Agent.InterfaceManager import InterfaceManager
+from lnst.Agent.Job import Job, JobContext, JobWorkerPool
+from lnst.Agent.ForkGuard import fork_guard
+from lnst.Agent.NetNamespace import enter_new_netns, remove_netns
 from lnst.Agent.BridgeTool import BridgeTool
 from lnst.Agent.AgentSecSocket import AgentSecSocket, SecSocketException
 
@@ -73,8 +79,9 @@ class RemoteMethods:
     RPC methods exposed to the Controller
     """
     def __init__(self, job_context, log_ctl, net_namespaces,
-                 server_handler, agent_config, agent_server):
-        self._packet_captures = {}
+                 server_handler, agent_config, agent_server, cache=None):
+        self._capture_worker = None
+        self._capture_dir = None
         self._if_manager = None
         self._job_context = job_context
         self._log_ctl = log_ctl
@@ -83,17 +90,33 @@ class RemoteMethods:
         self._agent_server = agent_server
         self._agent_config = agent_config
 
-        self._capture_files = {}
         self._copy_targets = {}
         self._copy_sources = {}
         self._system_config = {}
 
-        self._cache = ResourceCache(agent_config.get_option("cache", "dir"),
-                                    agent_config.get_option("cache", "expiration_period"))
+        if cache is None:
+            cache = ResourceCache(agent_config.get_option("cache", "dir"),
+                                  agent_config.get_option("cache", "expiration_period"))
+        self._cache = cache
 
         self._dynamic_modules = {}
         self._dynamic_classes = {}
         self._dynamic_objects = {}
+        self._shared_lock = threading.RLock()
+
+    @contextmanager
+    def _shared_state(self):
+        """Guards the state shared with the lightweight network namespaces
+
+        The resource cache, the dynamically loaded modules and classes and
+        the Devices module are used by the threads of all the lightweight
+        network namespaces. The lock is taken in a fork guard section so
+        that a process forked by another thread doesn't inherit it locked,
+        nothing done while holding it may fork.
+        """
+        with fork_guard.section():
+            with self._shared_lock:
+                yield
 
     def hello(self):
         logging.info("Recieved a controller connection.")
@@ -115,7 +138,8 @@ class RemoteMethods:
     def prepare_machine(self):
         self.machine_cleanup()
 
-        self._cache.del_old_entries()
+        with self._shared_state():
+            self._cache.del_old_entries()
         self.reset_file_transfers()
         return True
 
@@ -140,46 +164,60 @@ class RemoteMethods:
 
     def bye(self):
         self.restore_system_config()
-        self._cache.del_old_entries()
+        with self._shared_state():
+            self._cache.del_old_entries()
         self.reset_file_transfers()
         self._remove_capture_files()
         return "bye"
 
     def map_device_class(self, cls_name, module_name):
-        if cls_name in self._dynamic_classes:
-            return
+        with self._shared_state():
+            if cls_name in self._dynamic_classes:
+                return
 
-        module = self._dynamic_modules[module_name]
-        cls = getattr(module, cls_name)
+            module = self._dynamic_modules[module_name]
+            cls = getattr(module, cls_name)
 
-        self._dynamic_classes["{}.{}".format(module_name, cls_name)] = cls
+            self._dynamic_classes["{}.{}".format(module_name, cls_name)] = cls
 
-        setattr(Devices, cls_name, cls)
+            setattr(Devices, cls_name, cls)
+
+        # the Controller maps the device classes on demand, the ones mapped
+        # after the interface manager was created need to be added to it
+        if self._if_manager is not None:
+            self._if_manager.replace_device_class(cls_name, cls)
 
     def load_cached_module(self, module_name, res_hash):
-        self._cache.renew_entry(res_hash)
-        if module_name in self._dynamic_modules:
-            return
-        module_path = self._cache.get_path(res_hash)
-        module = imp.load_source(module_name, module_path)
-        self._dynamic_modules[module_name] = module
+        with self._shared_state():
+            self._cache.renew_entry(res_hash)
+            if module_name in self._dynamic_modules:
+                return
+            module_path = self._cache.get_path(res_hash)
+            module = imp.load_source(module_name, module_path)
+            self._dynamic_modules[module_name] = module
 
     def init_cls(self, cls_name, module_name, args, kwargs):
-        module = self._dynamic_modules[module_name]
-        cls = getattr(module, cls_name)
+        with self._shared_state():
+            module = self._dynamic_modules[module_name]
+            cls = getattr(module, cls_name)
 
-        self._dynamic_classes["{}.{}".format(module_name, cls_name)] = cls
+            self._dynamic_classes["{}.{}".format(module_name, cls_name)] = cls
 
         new_obj = cls(*args, **kwargs)
         self._dynamic_objects[id(new_obj)] = new_obj
         return id(new_obj)
 
     def init_if_manager(self):
+        # pyroute2 is expensive to import, it's loaded only once a
+        # Controller connects
+        from lnst.Agent.InterfaceManager import InterfaceManager
+
         self._if_manager = InterfaceManager(self._server_handler)
-        for cls_name in dir(Devices):
-            cls = getattr(Devices, cls_name)
-            if isclass(cls):
-                self._if_manager.add_device_class(cls_name, cls)
+        with self._shared_state():
+            for cls_name in dir(Devices):
+                cls = getattr(Devices, cls_name)
+                if isclass(cls):
+                    self._if_manager.add_device_class(cls_name, cls)
 
         self._if_manager.rescan_devices()
         self._server_handler.set_if_manager(self._if_manager)
@@ -237,6 +275,14 @@ class RemoteMethods:
             result[device.ifindex] = device._get_if_data()
         return result
 
+    def get_device_snapshots(self, ifindexes):
+        devices = {dev.ifindex: dev for dev in self._if_manager.get_devices()}
+        result = {}
+        for ifindex in ifindexes:
+            if ifindex in devices:
+                result[ifindex] = devices[ifindex]._get_snapshot()
+        return result
+
     def get_device(self, ifindex):
         device = self._if_manager.get_device(ifindex)
         if device:
@@ -311,50 +357,138 @@ class RemoteMethods:
         dev =  self._if_manager.create_device(clsname, args, kwargs)
         return {"ifindex": dev.ifindex, "name": dev.name}
 
-    def start_packet_capture(self, filt):
-        if not is_installed("tcpdump"):
-            raise Exception("Can't start packet capture, tcpdump not available")
+    def get_cpu_topology(self):
+        return read_cpu_topology()
+
+    def get_devices_locality(self, ifindexes):
+        """Returns dictionary of ifindex to the NUMA locality and queue
+        counts of the device, see read_device_locality"""
+        result = {}
+        for ifindex in ifindexes:
+            dev = self._if_manager.get_device(ifindex)
+            result[ifindex] = read_device_locality(dev.name)
+        return result
 
-        files = {}
-        for if_id, dev in self._if_manager.get_mapped_devices().items():
-            if dev.get_netns() != None:
-                continue
-            dev_name = dev.get_name()
+    def start_packet_capture(self, filt="", ifindexes=None, **capture_opts):
+        """Starts capturing packets on the devices of the namespace
 
-            df_handle = NamedTemporaryFile(delete=False)
-            dump_file = df_handle.name
-            df_handle.close()
+        All the captures are served by a single worker thread reading
+        TPACKET_V3 rings of AF_PACKET sockets, filt is a pcap-filter(7)
+        expression or a compiled BPF program applied in the kernel.
 
-            files[if_id] = dump_file
+        Args:
+            ifindexes -- devices to capture on, all devices when None
+            capture_opts -- ring_size, rotate_size, rotate_time,
+                rotate_count and snaplen options of the PacketCapture class
 
-            pcap = PacketCapture()
-            pcap.set_interface(dev_name)
-            pcap.set_output_file(dump_file)
-            pcap.set_filter(filt)
-            pcap.start()
+        Returns dictionary of ifindex to the list of capture files.
+        """
+        if self._capture_worker is not None:
+            if self._capture_worker.is_alive():
+                raise PacketCaptureError("Packet capture already running")
+            self._remove_capture_files()
 
-            self._packet_captures[if_id] = pcap
+        if ifindexes is None:
+            devices = self._if_manager.get_devices()
+        else:
+            devices = [self._if_manager.get_device(i) for i in ifindexes]
 
-        self._capture_files = files
-        return files
+        self._capture_dir = mkdtemp(prefix="lnst-capture-")
+        programs = {}
+        captures = []
+        try:
+            for dev in devices:
+                linktype = linktype_for_header_type(dev.link_header_type)
+                if linktype not in programs:
+                    programs[linktype] = compile_filter(filt, linktype)
+                captures.append(PacketCapture(dev.ifindex, dev.name,
+                                              self._capture_dir, linktype,
+                                              programs[linktype],
+                                              **capture_opts))
+        except:
+            for capture in captures:
+                capture.close()
+                capture.remove_files()
+            self._remove_capture_files()
+            raise
+
+        self._capture_worker = CaptureWorker(captures)
+        self._capture_worker.start()
+        return {capture.ifindex: capture.stats()["files"]
+                for capture in captures}
+
+    def packet_capture_stats(self):
+        """Returns dictionary of ifindex to capture counters
+
+        The counters include the number of captured packets and the number
+        of packets dropped by the kernel because the capture ring was full.
+        """
+        if self._capture_worker is None:
+            return {}
+
+        return {capture.ifindex: capture.stats()
+                for capture in self._capture_worker.captures}
+
+    def get_packet_capture(self, ifindex, start=None, end=None,
+                           max_packets=None):
+        """Prepares the packets captured in a time window for a transfer
+
+        The packets are written to a pcap file which is opened for reading
+        with copy_part_from and removed, finish_copy_from closes it.
+
+        Args:
+            start, end -- unix timestamps limiting the window
+            max_packets -- maximum number of packets returned
+
+        Returns the path of the file to pass to copy_part_from.
+        """
+        if self._capture_worker is None:
+            raise PacketCaptureError("No packet capture available")
+
+        for capture in self._capture_worker.captures:
+            if capture.ifindex == ifindex:
+                break
+        else:
+            raise PacketCaptureError("No packet capture of device %d" % ifindex)
+
+        with NamedTemporaryFile(dir=self._capture_dir, prefix="window-",
+                                suffix=".pcap", delete=False) as f:
+            path = f.name
+        try:
+            capture.window(path, start, end, max_packets)
+            self._copy_sources[path] = open(path, "rb")
+        finally:
+            os.unlink(path)
+        return path
 
     def stop_packet_capture(self):
-        if self._packet_captures == None:
-            return True
+        """Stops the capture worker
 
-        for ifindex, pcap in self._packet_captures.items():
-            pcap.stop()
+        The capture files are kept until the next capture is started or
+        until the machine cleanup so they can still be retrieved.
 
-        self._packet_captures.clear()
+        Returns the final capture counters, see packet_capture_stats.
+        """
+        if self._capture_worker is None:
+            return {}
 
-        return True
+        if self._capture_worker.is_alive():
+            self._capture_worker.stop()
+        return self.packet_capture_stats()
 
     def _remove_capture_files(self):
-        for key, name in self._capture_files.items():
-            logging.debug("Removing temporary packet capture file %s", name)
-            os.unlink(name)
-
-        self._capture_files.clear()
+        if self._capture_worker is not None:
+            if self._capture_worker.is_alive():
+                self._capture_worker.stop()
+            for capture in self._capture_worker.captures:
+                capture.remove_files()
+            self._capture_worker = None
+
+        if self._capture_dir is not None:
+            logging.debug("Removing packet capture directory %s",
+                          self._capture_dir)
+            shutil.rmtree(self._capture_dir, ignore_errors=True)
+            self._capture_dir = None
 
     def _update_system_config(self, options, persistent):
         system_config = self._system_config
@@ -385,7 +519,8 @@ class RemoteMethods:
         return True
 
     def run_job(self, job):
-        job_instance = Job(job, self._log_ctl)
+        job_instance = Job(job, self._log_ctl,
+                           self._job_context.get_worker_pool())
         self._job_context.add_job(job_instance)
 
         res = job_instance.run()
@@ -417,37 +552,45 @@ class RemoteMethods:
 
         for netns in list(self._net_namespaces.keys()):
             self.del_namespace(netns)
-        self._net_namespaces = {}
-
-        for obj_id, obj in list(self._dynamic_objects.items()):
-            del obj
+        self._net_namespaces.clear()
 
-        for cls_name in dir(Devices):
-            cls = getattr(Devices, cls_name)
-            if isclass(cls):
-                delattr(Devices, cls_name)
+        self._cleanup_dynamic_code()
 
-        for module_name, module in list(self._dynamic_modules.items()):
-            del sys.modules[module_name]
-
-        self._dynamic_objects = {}
-        self._dynamic_classes = {}
-        self._dynamic_modules = {}
         self._if_manager = None
         self._server_handler.set_if_manager(None)
-        self._cache.del_old_entries()
+        with self._shared_state():
+            self._cache.del_old_entries()
         self._remove_capture_files()
         return True
 
+    def _cleanup_dynamic_code(self):
+        for obj_id, obj in list(self._dynamic_objects.items()):
+            del obj
+
+        with self._shared_state():
+            for cls_name in dir(Devices):
+                cls = getattr(Devices, cls_name)
+                if isclass(cls):
+                    delattr(Devices, cls_name)
+
+            for module_name, module in list(self._dynamic_modules.items()):
+                del sys.modules[module_name]
+
+            self._dynamic_classes.clear()
+            self._dynamic_modules.clear()
+        self._dynamic_objects.clear()
+
     def has_resource(self, res_hash):
-        if self._cache.query(res_hash):
-            return True
+        with self._shared_state():
+            if self._cache.query(res_hash):
+                return True
 
         return False
 
     def add_resource_to_cache(self, res_type, local_path, name):
         if res_type == "file":
-            self._cache.add_file_entry(local_path, name)
+            with self._shared_state():
+                self._cache.add_file_entry(local_path, name)
             return True
         else:
             raise Exception("Unknown resource type")
@@ -509,9 +652,28 @@ class RemoteMethods:
             file_handle.close()
         self._copy_sources = {}
 
-    def add_namespace(self, netns):
+    def add_namespace(self, netns, lightweight=False):
         if netns in self._net_namespaces:
             logging.debug("Network namespace %s already exists." % netns)
+        elif lightweight:
+            logging.debug("Creating lightweight network namespace %s." % netns)
+            read_pipe, write_pipe = multiprocessing.Pipe()
+            thread = NamespaceThread(netns, write_pipe, self)
+            self._net_namespaces[netns] = {"thread": thread,
+                                           "pipe": read_pipe}
+            self._server_handler.add_netns(netns, read_pipe)
+            thread.start()
+
+            result = self._agent_server.wait_for_result(netns)
+            if result["result"] != True:
+                thread.join()
+                thread.close()
+                read_pipe.close()
+                self._server_handler.del_netns(netns)
+                del self._net_namespaces[netns]
+                raise Exception("Namespace creation failed")
+
+            return True
         else:
             logging.debug("Creating network namespace %s." % netns)
             read_pipe, write_pipe = multiprocessing.Pipe()
@@ -528,66 +690,7 @@ class RemoteMethods:
                 return True
             elif pid == 0:
                 self._agent_server.set_netns_sighandlers()
-                #create new network namespace
-                libc_name = ctypes.util.find_library("c")
-                #from sched.h
-                CLONE_NEWNET = 0x40000000
-                CLONE_NEWNS = 0x00020000
-                #based on ipnetns.c from the iproute2 project
-                MNT_DETACH = 0x00000002
-                MS_BIND = 4096
-                MS_SLAVE = 1<<19
-                MS_REC = 16384
-                MS_SHARED = 1 << 20
-                libc = ctypes.CDLL(libc_name)
-
-                #based on ipnetns.c from the iproute2 project
-                #bind to named namespace
-                netns_dir = "/var/run/netns/".encode("ascii")
-                if not os.path.exists(netns_dir):
-                    os.mkdir(netns_dir, stat.S_IRWXU | stat.S_IRGRP |
-                                         stat.S_IXGRP | stat.S_IROTH |
-                                         stat.S_IXOTH)
-
-                # this is a code mimicking the iproute2 implementation
-                # introduced by commit 58a3e8270f:
-                # modify all mounts in the files and subdirectories of
-                # /var/run/netns to be shared mount points so that unmount
-                # events can propagate, making it unlikely that "ip netns delete"
-                # will fail because a directory is mounted in another mount
-                # namespace
-                done = False
-                while libc.mount(b'', netns_dir, b'none', MS_SHARED | MS_REC, None) != 0:
-                    if done:
-                        raise OSError(ctypes.get_errno(), 'share rundir failed', netns)
-                    if libc.mount(netns_dir, netns_dir, b'none', MS_BIND | MS_REC,
-                                  None) != 0:
-                        raise OSError(ctypes.get_errno(), 'mount rundir failed', netns)
-                    done = True
-
-                netns_path = netns_dir + netns.encode("ascii")
-                try:
-                    f = os.open(netns_path, os.O_RDONLY | os.O_CREAT | os.O_EXCL, 0)
-                except FileExistsError:
-                    raise Exception("Network namespace {} already exists".format(netns))
-
-                os.close(f)
-                if libc.unshare(CLONE_NEWNET) < 0:
-                    raise OSError(ctypes.get_errno(), 'unshare failed', netns)
-
-                if libc.mount(
-                        b'/proc/self/ns/net',
-                        netns_path,
-                        b'none',
-                        MS_BIND,
-                        None) < 0:
-                    raise OSError(ctypes.get_errno(), 'mount failed', netns)
-
-                #map network sysfs to new net
-                libc.unshare(CLONE_NEWNS)
-                libc.mount(b'', b'/', b'none', MS_SLAVE | MS_REC, None)
-                libc.umount2(b'/sys', MNT_DETACH)
-                libc.mount(netns, b'/sys', b'sysfs', 0, None)
+                enter_new_netns(netns)
 
                 #set ctl socket to pipe to main netns
                 self._server_handler.close_s_sock()
@@ -614,22 +717,22 @@ class RemoteMethods:
             logging.debug("Network namespace %s doesn't exist." % netns)
             return False
         else:
-            MNT_DETACH = 0x00000002
-            libc_name = ctypes.util.find_library("c")
-            libc = ctypes.CDLL(libc_name)
-            netns_path = "/var/run/netns/" + netns
-            netns_path = netns_path.encode('ascii')
-
-            netns_pid = self._net_namespaces[netns]["pid"]
-            os.kill(netns_pid, signal.SIGUSR1)
-            os.waitpid(netns_pid, 0)
+            if "thread" in self._net_namespaces[netns]:
+                self._server_handler.send_data_to_netns(netns,
+                                                        {"type": "netns_stop"})
+                self._agent_server.wait_for_result(netns)
+                self._net_namespaces[netns]["thread"].join()
+                self._net_namespaces[netns]["thread"].close()
+            else:
+                netns_pid = self._net_namespaces[netns]["pid"]
+                os.kill(netns_pid, signal.SIGUSR1)
+                os.waitpid(netns_pid, 0)
 
             # Remove named namespace
             try:
-                libc.umount2(netns_path, MNT_DETACH)
-                os.unlink(netns_path)
+                remove_netns(netns)
             except Exception as e:
-                logging.warning("Unable to remove named namespace %s. %s" % (netns_path, e))
+                logging.warning("Unable to remove named namespace %s. %s" % (netns, e))
 
             logging.debug("Network namespace %s removed." % netns)
 
@@ -755,18 +858,62 @@ class RemoteMethods:
         brt.set_state(br_state_info)
         return True
 
+class NamespaceRemoteMethods(RemoteMethods):
+    """
+    RPC methods of a lightweight network namespace
+
+    The namespace is served by a thread of the root agent process so the
+    resource cache and the dynamically loaded modules and classes are shared
+    with the root namespace instead of being loaded again, they're accessed
+    under the shared lock of the root namespace.
+    """
+    def __init__(self, root_methods, job_context, server_handler, agent_server):
+        super(NamespaceRemoteMethods, self).__init__(
+            job_context, root_methods._log_ctl, {}, server_handler,
+            root_methods._agent_config, agent_server,
+            cache=root_methods._cache)
+
+        self._dynamic_modules = root_methods._dynamic_modules
+        self._dynamic_classes = root_methods._dynamic_classes
+        self._shared_lock = root_methods._shared_lock
+
+    def add_namespace(self, netns, lightweight=False):
+        raise LnstError("Can't create network namespace %s from a "
+                        "lightweight network namespace." % netns)
+
+    def _cleanup_dynamic_code(self):
+        self._dynamic_objects.clear()
+
+class NetlinkWakeup(object):
+    """Wakes the agent up when netlink events arrive
+
+    Passed to check_connections as its wakeup object, so device updates
+    reach the controller promptly and before the messages received at the
+    same time, e.g. the result of a job that changed the device.
+    """
+    def __init__(self, if_manager):
+        self._if_manager = if_manager
+
+    def fileno(self):
+        return self._if_manager.get_nl_socket().fileno()
+
+    def clear(self):
+        self._if_manager.handle_netlink_msgs()
+
 class ServerHandler(ConnectionHandler):
     def __init__(self, addr, agent_config):
         super(ServerHandler, self).__init__()
         self._netns_con_mapping = {}
-        try:
-            self._s_socket = socket.socket()
-            self._s_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self._s_socket.bind(addr)
-            self._s_socket.listen(1)
-        except socket.error as e:
-            logging.error(e[1])
-            exit(1)
+        self._s_socket = None
+        if addr is not None:
+            try:
+                self._s_socket = socket.socket()
+                self._s_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                self._s_socket.bind(addr)
+                self._s_socket.listen(1)
+            except socket.error as e:
+                logging.error(e[1])
+                exit(1)
 
         self._netns = None
         self._c_socket = None
@@ -805,7 +952,8 @@ class ServerHandler(ConnectionHandler):
         self.add_connection(self._c_socket[1], self._c_socket[0])
 
     def close_s_sock(self):
-        self._s_socket.close()
+        if self._s_socket is not None:
+            self._s_socket.close()
         self._s_socket = None
 
     def close_c_sock(self):
@@ -814,11 +962,19 @@ class ServerHandler(ConnectionHandler):
         self._c_socket = None
 
     def check_connections(self, timeout=None):
-        if self._if_manager is not None:
-            self._if_manager.handle_netlink_msgs()
-        msgs = super(ServerHandler, self).check_connections(timeout=timeout)
+        if self._if_manager is None:
+            return super(ServerHandler, self).check_connections(timeout=timeout)
+
+        self._if_manager.handle_netlink_msgs()
+        msgs = super(ServerHandler, self).check_connections(
+            timeout=timeout, wakeup=NetlinkWakeup(self._if_manager))
         return msgs
 
+    def _recv_data(self, connection):
+        # unpickling imports the modules of the received objects
+        with fork_guard.section():
+            return super(ServerHandler, self)._recv_data(connection)
+
     def get_messages(self):
         messages = self.check_connections(timeout=MAX_SERVER_HANG)
 
@@ -961,7 +1117,10 @@ class Agent:
         self._agent_config = agent_config
         die_when_parent_die()
 
-        self._job_context = JobContext()
+        if agent_config.get_option("environment", "job_worker_pool"):
+            self._job_context = JobContext(JobWorkerPool(log_ctl))
+        else:
+            self._job_context = JobContext()
         port = agent_config.get_option("environment", "rpcport")
         logging.info("Using RPC port %d." % port)
         self._server_handler = ServerHandler(("", port), agent_config)
@@ -992,6 +1151,7 @@ class Agent:
                     except (socket.error, SecSocketException):
                         continue
                     self._log_ctl.set_connection(self._server_handler.get_ctl_sock())
+                    netns_log_redirect.install()
 
                 msgs = self._server_handler.get_messages()
 
@@ -1033,12 +1193,15 @@ class Agent:
                 except LnstError as e:
                     log_exc_traceback()
                     response = {"type": "exception", "Exception": e}
+                else:
+                    response = {"type": "result", "result": result}
+                    response = device_to_deviceref(response)
 
-                    self._server_handler.send_data_to_ctl(response)
-                    return
-
-                response = {"type": "result", "result": result}
-                response = device_to_deviceref(response)
+                if_manager = self._methods._if_manager
+                if if_manager is not None:
+                    # device updates caused by the command are sent before
+                    # its result
+                    if_manager.handle_netlink_msgs()
                 self._server_handler.send_data_to_ctl(response)
             else:
                 err = LnstError("Method '%s' not supported." % msg["method_name"])
@@ -1059,6 +1222,10 @@ class Agent:
             job.join()
             self._job_context.del_cmd(job)
             self._server_handler.send_data_to_ctl(msg)
+        elif msg["type"] == "job_started":
+            job = self._job_context.get_job(msg["job_id"])
+            if job is not None:
+                job.set_started(msg["pid"])
         elif msg["type"] == "job_finished":
             job = self._job_context.get_job(msg["job_id"])
             job.join()
@@ -1067,7 +1234,11 @@ class Agent:
             self._server_handler.send_data_to_ctl(msg)
 
             self._job_context.del_job(job)
+            # pooled workers keep their pipe open for the next job
+            self._server_handler.remove_connection_by_id(job.get_id())
 
+        elif msg["type"] == "job_interim":
+            self._server_handler.send_data_to_ctl(msg)
         elif msg["type"] == "from_netns":
             msg["data"]["netns"] = msg["netns"]
             self._server_handler.send_data_to_ctl(msg["data"])
@@ -1103,3 +1274,127 @@ class Agent:
         signal.signal(signal.SIGINT, self._parent_resend_signal_handler)
         signal.signal(signal.SIGTERM, self._parent_resend_signal_handler)
         signal.signal(signal.SIGUSR1, self._signal_die_handler)
+
+
+class NamespaceAgent(Agent):
+    """
+    Message loop of a lightweight network namespace
+
+    Runs in a NamespaceThread, communicates with the root namespace through a
+    pipe the same way a forked namespace agent does.
+    """
+    def __init__(self, netns, pipe, root_methods, log_ctl, agent_config):
+        self._agent_config = agent_config
+        self._log_ctl = log_ctl
+        self._finished = False
+
+        if agent_config.get_option("environment", "job_worker_pool"):
+            self._job_context = JobContext(JobWorkerPool(log_ctl))
+        else:
+            self._job_context = JobContext()
+
+        self._server_handler = ServerHandler(None, agent_config)
+        self._server_handler.set_netns(netns)
+        self._server_handler.set_ctl_sock((pipe, "root_netns"))
+
+        self._net_namespaces = {}
+        self._methods = NamespaceRemoteMethods(root_methods,
+                                               self._job_context,
+                                               self._server_handler, self)
+
+    def run(self):
+        self._methods.init_if_manager()
+        self._server_handler.send_data_to_ctl({"type": "result",
+                                               "result": True})
+
+        while not self._finished:
+            if self._server_handler.get_ctl_sock() is None:
+                break
+
+            msgs = self._server_handler.get_messages()
+            for msg in msgs:
+                self._process_msg(msg[1])
+
+        self._methods.machine_cleanup()
+        self._server_handler.send_data_to_ctl({"type": "result",
+                                               "result": True})
+
+    def _process_msg(self, msg):
+        if msg["type"] == "netns_stop":
+            self._finished = True
+        else:
+            super(NamespaceAgent, self)._process_msg(msg)
+
+
+class NamespaceThread(threading.Thread):
+    """
+    Thread serving a lightweight network namespace
+
+    Instead of forking the whole agent, the thread moves itself into a new
+    network and mount namespace and runs a NamespaceAgent there. Log records
+    emitted by the thread are sent to the root namespace through the pipe, see
+    NetnsThreadLogRedirect.
+    """
+    def __init__(self, netns, pipe, root_methods):
+        super(NamespaceThread, self).__init__(name="netns-%s" % netns)
+        self.daemon = True
+        self.netns = netns
+        self.pid = os.getpid()
+
+        self._pipe = pipe
+        self._root_methods = root_methods
+        self._log_handler = TransmitHandler(pipe)
+        self._log_handler.set_origin_name(netns)
+
+    def transmit_log(self, record):
+        self._log_handler.emit(record)
+
+    def run(self):
+        netns_log_redirect.install()
+        try:
+            enter_new_netns(self.netns, thread=True)
+            agent = NamespaceAgent(self.netns, self._pipe, self._root_methods,
+                                   self._root_methods._log_ctl,
+                                   self._root_methods._agent_config)
+        except Exception:
+            log_exc_traceback()
+            send_data(self._pipe, {"type": "result", "result": False})
+            return
+
+        logging.debug("Created lightweight network namespace %s" % self.netns)
+        try:
+            agent.run()
+        except Exception:
+            log_exc_traceback()
+
+    def close(self):
+        """Closes the namespace end of the pipe, call after join()"""
+        self._pipe.close()
+
+
+class NetnsThreadLogRedirect(logging.Filter):
+    """
+    Filter of the root logger handlers that hands records emitted by a
+    NamespaceThread over to its pipe instead of the handlers of the root
+    namespace, the root namespace then forwards them to the controller from
+    its own thread.
+
+    Filters of a logger don't see the records propagated from its child
+    loggers, so the filter is added to the handlers instead. It has to be
+    installed again when a handler is added to the root logger.
+    """
+    def install(self):
+        for handler in logging.getLogger().handlers:
+            handler.addFilter(self)
+
+    def filter(self, record):
+        thread = threading.current_thread()
+        if isinstance(thread, NamespaceThread) and thread.pid == os.getpid():
+            # the record goes through all the handlers, send it only once
+            if not getattr(record, "netns_redirected", False):
+                record.netns_redirected = True
+                thread.transmit_log(record)
+            return False
+        return True
+
+netns_log_redirect = NetnsThreadLogRedirect()
@@ -28,6 +28,11 @@ class AgentConfig(Config):
                 "additive" : False,
                 "action" : self.optionPort,
                 "name" : "rpcport"}
+        self._options['environment']['job_worker_pool'] = {\
+                "value" : True,
+                "additive" : False,
+                "action" : self.optionBool,
+                "name" : "job_worker_pool"}
 
         self._options['cache'] = dict()
         self._options['cache']['dir'] = {\
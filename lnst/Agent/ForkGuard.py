@@ -0,0 +1,86 @@
+"""
+This module defines the ForkGuard that keeps the processes forked by a
+multithreaded Agent from inheriting state locked by another thread
+
+Copyright 2026 Red Hat, Inc.
+Licensed under the GNU General Public License, version 2 as
+published by the Free Software Foundation; see COPYING for details.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+class ForkGuard(object):
+    """Delays forks while another thread is in a guarded section
+
+    With lightweight network namespaces the Agent is multithreaded and the
+    jobs, job workers and forked namespaces are forked from any of its
+    threads. A forked child only has the forking thread, so any lock held
+    by another thread at that moment stays locked in the child forever.
+
+    The locks a child can run into are:
+    * the logging module lock and the locks of the logging handlers, these
+      are reinitialized in the child by the logging module itself
+    * the locks of the netlink sockets (pyroute2), every namespace thread
+      has its own InterfaceManager and sockets, so the devices passed to a
+      job only use sockets of the thread that forked it
+    * the import locks of the modules imported by another thread, these are
+      taken when unpickling the received messages and when loading the
+      modules synchronized from the Controller; both are done in a guarded
+      section
+
+    The hooks are registered with os.register_at_fork so every fork of the
+    Agent process waits until no other thread is in a guarded section and
+    no guarded section is entered until the fork is done. Guarded sections
+    mustn't block on other threads of the Agent (e.g. by sending to a
+    namespace pipe), the forking thread may be the one they wait for.
+    """
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._sections = {}
+        self._forking = None
+
+    @contextmanager
+    def section(self):
+        ident = threading.get_ident()
+        with self._cond:
+            while self._forking not in (None, ident):
+                self._cond.wait()
+            self._sections[ident] = self._sections.get(ident, 0) + 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._sections[ident] -= 1
+                if not self._sections[ident]:
+                    del self._sections[ident]
+                self._cond.notify_all()
+
+    def _before_fork(self):
+        ident = threading.get_ident()
+        self._cond.acquire()
+        while (self._forking is not None or
+               any(i != ident for i in self._sections)):
+            self._cond.wait()
+        self._forking = ident
+        self._cond.release()
+
+    def _after_fork_in_parent(self):
+        with self._cond:
+            self._forking = None
+            self._cond.notify_all()
+
+    def _after_fork_in_child(self):
+        # only the forking thread exists in the child
+        ident = threading.get_ident()
+        self._cond = threading.Condition(threading.Lock())
+        self._sections = {ident: self._sections[ident]} \
+                if ident in self._sections else {}
+        self._forking = None
+
+fork_guard = ForkGuard()
+
+os.register_at_fork(before=fork_guard._before_fork,
+                    after_in_parent=fork_guard._after_fork_in_parent,
+                    after_in_child=fork_guard._after_fork_in_child)
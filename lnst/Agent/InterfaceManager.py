@@ -20,8 +20,9 @@ from lnst.Common.ExecCmd import exec_cmd
 from lnst.Common.DeviceError import (DeviceNotFound, DeviceConfigError,
         DeviceError)
 from lnst.Common.InterfaceManagerError import InterfaceManagerError
+from lnst.Common.EthtoolNetlink import EthtoolNetlink
 from pyroute2 import IPRSocket
-from pyroute2.netlink import NLM_F_REQUEST, NLM_F_DUMP
+from pyroute2.netlink import NLM_F_REQUEST, NLM_F_DUMP, NLM_F_MULTI
 from pyroute2.netlink.rtnl import RTMGRP_IPV4_IFADDR
 from pyroute2.netlink.rtnl import RTMGRP_IPV6_IFADDR
 from pyroute2.netlink.rtnl import RTMGRP_LINK
@@ -45,6 +46,9 @@ class InterfaceManager(object):
         self._nl_socket.bind(groups=NL_GROUPS)
 
         self._msg_queue = deque()
+        self._updated_devices = set()
+
+        self._ethtool = None
 
         #TODO split DevlinkManager away from the InterfaceManager
         #self._dl_manager = DevlinkManager()
@@ -61,6 +65,10 @@ class InterfaceManager(object):
         self._device_classes[name] = cls
         return cls
 
+    def replace_device_class(self, name, cls):
+        self._device_classes[name] = cls
+        return cls
+
     def reconnect_netlink(self):
         if self._nl_socket != None:
             self._nl_socket.close()
@@ -68,11 +76,27 @@ class InterfaceManager(object):
         self._nl_socket = IPRSocket()
         self._nl_socket.bind(groups=NL_GROUPS)
 
+        if self._ethtool is not None:
+            self._ethtool.close()
+            self._ethtool = None
+
+        # events may have been lost
+        self._updated_devices.update(self._devices.keys())
         self.rescan_devices()
 
     def get_nl_socket(self):
         return self._nl_socket
 
+    def get_ethtool(self):
+        """Returns the ethtool netlink socket shared by the devices
+
+        Created on first use so that it's bound to the network namespace
+        the InterfaceManager works in.
+        """
+        if self._ethtool is None:
+            self._ethtool = EthtoolNetlink()
+        return self._ethtool
+
     def pull_netlink_messages_into_queue(self):
         try:
             while True:
@@ -103,6 +127,13 @@ class InterfaceManager(object):
             msg = self._msg_queue.popleft()
             self._handle_netlink_msg(msg)
 
+        if self._updated_devices:
+            # the Controller drops its snapshots of these devices
+            update_msg = {"type": "dev_updated",
+                          "ifindexes": sorted(self._updated_devices)}
+            self._updated_devices = set()
+            self._server_handler.send_data_to_ctl(update_msg)
+
         # self._dl_manager.rescan_ports()
         # for device in self._devices.values():
             # dl_port = self._dl_manager.get_port(device.name)
@@ -112,6 +143,10 @@ class InterfaceManager(object):
         if msg['header']['type'] in [RTM_NEWLINK, RTM_NEWADDR, RTM_DELADDR]:
             if msg['index'] in self._devices:
                 self._devices[msg['index']]._update_netlink(msg)
+                # replies to our dumps (NLM_F_MULTI) don't report changes,
+                # the kernel sends an event for each of them
+                if not msg['header']['flags'] & NLM_F_MULTI:
+                    self._updated_devices.add(msg['index'])
             elif msg['header']['type'] == RTM_NEWLINK:
                 if msg['ifi_type'] == 772:
                     dev = self._device_classes["LoopbackDevice"](self)
@@ -13,24 +13,242 @@ olichtne@redhat.com (Ondrej Lichtner)
 import os
 import signal
 import logging
+import threading
 import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 from lnst.Common.JobError import JobError
 from lnst.Common.ExecCmd import exec_cmd, ExecCmdFail
 from lnst.Common.ConnectionHandler import send_data
 from lnst.Common.Logs import log_exc_traceback
+from lnst.Common.Utils import die_when_parent_die
 
 def get_job_class(what):
     if what["type"] == "shell":
         return ShellExecJob(what)
+    elif what["type"] == "shell_batch":
+        return ShellBatchJob(what)
     elif what["type"] == "module":
         return ModuleJob(what)
     else:
         logging.error("Unknown job type \"%s\"" % what["type"])
         raise JobError("Unknown command type \"%s\"" % what["type"])
 
+class InterimSender(object):
+    """Sends interim records of a running job to the agent
+
+    The records are sent over the pipe of the job process which is shared
+    with the TransmitHandler forwarding log records, the handler's lock is
+    used so that messages sent from different threads don't interleave.
+    """
+    def __init__(self, job_id, pipe, log_handler):
+        self._job_id = job_id
+        self._pipe = pipe
+        self._log_handler = log_handler
+
+    def __call__(self, data):
+        msg = {"type": "job_interim", "job_id": self._job_id, "data": data}
+        self._log_handler.acquire()
+        try:
+            send_data(self._pipe, msg)
+        finally:
+            self._log_handler.release()
+
+def run_job_cls(job_id, job_cls, interim_sender=None):
+    """Runs the job and returns the job_finished message describing it"""
+    result = {}
+    if interim_sender is not None and job_cls.interim_requested:
+        job_cls.set_interim_sender(interim_sender)
+    try:
+        job_cls.run()
+        job_result = job_cls.get_result()
+    except Exception as e:
+        log_exc_traceback()
+        job_result = {}
+        job_result["passed"] = False
+        job_result["type"] = "exception"
+        job_result["res_data"] = job_cls.get_result()
+        job_result["res_data"]["exception"] = e
+    finally:
+        result["type"] = "job_finished"
+        result["job_id"] = job_id
+        result["result"] = job_result
+    return result
+
+def reset_job_process_signals():
+    os.setpgrp()
+    signal.signal(signal.SIGHUP, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+class JobWorker(object):
+    """Warm process starting short jobs one after another
+
+    The worker is forked once and then receives job descriptions over a pipe,
+    so short jobs don't pay for a new pipe and logging setup each time
+    they're run. Every job is forked from the worker into its own process
+    group, the pid of the job process is reported with a job_started message
+    so that signals are sent only to the job and not to the whole worker.
+    """
+    def __init__(self, log_ctl):
+        self._log_ctl = log_ctl
+        self._pipe = None
+        self.pid = None
+        self.busy = False
+
+    def start(self):
+        self._pipe, child_pipe = multiprocessing.Pipe()
+        pid = os.fork()
+        if pid == 0:
+            self._pipe.close()
+            try:
+                self._loop(child_pipe)
+            finally:
+                os._exit(0)
+
+        child_pipe.close()
+        self.pid = pid
+        logging.debug("Started job worker with pid \"%d\"" % self.pid)
+
+    def _loop(self, pipe):
+        reset_job_process_signals()
+        signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+        die_when_parent_die()
+
+        self._log_ctl.disable_logging()
+        self._log_ctl.set_connection(pipe)
+
+        while True:
+            try:
+                what = pipe.recv()
+            except (EOFError, OSError):
+                break
+
+            if what is None:
+                break
+
+            pid = os.fork()
+            if pid == 0:
+                status = 1
+                try:
+                    self._run_job(pipe, what)
+                    status = 0
+                finally:
+                    os._exit(status)
+
+            _, status = os.waitpid(pid, 0)
+            if not os.WIFEXITED(status) or os.WEXITSTATUS(status) != 0:
+                # the job process didn't get to send its result
+                if os.WIFSIGNALED(status):
+                    res_data = "Job killed by signal %d" % os.WTERMSIG(status)
+                else:
+                    res_data = "Job process failed"
+                send_data(pipe, dict(type="job_finished",
+                                     job_id=what["job_id"],
+                                     result=dict(passed=False,
+                                                 res_data=res_data,
+                                                 type="result")))
+        pipe.close()
+
+    def _run_job(self, pipe, what):
+        reset_job_process_signals()
+        die_when_parent_die()
+
+        send_data(pipe, dict(type="job_started", job_id=what["job_id"],
+                             pid=os.getpid()))
+
+        sender = InterimSender(what["job_id"], pipe,
+                               self._log_ctl.transmit_handler)
+        result = run_job_cls(what["job_id"], get_job_class(what), sender)
+        send_data(pipe, result)
+
+    def get_pipe(self):
+        return self._pipe
+
+    def submit(self, what):
+        self.busy = True
+        return send_data(self._pipe, what)
+
+    def is_alive(self):
+        try:
+            pid, _ = os.waitpid(self.pid, os.WNOHANG)
+        except ChildProcessError:
+            return False
+        return pid == 0
+
+    def stop(self, sig=None):
+        if sig is not None:
+            try:
+                os.killpg(self.pid, sig)
+            except OSError:
+                pass
+        else:
+            send_data(self._pipe, None)
+
+        self._pipe.close()
+        try:
+            os.waitpid(self.pid, 0)
+        except ChildProcessError:
+            pass
+
+class JobWorkerPool(object):
+    """Pool of warm job workers of a single (network namespace) agent process
+
+    A worker runs one job at a time, when all the workers are busy a new one
+    is started so that a long running job doesn't hold back the jobs started
+    after it. At most max_idle workers are kept once their jobs finish.
+    Workers inherited from the parent agent process (e.g. by a fork into a
+    new network namespace) are dropped, new workers are started from within
+    the namespace on first use.
+    """
+    def __init__(self, log_ctl, max_idle=1):
+        self._log_ctl = log_ctl
+        self._max_idle = max_idle
+        self._workers = []
+        self._owner = os.getpid()
+
+    def acquire(self):
+        if self._owner != os.getpid():
+            self._workers = []
+            self._owner = os.getpid()
+
+        for worker in list(self._workers):
+            if not worker.busy and not worker.is_alive():
+                logging.debug("Job worker with pid \"%d\" died" % worker.pid)
+                self._workers.remove(worker)
+
+        for worker in self._workers:
+            if not worker.busy:
+                return worker
+
+        worker = JobWorker(self._log_ctl)
+        worker.start()
+        self._workers.append(worker)
+        return worker
+
+    def release(self, worker):
+        worker.busy = False
+        idle = [w for w in self._workers if not w.busy]
+        if worker in idle and len(idle) > self._max_idle:
+            self.discard(worker)
+
+    def discard(self, worker, sig=None):
+        if worker in self._workers:
+            self._workers.remove(worker)
+        worker.stop(sig)
+
+    def shutdown(self):
+        if self._owner == os.getpid():
+            for worker in list(self._workers):
+                self.discard(worker, signal.SIGKILL if worker.busy else None)
+        self._workers = []
+
 class JobContext(object):
-    def __init__(self):
+    def __init__(self, worker_pool=None):
         self._dict = {}
+        self._worker_pool = worker_pool
+
+    def get_worker_pool(self):
+        return self._worker_pool
 
     def add_job(self, job):
         self._dict[job.get_id()] = job
@@ -53,6 +271,8 @@ class JobContext(object):
         logging.debug("Cleaning up leftover processes.")
         self._kill_all_jobs()
         self._dict = {}
+        if self._worker_pool is not None:
+            self._worker_pool.shutdown()
 
     def get_parent_pipes(self):
         pipes = {}
@@ -63,9 +283,12 @@ class JobContext(object):
         return pipes
 
 class Job(object):
-    def __init__(self, what, log_ctl):
+    def __init__(self, what, log_ctl, worker_pool=None):
         self._job_cls = get_job_class(what)
         self._what = what
+        self._worker_pool = worker_pool
+        self._worker = None
+        self._pending_signals = []
 
         self._id = what["job_id"]
         self._parent_pipe = None
@@ -82,6 +305,16 @@ class Job(object):
         return self._parent_pipe
 
     def run(self):
+        if self._worker_pool is not None and self._what.get("pooled", False):
+            self._worker = self._worker_pool.acquire()
+
+        if self._worker is not None:
+            self._parent_pipe = self._worker.get_pipe()
+            self._worker.submit(self._what)
+
+            logging.debug("Running job %d in worker with pid \"%d\"" % (self._id, self._worker.pid))
+            return True
+
         self._parent_pipe, self._child_pipe = multiprocessing.Pipe()
         self._process = multiprocessing.Process(target=self._run)
 
@@ -92,32 +325,24 @@ class Job(object):
         logging.debug("Running job %d with pid \"%d\"" % (self._id, self._pid))
         return True
 
+    def set_started(self, pid):
+        """Sets the pid of the job process forked by a worker"""
+        self._pid = pid
+        pending, self._pending_signals = self._pending_signals, []
+        for sig in pending:
+            self.kill(sig)
+
     def _run(self):
         self._parent_pipe.close()
 
-        os.setpgrp()
-        signal.signal(signal.SIGHUP, signal.SIG_DFL)
-        signal.signal(signal.SIGINT, signal.SIG_DFL)
-        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        reset_job_process_signals()
 
         self._log_ctl.disable_logging()
         self._log_ctl.set_connection(self._child_pipe)
 
-        result = {}
-        try:
-            self._job_cls.run()
-            job_result = self._job_cls.get_result()
-        except Exception as e:
-            log_exc_traceback()
-            job_result = {}
-            job_result["passed"] = False
-            job_result["type"] = "exception"
-            job_result["res_data"] = self._job_cls.get_result()
-            job_result["res_data"]["exception"] = e
-        finally:
-            result["type"] = "job_finished"
-            result["job_id"] = self._id
-            result["result"] = job_result
+        sender = InterimSender(self._id, self._child_pipe,
+                               self._log_ctl.transmit_handler)
+        result = run_job_cls(self._id, self._job_cls, sender)
 
         send_data(self._child_pipe, result)
         self._child_pipe.close()
@@ -126,11 +351,17 @@ class Job(object):
         if self._finished:
             logging.debug("Job finished before sending the signal")
             return True
+        if self._worker is not None and self._pid is None:
+            logging.debug("Job %d not started by the worker yet, signal %s "
+                          "postponed" % (self._id, sig))
+            self._pending_signals.append(sig)
+            return True
         try:
             logging.debug("Sending signal %s to pid %d" % (sig, self._pid))
             os.killpg(self._pid, sig)
 
-            if sig == signal.SIGKILL:
+            # the worker reports a job killed in it as finished
+            if sig == signal.SIGKILL and self._worker is None:
                 self.set_finished(dict(type = "job_finished",
                                        job_id = self._id,
                                        result = dict(passed = False,
@@ -144,14 +375,18 @@ class Job(object):
             return False
 
     def join(self):
-        self._process.join()
+        if self._worker is None:
+            self._process.join()
 
     def set_finished(self, result):
         self._finished = True
         self._result = result
 
-        self._parent_pipe.close()
-        self._child_pipe.close()
+        if self._worker is not None:
+            self._worker_pool.release(self._worker)
+        else:
+            self._parent_pipe.close()
+            self._child_pipe.close()
         self._parent_pipe = None
         self._child_pipe = None
 
@@ -164,6 +399,14 @@ class GenericJob(object):
         self._result = {"passed": False,
                         "res_data": None,
                         "type": "result"}
+        self._interim_sender = None
+
+    @property
+    def interim_requested(self):
+        return self._what.get("interim", False)
+
+    def set_interim_sender(self, sender):
+        self._interim_sender = sender
 
     def run(self):
         raise JobError("Method run must be defined.")
@@ -257,9 +500,44 @@ class ShellExecJob(GenericJob):
         # cmd = "%-9scmd: \"%s\"" %(cmd_type + netns, cmd_val)
         # return cmd
 
+class ShellBatchJob(GenericJob):
+    def run(self):
+        commands = self._what["commands"]
+        fail_fast = self._what["fail_fast"]
+        parallel = self._what["parallel"]
+
+        results = [{"command": cmd, "stdout": "", "stderr": "", "retval": None}
+                   for cmd in commands]
+        failed = threading.Event()
+
+        def run_command(i):
+            if fail_fast and failed.is_set():
+                return
+
+            res = results[i]
+            try:
+                res["stdout"], res["stderr"] = exec_cmd(res["command"])
+                res["retval"] = 0
+            except ExecCmdFail as e:
+                res["stdout"] = e.get_stdout()
+                res["stderr"] = e.get_stderr()
+                res["retval"] = e.get_retval()
+                failed.set()
+
+        if parallel > 1:
+            with ThreadPoolExecutor(max_workers=parallel) as executor:
+                list(executor.map(run_command, range(len(commands))))
+        else:
+            for i in range(len(commands)):
+                run_command(i)
+
+        self._result["passed"] = not failed.is_set()
+        self._result["res_data"] = {"results": results}
+
 class ModuleJob(GenericJob):
     def run(self):
         try:
+            self._what["module"]._set_interim_sender(self._interim_sender)
             self._result["passed"] = self._what["module"].run()
             self._result["res_data"] = self._what["module"]._get_res_data()
         except Exception as e:
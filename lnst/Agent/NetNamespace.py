@@ -0,0 +1,113 @@
+"""
+This module defines functions creating and removing named network namespaces
+of the Agent
+
+Copyright 2026 Red Hat, Inc.
+Licensed under the GNU General Public License, version 2 as
+published by the Free Software Foundation; see COPYING for details.
+"""
+
+import os
+import stat
+import ctypes
+import ctypes.util
+
+#from sched.h
+CLONE_NEWNET = 0x40000000
+CLONE_NEWNS = 0x00020000
+#based on ipnetns.c from the iproute2 project
+MNT_DETACH = 0x00000002
+MS_BIND = 4096
+MS_SLAVE = 1<<19
+MS_REC = 16384
+MS_SHARED = 1 << 20
+
+NETNS_DIR = "/var/run/netns/"
+
+def _libc():
+    return ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+
+def _check(ret, msg, netns):
+    if ret < 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, "{}: {}".format(msg, os.strerror(errno)), netns)
+
+def netns_path(netns):
+    return (NETNS_DIR + netns).encode("ascii")
+
+def enter_new_netns(netns, thread=False):
+    """Moves the caller into a new named network namespace
+
+    Creates /var/run/netns/<netns> the same way "ip netns add" does and
+    remounts /sys so that it shows the devices of the new namespace. With
+    thread=True only the calling thread is moved, this relies on network and
+    mount namespaces being per thread attributes.
+
+    Raises OSError if any of the steps fails, the named namespace is removed
+    again in that case. The caller may already be in the new network
+    namespace then, so it shouldn't be used any more.
+    """
+    libc = _libc()
+
+    #based on ipnetns.c from the iproute2 project
+    #bind to named namespace
+    netns_dir = NETNS_DIR.encode("ascii")
+    if not os.path.exists(netns_dir):
+        os.mkdir(netns_dir, stat.S_IRWXU | stat.S_IRGRP |
+                             stat.S_IXGRP | stat.S_IROTH |
+                             stat.S_IXOTH)
+
+    # this is a code mimicking the iproute2 implementation
+    # introduced by commit 58a3e8270f:
+    # modify all mounts in the files and subdirectories of
+    # /var/run/netns to be shared mount points so that unmount
+    # events can propagate, making it unlikely that "ip netns delete"
+    # will fail because a directory is mounted in another mount
+    # namespace
+    done = False
+    while libc.mount(b'', netns_dir, b'none', MS_SHARED | MS_REC, None) != 0:
+        if done:
+            _check(-1, 'share rundir failed', netns)
+        _check(libc.mount(netns_dir, netns_dir, b'none', MS_BIND | MS_REC,
+                          None), 'mount rundir failed', netns)
+        done = True
+
+    path = netns_path(netns)
+    try:
+        f = os.open(path, os.O_RDONLY | os.O_CREAT | os.O_EXCL, 0)
+    except FileExistsError:
+        raise Exception("Network namespace {} already exists".format(netns))
+    os.close(f)
+
+    try:
+        _check(libc.unshare(CLONE_NEWNET), 'unshare failed', netns)
+
+        if thread:
+            ns_file = b'/proc/thread-self/ns/net'
+        else:
+            ns_file = b'/proc/self/ns/net'
+
+        _check(libc.mount(ns_file, path, b'none', MS_BIND, None),
+               'mount failed', netns)
+
+        #map network sysfs to new net, the remount mustn't happen in the
+        #mount namespace of the caller
+        _check(libc.unshare(CLONE_NEWNS), 'unshare mount namespace failed',
+               netns)
+        _check(libc.mount(b'', b'/', b'none', MS_SLAVE | MS_REC, None),
+               'remount / failed', netns)
+        libc.umount2(b'/sys', MNT_DETACH)
+        _check(libc.mount(netns.encode("ascii"), b'/sys', b'sysfs', 0, None),
+               'mount sysfs failed', netns)
+    except OSError:
+        remove_netns(netns)
+        raise
+
+def remove_netns(netns):
+    """Removes the named network namespace created by enter_new_netns
+
+    The namespace itself is freed once no process or thread uses it.
+    """
+    path = netns_path(netns)
+    _libc().umount2(path, MNT_DETACH)
+    os.unlink(path)
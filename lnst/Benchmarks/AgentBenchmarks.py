@@ -0,0 +1,306 @@
+"""
+Benchmarks of the Controller-Agent communication
+
+The :any:`LoopbackAgent` starts an Agent process on the local machine with a
+temporary pool describing it, the :any:`BenchmarkRecipe` is then run by a
+regular :any:`Controller` so that the benchmarks exercise the complete
+Controller side stack - the MessageDispatcher, the SecureSocket and the
+RemoteDevice proxies.
+
+In the "loopback" mode the Agent runs in the current network namespace and
+the Controller connects to it through the loopback device. In the "netns"
+mode the Agent runs in a new network namespace connected with a veth pair,
+so that the traffic passes through a real network device. The test device
+of the Agent is a veth pair in both cases.
+"""
+
+import os
+import sys
+import time
+import shutil
+import logging
+import tempfile
+import subprocess
+from lnst.Common.ExecCmd import exec_cmd
+from lnst.Controller import Controller, BaseRecipe, HostReq, DeviceReq
+from lnst.Controller.Config import CtlConfig
+from lnst.Benchmarks.Harness import BaseBenchmark, BenchmarkError
+
+AGENT_MODES = ["loopback", "netns"]
+
+POOL_MACHINE_TEMPLATE = """<agentmachine>
+    <params>
+        <param name="hostname" value="{hostname}"/>
+        <param name="rpc_port" value="{port}"/>
+    </params>
+    <interfaces>
+        <eth label="lnst_benchmark" id="eth0">
+            <params>
+                <param name="hwaddr" value="{hwaddr}"/>
+            </params>
+        </eth>
+    </interfaces>
+</agentmachine>
+"""
+
+
+class LoopbackAgent(object):
+    """Runs a local Agent for the duration of a with statement
+
+    Requires root privileges to create the veth devices and the network
+    namespace.
+
+    :param mode: "loopback" or "netns"
+    :param port: RPC port of the Agent
+    :param prefix: prefix of the names of the created devices and namespace
+    """
+    def __init__(self, mode="loopback", port=9998, prefix="lnstbench"):
+        if mode not in AGENT_MODES:
+            raise BenchmarkError("Unknown agent mode {}".format(mode))
+        self._mode = mode
+        self._port = port
+        self._prefix = prefix
+        self._netns = prefix if mode == "netns" else None
+        self._ctl_addr = "192.168.254.1"
+        self._agent_addr = "192.168.254.2"
+        self._workdir = None
+        self._process = None
+
+    @property
+    def hostname(self):
+        return self._agent_addr if self._netns else "127.0.0.1"
+
+    def __enter__(self):
+        self._workdir = tempfile.mkdtemp(prefix="lnst-benchmark-")
+        try:
+            self._create_devices()
+            self._write_pool()
+            self._start_agent()
+        except:
+            self._cleanup()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self._cleanup()
+
+    def controller_config(self):
+        """Returns CtlConfig with the pool of the Agent and temporary logs"""
+        config = CtlConfig()
+        config.set_option("environment", "log_dir",
+                          os.path.join(self._workdir, "ctl_logs"))
+        config.add_pool("lnst_benchmark", os.path.join(self._workdir, "pool"),
+                        self._workdir)
+        return config
+
+    def _netns_exec(self, cmd):
+        if self._netns:
+            return "ip netns exec {} {}".format(self._netns, cmd)
+        return cmd
+
+    def _create_devices(self):
+        test_dev = self._prefix + "0"
+        exec_cmd("ip link add {} type veth peer name {}".format(
+            test_dev, self._prefix + "1"))
+
+        if self._netns:
+            ctl_dev = self._prefix + "c"
+            agent_dev = self._prefix + "a"
+            exec_cmd("ip netns add {}".format(self._netns))
+            exec_cmd("ip link set {} netns {}".format(test_dev, self._netns))
+            exec_cmd("ip link set {} netns {}".format(self._prefix + "1",
+                                                     self._netns))
+            exec_cmd("ip link add {} type veth peer name {}".format(
+                ctl_dev, agent_dev))
+            exec_cmd("ip link set {} netns {}".format(agent_dev, self._netns))
+            exec_cmd("ip addr add {}/30 dev {}".format(self._ctl_addr,
+                                                      ctl_dev))
+            exec_cmd("ip link set {} up".format(ctl_dev))
+            exec_cmd(self._netns_exec("ip addr add {}/30 dev {}".format(
+                self._agent_addr, agent_dev)))
+            exec_cmd(self._netns_exec("ip link set {} up".format(agent_dev)))
+            exec_cmd(self._netns_exec("ip link set lo up"))
+
+        out, _ = exec_cmd(self._netns_exec(
+            "cat /sys/class/net/{}/address".format(test_dev)))
+        self._hwaddr = out.strip()
+
+    def _write_pool(self):
+        pool_dir = os.path.join(self._workdir, "pool")
+        os.mkdir(pool_dir)
+        with open(os.path.join(pool_dir, "agent.xml"), "w") as f:
+            f.write(POOL_MACHINE_TEMPLATE.format(
+                hostname=self.hostname, port=self._port, hwaddr=self._hwaddr))
+
+        with open(os.path.join(self._workdir, "lnst-agent.conf"), "w") as f:
+            f.write("[environment]\nlog_dir = {}\n[cache]\ncache_dir = {}\n"
+                    .format(os.path.join(self._workdir, "agent_logs"),
+                            os.path.join(self._workdir, "agent_cache")))
+
+    def _start_agent(self):
+        cmd = [sys.executable, "-m", "lnst.Agent", "-m",
+               "-p", str(self._port),
+               "-c", os.path.join(self._workdir, "lnst-agent.conf")]
+        if self._netns:
+            cmd = ["ip", "netns", "exec", self._netns] + cmd
+
+        env = dict(os.environ)
+        lnst_root = os.path.dirname(os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__))))
+        env["PYTHONPATH"] = os.pathsep.join(
+            [lnst_root] + [p for p in [env.get("PYTHONPATH")] if p])
+
+        with open(os.path.join(self._workdir, "agent.out"), "w") as out:
+            self._process = subprocess.Popen(cmd, env=env, stdout=out,
+                                             stderr=subprocess.STDOUT)
+
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if self._process.poll() is not None:
+                with open(os.path.join(self._workdir, "agent.out")) as out:
+                    output = out.read()[-2000:]
+                raise BenchmarkError("Agent exited with {}:\n{}".format(
+                    self._process.returncode, output))
+            if self._agent_listening():
+                return
+            time.sleep(0.1)
+        raise BenchmarkError("Agent didn't start listening on {}:{}".format(
+            self.hostname, self._port))
+
+    def _agent_listening(self):
+        # the agent accepts a single controller connection, so it's not
+        # probed by connecting to it, the listening sockets are checked
+        # instead
+        out, _ = exec_cmd(self._netns_exec("cat /proc/net/tcp /proc/net/tcp6"),
+                          die_on_err=False, log_outputs=False)
+        for line in out.splitlines()[1:]:
+            fields = line.split()
+            if len(fields) < 4 or ":" not in fields[1]:
+                continue
+            if (int(fields[1].rsplit(":", 1)[1], 16) == self._port and
+                    fields[3] == "0A"):
+                return True
+        return False
+
+    def _cleanup(self):
+        if self._process is not None:
+            self._process.terminate()
+            try:
+                self._process.wait(10)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
+            self._process = None
+
+        exec_cmd(self._netns_exec("ip link del {}".format(self._prefix + "0")),
+                 die_on_err=False)
+        if self._netns:
+            exec_cmd("ip link del {}".format(self._prefix + "c"),
+                     die_on_err=False)
+            exec_cmd("ip netns del {}".format(self._netns), die_on_err=False)
+
+        if self._workdir is not None:
+            shutil.rmtree(self._workdir, ignore_errors=True)
+            self._workdir = None
+
+
+class BenchmarkRecipe(BaseRecipe):
+    """Runs the agent benchmarks on the mapped Agent host"""
+    agent = HostReq()
+    agent.eth0 = DeviceReq(label="lnst_benchmark")
+
+    def __init__(self, benchmarks, runner, **kwargs):
+        super().__init__(**kwargs)
+        self._benchmarks = benchmarks
+        self._runner = runner
+        self.benchmark_results = []
+
+    def test(self):
+        for benchmark in self._benchmarks:
+            benchmark.host = self.matched.agent
+            logging.info("Running benchmark {}".format(benchmark.name))
+            self.benchmark_results.append(self._runner.run(benchmark))
+
+
+def run_agent_benchmarks(benchmarks, runner, mode="loopback", port=9998):
+    """Starts a :any:`LoopbackAgent` and runs the benchmarks through a
+    Controller connected to it
+
+    :return: list of :any:`BenchmarkResult`
+    """
+    with LoopbackAgent(mode, port) as agent:
+        ctl = Controller(config=agent.controller_config(),
+                         pools=["lnst_benchmark"])
+        recipe = BenchmarkRecipe(benchmarks, runner)
+        ctl.run(recipe)
+        return recipe.benchmark_results
+
+
+class RpcRoundTripBenchmark(BaseBenchmark):
+    """Calls a trivial remote method of the Agent"""
+    name = "rpc.round_trip"
+    group = "agent"
+
+    def run(self):
+        self.host._machine.rpc_call("has_resource", "0" * 40)
+
+
+class JobRunBenchmark(BaseBenchmark):
+    """Runs a short foreground command on the Agent"""
+    name = "rpc.job_run_true"
+    group = "agent"
+
+    def run(self):
+        self.host.run("true")
+
+
+class RemoteDeviceGetattrBenchmark(BaseBenchmark):
+    """Reads an attribute of a RemoteDevice, each access is a remote call
+    unless the read only cache is enabled"""
+    group = "agent"
+
+    def __init__(self, attr, cached=False):
+        self.name = "remotedevice.{}getattr_{}".format(
+            "cached_" if cached else "", attr)
+        self._attr = attr
+        self._cached = cached
+
+    def setup(self):
+        self._dev = self.host.eth0
+        if self._cached:
+            self._dev.enable_readonly_cache()
+
+    def run(self):
+        getattr(self._dev, self._attr)
+
+    def teardown(self):
+        if self._cached:
+            self._dev.disable_readonly_cache()
+
+
+class RemoteDeviceCacheRefreshBenchmark(BaseBenchmark):
+    """Refreshes the read only cache of a RemoteDevice, i.e. fetches all
+    of its attributes"""
+    name = "remotedevice.cache_refresh"
+    group = "agent"
+
+    def setup(self):
+        self._dev = self.host.eth0
+
+    def run(self):
+        self._dev.update_readonly_cache()
+
+    def teardown(self):
+        self._dev.disable_readonly_cache()
+
+
+def agent_benchmarks():
+    """Returns the default set of agent benchmarks"""
+    return [
+        RpcRoundTripBenchmark(),
+        JobRunBenchmark(),
+        RemoteDeviceGetattrBenchmark("mtu"),
+        RemoteDeviceGetattrBenchmark("ips"),
+        RemoteDeviceGetattrBenchmark("mtu", cached=True),
+        RemoteDeviceCacheRefreshBenchmark(),
+    ]
@@ -0,0 +1,292 @@
+"""
+Benchmark runner, result storage and comparison
+
+A benchmark is a :any:`BaseBenchmark` subclass that implements a single
+operation in its `run` method. The :any:`BenchmarkRunner` calibrates how many
+operations fit into one sample, collects the configured number of samples and
+returns a :any:`BenchmarkResult` with the time of one operation per sample.
+
+Results of a whole run are stored as a JSON document::
+
+    {
+        "format": 1,
+        "lnst_version": "14",
+        "python": "3.11.4",
+        "platform": "Linux-6.5.6-x86_64-with-glibc2.38",
+        "timestamp": 1700000000.0,
+        "agent": "loopback",
+        "results": {
+            "securesocket.send_recv_4k": {
+                "unit": "s", "number": 1024, "samples": [...],
+                "median": 1.1e-05, "mean": ..., "stdev": ..., "min": ...,
+                "bytes_per_op": 4096
+            },
+            ...
+        }
+    }
+
+and :any:`compare_results` compares such documents benchmark by benchmark.
+"""
+
+import gc
+import json
+import time
+import platform
+import statistics
+from lnst.Common.LnstError import LnstError
+from lnst.Common.Version import lnst_version
+
+RESULTS_FORMAT = 1
+
+
+class BenchmarkError(LnstError):
+    pass
+
+
+class BaseBenchmark(object):
+    """Base class of the benchmarks
+
+    :ivar name: unique dotted name of the benchmark, used to pair the results
+        with the reference results
+    :ivar group: "local" benchmarks run in the controller process, "agent"
+        benchmarks need a running Agent, the runner sets the mapped
+        :any:`Host` to the `host` attribute before calling `setup`
+    :ivar bytes_per_op: optional number of bytes processed by one operation,
+        the throughput is reported when set
+    """
+    name = None
+    group = "local"
+    bytes_per_op = None
+
+    def setup(self):
+        pass
+
+    def run(self):
+        """Performs a single operation"""
+        raise NotImplementedError()
+
+    def teardown(self):
+        pass
+
+
+class BenchmarkResult(object):
+    """Timing of a benchmark
+
+    :ivar samples: list of seconds per operation, one per sample
+    :ivar number: operations per sample
+    """
+    def __init__(self, name, samples, number, bytes_per_op=None):
+        self.name = name
+        self.samples = samples
+        self.number = number
+        self.bytes_per_op = bytes_per_op
+
+    @property
+    def median(self):
+        return statistics.median(self.samples)
+
+    @property
+    def mean(self):
+        return statistics.mean(self.samples)
+
+    @property
+    def stdev(self):
+        if len(self.samples) < 2:
+            return 0.0
+        return statistics.stdev(self.samples)
+
+    @property
+    def min(self):
+        return min(self.samples)
+
+    @property
+    def throughput(self):
+        """bytes per second of the median sample"""
+        if self.bytes_per_op is None or not self.median:
+            return None
+        return self.bytes_per_op / self.median
+
+    def to_dict(self):
+        return {
+            "unit": "s",
+            "number": self.number,
+            "samples": self.samples,
+            "median": self.median,
+            "mean": self.mean,
+            "stdev": self.stdev,
+            "min": self.min,
+            "bytes_per_op": self.bytes_per_op,
+        }
+
+    @classmethod
+    def from_dict(cls, name, data):
+        return cls(name, data["samples"], data["number"],
+                   data.get("bytes_per_op"))
+
+    def describe(self):
+        desc = "{:<44} {:>12} {:>12} {:>7.1%} {:>9}".format(
+            self.name, format_time(self.median), format_time(self.min),
+            self.stdev / self.median if self.median else 0.0, self.number)
+        if self.throughput is not None:
+            desc += " {:>10.1f} MiB/s".format(self.throughput / 2**20)
+        return desc
+
+
+def format_time(seconds):
+    for unit, scale in [("s", 1), ("ms", 1e-3), ("us", 1e-6)]:
+        if seconds >= scale:
+            return "{:.3f} {}".format(seconds / scale, unit)
+    return "{:.1f} ns".format(seconds / 1e-9)
+
+
+class BenchmarkRunner(object):
+    """Times benchmarks in the style of the timeit module
+
+    The number of operations per sample is doubled until a sample takes at
+    least min_time seconds, the garbage collector is disabled while a sample
+    is being timed.
+
+    :param repeat: number of samples
+    :param min_time: minimal duration of a sample in seconds
+    :param max_number: upper limit of the operations per sample, limits the
+        calibration of slow agent benchmarks
+    """
+    def __init__(self, repeat=7, min_time=0.2, max_number=2**20):
+        if repeat < 1:
+            raise BenchmarkError("repeat has to be at least 1")
+        self._repeat = repeat
+        self._min_time = min_time
+        self._max_number = max_number
+
+    def run(self, benchmark):
+        benchmark.setup()
+        try:
+            number = self._calibrate(benchmark)
+            samples = [self._sample(benchmark, number)
+                       for i in range(self._repeat)]
+        finally:
+            benchmark.teardown()
+
+        return BenchmarkResult(benchmark.name, samples, number,
+                               benchmark.bytes_per_op)
+
+    def _calibrate(self, benchmark):
+        number = 1
+        while number < self._max_number:
+            if self._sample(benchmark, number) * number >= self._min_time:
+                break
+            number *= 2
+        return number
+
+    @staticmethod
+    def _sample(benchmark, number):
+        run = benchmark.run
+        gc.collect()
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            for i in range(number):
+                run()
+            end = time.perf_counter()
+        finally:
+            if gc_enabled:
+                gc.enable()
+        return (end - start) / number
+
+
+def results_document(results, agent=None):
+    """Creates the stored form of a list of :any:`BenchmarkResult`"""
+    return {
+        "format": RESULTS_FORMAT,
+        "lnst_version": str(lnst_version),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.time(),
+        "agent": agent,
+        "results": {result.name: result.to_dict() for result in results},
+    }
+
+
+def save_results(document, path):
+    with open(path, "w") as f:
+        json.dump(document, f, indent=4, sort_keys=True)
+
+
+def load_results(path):
+    """Loads a stored results document
+
+    :return: dictionary of benchmark name to :any:`BenchmarkResult`
+    """
+    try:
+        with open(path) as f:
+            document = json.load(f)
+    except (OSError, ValueError) as e:
+        raise BenchmarkError("Can't load benchmark results {}: {}".format(
+            path, e))
+
+    if document.get("format") != RESULTS_FORMAT:
+        raise BenchmarkError("Unsupported benchmark results format in {}"
+                             .format(path))
+
+    return {name: BenchmarkResult.from_dict(name, data)
+            for name, data in document["results"].items()}
+
+
+class Comparison(object):
+    """Result of comparing a benchmark with its reference
+
+    :ivar status: one of "regression", "improvement", "unchanged", "new"
+        (no reference) and "missing" (no current result)
+    :ivar change: relative change of the median time, positive is slower
+    """
+    def __init__(self, name, current, reference, status, change=None):
+        self.name = name
+        self.current = current
+        self.reference = reference
+        self.status = status
+        self.change = change
+
+    def describe(self):
+        if self.change is None:
+            return "{:<44} {}".format(self.name, self.status)
+        return "{:<44} {:>12} -> {:>12} {:>+8.1%} {}".format(
+            self.name, format_time(self.reference.median),
+            format_time(self.current.median), self.change, self.status)
+
+
+def compare_results(current, reference, threshold=0.1, noise_factor=2.0):
+    """Compares current results with reference results
+
+    A benchmark regressed when its median time grew by more than threshold
+    (relative) and the growth is larger than noise_factor times the larger
+    of the two standard deviations, i.e. differences within the run to run
+    noise of noisy benchmarks aren't reported. Improvements are detected
+    symmetrically.
+
+    :param current: dictionary of name to :any:`BenchmarkResult`
+    :param reference: dictionary of name to :any:`BenchmarkResult`
+    :return: list of :any:`Comparison` sorted by name
+    """
+    comparisons = []
+    for name in sorted(set(current) | set(reference)):
+        cur = current.get(name)
+        ref = reference.get(name)
+        if ref is None:
+            comparisons.append(Comparison(name, cur, ref, "new"))
+            continue
+        if cur is None:
+            comparisons.append(Comparison(name, cur, ref, "missing"))
+            continue
+
+        diff = cur.median - ref.median
+        change = diff / ref.median if ref.median else 0.0
+        noise = noise_factor * max(cur.stdev, ref.stdev)
+        if abs(change) <= threshold or abs(diff) <= noise:
+            status = "unchanged"
+        elif diff > 0:
+            status = "regression"
+        else:
+            status = "improvement"
+        comparisons.append(Comparison(name, cur, ref, status, change))
+    return comparisons
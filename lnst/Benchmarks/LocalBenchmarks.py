@@ -0,0 +1,198 @@
+"""
+Benchmarks of the Controller side code that run without an Agent
+"""
+
+import sys
+import socket
+import subprocess
+from lnst.Common.SecureSocket import SecureSocket
+from lnst.Controller.MachineMapper import MachineMapper
+from lnst.RecipeCommon.Perf.Results import PerfInterval
+from lnst.RecipeCommon.Perf.Results import SequentialPerfResult
+from lnst.RecipeCommon.Perf.Results import ParallelPerfResult
+from lnst.Benchmarks.Harness import BaseBenchmark, BenchmarkError
+
+
+class SecureSocketBenchmark(BaseBenchmark):
+    """Sends a message of the given payload size through a pair of connected
+    unix sockets and receives it on the other end, including the pickling
+    and the length prefix parsing
+
+    Both ends are handled by the same thread, the message has to fit into
+    the socket buffers.
+    """
+    def __init__(self, size):
+        self.name = "securesocket.send_recv_{}".format(_format_size(size))
+        self.bytes_per_op = size
+        self._size = size
+
+    def setup(self):
+        first, second = socket.socketpair()
+        self._sender = SecureSocket(first)
+        self._receiver = SecureSocket(second)
+        self._msg = {"type": "result", "result": b"x" * self._size}
+
+    def run(self):
+        self._sender.send_msg(self._msg)
+        if self._receiver.recv_msg()["type"] != "result":
+            raise BenchmarkError("Unexpected message received")
+
+    def teardown(self):
+        self._sender.close()
+        self._receiver.close()
+
+
+class _SyntheticPoolsManager(object):
+    """Provides a single pool of generated machines to the MachineMapper,
+    all of them available"""
+    def __init__(self, pool):
+        self._pools = {"benchmark": pool}
+
+    def get_pools(self):
+        return self._pools
+
+    def check_availability(self, pool_name, m_ids):
+        for m_id in m_ids:
+            self._pools[pool_name][m_id]["available"] = True
+
+
+class MachineMapperBenchmark(BaseBenchmark):
+    """Maps two hosts with two devices each to a generated pool
+
+    Only the last two machines of the pool (in the order the mapper tries
+    them) have devices with the required driver, so the mapper has to
+    backtrack through the device combinations of all the others.
+    """
+    def __init__(self, pool_size, interfaces=4):
+        self.name = "machinemapper.match_{}x{}".format(pool_size, interfaces)
+        self._pool_size = pool_size
+        self._interfaces = interfaces
+
+    def setup(self):
+        pool = {}
+        for i in range(self._pool_size):
+            driver = "mlx5" if i >= self._pool_size - 2 else "ixgbe"
+            pool["m{:05d}".format(i)] = {
+                "params": {"hostname": "m{}.example.com".format(i)},
+                "interfaces": {
+                    "eth{}".format(j): {
+                        "network": "net{}".format(j),
+                        "params": {
+                            "hwaddr": "52:54:00:{:02x}:{:02x}:{:02x}".format(
+                                i >> 8, i & 0xff, j),
+                            "driver": driver,
+                        },
+                    }
+                    for j in range(self._interfaces)
+                },
+                "security": {"auth_type": "none"},
+                "available": True,
+            }
+
+        dev_req = lambda label: {"network": label,
+                                 "params": {"driver": "mlx5"}}
+        self._mreqs = {
+            host: {"params": {},
+                   "interfaces": {"eth0": dev_req("a"), "eth1": dev_req("b")}}
+            for host in ["host1", "host2"]
+        }
+        self._pools_manager = _SyntheticPoolsManager(pool)
+
+    def run(self):
+        mapper = MachineMapper()
+        mapper.set_pools_manager(self._pools_manager)
+        mapper.set_requirements(self._mreqs)
+        next(mapper.matches())
+
+
+def _generate_series(count, parallel=1, unit="bits"):
+    result = ParallelPerfResult()
+    for i in range(parallel):
+        series = SequentialPerfResult()
+        for j in range(count):
+            series.append(PerfInterval(1000.0 + j % 7, 1.0, unit, 1000.0 + j))
+        result.append(series)
+    return result
+
+
+class PerfResultBuildBenchmark(BaseBenchmark):
+    """Builds parallel series of one second PerfIntervals, as the flow
+    measurements do when parsing the per second samples of the perf tools"""
+    def __init__(self, count, parallel):
+        self.name = "perfresult.build_{}x{}".format(parallel, count)
+        self._count = count
+        self._parallel = parallel
+
+    def run(self):
+        _generate_series(self._count, self._parallel)
+
+
+class PerfResultAggregationBenchmark(BaseBenchmark):
+    """Computes a statistic of a long parallel series
+
+    :param statistic: "average", "std_deviation" or "time_slice", the time
+        slice drops the first and last 10% of the series, similar to the
+        warmup and warmdown removal
+    """
+    def __init__(self, statistic, count, parallel):
+        self.name = "perfresult.{}_{}x{}".format(statistic, parallel, count)
+        self._statistic = statistic
+        self._count = count
+        self._parallel = parallel
+
+    def setup(self):
+        self._result = _generate_series(self._count, self._parallel)
+
+    def run(self):
+        if self._statistic == "time_slice":
+            margin = self._count // 10
+            self._result.time_slice(self._result.start_timestamp + margin,
+                                    self._result.end_timestamp - margin)
+        else:
+            getattr(self._result, self._statistic)
+
+    def teardown(self):
+        self._result = None
+
+
+class ImportTimeBenchmark(BaseBenchmark):
+    """Imports a module in a new interpreter, measures the startup time of
+    the Controller and Agent entry points
+
+    The interpreter startup itself is included, compare with the
+    "import.sys" benchmark to get the time spent in the module imports.
+    """
+    def __init__(self, module):
+        self.name = "import.{}".format(module)
+        self._cmd = [sys.executable, "-c", "import {}".format(module)]
+
+    def run(self):
+        if subprocess.call(self._cmd) != 0:
+            raise BenchmarkError("Failed to run {}".format(" ".join(self._cmd)))
+
+
+def _format_size(size):
+    if size >= 2**20 and size % 2**20 == 0:
+        return "{}m".format(size // 2**20)
+    if size >= 2**10 and size % 2**10 == 0:
+        return "{}k".format(size // 2**10)
+    return str(size)
+
+
+def local_benchmarks():
+    """Returns the default set of local benchmarks"""
+    return [
+        SecureSocketBenchmark(64),
+        SecureSocketBenchmark(4 * 2**10),
+        SecureSocketBenchmark(64 * 2**10),
+        MachineMapperBenchmark(100),
+        MachineMapperBenchmark(1000),
+        PerfResultBuildBenchmark(3600, 8),
+        PerfResultAggregationBenchmark("average", 3600, 8),
+        PerfResultAggregationBenchmark("std_deviation", 3600, 8),
+        PerfResultAggregationBenchmark("time_slice", 3600, 8),
+        ImportTimeBenchmark("sys"),
+        ImportTimeBenchmark("lnst.Controller"),
+        ImportTimeBenchmark("lnst.Agent.Agent"),
+        ImportTimeBenchmark("lnst.Recipes.ENRT"),
+    ]
@@ -0,0 +1,18 @@
+"""
+Benchmarks of LNST's own code
+
+Run with::
+
+    python -m lnst.Benchmarks --output results.json
+    python -m lnst.Benchmarks --compare results.json --threshold 0.1
+
+The local benchmarks (SecureSocket, MachineMapper, PerfResult aggregation,
+import time of the entry points) run in the current process, the agent
+benchmarks (remote method calls, RemoteDevice attribute access, jobs) start
+an Agent on the local machine and need root privileges, see
+:any:`AgentBenchmarks`.
+"""
+
+from lnst.Benchmarks.Harness import BaseBenchmark, BenchmarkResult
+from lnst.Benchmarks.Harness import BenchmarkRunner, BenchmarkError
+from lnst.Benchmarks.Harness import compare_results
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Command line entry point of the LNST benchmarks
+
+Exits with 1 when a regression against the reference results is found.
+"""
+import os
+import sys
+import fnmatch
+import argparse
+from lnst.Benchmarks.Harness import BenchmarkRunner, BenchmarkError
+from lnst.Benchmarks.Harness import results_document, save_results
+from lnst.Benchmarks.Harness import load_results, compare_results
+from lnst.Benchmarks.LocalBenchmarks import local_benchmarks
+from lnst.Benchmarks.AgentBenchmarks import agent_benchmarks
+from lnst.Benchmarks.AgentBenchmarks import run_agent_benchmarks, AGENT_MODES
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LNST benchmarks")
+    parser.add_argument("-a", "--agent", choices=AGENT_MODES + ["none"],
+                        default="loopback" if os.geteuid() == 0 else "none",
+                        help="how to run the Agent for the agent benchmarks, "
+                             "'none' runs only the local benchmarks "
+                             "(default without root privileges)")
+    parser.add_argument("-p", "--port", type=int, default=9998,
+                        help="RPC port of the benchmark Agent")
+    parser.add_argument("-f", "--filter", action="append", default=[],
+                        help="run only the benchmarks matching the fnmatch "
+                             "pattern, can be repeated")
+    parser.add_argument("-l", "--list", action="store_true",
+                        help="list the benchmarks and exit")
+    parser.add_argument("-r", "--repeat", type=int, default=7,
+                        help="number of samples of each benchmark")
+    parser.add_argument("-t", "--min-time", type=float, default=0.2,
+                        help="minimal duration of a sample in seconds")
+    parser.add_argument("-o", "--output",
+                        help="store the results to a JSON file")
+    parser.add_argument("-c", "--compare",
+                        help="compare the results with reference results "
+                             "stored by a previous run")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative slowdown reported as a regression, "
+                             "default 0.1")
+    args = parser.parse_args()
+
+    benchmarks = local_benchmarks()
+    if args.agent != "none":
+        benchmarks += agent_benchmarks()
+    if args.filter:
+        benchmarks = [b for b in benchmarks
+                      if any(fnmatch.fnmatchcase(b.name, f)
+                             for f in args.filter)]
+
+    if args.list:
+        for benchmark in benchmarks:
+            print("{:<44} {}".format(benchmark.name, benchmark.group))
+        return 0
+
+    try:
+        reference = load_results(args.compare) if args.compare else None
+
+        runner = BenchmarkRunner(args.repeat, args.min_time)
+        results = []
+        print("{:<44} {:>12} {:>12} {:>7} {:>9}".format(
+            "benchmark", "median", "min", "stdev", "number"))
+        for benchmark in benchmarks:
+            if benchmark.group == "local":
+                results.append(runner.run(benchmark))
+                print(results[-1].describe())
+
+        remote = [b for b in benchmarks if b.group == "agent"]
+        if remote:
+            agent_results = run_agent_benchmarks(remote, runner, args.agent,
+                                                 args.port)
+            for result in agent_results:
+                print(result.describe())
+            results += agent_results
+    except BenchmarkError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    if args.output:
+        save_results(results_document(results, args.agent), args.output)
+
+    if reference is None:
+        return 0
+
+    # the benchmarks that weren't selected aren't reported as missing
+    names = set(b.name for b in benchmarks)
+    reference = {name: ref for name, ref in reference.items() if name in names}
+
+    print()
+    regressions = 0
+    for comparison in compare_results({r.name: r for r in results},
+                                      reference, args.threshold):
+        print(comparison.describe())
+        regressions += comparison.status == "regression"
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
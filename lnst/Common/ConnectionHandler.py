@@ -43,13 +43,47 @@ def recv_data(s):
     return data
 
 
+class WakeupEvent(object):
+    """Event that can be selected together with the connections
+
+    Setting the event from any thread interrupts a check_connections call
+    that is blocked in select, the event is cleared by that call.
+    """
+    def __init__(self):
+        self._r, self._w = socket.socketpair()
+        self._r.setblocking(False)
+        self._w.setblocking(False)
+
+    def fileno(self):
+        return self._r.fileno()
+
+    def set(self):
+        try:
+            self._w.send(b"\0")
+        except BlockingIOError:
+            # the buffer is full, so the event is already set
+            pass
+
+    def clear(self):
+        try:
+            while self._r.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def close(self):
+        self._r.close()
+        self._w.close()
+
+
 class ConnectionHandler(object):
     def __init__(self):
         self._connections = []
         self._connection_mapping = {}
 
-    def check_connections(self, timeout=None):
-        return self._check_connections(list(self._connections), timeout)
+    def check_connections(self, timeout=None, wakeup=None):
+        return self._check_connections(list(self._connections), timeout,
+                                       wakeup)
 
     def check_connections_by_id(self, connection_ids, timeout=None):
         connections = []
@@ -57,23 +91,29 @@ class ConnectionHandler(object):
             connections.append(self._connection_mapping[con_id])
         return self._check_connections(connections, timeout)
 
-    def _check_connections(self, connections, timeout):
+    def _check_connections(self, connections, timeout, wakeup=None):
         for c in list(connections):
             if c.closed:
                 self.remove_connection(c)
                 connections.remove(c)
 
         requests = []
+        selected = list(connections)
+        if wakeup is not None:
+            selected.append(wakeup)
         try:
-            rl, wl, xl = select.select(connections, [], [], timeout)
+            rl, wl, xl = select.select(selected, [], [], timeout)
         except select.error:
             logging.debug(traceback.format_exc())
             return []
+        if wakeup is not None and wakeup in rl:
+            wakeup.clear()
+            rl.remove(wakeup)
         for f in rl:
             f_ready = True
             while f_ready:
                 try:
-                    data = recv_data(f)
+                    data = self._recv_data(f)
 
                     if data == "":
                         f.close()
@@ -100,6 +140,9 @@ class ConnectionHandler(object):
 
         return requests
 
+    def _recv_data(self, connection):
+        return recv_data(connection)
+
     def get_connection(self, id):
         if id in self._connection_mapping:
             return self._connection_mapping[id]
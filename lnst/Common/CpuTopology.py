@@ -0,0 +1,101 @@
+"""
+CPU topology and NUMA locality of network devices read from sysfs
+
+The functions are used by the Agent to describe the host to the Controller,
+the results are plain dictionaries so that they can be sent over RPC.
+"""
+
+import os
+import glob
+import re
+
+SYSFS_CPU_DIR = "/sys/devices/system/cpu"
+SYSFS_NODE_DIR = "/sys/devices/system/node"
+SYSFS_NET_DIR = "/sys/class/net"
+
+
+def parse_cpu_list(cpu_list):
+    """Parses cpu list in the kernel format, e.g. "0-3,8,10-11" """
+    cpus = []
+    for item in cpu_list.strip().split(","):
+        if not item:
+            continue
+        if "-" in item:
+            first, last = item.split("-")
+            cpus.extend(range(int(first), int(last) + 1))
+        else:
+            cpus.append(int(item))
+    return cpus
+
+
+def _read(path, default=None):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return default
+
+
+def _read_int(path, default=None):
+    value = _read(path)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def read_cpu_topology():
+    """Returns the topology of the online CPUs
+
+    Returns dictionary of cpu id to {"node": numa node, "package": physical
+    package id, "core": core id, "siblings": list of SMT sibling cpus
+    including the cpu itself}.
+    """
+    online = _read(os.path.join(SYSFS_CPU_DIR, "online"))
+    if online is None:
+        online_cpus = [int(re.search(r"cpu(\d+)$", path).group(1))
+                       for path in glob.glob(os.path.join(SYSFS_CPU_DIR,
+                                                          "cpu[0-9]*"))]
+    else:
+        online_cpus = parse_cpu_list(online)
+
+    cpu_nodes = {}
+    for node_path in glob.glob(os.path.join(SYSFS_NODE_DIR, "node[0-9]*")):
+        node = int(re.search(r"node(\d+)$", node_path).group(1))
+        for cpu in parse_cpu_list(_read(os.path.join(node_path, "cpulist"),
+                                        "")):
+            cpu_nodes[cpu] = node
+
+    topology = {}
+    for cpu in sorted(online_cpus):
+        topo_dir = os.path.join(SYSFS_CPU_DIR, "cpu%d" % cpu, "topology")
+        siblings = _read(os.path.join(topo_dir, "thread_siblings_list"))
+        topology[cpu] = {
+            "node": cpu_nodes.get(cpu, 0),
+            "package": _read_int(os.path.join(topo_dir,
+                                              "physical_package_id"), 0),
+            "core": _read_int(os.path.join(topo_dir, "core_id"), cpu),
+            "siblings": parse_cpu_list(siblings) if siblings else [cpu],
+        }
+    return topology
+
+
+def read_device_locality(ifname):
+    """Returns NUMA locality and queue counts of a network device
+
+    Returns dictionary with "numa_node" (-1 when the device isn't attached to
+    a specific node, e.g. virtual devices), "local_cpus" (list of cpus close
+    to the device, empty when unknown), "rx_queues" and "tx_queues".
+    """
+    dev_dir = os.path.join(SYSFS_NET_DIR, ifname)
+    local_cpus = _read(os.path.join(dev_dir, "device", "local_cpulist"))
+    queues = os.listdir(os.path.join(dev_dir, "queues")) \
+        if os.path.isdir(os.path.join(dev_dir, "queues")) else []
+
+    return {
+        "numa_node": _read_int(os.path.join(dev_dir, "device", "numa_node"),
+                               -1),
+        "local_cpus": parse_cpu_list(local_cpus) if local_cpus else [],
+        "rx_queues": len([q for q in queues if q.startswith("rx-")]),
+        "tx_queues": len([q for q in queues if q.startswith("tx-")]),
+    }
@@ -0,0 +1,516 @@
+"""
+Access to the kernel's ethtool generic netlink family
+
+Reads and writes device offload features, interrupt coalescing, pause frame,
+ring and channel settings with netlink requests instead of running and parsing
+the output of the ethtool binary. All values of one request are applied by the
+kernel atomically and results are returned as dictionaries using the same
+setting names as the ethtool command line (e.g. "rx-usecs", "adaptive-rx",
+"combined").
+"""
+
+import fnmatch
+from pyroute2.netlink import NLA_F_NESTED, NLM_F_ACK, NLM_F_REQUEST
+from pyroute2.netlink import genlmsg, nla
+from pyroute2.netlink.generic import GenericNetlinkSocket
+
+ETHTOOL_GENL_NAME = "ethtool"
+ETHTOOL_GENL_VERSION = 1
+
+ETHTOOL_MSG_FEATURES_GET = 11
+ETHTOOL_MSG_FEATURES_SET = 12
+ETHTOOL_MSG_RINGS_GET = 15
+ETHTOOL_MSG_RINGS_SET = 16
+ETHTOOL_MSG_CHANNELS_GET = 17
+ETHTOOL_MSG_CHANNELS_SET = 18
+ETHTOOL_MSG_COALESCE_GET = 19
+ETHTOOL_MSG_COALESCE_SET = 20
+ETHTOOL_MSG_PAUSE_GET = 21
+ETHTOOL_MSG_PAUSE_SET = 22
+
+ETHTOOL_FLAG_OMIT_REPLY = 1 << 1
+
+# legacy "ethtool -K" feature names and the kernel feature name patterns
+# they stand for, mirrors the off_flag_def table of the ethtool utility
+FEATURE_ALIASES = {
+    "rx": "rx-checksum",
+    "rx-checksumming": "rx-checksum",
+    "tx": "tx-checksum-*",
+    "tx-checksumming": "tx-checksum-*",
+    "sg": "tx-scatter-gather",
+    "scatter-gather": "tx-scatter-gather",
+    "tso": "tx-tcp*-segmentation",
+    "tcp-segmentation-offload": "tx-tcp*-segmentation",
+    "ufo": "tx-udp-fragmentation",
+    "udp-fragmentation-offload": "tx-udp-fragmentation",
+    "gso": "tx-generic-segmentation",
+    "generic-segmentation-offload": "tx-generic-segmentation",
+    "gro": "rx-gro",
+    "generic-receive-offload": "rx-gro",
+    "lro": "rx-lro",
+    "large-receive-offload": "rx-lro",
+    "rxvlan": "rx-vlan-hw-parse",
+    "rx-vlan-offload": "rx-vlan-hw-parse",
+    "txvlan": "tx-vlan-hw-insert",
+    "tx-vlan-offload": "tx-vlan-hw-insert",
+    "ntuple": "rx-ntuple-filter",
+    "ntuple-filters": "rx-ntuple-filter",
+    "rxhash": "rx-hashing",
+    "receive-hashing": "rx-hashing",
+}
+
+
+class ethtoolheader(nla):
+    nla_flags = NLA_F_NESTED
+    nla_map = (
+        ("ETHTOOL_A_HEADER_UNSPEC", "none"),
+        ("ETHTOOL_A_HEADER_DEV_INDEX", "uint32"),
+        ("ETHTOOL_A_HEADER_DEV_NAME", "asciiz"),
+        ("ETHTOOL_A_HEADER_FLAGS", "uint32"),
+    )
+
+
+class ethtoolbitset(nla):
+    nla_flags = NLA_F_NESTED
+    nla_map = (
+        ("ETHTOOL_A_BITSET_UNSPEC", "none"),
+        ("ETHTOOL_A_BITSET_NOMASK", "flag"),
+        ("ETHTOOL_A_BITSET_SIZE", "uint32"),
+        ("ETHTOOL_A_BITSET_BITS", "bitset_bits"),
+        ("ETHTOOL_A_BITSET_VALUE", "hex"),
+        ("ETHTOOL_A_BITSET_MASK", "hex"),
+    )
+
+    class bitset_bits(nla):
+        nla_flags = NLA_F_NESTED
+        nla_map = (
+            ("ETHTOOL_A_BITSET_BITS_UNSPEC", "none"),
+            ("ETHTOOL_A_BITSET_BITS_BIT", "bitset_bit"),
+        )
+
+        class bitset_bit(nla):
+            nla_flags = NLA_F_NESTED
+            nla_map = (
+                ("ETHTOOL_A_BITSET_BIT_UNSPEC", "none"),
+                ("ETHTOOL_A_BITSET_BIT_INDEX", "uint32"),
+                ("ETHTOOL_A_BITSET_BIT_NAME", "asciiz"),
+                ("ETHTOOL_A_BITSET_BIT_VALUE", "flag"),
+            )
+
+
+class ethtool_features_msg(genlmsg):
+    nla_map = (
+        ("ETHTOOL_A_FEATURES_UNSPEC", "none"),
+        ("ETHTOOL_A_FEATURES_HEADER", "ethtoolheader"),
+        ("ETHTOOL_A_FEATURES_HW", "ethtoolbitset"),
+        ("ETHTOOL_A_FEATURES_WANTED", "ethtoolbitset"),
+        ("ETHTOOL_A_FEATURES_ACTIVE", "ethtoolbitset"),
+        ("ETHTOOL_A_FEATURES_NOCHANGE", "ethtoolbitset"),
+    )
+
+    ethtoolheader = ethtoolheader
+    ethtoolbitset = ethtoolbitset
+
+
+class ethtool_rings_msg(genlmsg):
+    nla_map = (
+        ("ETHTOOL_A_RINGS_UNSPEC", "none"),
+        ("ETHTOOL_A_RINGS_HEADER", "ethtoolheader"),
+        ("ETHTOOL_A_RINGS_RX_MAX", "uint32"),
+        ("ETHTOOL_A_RINGS_RX_MINI_MAX", "uint32"),
+        ("ETHTOOL_A_RINGS_RX_JUMBO_MAX", "uint32"),
+        ("ETHTOOL_A_RINGS_TX_MAX", "uint32"),
+        ("ETHTOOL_A_RINGS_RX", "uint32"),
+        ("ETHTOOL_A_RINGS_RX_MINI", "uint32"),
+        ("ETHTOOL_A_RINGS_RX_JUMBO", "uint32"),
+        ("ETHTOOL_A_RINGS_TX", "uint32"),
+        ("ETHTOOL_A_RINGS_RX_BUF_LEN", "uint32"),
+        ("ETHTOOL_A_RINGS_TCP_DATA_SPLIT", "uint8"),
+        ("ETHTOOL_A_RINGS_CQE_SIZE", "uint32"),
+        ("ETHTOOL_A_RINGS_TX_PUSH", "uint8"),
+        ("ETHTOOL_A_RINGS_RX_PUSH", "uint8"),
+        ("ETHTOOL_A_RINGS_TX_PUSH_BUF_LEN", "uint32"),
+        ("ETHTOOL_A_RINGS_TX_PUSH_BUF_LEN_MAX", "uint32"),
+    )
+
+    ethtoolheader = ethtoolheader
+
+
+class ethtool_channels_msg(genlmsg):
+    nla_map = (
+        ("ETHTOOL_A_CHANNELS_UNSPEC", "none"),
+        ("ETHTOOL_A_CHANNELS_HEADER", "ethtoolheader"),
+        ("ETHTOOL_A_CHANNELS_RX_MAX", "uint32"),
+        ("ETHTOOL_A_CHANNELS_TX_MAX", "uint32"),
+        ("ETHTOOL_A_CHANNELS_OTHER_MAX", "uint32"),
+        ("ETHTOOL_A_CHANNELS_COMBINED_MAX", "uint32"),
+        ("ETHTOOL_A_CHANNELS_RX_COUNT", "uint32"),
+        ("ETHTOOL_A_CHANNELS_TX_COUNT", "uint32"),
+        ("ETHTOOL_A_CHANNELS_OTHER_COUNT", "uint32"),
+        ("ETHTOOL_A_CHANNELS_COMBINED_COUNT", "uint32"),
+    )
+
+    ethtoolheader = ethtoolheader
+
+
+class ethtool_coalesce_msg(genlmsg):
+    nla_map = (
+        ("ETHTOOL_A_COALESCE_UNSPEC", "none"),
+        ("ETHTOOL_A_COALESCE_HEADER", "ethtoolheader"),
+        ("ETHTOOL_A_COALESCE_RX_USECS", "uint32"),
+        ("ETHTOOL_A_COALESCE_RX_MAX_FRAMES", "uint32"),
+        ("ETHTOOL_A_COALESCE_RX_USECS_IRQ", "uint32"),
+        ("ETHTOOL_A_COALESCE_RX_MAX_FRAMES_IRQ", "uint32"),
+        ("ETHTOOL_A_COALESCE_TX_USECS", "uint32"),
+        ("ETHTOOL_A_COALESCE_TX_MAX_FRAMES", "uint32"),
+        ("ETHTOOL_A_COALESCE_TX_USECS_IRQ", "uint32"),
+        ("ETHTOOL_A_COALESCE_TX_MAX_FRAMES_IRQ", "uint32"),
+        ("ETHTOOL_A_COALESCE_STATS_BLOCK_USECS", "uint32"),
+        ("ETHTOOL_A_COALESCE_USE_ADAPTIVE_RX", "uint8"),
+        ("ETHTOOL_A_COALESCE_USE_ADAPTIVE_TX", "uint8"),
+        ("ETHTOOL_A_COALESCE_PKT_RATE_LOW", "uint32"),
+        ("ETHTOOL_A_COALESCE_RX_USECS_LOW", "uint32"),
+        ("ETHTOOL_A_COALESCE_RX_MAX_FRAMES_LOW", "uint32"),
+        ("ETHTOOL_A_COALESCE_TX_USECS_LOW", "uint32"),
+        ("ETHTOOL_A_COALESCE_TX_MAX_FRAMES_LOW", "uint32"),
+        ("ETHTOOL_A_COALESCE_PKT_RATE_HIGH", "uint32"),
+        ("ETHTOOL_A_COALESCE_RX_USECS_HIGH", "uint32"),
+        ("ETHTOOL_A_COALESCE_RX_MAX_FRAMES_HIGH", "uint32"),
+        ("ETHTOOL_A_COALESCE_TX_USECS_HIGH", "uint32"),
+        ("ETHTOOL_A_COALESCE_TX_MAX_FRAMES_HIGH", "uint32"),
+        ("ETHTOOL_A_COALESCE_RATE_SAMPLE_INTERVAL", "uint32"),
+        ("ETHTOOL_A_COALESCE_USE_CQE_MODE_TX", "uint8"),
+        ("ETHTOOL_A_COALESCE_USE_CQE_MODE_RX", "uint8"),
+        ("ETHTOOL_A_COALESCE_TX_AGGR_MAX_BYTES", "uint32"),
+        ("ETHTOOL_A_COALESCE_TX_AGGR_MAX_FRAMES", "uint32"),
+        ("ETHTOOL_A_COALESCE_TX_AGGR_TIME_USECS", "uint32"),
+    )
+
+    ethtoolheader = ethtoolheader
+
+
+class ethtool_pause_msg(genlmsg):
+    nla_map = (
+        ("ETHTOOL_A_PAUSE_UNSPEC", "none"),
+        ("ETHTOOL_A_PAUSE_HEADER", "ethtoolheader"),
+        ("ETHTOOL_A_PAUSE_AUTONEG", "uint8"),
+        ("ETHTOOL_A_PAUSE_RX", "uint8"),
+        ("ETHTOOL_A_PAUSE_TX", "uint8"),
+    )
+
+    ethtoolheader = ethtoolheader
+
+
+# ethtool command line setting names mapped to netlink attributes, settings
+# with a bool value are flags stored as uint8 attributes
+COALESCE_SETTINGS = {
+    "rx-usecs": ("ETHTOOL_A_COALESCE_RX_USECS", int),
+    "rx-frames": ("ETHTOOL_A_COALESCE_RX_MAX_FRAMES", int),
+    "rx-usecs-irq": ("ETHTOOL_A_COALESCE_RX_USECS_IRQ", int),
+    "rx-frames-irq": ("ETHTOOL_A_COALESCE_RX_MAX_FRAMES_IRQ", int),
+    "tx-usecs": ("ETHTOOL_A_COALESCE_TX_USECS", int),
+    "tx-frames": ("ETHTOOL_A_COALESCE_TX_MAX_FRAMES", int),
+    "tx-usecs-irq": ("ETHTOOL_A_COALESCE_TX_USECS_IRQ", int),
+    "tx-frames-irq": ("ETHTOOL_A_COALESCE_TX_MAX_FRAMES_IRQ", int),
+    "stats-block-usecs": ("ETHTOOL_A_COALESCE_STATS_BLOCK_USECS", int),
+    "adaptive-rx": ("ETHTOOL_A_COALESCE_USE_ADAPTIVE_RX", bool),
+    "adaptive-tx": ("ETHTOOL_A_COALESCE_USE_ADAPTIVE_TX", bool),
+    "pkt-rate-low": ("ETHTOOL_A_COALESCE_PKT_RATE_LOW", int),
+    "rx-usecs-low": ("ETHTOOL_A_COALESCE_RX_USECS_LOW", int),
+    "rx-frames-low": ("ETHTOOL_A_COALESCE_RX_MAX_FRAMES_LOW", int),
+    "tx-usecs-low": ("ETHTOOL_A_COALESCE_TX_USECS_LOW", int),
+    "tx-frames-low": ("ETHTOOL_A_COALESCE_TX_MAX_FRAMES_LOW", int),
+    "pkt-rate-high": ("ETHTOOL_A_COALESCE_PKT_RATE_HIGH", int),
+    "rx-usecs-high": ("ETHTOOL_A_COALESCE_RX_USECS_HIGH", int),
+    "rx-frames-high": ("ETHTOOL_A_COALESCE_RX_MAX_FRAMES_HIGH", int),
+    "tx-usecs-high": ("ETHTOOL_A_COALESCE_TX_USECS_HIGH", int),
+    "tx-frames-high": ("ETHTOOL_A_COALESCE_TX_MAX_FRAMES_HIGH", int),
+    "sample-interval": ("ETHTOOL_A_COALESCE_RATE_SAMPLE_INTERVAL", int),
+    "cqe-mode-tx": ("ETHTOOL_A_COALESCE_USE_CQE_MODE_TX", bool),
+    "cqe-mode-rx": ("ETHTOOL_A_COALESCE_USE_CQE_MODE_RX", bool),
+    "tx-aggr-max-bytes": ("ETHTOOL_A_COALESCE_TX_AGGR_MAX_BYTES", int),
+    "tx-aggr-max-frames": ("ETHTOOL_A_COALESCE_TX_AGGR_MAX_FRAMES", int),
+    "tx-aggr-time-usecs": ("ETHTOOL_A_COALESCE_TX_AGGR_TIME_USECS", int),
+}
+
+PAUSE_SETTINGS = {
+    "autoneg": ("ETHTOOL_A_PAUSE_AUTONEG", bool),
+    "rx": ("ETHTOOL_A_PAUSE_RX", bool),
+    "tx": ("ETHTOOL_A_PAUSE_TX", bool),
+}
+
+RINGS_SETTINGS = {
+    "rx": ("ETHTOOL_A_RINGS_RX", int),
+    "rx-mini": ("ETHTOOL_A_RINGS_RX_MINI", int),
+    "rx-jumbo": ("ETHTOOL_A_RINGS_RX_JUMBO", int),
+    "tx": ("ETHTOOL_A_RINGS_TX", int),
+    "rx-buf-len": ("ETHTOOL_A_RINGS_RX_BUF_LEN", int),
+    "cqe-size": ("ETHTOOL_A_RINGS_CQE_SIZE", int),
+    "tx-push": ("ETHTOOL_A_RINGS_TX_PUSH", bool),
+    "rx-push": ("ETHTOOL_A_RINGS_RX_PUSH", bool),
+    "tx-push-buf-len": ("ETHTOOL_A_RINGS_TX_PUSH_BUF_LEN", int),
+}
+
+RINGS_MAXIMUMS = {
+    "rx": "ETHTOOL_A_RINGS_RX_MAX",
+    "rx-mini": "ETHTOOL_A_RINGS_RX_MINI_MAX",
+    "rx-jumbo": "ETHTOOL_A_RINGS_RX_JUMBO_MAX",
+    "tx": "ETHTOOL_A_RINGS_TX_MAX",
+    "tx-push-buf-len": "ETHTOOL_A_RINGS_TX_PUSH_BUF_LEN_MAX",
+}
+
+CHANNELS_SETTINGS = {
+    "rx": ("ETHTOOL_A_CHANNELS_RX_COUNT", int),
+    "tx": ("ETHTOOL_A_CHANNELS_TX_COUNT", int),
+    "other": ("ETHTOOL_A_CHANNELS_OTHER_COUNT", int),
+    "combined": ("ETHTOOL_A_CHANNELS_COMBINED_COUNT", int),
+}
+
+CHANNELS_MAXIMUMS = {
+    "rx": "ETHTOOL_A_CHANNELS_RX_MAX",
+    "tx": "ETHTOOL_A_CHANNELS_TX_MAX",
+    "other": "ETHTOOL_A_CHANNELS_OTHER_MAX",
+    "combined": "ETHTOOL_A_CHANNELS_COMBINED_MAX",
+}
+
+
+def setting_to_bool(value):
+    """Accepts bools as well as the "on"/"off" strings of ethtool"""
+    if isinstance(value, str):
+        if value not in ["on", "off"]:
+            raise ValueError("Invalid on/off value {}".format(value))
+        return value == "on"
+    return bool(value)
+
+
+def normalize_settings(values, settings):
+    """Converts the values to the types used in the results of the get methods
+
+    Args:
+        values -- dictionary of setting name to value, values can also be
+            strings as accepted by the ethtool command line
+        settings -- one of the *_SETTINGS dictionaries
+
+    Raises ValueError for unknown settings or invalid values.
+    """
+    result = {}
+    for name, value in values.items():
+        try:
+            _, value_type = settings[name]
+        except KeyError:
+            raise ValueError("Unknown setting {}".format(name))
+        if value_type is bool:
+            result[name] = setting_to_bool(value)
+        else:
+            result[name] = int(value)
+    return result
+
+
+def expand_feature_names(settings, known_features):
+    """Translates "ethtool -K" style feature settings to kernel features
+
+    Args:
+        settings -- dictionary of feature name to on/off value, the names
+            can be the legacy short names (e.g. "gro", "tso") or the kernel
+            feature names (e.g. "rx-gro")
+        known_features -- names of the features that can be changed on the
+            device, used to expand the wildcard patterns of legacy names
+
+    Returns dictionary of kernel feature name to bool.
+    """
+    result = {}
+    for name, value in settings.items():
+        value = setting_to_bool(value)
+        pattern = FEATURE_ALIASES.get(name, name)
+        if any(c in pattern for c in "*?["):
+            for feature in fnmatch.filter(known_features, pattern):
+                result[feature] = value
+        else:
+            result[pattern] = value
+    return result
+
+
+class EthtoolNetlink(object):
+    """Wrapper of a generic netlink socket bound to the ethtool family
+
+    The socket talks to the kernel in the network namespace it was created
+    in, so an instance shouldn't be shared between namespaces. Methods raise
+    pyroute2 NetlinkError on failure.
+    """
+
+    def __init__(self):
+        self._socket = GenericNetlinkSocket()
+        self._msg_class = None
+
+    def close(self):
+        self._socket.close()
+        self._socket = None
+
+    def _request(self, msg_class, cmd, ifindex, attrs=None, flags=0, ack=False):
+        # binding performs the family lookup, skip it when the previous
+        # request parsed its replies with the same message class
+        if self._msg_class is not msg_class:
+            self._socket.bind(ETHTOOL_GENL_NAME, msg_class)
+            self._msg_class = msg_class
+
+        header = {"attrs": [["ETHTOOL_A_HEADER_DEV_INDEX", ifindex]]}
+        if flags:
+            header["attrs"].append(["ETHTOOL_A_HEADER_FLAGS", flags])
+
+        msg = msg_class()
+        msg["cmd"] = cmd
+        msg["version"] = ETHTOOL_GENL_VERSION
+        msg["attrs"].append([msg_class.nla_map[1][0], header])
+        if attrs:
+            msg["attrs"].extend(attrs)
+
+        msg_flags = NLM_F_REQUEST
+        if ack:
+            msg_flags |= NLM_F_ACK
+        return list(
+            self._socket.nlm_request(
+                msg, msg_type=self._socket.prid, msg_flags=msg_flags
+            )
+        )
+
+    def _get(self, msg_class, cmd, ifindex):
+        return self._request(msg_class, cmd, ifindex)[0]
+
+    def _set(self, msg_class, cmd, ifindex, attrs):
+        if attrs:
+            self._request(msg_class, cmd, ifindex, attrs, ack=True)
+
+    @staticmethod
+    def _decode(msg, settings):
+        result = {}
+        for name, (attr, value_type) in settings.items():
+            value = msg.get_attr(attr)
+            if value is not None:
+                result[name] = value_type(value)
+        return result
+
+    @staticmethod
+    def _encode(values, settings):
+        return [
+            [settings[name][0], int(value)]
+            for name, value in normalize_settings(values, settings).items()
+        ]
+
+    @staticmethod
+    def _bitset_names(bitset):
+        if bitset is None:
+            return set()
+        bits = bitset.get_attr("ETHTOOL_A_BITSET_BITS")
+        if bits is None:
+            return set()
+        names = {
+            bit.get_attr("ETHTOOL_A_BITSET_BIT_NAME")
+            for bit in bits.get_attrs("ETHTOOL_A_BITSET_BITS_BIT")
+        }
+        # bits without a feature string are reported with an empty name
+        names.discard("")
+        return names
+
+    def get_features(self, ifindex):
+        """Returns a tuple of dictionaries, active features and changeability
+
+        The first maps every kernel feature name of the device that is either
+        active or changeable to bool, the second maps the same names to
+        whether the feature can be toggled.
+        """
+        msg = self._get(ethtool_features_msg, ETHTOOL_MSG_FEATURES_GET, ifindex)
+        hw = self._bitset_names(msg.get_attr("ETHTOOL_A_FEATURES_HW"))
+        active = self._bitset_names(msg.get_attr("ETHTOOL_A_FEATURES_ACTIVE"))
+        nochange = self._bitset_names(msg.get_attr("ETHTOOL_A_FEATURES_NOCHANGE"))
+        names = sorted(hw | active)
+        return (
+            {name: name in active for name in names},
+            {name: name in hw and name not in nochange for name in names},
+        )
+
+    def set_features(self, ifindex, features):
+        """Changes the listed kernel features in a single request
+
+        Args:
+            features -- dictionary of kernel feature name to bool
+        """
+        if not features:
+            return
+        bits = []
+        for name, value in features.items():
+            bit = [["ETHTOOL_A_BITSET_BIT_NAME", name]]
+            if value:
+                bit.append(["ETHTOOL_A_BITSET_BIT_VALUE", True])
+            bits.append(["ETHTOOL_A_BITSET_BITS_BIT", {"attrs": bit}])
+        wanted = {"attrs": [["ETHTOOL_A_BITSET_BITS", {"attrs": bits}]]}
+        self._request(
+            ethtool_features_msg,
+            ETHTOOL_MSG_FEATURES_SET,
+            ifindex,
+            [["ETHTOOL_A_FEATURES_WANTED", wanted]],
+            flags=ETHTOOL_FLAG_OMIT_REPLY,
+            ack=True,
+        )
+
+    def get_coalesce(self, ifindex):
+        """Returns the coalescing settings supported by the device"""
+        msg = self._get(ethtool_coalesce_msg, ETHTOOL_MSG_COALESCE_GET, ifindex)
+        return self._decode(msg, COALESCE_SETTINGS)
+
+    def set_coalesce(self, ifindex, settings):
+        self._set(
+            ethtool_coalesce_msg,
+            ETHTOOL_MSG_COALESCE_SET,
+            ifindex,
+            self._encode(settings, COALESCE_SETTINGS),
+        )
+
+    def get_pause(self, ifindex):
+        msg = self._get(ethtool_pause_msg, ETHTOOL_MSG_PAUSE_GET, ifindex)
+        return self._decode(msg, PAUSE_SETTINGS)
+
+    def set_pause(self, ifindex, settings):
+        self._set(
+            ethtool_pause_msg,
+            ETHTOOL_MSG_PAUSE_SET,
+            ifindex,
+            self._encode(settings, PAUSE_SETTINGS),
+        )
+
+    def get_rings(self, ifindex):
+        """Returns {"preset": maximums, "current": current settings}"""
+        msg = self._get(ethtool_rings_msg, ETHTOOL_MSG_RINGS_GET, ifindex)
+        return {
+            "preset": {
+                name: msg.get_attr(attr) for name, attr in RINGS_MAXIMUMS.items()
+            },
+            "current": self._decode(msg, RINGS_SETTINGS),
+        }
+
+    def set_rings(self, ifindex, settings):
+        self._set(
+            ethtool_rings_msg,
+            ETHTOOL_MSG_RINGS_SET,
+            ifindex,
+            self._encode(settings, RINGS_SETTINGS),
+        )
+
+    def get_channels(self, ifindex):
+        """Returns {"preset": maximums, "current": channel counts}
+
+        Channel types not supported by the device have a None value.
+        """
+        msg = self._get(ethtool_channels_msg, ETHTOOL_MSG_CHANNELS_GET, ifindex)
+        result = {"preset": {}, "current": {}}
+        for name, attr in CHANNELS_MAXIMUMS.items():
+            result["preset"][name] = msg.get_attr(attr)
+            result["current"][name] = msg.get_attr(CHANNELS_SETTINGS[name][0])
+        return result
+
+    def set_channels(self, ifindex, settings):
+        self._set(
+            ethtool_channels_msg,
+            ETHTOOL_MSG_CHANNELS_SET,
+            ifindex,
+            self._encode(settings, CHANNELS_SETTINGS),
+        )
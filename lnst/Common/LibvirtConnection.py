@@ -0,0 +1,176 @@
+"""
+Shared libvirt connection with event delivery
+
+All libvirt users of the Controller (VirtDomainCtl and VirtNetCtl) share a
+single connection, opening a connection per object sometimes fails as libvirtd
+doesn't handle that many connections at a time. The default libvirt event loop
+is run in a background thread and domain lifecycle, device added/removed and
+network lifecycle events are recorded, so that callers can wait for an
+asynchronous operation to complete instead of polling its result.
+
+Waiting for an event is done in two steps to avoid missing events that arrive
+before the wait starts:
+
+    mark = conn.event_mark()
+    domain.detachDevice(xml)
+    conn.wait_for_events(mark, [("device-removed", "guest1", "net1")])
+"""
+
+import threading
+import time
+from collections import deque
+from lnst.Common.LnstError import LnstError
+from lnst.Common.DependencyError import DependencyError
+
+EVENT_HISTORY_SIZE = 1024
+DEFAULT_EVENT_TIMEOUT = 60
+
+
+class LibvirtConnectionError(LnstError):
+    pass
+
+
+class LibvirtConnection(object):
+    def __init__(self, uri=None):
+        try:
+            import libvirt
+        except ModuleNotFoundError as e:
+            raise DependencyError(e)
+        self.libvirt = libvirt
+
+        self._events = deque(maxlen=EVENT_HISTORY_SIZE)
+        self._event_seq = 0
+        self._event_cond = threading.Condition()
+
+        # the event implementation has to be registered before the
+        # connection is opened
+        libvirt.virEventRegisterDefaultImpl()
+        self._event_thread = threading.Thread(target=self._run_event_loop,
+                                              name="libvirt-events",
+                                              daemon=True)
+        self._event_thread.start()
+
+        self.conn = libvirt.open(uri)
+        self._lifecycle_names = {
+            getattr(libvirt, "VIR_DOMAIN_EVENT_" + name.upper()): name
+            for name in ["defined", "undefined", "started", "suspended",
+                         "resumed", "stopped", "shutdown", "pmsuspended",
+                         "crashed"]
+            if hasattr(libvirt, "VIR_DOMAIN_EVENT_" + name.upper())}
+        self._net_lifecycle_names = {
+            getattr(libvirt, "VIR_NETWORK_EVENT_" + name.upper()): name
+            for name in ["defined", "undefined", "started", "stopped"]}
+        self._register_callbacks()
+
+    def _run_event_loop(self):
+        while True:
+            self.libvirt.virEventRunDefaultImpl()
+
+    def _register_callbacks(self):
+        libvirt = self.libvirt
+        domain_callbacks = [
+            (libvirt.VIR_DOMAIN_EVENT_ID_LIFECYCLE, self._domain_lifecycle_cb),
+            (libvirt.VIR_DOMAIN_EVENT_ID_REBOOT, self._domain_reboot_cb),
+            (libvirt.VIR_DOMAIN_EVENT_ID_DEVICE_ADDED,
+             self._domain_device_cb("device-added")),
+            (libvirt.VIR_DOMAIN_EVENT_ID_DEVICE_REMOVED,
+             self._domain_device_cb("device-removed")),
+            (libvirt.VIR_DOMAIN_EVENT_ID_DEVICE_REMOVAL_FAILED,
+             self._domain_device_cb("device-removal-failed")),
+        ]
+        for event_id, callback in domain_callbacks:
+            self.conn.domainEventRegisterAny(None, event_id, callback, None)
+
+        self.conn.networkEventRegisterAny(
+            None, libvirt.VIR_NETWORK_EVENT_ID_LIFECYCLE,
+            self._network_lifecycle_cb, None)
+
+    def _record_event(self, kind, name, data):
+        with self._event_cond:
+            self._event_seq += 1
+            self._events.append((self._event_seq, kind, name, data))
+            self._event_cond.notify_all()
+
+    def _domain_lifecycle_cb(self, conn, dom, event, detail, opaque):
+        self._record_event("lifecycle", dom.name(),
+                           self._lifecycle_names.get(event, event))
+
+    def _domain_reboot_cb(self, conn, dom, opaque):
+        self._record_event("reboot", dom.name(), None)
+
+    def _domain_device_cb(self, kind):
+        def callback(conn, dom, dev_alias, opaque):
+            self._record_event(kind, dom.name(), dev_alias)
+        return callback
+
+    def _network_lifecycle_cb(self, conn, net, event, detail, opaque):
+        self._record_event("network-lifecycle", net.name(),
+                           self._net_lifecycle_names.get(event, event))
+
+    def event_mark(self):
+        """Returns a mark to be passed to wait_for_events
+
+        Has to be taken before the operation that is waited for is started.
+        """
+        with self._event_cond:
+            return self._event_seq
+
+    def wait_for_events(self, mark, expected, timeout=DEFAULT_EVENT_TIMEOUT,
+                        failures=None):
+        """Waits until all the expected events are received after mark
+
+        Args:
+            mark -- value returned by event_mark()
+            expected -- list of (kind, name, data) tuples, data of None
+                matches any value
+            timeout -- maximal time to wait in seconds
+            failures -- list of (kind, name, data) tuples of events that
+                mean the awaited operation failed
+
+        Raises LibvirtConnectionError on timeout or on a failure event.
+        """
+        failures = failures or []
+        pending = list(expected)
+        deadline = time.monotonic() + timeout
+        with self._event_cond:
+            while pending:
+                for seq, kind, name, data in self._events:
+                    if seq <= mark:
+                        continue
+                    event = (kind, name, data)
+                    for failure in failures:
+                        if self._event_matches(failure, event):
+                            raise LibvirtConnectionError(
+                                "libvirt reported {} for {} {}".format(
+                                    kind, name, data))
+                    pending = [i for i in pending
+                               if not self._event_matches(i, event)]
+                    mark = seq
+                if not pending:
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise LibvirtConnectionError(
+                        "Timed out waiting for libvirt events {}".format(
+                            pending))
+                self._event_cond.wait(remaining)
+
+    @staticmethod
+    def _event_matches(expected, event):
+        kind, name, data = expected
+        return (kind == event[0] and name == event[1] and
+                (data is None or data == event[2]))
+
+
+_connection = None
+_connection_lock = threading.Lock()
+
+
+def get_libvirt_connection():
+    """Returns the libvirt connection shared by the whole process"""
+    global _connection
+    with _connection_lock:
+        if _connection is None:
+            _connection = LibvirtConnection()
+        return _connection
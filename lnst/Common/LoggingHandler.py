@@ -16,7 +16,7 @@ olichtne@redhat.com (Ondrej Lichtner)
 
 import pickle
 import logging
-import xmlrpc.client
+import threading
 from lnst.Common.ConnectionHandler import send_data
 
 class LogBuffer(logging.Handler):
@@ -34,6 +34,8 @@ class LogBuffer(logging.Handler):
         """
         Pickles the record so that it can be sent over the xmlrpc we use.
         """
+        import xmlrpc.client
+
         d = dict(record.__dict__)
         d['msg'] = record.getMessage()
         d['args'] = None
@@ -97,3 +99,58 @@ class ExportHandler(logging.Handler):
 
     def close(self):
         logging.Handler.close(self)
+
+
+class ThreadLogBuffer(logging.Filter):
+    """
+    Filter holding back the records logged by selected threads. Installed on
+    the handlers of the root logger it allows running work concurrently in
+    several threads and emitting the log records of each thread afterwards as
+    one block, so the output isn't interleaved.
+
+    Every buffer has a name, records received from the agent of the same
+    name (their address attribute) are added to the buffer too, no matter
+    which thread handles them.
+    """
+    def __init__(self):
+        logging.Filter.__init__(self)
+        self._buffers = {}
+        self._threads = {}
+        self._lock = threading.Lock()
+
+    def install(self):
+        for handler in logging.getLogger().handlers:
+            handler.addFilter(self)
+
+    def uninstall(self):
+        for handler in logging.getLogger().handlers:
+            handler.removeFilter(self)
+
+    def start_buffering(self, name):
+        with self._lock:
+            self._threads[threading.get_ident()] = name
+            self._buffers[name] = []
+
+    def stop_buffering(self, name):
+        with self._lock:
+            self._threads.pop(threading.get_ident(), None)
+            return self._buffers.pop(name, [])
+
+    def filter(self, record):
+        with self._lock:
+            name = record.__dict__.get("address")
+            if name not in self._buffers:
+                name = self._threads.get(record.thread)
+            buf = self._buffers.get(name)
+            if buf is None:
+                return True
+            # the filter is called once for each handler
+            if not buf or buf[-1] is not record:
+                buf.append(record)
+            return False
+
+    @staticmethod
+    def emit_records(records):
+        logger = logging.getLogger()
+        for record in records:
+            logger.handle(record)
@@ -10,6 +10,7 @@ __author__ = """
 jzupka@redhat.com (Jiri Zupka)
 """
 import os, sys, shutil
+import threading
 from logging import Formatter
 import logging.handlers
 import traceback
@@ -115,6 +116,8 @@ class LoggingCtl:
                 logger.removeHandler(i)
 
         self._origin_name = None
+        # agents are added and removed by the threads of the machines
+        self._agents_lock = threading.Lock()
 
         if log_dir != None:
             self.log_folder = os.path.abspath(os.path.join(log_dir, log_subdir))
@@ -190,31 +193,34 @@ class LoggingCtl:
 
     def add_agent(self, agent_id):
         agent_log_path = os.path.join(self.recipe_log_path, agent_id)
-        self._clean_folder(agent_log_path)
 
-        logger = logging.getLogger(agent_id)
-        logger.setLevel(logging.DEBUG)
-        logger.propagate = True
+        with self._agents_lock:
+            self._clean_folder(agent_log_path)
+
+            logger = logging.getLogger(agent_id)
+            logger.setLevel(logging.DEBUG)
+            logger.propagate = True
 
-        (agent_info, agent_debug) = self._create_file_handler(agent_log_path)
-        logger.addHandler(agent_info)
-        logger.addHandler(agent_debug)
+            (agent_info, agent_debug) = self._create_file_handler(agent_log_path)
+            logger.addHandler(agent_info)
+            logger.addHandler(agent_debug)
 
-        self.log_list[agent_id] = []
-        export_handler = self._create_export_handler(self.log_list[agent_id])
-        logger.addHandler(export_handler)
+            self.log_list[agent_id] = []
+            export_handler = self._create_export_handler(self.log_list[agent_id])
+            logger.addHandler(export_handler)
 
-        self.agents[agent_id] = (agent_info, agent_debug, export_handler)
+            self.agents[agent_id] = (agent_info, agent_debug, export_handler)
 
     def remove_agent(self, agent_id):
-        logger = logging.getLogger(agent_id)
-        logger.propagate = False
+        with self._agents_lock:
+            logger = logging.getLogger(agent_id)
+            logger.propagate = False
 
-        logger.removeHandler(self.agents[agent_id][0])
-        logger.removeHandler(self.agents[agent_id][1])
-        logger.removeHandler(self.agents[agent_id][2])
+            logger.removeHandler(self.agents[agent_id][0])
+            logger.removeHandler(self.agents[agent_id][1])
+            logger.removeHandler(self.agents[agent_id][2])
 
-        del self.agents[agent_id]
+            del self.agents[agent_id]
 
     def add_client_log(self, agent_id, log_record):
         logger = logging.getLogger(agent_id)
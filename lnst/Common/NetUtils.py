@@ -13,7 +13,6 @@ rpazdera@redhat.com (Radek Pazdera)
 import re
 import socket
 import subprocess
-from pyroute2 import IPRoute
 
 
 def normalize_hwaddr(hwaddr):
@@ -24,6 +23,9 @@ def normalize_hwaddr(hwaddr):
 
 
 def scan_netdevs():
+    # pyroute2 is expensive to import and not needed by the controller
+    from pyroute2 import IPRoute
+
     scan = []
 
     with IPRoute() as ipr:
@@ -1,6 +1,12 @@
 """
 This module contains tools for capturing packets within LNST.
 
+Packets are received through AF_PACKET sockets with a TPACKET_V3 memory
+mapped ring buffer, optionally filtered in the kernel by a classic BPF
+program. A single CaptureWorker thread serves the rings of all the captured
+interfaces and writes the packets to pcap files that are rotated by size and
+time.
+
 Copyright 2012 Red Hat, Inc.
 Licensed under the GNU General Public License, version 2 as
 published by the Free Software Foundation; see COPYING for details.
@@ -10,56 +16,433 @@ __author__ = """
 rpazdera@redhat.com (Radek Pazdera)
 """
 
-import subprocess
 import os
+import mmap
+import time
+import ctypes
+import ctypes.util
+import select
+import socket
+import struct
+import logging
+import threading
+from lnst.Common.LnstError import LnstError
+
+SOL_PACKET = 263
+PACKET_RX_RING = 5
+PACKET_STATISTICS = 6
+PACKET_VERSION = 10
+TPACKET_V3 = 2
+SO_ATTACH_FILTER = 26
+ETH_P_ALL = 0x0003
+
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1
+
+DEFAULT_BLOCK_SIZE = 1 << 20
+DEFAULT_RING_SIZE = 16 * DEFAULT_BLOCK_SIZE
+DEFAULT_FRAME_SIZE = 2048
+# a block is passed to userspace after this many ms even if it isn't full
+BLOCK_TIMEOUT = 100
+
+DEFAULT_ROTATE_SIZE = 64 * 1024 * 1024
+DEFAULT_ROTATE_COUNT = 8
+DEFAULT_SNAPLEN = 262144
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+
+# ARPHRD types of devices without a link layer header
+RAW_IP_HEADER_TYPES = [768, 769, 776, 65534]
+
+PCAP_MAGIC_NSEC = 0xa1b23c4d
+PCAP_HEADER = struct.Struct("=IHHiIII")
+PCAP_RECORD = struct.Struct("=IIII")
+
+# struct tpacket_req3
+TPACKET_REQ3 = struct.Struct("=IIIIIII")
+# struct tpacket_block_desc with struct tpacket_hdr_v1
+BLOCK_DESC = struct.Struct("=IIIIII")
+# leading fields of struct tpacket3_hdr
+TPACKET3_HDR = struct.Struct("=IIIIIIHH")
+# struct tpacket_stats_v3
+TPACKET_STATS_V3 = struct.Struct("=III")
+
+
+class PacketCaptureError(LnstError):
+    pass
+
+
+class sock_filter(ctypes.Structure):
+    _fields_ = [("code", ctypes.c_ushort),
+                ("jt", ctypes.c_ubyte),
+                ("jf", ctypes.c_ubyte),
+                ("k", ctypes.c_uint32)]
+
+
+class sock_fprog(ctypes.Structure):
+    _fields_ = [("len", ctypes.c_ushort),
+                ("filter", ctypes.POINTER(sock_filter))]
+
+
+def linktype_for_header_type(header_type):
+    if header_type in RAW_IP_HEADER_TYPES:
+        return LINKTYPE_RAW
+    return LINKTYPE_ETHERNET
+
 
-class PacketCapture:
-    """ Capture/handle traffic that goes through a specific
-        network interface. Capturing backend of this class
-        is provided by tcpdump(8).
+def compile_filter(expression, linktype=LINKTYPE_ETHERNET,
+                   snaplen=DEFAULT_SNAPLEN):
+    """Compiles a pcap-filter(7) expression to classic BPF
+
+    The compilation is done by libpcap loaded through ctypes. An already
+    compiled program, a list of (code, jt, jf, k) tuples as printed by
+    'tcpdump -dd', is returned unchanged.
+
+    Returns None for an empty expression (no filtering).
     """
+    if not expression:
+        return None
+    if not isinstance(expression, str):
+        return [tuple(insn) for insn in expression]
 
-    _cmd = ""
-    _tcpdump = None
+    lib_path = ctypes.util.find_library("pcap")
+    if lib_path is None:
+        raise PacketCaptureError(
+            "Can't compile packet filter '%s', libpcap not available" %
+            expression)
 
-    _devname = None
-    _file    = None
-    _filter  = None
+    class bpf_program(ctypes.Structure):
+        _fields_ = [("bf_len", ctypes.c_uint),
+                    ("bf_insns", ctypes.POINTER(sock_filter))]
 
-    def set_interface(self, devname):
-        self._devname = devname
+    libpcap = ctypes.CDLL(lib_path)
+    libpcap.pcap_open_dead.restype = ctypes.c_void_p
+    libpcap.pcap_open_dead.argtypes = [ctypes.c_int, ctypes.c_int]
+    libpcap.pcap_compile.argtypes = [ctypes.c_void_p,
+                                     ctypes.POINTER(bpf_program),
+                                     ctypes.c_char_p, ctypes.c_int,
+                                     ctypes.c_uint32]
+    libpcap.pcap_geterr.restype = ctypes.c_char_p
+    libpcap.pcap_geterr.argtypes = [ctypes.c_void_p]
+    libpcap.pcap_freecode.argtypes = [ctypes.POINTER(bpf_program)]
+    libpcap.pcap_close.argtypes = [ctypes.c_void_p]
 
-    def set_output_file(self, file_path):
-        self._file = file_path
+    handle = libpcap.pcap_open_dead(linktype, snaplen)
+    program = bpf_program()
+    try:
+        if libpcap.pcap_compile(handle, ctypes.byref(program),
+                                expression.encode(), 1, 0xffffffff) != 0:
+            raise PacketCaptureError(
+                "Invalid packet filter '%s': %s" %
+                (expression, libpcap.pcap_geterr(handle).decode()))
+        result = [(insn.code, insn.jt, insn.jf, insn.k)
+                  for insn in program.bf_insns[:program.bf_len]]
+        libpcap.pcap_freecode(ctypes.byref(program))
+    finally:
+        libpcap.pcap_close(handle)
+    return result
 
-    def set_filter(self, filt):
-        self._filter = filt
 
-    def start(self):
-        self._run()
+def attach_filter(sock, program):
+    insns = (sock_filter * len(program))(*program)
+    fprog = sock_fprog(len(program), insns)
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER,
+                    ctypes.string_at(ctypes.addressof(fprog),
+                                     ctypes.sizeof(fprog)))
 
-    def stop(self):
-        """ Send SIGTERM to the background instance of
-            tcpdump.
+
+def pcap_header(linktype, snaplen):
+    return PCAP_HEADER.pack(PCAP_MAGIC_NSEC, 2, 4, 0, 0, snaplen, linktype)
+
+
+def read_pcap_records(path):
+    """Yields (timestamp, record) tuples of a pcap file written by LNST
+
+    The file is read record by record, a truncated record at the end (the
+    file is still being written) is ignored.
+    """
+    with open(path, "rb") as f:
+        f.read(PCAP_HEADER.size)
+        while True:
+            header = f.read(PCAP_RECORD.size)
+            if len(header) < PCAP_RECORD.size:
+                break
+            sec, nsec, caplen, _ = PCAP_RECORD.unpack(header)
+            data = f.read(caplen)
+            if len(data) < caplen:
+                break
+            yield sec + nsec / 1e9, header + data
+
+
+class PacketCapture(object):
+    """Capture of the traffic that goes through a specific network interface
+
+    Packets are written to pcap files named <ifname>.<sequence>.pcap in the
+    given directory. A new file is started when the current one reaches
+    rotate_size bytes or is older than rotate_time seconds, only the newest
+    rotate_count files are kept.
+    """
+
+    def __init__(self, ifindex, ifname, directory, linktype=LINKTYPE_ETHERNET,
+                 program=None, ring_size=DEFAULT_RING_SIZE,
+                 rotate_size=DEFAULT_ROTATE_SIZE, rotate_time=None,
+                 rotate_count=DEFAULT_ROTATE_COUNT, snaplen=DEFAULT_SNAPLEN):
+        self._ifindex = ifindex
+        self._ifname = ifname
+        self._directory = directory
+        self._linktype = linktype
+        self._rotate_size = rotate_size
+        self._rotate_time = rotate_time
+        self._rotate_count = rotate_count
+        self._snaplen = snaplen
+
+        self._lock = threading.Lock()
+        self._files = []
+        self._file = None
+        self._file_size = 0
+        self._file_opened = None
+        self._sequence = 0
+
+        self._packets = 0
+        self._bytes = 0
+        self._kernel_packets = 0
+        self._drops = 0
+        self._freeze_queue = 0
+
+        self._block_size = DEFAULT_BLOCK_SIZE
+        self._block_nr = max(ring_size // self._block_size, 1)
+        self._block = 0
+
+        self._sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW,
+                                   socket.htons(ETH_P_ALL))
+        try:
+            if program:
+                attach_filter(self._sock, program)
+            self._setup_ring()
+            self._sock.bind((ifname, ETH_P_ALL))
+        except:
+            self._sock.close()
+            raise
+
+        self._rotate()
+
+    def _setup_ring(self):
+        self._sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V3)
+        frame_nr = self._block_size // DEFAULT_FRAME_SIZE * self._block_nr
+        req = TPACKET_REQ3.pack(self._block_size, self._block_nr,
+                                DEFAULT_FRAME_SIZE, frame_nr,
+                                BLOCK_TIMEOUT, 0, 0)
+        self._sock.setsockopt(SOL_PACKET, PACKET_RX_RING, req)
+        self._ring = mmap.mmap(self._sock.fileno(),
+                               self._block_size * self._block_nr,
+                               mmap.MAP_SHARED,
+                               mmap.PROT_READ | mmap.PROT_WRITE)
+
+    @property
+    def ifindex(self):
+        return self._ifindex
+
+    def fileno(self):
+        return self._sock.fileno()
+
+    def _rotate(self):
+        if self._file is not None:
+            self._file.close()
+
+        path = os.path.join(self._directory, "%s.%d.pcap" %
+                            (self._ifname, self._sequence))
+        self._sequence += 1
+        self._file = open(path, "wb")
+        self._file.write(pcap_header(self._linktype, self._snaplen))
+        self._file_size = PCAP_HEADER.size
+        self._file_opened = time.time()
+        self._files.append(path)
+
+        while self._rotate_count and len(self._files) > self._rotate_count:
+            os.unlink(self._files.pop(0))
+
+    def _rotation_due(self, now):
+        if self._rotate_size and self._file_size >= self._rotate_size:
+            return True
+        if self._rotate_time and now - self._file_opened >= self._rotate_time:
+            return True
+        return False
+
+    def check_rotation(self, now):
+        with self._lock:
+            if self._file is not None and self._rotation_due(now):
+                self._rotate()
+
+    def process(self):
+        """Writes out the packets of all the blocks the kernel handed over
+
+        Returns number of processed packets.
+        """
+        count = 0
+        with self._lock:
+            while True:
+                offset = self._block * self._block_size
+                _, _, status, num_pkts, first, _ = \
+                    BLOCK_DESC.unpack_from(self._ring, offset)
+                if not status & TP_STATUS_USER:
+                    break
+
+                pkt = offset + first
+                for _ in range(num_pkts):
+                    self._write_packet(pkt)
+                    next_offset = struct.unpack_from("=I", self._ring, pkt)[0]
+                    pkt += next_offset
+                count += num_pkts
+
+                struct.pack_into("=I", self._ring, offset + 8,
+                                 TP_STATUS_KERNEL)
+                self._block = (self._block + 1) % self._block_nr
+        return count
+
+    def _write_packet(self, pkt):
+        _, sec, nsec, snaplen, length, _, mac, _ = \
+            TPACKET3_HDR.unpack_from(self._ring, pkt)
+        caplen = min(snaplen, self._snaplen)
+        data = self._ring[pkt + mac:pkt + mac + caplen]
+
+        if self._rotation_due(time.time()):
+            self._rotate()
+        self._file.write(PCAP_RECORD.pack(sec, nsec, caplen, length))
+        self._file.write(data)
+        self._file_size += PCAP_RECORD.size + caplen
+        self._packets += 1
+        self._bytes += length
+
+    def stats(self):
+        """Returns packet counters of the capture
+
+        "packets" is the number of packets written to the pcap files,
+        "drops" the number of packets the kernel dropped because the ring
+        was full.
+        """
+        with self._lock:
+            self._update_kernel_stats()
+            return {"ifname": self._ifname,
+                    "packets": self._packets,
+                    "bytes": self._bytes,
+                    "kernel_packets": self._kernel_packets,
+                    "drops": self._drops,
+                    "freeze_queue": self._freeze_queue,
+                    "files": list(self._files)}
+
+    def _update_kernel_stats(self):
+        if self._sock is None:
+            return
+        data = self._sock.getsockopt(SOL_PACKET, PACKET_STATISTICS,
+                                     TPACKET_STATS_V3.size)
+        # the kernel resets the counters with each read
+        packets, drops, freeze = TPACKET_STATS_V3.unpack(data)
+        self._kernel_packets += packets
+        self._drops += drops
+        self._freeze_queue += freeze
+
+    def window(self, path, start=None, end=None, max_packets=None):
+        """Writes the captured packets in a time window to a pcap file
+
+        The capture files are streamed record by record, so the memory use
+        doesn't depend on their size.
+
+        Args:
+            path -- path of the pcap file to create
+            start, end -- unix timestamps limiting the window, None means
+                unlimited
+            max_packets -- write at most this many (the first) packets
+
+        Returns the number of written packets.
         """
-        self._tcpdump.terminate()
-
-    def _compose_cmd(self):
-        """ Create a command from the options """
-        interface = self._devname
-        output_file = self._file
-        pcap_filter = self._filter
-
-        self._cmd = "tcpdump -p -i %s -w %s %s" % \
-                            (interface, output_file, pcap_filter)
-
-    def _execute_tcpdump(self):
-        """ Start tcpdump in the background """
-        cmd = self._cmd.split()
-        fnull = open(os.devnull, "w")
-        self._tcpdump = subprocess.Popen(cmd, shell=False, stdout=fnull,
-                                            stderr=subprocess.STDOUT)
-
-    def _run(self):
-        self._compose_cmd()
-        self._execute_tcpdump()
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+            files = list(self._files)
+
+        count = 0
+        with open(path, "wb") as out:
+            out.write(pcap_header(self._linktype, self._snaplen))
+            for capture_path in files:
+                if max_packets is not None and count >= max_packets:
+                    break
+                try:
+                    records = read_pcap_records(capture_path)
+                    for timestamp, record in records:
+                        if start is not None and timestamp < start:
+                            continue
+                        if end is not None and timestamp > end:
+                            continue
+                        if max_packets is not None and count >= max_packets:
+                            break
+                        out.write(record)
+                        count += 1
+                except FileNotFoundError:
+                    # rotated away in the meantime
+                    continue
+        return count
+
+    def close(self):
+        with self._lock:
+            if self._sock is not None:
+                self._update_kernel_stats()
+                self._ring.close()
+                self._sock.close()
+                self._sock = None
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def remove_files(self):
+        with self._lock:
+            for path in self._files:
+                logging.debug("Removing packet capture file %s", path)
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            self._files = []
+
+
+class CaptureWorker(threading.Thread):
+    """Single thread serving the rings of all the packet captures"""
+
+    def __init__(self, captures):
+        super(CaptureWorker, self).__init__(name="packet-capture", daemon=True)
+        self._captures = {capture.fileno(): capture for capture in captures}
+        self._stop_r, self._stop_w = os.pipe()
+
+    @property
+    def captures(self):
+        return list(self._captures.values())
+
+    def run(self):
+        poller = select.poll()
+        poller.register(self._stop_r, select.POLLIN)
+        for fd in self._captures:
+            poller.register(fd, select.POLLIN | select.POLLERR)
+
+        while True:
+            events = poller.poll(BLOCK_TIMEOUT * 2)
+            if any(fd == self._stop_r for fd, _ in events):
+                break
+            for fd, _ in events:
+                self._captures[fd].process()
+
+            now = time.time()
+            for capture in self._captures.values():
+                capture.check_rotation(now)
+
+        # drain what's left in the rings
+        for capture in self._captures.values():
+            capture.process()
+
+    def stop(self):
+        """Stops the worker thread, the captures are closed afterwards"""
+        os.write(self._stop_w, b"x")
+        self.join()
+        os.close(self._stop_r)
+        os.close(self._stop_w)
+        for capture in self._captures.values():
+            capture.close()
@@ -9,53 +9,134 @@ published by the Free Software Foundation; see COPYING for details.
 __author__ = """
 jzupka@redhat.com (Jiri Zupka)
 """
-import os, signal, _thread, logging
+import os, signal, select, threading, _thread, logging
+
+# how often the registered processes are checked when pidfds aren't available
+REAPER_POLL_INTERVAL = 0.1
 
 class ProcessManager:
     class SubProcess:
         def __init__(self, pid, handler):
             self.pid = pid
-            self.lock = _thread.allocate_lock()
-            self.lock.acquire()
+            self.exited = threading.Event()
             self.handler = handler
             self.enabled = True
             self.status = None
-            _thread.start_new_thread(self.waitpid, (self.pid, self.lock,
-                                                   self.handler))
 
         def isAlive(self):
-            return self.lock.locked()
+            return not self.exited.is_set()
 
         def kill(self):
             os.kill(self.pid, signal.SIGTERM)
 
-        def waitpid(self, pid, lock, handler):
-            _pid, status = ProcessManager.std_waitpid(pid, 0)
+        def reaped(self, status):
             self.status = status
+            self.exited.set()
+            if not self.enabled or status is None:
+                return
+
             status = os.WEXITSTATUS(status)
-            lock.release()
-            if self.enabled:
-                ProcessManager.lock.acquire()
-                if handler is not None:
-                    try:
-                        handler(status)
-                    except:
-                        import sys, traceback
-                        type, value, tb = sys.exc_info()
-                        logging.error(''.join(traceback.format_exception(type, value, tb)))
-                        os.kill(os.getpid(), signal.SIGTERM)
+            ProcessManager.lock.acquire()
+            if self.handler is not None:
+                try:
+                    self.handler(status)
+                except:
+                    import sys, traceback
+                    type, value, tb = sys.exc_info()
+                    logging.error(''.join(traceback.format_exception(type, value, tb)))
+                    os.kill(os.getpid(), signal.SIGTERM)
+            else:
+                print("Process pid %s exit with exitcode %s" % (self.pid, status))
+            ProcessManager.lock.release()
+
+    class Reaper(threading.Thread):
+        """Single thread collecting all the registered child processes
+
+        Every process is tracked by a pidfd that becomes readable when the
+        process exits, all the pidfds are multiplexed by one poll call so no
+        thread per process is needed. Without pidfd support (kernels older
+        than 5.3) the processes are checked with WNOHANG waitpid calls.
+        """
+        def __init__(self):
+            super(ProcessManager.Reaper, self).__init__(
+                name="process-reaper", daemon=True)
+            self._poller = select.poll()
+            self._pidfds = {}
+            self._polled = {}
+            self._pending = []
+            self._pending_lock = threading.Lock()
+            self._wake_r, self._wake_w = os.pipe()
+            self._poller.register(self._wake_r, select.POLLIN)
+            self.owner = os.getpid()
+
+        def add(self, process):
+            with self._pending_lock:
+                self._pending.append(process)
+            os.write(self._wake_w, b"x")
+
+        def _track_pending(self):
+            os.read(self._wake_r, 4096)
+            with self._pending_lock:
+                pending, self._pending = self._pending, []
+
+            for process in pending:
+                try:
+                    pidfd = os.pidfd_open(process.pid)
+                except (AttributeError, OSError):
+                    self._polled[process.pid] = process
                 else:
-                    print("Process pid %s exit with exitcode %s" % (pid, status))
-                ProcessManager.lock.release()
-            _thread.exit()
+                    self._pidfds[pidfd] = process
+                    self._poller.register(pidfd, select.POLLIN)
+
+        def run(self):
+            while True:
+                timeout = REAPER_POLL_INTERVAL * 1000 if self._polled else None
+                for fd, _ in self._poller.poll(timeout):
+                    if fd == self._wake_r:
+                        self._track_pending()
+                        continue
+                    process = self._pidfds.pop(fd)
+                    self._poller.unregister(fd)
+                    os.close(fd)
+                    self._reap(process, 0)
+
+                for pid, process in list(self._polled.items()):
+                    if self._reap(process, os.WNOHANG):
+                        del self._polled[pid]
+
+        def _reap(self, process, options):
+            try:
+                pid, status = ProcessManager.std_waitpid(process.pid, options)
+            except ChildProcessError:
+                # collected by somebody else, the status is lost
+                pid, status = process.pid, None
+            if pid == 0:
+                return False
+            process.reaped(status)
+            return True
 
     pids = {}
     lock = _thread.allocate_lock()
     std_waitpid = None
+    reaper = None
+    reaper_lock = threading.Lock()
+
+    @classmethod
+    def _get_reaper(cls):
+        with cls.reaper_lock:
+            if cls.reaper is None or cls.reaper.owner != os.getpid():
+                # processes registered before a fork aren't our children
+                cls.pids = {}
+                cls.reaper = ProcessManager.Reaper()
+                cls.reaper.start()
+            return cls.reaper
 
     @classmethod
     def register_pid(cls, pid, handler=None):
-        cls.pids[pid] = ProcessManager.SubProcess(pid, handler)
+        reaper = cls._get_reaper()
+        process = ProcessManager.SubProcess(pid, handler)
+        cls.pids[pid] = process
+        reaper.add(process)
 
     @classmethod
     def remove_pid(cls, pid):
@@ -64,22 +145,24 @@ class ProcessManager:
 
     @classmethod
     def kill_all(cls):
-        for pid in cls.pids:
-            cls.pids[pid].kill()
+        for pid, process in list(cls.pids.items()):
+            # exited processes are kept until waited for, their pid may
+            # have been reused already
+            if process.isAlive():
+                process.kill()
 
     @classmethod
     def waitpid(cls, pid, wait):
         if pid not in cls.pids:
             return ProcessManager.std_waitpid(pid, wait)
         if not wait:
-            cls.pids[pid].lock.acquire()
-            cls.pids[pid].lock.release()
+            cls.pids[pid].exited.wait()
             status = cls.pids[pid].status
             del cls.pids[pid]
             return pid, status
         else:
             status = cls.pids[pid].status
-            if status is not None:
+            if cls.pids[pid].exited.is_set():
                 del cls.pids[pid]
             else:
                 pid = 0
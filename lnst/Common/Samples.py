@@ -0,0 +1,43 @@
+"""
+Compact columnar encoding of numeric samples
+
+Test modules that sample some values over time return them as a dictionary
+mapping a column name to an array.array of doubles instead of a list of per
+sample dictionaries. An array is pickled as a single contiguous buffer so the
+result is much smaller and cheaper to transfer from the Agent than rows of
+strings, and the controller doesn't need to parse the values again.
+"""
+
+from array import array
+from typing import Dict, Iterable, Mapping, Sequence
+
+SAMPLE_TYPECODE = "d"
+
+Columns = Dict[str, array]
+
+
+def new_columns(names: Iterable[str]) -> Columns:
+    return {name: array(SAMPLE_TYPECODE) for name in names}
+
+
+def append_row(columns: Columns, row: Mapping) -> None:
+    """Appends one sample, row has to contain a value for every column"""
+    for name, column in columns.items():
+        column.append(float(row[name]))
+
+
+def rows_to_columns(rows: Iterable[Mapping], names: Sequence[str]) -> Columns:
+    """Converts rows (e.g. from a csv.DictReader) to the columnar encoding
+
+    Only the listed columns are kept, values are converted to floats.
+    """
+    columns = new_columns(names)
+    for row in rows:
+        append_row(columns, row)
+    return columns
+
+
+def columns_len(columns: Columns) -> int:
+    for column in columns.values():
+        return len(column)
+    return 0
@@ -132,6 +132,11 @@ class SecureSocket(object):
         self._role = None
         self._socket = soc
 
+        # number of bytes transmitted through the socket, including the
+        # length prefix and the encryption and signing overhead
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
         self._master_secret = ""
 
         self._ctl_random = None
@@ -283,7 +288,8 @@ class SecureSocket(object):
 
         transmit_data = bytes(str(len(protected_data)).encode('ascii')) + b" " + protected_data
 
-        return self._socket.sendall(transmit_data)
+        self._socket.sendall(transmit_data)
+        self.bytes_sent += len(transmit_data)
 
     def recv(self):
         length = b""
@@ -291,6 +297,7 @@ class SecureSocket(object):
             c = self._socket.recv(1)
 
             if c == b' ':
+                self.bytes_received += len(length) + 1
                 length = int(length.decode('ascii'))
                 break
             elif c == b"":
@@ -305,6 +312,7 @@ class SecureSocket(object):
                 return b""
             else:
                 data += c
+        self.bytes_received += length
 
         msg = self._uprotect_data(data)
         if msg is None:
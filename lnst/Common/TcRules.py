@@ -0,0 +1,307 @@
+"""
+Declarative tc flower rule sets
+
+A rule set describes a large number of similar flower filters with a single
+dictionary instead of listing every rule, e.g.:
+
+    {"dev": "eth0", "count": 100000,
+     "src_mac": "00:00:01:00:00:00", "dst_mac": "00:00:01:80:00:00",
+     "src_ip": "56.0.0.0", "dst_ip": "55.0.0.0", "action": "drop"}
+
+Every rule matches the next source/destination MAC and IPv4 address of the
+ranges starting at the given addresses. The rule set is expanded on the Agent,
+either to lines of a "tc -b" batch file or directly to RTM_NEWTFILTER netlink
+messages that are sent to the kernel in batches. pyroute2 doesn't implement
+the flower classifier, the messages are therefore encoded here.
+"""
+
+import errno
+import ipaddress
+import socket
+import struct
+import time
+
+from lnst.Common.LnstError import LnstError
+
+RULE_SET_DEFAULTS = {
+    "parent": "ffff:",
+    "protocol": "ip",
+    "prio": 1,
+    "src_mac": "00:00:00:00:00:00",
+    "dst_mac": "00:00:00:80:00:00",
+    "src_ip": "56.0.0.0",
+    "dst_ip": "55.0.0.0",
+    "action": "drop",
+    "flags": None,
+}
+
+ACTIONS = {"drop": 2, "pass": 0}  # TC_ACT_SHOT, TC_ACT_OK
+FLAGS = {None: 0, "skip_hw": 1, "skip_sw": 2}
+
+NLMSG_ERROR = 2
+RTM_NEWTFILTER = 44
+NLM_F_REQUEST = 0x1
+NLM_F_ACK = 0x4
+NLM_F_EXCL = 0x200
+NLM_F_CREATE = 0x400
+NETLINK_CAP_ACK = 10
+SOL_NETLINK = 270
+SO_SNDBUFFORCE = 32
+SO_RCVBUFFORCE = 33
+
+TCA_KIND = 1
+TCA_OPTIONS = 2
+TCA_FLOWER_ACT = 3
+TCA_FLOWER_KEY_ETH_DST = 4
+TCA_FLOWER_KEY_ETH_DST_MASK = 5
+TCA_FLOWER_KEY_ETH_SRC = 6
+TCA_FLOWER_KEY_ETH_SRC_MASK = 7
+TCA_FLOWER_KEY_ETH_TYPE = 8
+TCA_FLOWER_KEY_IPV4_SRC = 10
+TCA_FLOWER_KEY_IPV4_SRC_MASK = 11
+TCA_FLOWER_KEY_IPV4_DST = 12
+TCA_FLOWER_KEY_IPV4_DST_MASK = 13
+TCA_FLOWER_FLAGS = 22
+TCA_ACT_KIND = 1
+TCA_ACT_OPTIONS = 2
+TCA_GACT_PARMS = 2
+NLA_F_NESTED = 0x8000
+
+ETH_P_IP = 0x0800
+
+NLMSGHDR = struct.Struct("=IHHII")
+TCMSG = struct.Struct("=BxxxiIII")
+
+
+class TcRulesError(LnstError):
+    pass
+
+
+def normalize_rule_set(rule_set):
+    """Returns the rule set with defaults filled in, raises TcRulesError
+    for invalid rule sets"""
+    result = dict(RULE_SET_DEFAULTS)
+    result.update(rule_set)
+
+    for key in ["dev", "count"]:
+        if key not in result:
+            raise TcRulesError("Rule set is missing '{}'".format(key))
+    if result["protocol"] != "ip":
+        raise TcRulesError("Only 'ip' protocol rule sets are supported")
+    if result["action"] not in ACTIONS:
+        raise TcRulesError("Unsupported action {}".format(result["action"]))
+    if result["flags"] not in FLAGS:
+        raise TcRulesError("Unsupported flags {}".format(result["flags"]))
+
+    count = result["count"]
+    for key in ["src_mac", "dst_mac"]:
+        result[key] = _int_to_mac(_mac_to_int(result[key]))
+        if _mac_to_int(result[key]) + count > 1 << 48:
+            raise TcRulesError("{} range is too short".format(key))
+    for key in ["src_ip", "dst_ip"]:
+        start = ipaddress.IPv4Address(result[key])
+        if int(start) + count > 1 << 32:
+            raise TcRulesError("{} range is too short".format(key))
+        result[key] = str(start)
+    return result
+
+
+def _mac_to_int(mac):
+    return int(mac.replace(":", ""), 16)
+
+
+def _int_to_mac(value):
+    return ":".join("%02x" % b for b in value.to_bytes(6, "big"))
+
+
+def _parse_handle(handle):
+    major, _, minor = handle.partition(":")
+    return (int(major or "0", 16) << 16) | int(minor or "0", 16)
+
+
+def batch_lines(rule_set):
+    """Yields the rules of a rule set as "tc -b" batch file lines"""
+    rs = normalize_rule_set(rule_set)
+    src_mac = _mac_to_int(rs["src_mac"])
+    dst_mac = _mac_to_int(rs["dst_mac"])
+    src_ip = int(ipaddress.IPv4Address(rs["src_ip"]))
+    dst_ip = int(ipaddress.IPv4Address(rs["dst_ip"]))
+    flags = " " + rs["flags"] if rs["flags"] else ""
+
+    prefix = "filter add dev {} parent {} protocol {} prio {} flower{} ".format(
+        rs["dev"], rs["parent"], rs["protocol"], rs["prio"], flags)
+    for i in range(rs["count"]):
+        yield "{}src_mac {} dst_mac {} src_ip {} dst_ip {} action {}\n".format(
+            prefix,
+            _int_to_mac(src_mac + i),
+            _int_to_mac(dst_mac + i),
+            ipaddress.IPv4Address(src_ip + i),
+            ipaddress.IPv4Address(dst_ip + i),
+            rs["action"])
+
+
+def write_batchfile(rule_set, path):
+    with open(path, "w") as f:
+        f.writelines(batch_lines(rule_set))
+    return path
+
+
+def _nla(nla_type, payload):
+    length = 4 + len(payload)
+    padding = b"\0" * ((4 - length % 4) % 4)
+    return struct.pack("=HH", length, nla_type) + payload + padding
+
+
+class _FlowerTemplate(object):
+    """Pre-encoded RTM_NEWTFILTER message of a rule set
+
+    Only the sequence number, MAC and IP addresses differ between the rules,
+    they are written to the known offsets of a copy of the template.
+    """
+    def __init__(self, rule_set, ifindex):
+        rs = rule_set
+        gact = struct.pack("=IIiii", 0, 0, ACTIONS[rs["action"]], 0, 0)
+        action = _nla(1, _nla(TCA_ACT_KIND, b"gact\0") +
+                      _nla(TCA_ACT_OPTIONS | NLA_F_NESTED,
+                           _nla(TCA_GACT_PARMS, gact)))
+
+        options = [_nla(TCA_FLOWER_KEY_ETH_TYPE, struct.pack("!H", ETH_P_IP))]
+        self._offsets = {}
+        for name, key, mask, size in [
+                ("dst_mac", TCA_FLOWER_KEY_ETH_DST,
+                 TCA_FLOWER_KEY_ETH_DST_MASK, 6),
+                ("src_mac", TCA_FLOWER_KEY_ETH_SRC,
+                 TCA_FLOWER_KEY_ETH_SRC_MASK, 6),
+                ("src_ip", TCA_FLOWER_KEY_IPV4_SRC,
+                 TCA_FLOWER_KEY_IPV4_SRC_MASK, 4),
+                ("dst_ip", TCA_FLOWER_KEY_IPV4_DST,
+                 TCA_FLOWER_KEY_IPV4_DST_MASK, 4)]:
+            self._offsets[name] = sum(len(o) for o in options) + 4
+            options.append(_nla(key, b"\0" * size))
+            options.append(_nla(mask, b"\xff" * size))
+        if FLAGS[rs["flags"]]:
+            options.append(_nla(TCA_FLOWER_FLAGS,
+                                struct.pack("=I", FLAGS[rs["flags"]])))
+        options.append(_nla(TCA_FLOWER_ACT | NLA_F_NESTED, action))
+
+        kind = _nla(TCA_KIND, b"flower\0")
+        options_start = NLMSGHDR.size + TCMSG.size + len(kind) + 4
+        for name in self._offsets:
+            self._offsets[name] += options_start
+
+        info = (rs["prio"] << 16) | socket.htons(ETH_P_IP)
+        body = (TCMSG.pack(socket.AF_UNSPEC, ifindex, 0,
+                           _parse_handle(rs["parent"]), info) +
+                kind + _nla(TCA_OPTIONS | NLA_F_NESTED, b"".join(options)))
+        self.size = NLMSGHDR.size + len(body)
+        self._template = bytearray(NLMSGHDR.pack(
+            self.size, RTM_NEWTFILTER,
+            NLM_F_REQUEST | NLM_F_ACK | NLM_F_CREATE | NLM_F_EXCL, 0, 0)
+            + body)
+
+        self._src_mac = _mac_to_int(rs["src_mac"])
+        self._dst_mac = _mac_to_int(rs["dst_mac"])
+        self._src_ip = int(ipaddress.IPv4Address(rs["src_ip"]))
+        self._dst_ip = int(ipaddress.IPv4Address(rs["dst_ip"]))
+
+    def encode_into(self, buf, offset, rule_no, seq):
+        buf[offset:offset + self.size] = self._template
+        struct.pack_into("=I", buf, offset + 8, seq)
+        off = self._offsets
+        buf[offset + off["src_mac"]:offset + off["src_mac"] + 6] = \
+            (self._src_mac + rule_no).to_bytes(6, "big")
+        buf[offset + off["dst_mac"]:offset + off["dst_mac"] + 6] = \
+            (self._dst_mac + rule_no).to_bytes(6, "big")
+        struct.pack_into("!I", buf, offset + off["src_ip"],
+                         self._src_ip + rule_no)
+        struct.pack_into("!I", buf, offset + off["dst_ip"],
+                         self._dst_ip + rule_no)
+
+
+class FlowerRuleInserter(object):
+    """Installs the rules of a rule set with batched netlink requests
+
+    Each batch of messages is written to the rtnetlink socket with a single
+    send call, then all the acknowledgements are read. The messages of a
+    batch are encoded before the time measurement of the batch starts.
+    """
+    def __init__(self, batch_size=1000):
+        self._batch_size = batch_size
+        self._seq = 0
+        self._sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                                   socket.NETLINK_ROUTE)
+        self._sock.bind((0, 0))
+        # don't echo the requests in the acknowledgements
+        self._sock.setsockopt(SOL_NETLINK, NETLINK_CAP_ACK, 1)
+        for opt, fallback in [(SO_SNDBUFFORCE, socket.SO_SNDBUF),
+                              (SO_RCVBUFFORCE, socket.SO_RCVBUF)]:
+            try:
+                self._sock.setsockopt(socket.SOL_SOCKET, opt, 32 << 20)
+            except PermissionError:
+                self._sock.setsockopt(socket.SOL_SOCKET, fallback, 32 << 20)
+
+    def close(self):
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def insert(self, rule_set):
+        """Installs all rules of the rule set
+
+        Returns list of batch records {"timestamp", "rules", "duration",
+        "errors"} where errors is a dictionary of errno name to the number
+        of rules that failed with it.
+        """
+        rs = normalize_rule_set(rule_set)
+        try:
+            ifindex = socket.if_nametoindex(rs["dev"])
+        except OSError as e:
+            raise TcRulesError("Unknown device {}: {}".format(rs["dev"], e))
+        template = _FlowerTemplate(rs, ifindex)
+
+        batches = []
+        buf = bytearray(template.size * min(self._batch_size, rs["count"]))
+        for first in range(0, rs["count"], self._batch_size):
+            count = min(self._batch_size, rs["count"] - first)
+            first_seq = self._seq + 1
+            for i in range(count):
+                self._seq += 1
+                template.encode_into(buf, i * template.size, first + i,
+                                     self._seq)
+
+            timestamp = time.time()
+            start = time.perf_counter()
+            self._sock.send(memoryview(buf)[:count * template.size])
+            errors = self._read_acks(first_seq, self._seq)
+            duration = time.perf_counter() - start
+
+            batches.append({"timestamp": timestamp,
+                            "rules": count - sum(errors.values()),
+                            "duration": duration,
+                            "errors": errors})
+        return batches
+
+    def _read_acks(self, first_seq, last_seq):
+        pending = last_seq - first_seq + 1
+        errors = {}
+        while pending > 0:
+            data = self._sock.recv(1 << 20)
+            offset = 0
+            while offset + NLMSGHDR.size <= len(data):
+                length, msg_type, _, seq, _ = NLMSGHDR.unpack_from(data,
+                                                                   offset)
+                if length < NLMSGHDR.size:
+                    break
+                if msg_type == NLMSG_ERROR and first_seq <= seq <= last_seq:
+                    pending -= 1
+                    error = -struct.unpack_from("=i", data,
+                                                offset + NLMSGHDR.size)[0]
+                    if error:
+                        name = errno.errorcode.get(error, str(error))
+                        errors[name] = errors.get(name, 0) + 1
+                offset += (length + 3) & ~3
+        return errors
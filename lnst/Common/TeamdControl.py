@@ -0,0 +1,285 @@
+"""
+Client of the teamd control interface
+
+teamd accepts the same method calls teamdctl uses (PortAdd, PortConfigUpdate,
+StateDump, ...) on a unix domain socket in its run directory. A TeamdControl
+object keeps one connection to a teamd instance open so that no teamdctl
+process has to be forked for every operation. Requests can also be pipelined,
+call_many() sends all of them first and then reads the replies which teamd
+sends in the same order.
+
+Teams started with D-Bus enabled are controlled over D-Bus instead, the
+TeamdDbusControl class provides the same methods implemented by running
+"teamdctl -D".
+"""
+
+import json
+import os
+import select
+import shlex
+import signal
+import socket
+import threading
+import time
+from lnst.Common.ExecCmd import exec_cmd, ExecCmdFail
+from lnst.Common.LnstError import LnstError
+
+TEAMD_RUN_DIR = "/var/run/teamd"
+
+REQUEST_PREFIX = "REQUEST"
+REPLY_SUCCESS_PREFIX = "REPLY_SUCCESS"
+REPLY_ERROR_PREFIX = "REPLY_ERROR"
+
+RECV_BUFSIZE = 64 * 1024
+
+
+class TeamdControlError(LnstError):
+    pass
+
+
+def teamd_socket_path(team_name):
+    return os.path.join(TEAMD_RUN_DIR, "{}.sock".format(team_name))
+
+
+def teamd_pid_path(team_name):
+    return os.path.join(TEAMD_RUN_DIR, "{}.pid".format(team_name))
+
+
+def teamd_pid(team_name):
+    """Returns the pid of the teamd daemon of the team or None"""
+    try:
+        with open(teamd_pid_path(team_name)) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def teamd_kill(team_name, timeout=5):
+    """Terminates the teamd daemon of the team and waits for it to exit
+
+    The same as "teamd -k" but the exit is waited for with a pidfd instead of
+    checking the pid periodically. Returns False if no daemon is running.
+    """
+    pid = teamd_pid(team_name)
+    if pid is None:
+        return False
+
+    try:
+        pidfd = os.pidfd_open(pid)
+    except ProcessLookupError:
+        return False
+    try:
+        os.kill(pid, signal.SIGTERM)
+        poller = select.poll()
+        poller.register(pidfd, select.POLLIN)
+        if not poller.poll(timeout * 1000):
+            raise TeamdControlError("teamd of {} didn't exit in {} seconds"
+                                    .format(team_name, timeout))
+    finally:
+        os.close(pidfd)
+    return True
+
+
+class TeamdControl(object):
+    def __init__(self, team_name):
+        self._team_name = team_name
+        self._sock = None
+        self._lock = threading.Lock()
+
+    @property
+    def connected(self):
+        return self._sock is not None
+
+    def connect(self, timeout=5):
+        """Connects to the control socket of teamd
+
+        The socket is created once teamd finished its initialization so the
+        connection is retried until timeout runs out.
+        """
+        self.close()
+        path = teamd_socket_path(self._team_name)
+        deadline = time.monotonic() + timeout
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+            try:
+                sock.connect(path)
+            except (FileNotFoundError, ConnectionRefusedError) as e:
+                sock.close()
+                if time.monotonic() >= deadline:
+                    raise TeamdControlError(
+                        "Can't connect to teamd of {}: {}".format(
+                            self._team_name, str(e)))
+                time.sleep(0.05)
+                continue
+            self._sock = sock
+            return
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def call(self, method, *args):
+        """Calls a teamd method and returns the reply as a string"""
+        return self.call_many([(method,) + tuple(args)])[0]
+
+    def call_many(self, calls):
+        """Calls several teamd methods with a single round trip
+
+        Args:
+            calls -- list of (method, arg, ...) tuples
+
+        Returns list of the replies. All the calls are processed by teamd
+        even if some of them fail, in that case TeamdControlError describing
+        the first failure is raised afterwards.
+        """
+        if not calls:
+            return []
+
+        with self._lock:
+            if self._sock is None:
+                self.connect()
+            try:
+                for call in calls:
+                    self._send(call[0], call[1:])
+                replies = [self._recv() for _ in calls]
+            except OSError as e:
+                self.close()
+                raise TeamdControlError("teamd of {} connection failed: {}"
+                                        .format(self._team_name, str(e)))
+
+        result = []
+        for call, (success, reply) in zip(calls, replies):
+            if not success:
+                raise TeamdControlError("teamd of {} method {} failed: {}"
+                                        .format(self._team_name, call[0],
+                                                reply))
+            result.append(reply)
+        return result
+
+    def _send(self, method, args):
+        lines = [REQUEST_PREFIX, method]
+        for arg in args:
+            if "\n" in arg:
+                raise TeamdControlError("teamd method arguments can't "
+                                        "contain newlines")
+            lines.append(arg)
+        self._sock.sendall(("\n".join(lines) + "\n").encode())
+
+    def _recv(self):
+        bufsize = RECV_BUFSIZE
+        while True:
+            data = self._sock.recv(bufsize, socket.MSG_PEEK)
+            if len(data) < bufsize:
+                break
+            bufsize *= 2
+        data = self._sock.recv(bufsize)
+        if not data:
+            raise ConnectionResetError("connection closed by teamd")
+
+        msg = data.decode().rstrip("\0")
+        prefix, _, rest = msg.partition("\n")
+        if prefix == REPLY_SUCCESS_PREFIX:
+            return True, rest
+        elif prefix == REPLY_ERROR_PREFIX:
+            err_name, _, err_msg = rest.partition("\n")
+            return False, "{} {}".format(err_name, err_msg.strip())
+        else:
+            raise TeamdControlError("Unexpected teamd reply: {}".format(msg))
+
+    def _call_json(self, method, *args):
+        reply = self.call(method, *args)
+        return json.loads(reply) if reply.strip() else {}
+
+    def config_dump(self, actual=True):
+        return self._call_json("ConfigDumpActual" if actual else "ConfigDump")
+
+    def state_dump(self):
+        return self._call_json("StateDump")
+
+    def state_item_get(self, path):
+        return self.call("StateItemValueGet", path).strip()
+
+    def state_item_set(self, path, value):
+        self.call("StateItemValueSet", path, str(value))
+
+    def port_config_dump(self, port_name):
+        return self._call_json("PortConfigDump", port_name)
+
+
+class TeamdDbusControl(TeamdControl):
+    """Client of the teamd D-Bus interface using teamdctl
+
+    Every call forks a teamdctl process, call_many() runs them one by one.
+    """
+
+    # teamdctl commands issuing the teamd methods
+    COMMANDS = {
+        "PortAdd": "port add",
+        "PortRemove": "port remove",
+        "PortConfigUpdate": "port config update",
+        "PortConfigDump": "port config dump",
+        "ConfigDump": "config dump",
+        "ConfigDumpActual": "config dump actual",
+        "StateDump": "state dump",
+        "StateItemValueGet": "state item get",
+        "StateItemValueSet": "state item set",
+    }
+
+    def __init__(self, team_name):
+        super(TeamdDbusControl, self).__init__(team_name)
+        self._connected = False
+
+    @property
+    def connected(self):
+        return self._connected
+
+    def connect(self, timeout=5):
+        """Checks that teamd is available on D-Bus
+
+        "teamd -d" returns once the D-Bus service is registered so unlike
+        the control socket no retries are needed.
+        """
+        success, reply = self._teamdctl("ConfigDump", ())
+        if not success:
+            raise TeamdControlError("Can't reach teamd of {} over D-Bus: {}"
+                                    .format(self._team_name, reply))
+        self._connected = True
+
+    def close(self):
+        self._connected = False
+
+    def call_many(self, calls):
+        """Calls several teamd methods, one teamdctl process each
+
+        Like TeamdControl.call_many() all the calls are made even if some of
+        them fail, TeamdControlError describing the first failure is raised
+        afterwards.
+        """
+        with self._lock:
+            replies = [self._teamdctl(call[0], call[1:]) for call in calls]
+
+        result = []
+        for call, (success, reply) in zip(calls, replies):
+            if not success:
+                raise TeamdControlError("teamd of {} method {} failed: {}"
+                                        .format(self._team_name, call[0],
+                                                reply))
+            result.append(reply)
+        return result
+
+    def _teamdctl(self, method, args):
+        try:
+            command = self.COMMANDS[method]
+        except KeyError:
+            raise TeamdControlError("teamd method {} isn't supported over "
+                                    "D-Bus".format(method))
+
+        cmd = "teamdctl -D {} {}".format(shlex.quote(self._team_name), command)
+        for arg in args:
+            cmd += " " + shlex.quote(arg)
+        try:
+            stdout, _ = exec_cmd(cmd, log_outputs=False)
+        except ExecCmdFail as e:
+            return False, e.get_stderr() or str(e)
+        return True, stdout
@@ -14,7 +14,6 @@ import logging
 import time
 import re
 import os
-import psutil
 import hashlib
 import tempfile
 import subprocess
@@ -191,6 +190,8 @@ def _is_newer_than(f, threshold):
     return stat.st_mtime > threshold
 
 def check_process_running(process_name):
+    import psutil
+
     return process_name in (p.info["name"] for p in psutil.process_iter(["name"]))
 
 def mkdir_p(path):
@@ -36,6 +36,9 @@ class AgentMachineParser(object):
         relaxng_doc = etree.parse(schema_path)
         self._schema = etree.RelaxNG(relaxng_doc)
 
+    def set_path(self, am_path):
+        self._path = am_path
+
     def parse(self):
         try:
             doc = self._parse(self._path)
@@ -0,0 +1,125 @@
+"""
+Cache of parsed agent machine descriptions
+
+Parsing and validating the machine XML files of large pools against the schema
+takes a considerable amount of time, the processed machine specs are therefore
+stored in a JSON file and reused as long as the machine file is unchanged. A
+file is considered unchanged if its mtime and size are the same, or if they
+differ but the content hash is still the same (e.g. after a checkout). The
+whole cache is dropped when the LNST version changes.
+
+Items of the spec that hold secrets (the "security" section with the agent
+password) can be excluded from the cached entries, they are missing from the
+specs returned from the cache and have to be read from the machine file when
+needed. The cache file is only readable by its owner.
+"""
+
+import copy
+import json
+import logging
+import os
+from lnst.Common.Utils import sha256sum
+from lnst.Common.Version import lnst_version
+
+
+class AgentPoolCache(object):
+    def __init__(self, cache_path, uncached_keys=()):
+        self._path = cache_path
+        self._uncached_keys = uncached_keys
+        self._entries = {}
+        self._used = set()
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        if not self._path:
+            return
+
+        try:
+            with open(self._path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.debug("Ignoring pool cache '%s': %s" % (self._path, e))
+            return
+
+        if data.get("version") != str(lnst_version):
+            logging.debug("Pool cache '%s' is from a different LNST version"
+                          % self._path)
+            return
+
+        self._entries = data.get("entries", {})
+
+        # drop the uncached items stored by older versions of the cache
+        for entry in self._entries.values():
+            for key in self._uncached_keys:
+                if entry["spec"].pop(key, None) is not None:
+                    self._dirty = True
+
+    def get(self, file_path, parse_func):
+        """Returns the machine spec of file_path
+
+        parse_func(file_path) is called to create the spec if the file isn't
+        cached or was modified since it was cached. The returned spec is a
+        copy that can be modified by the caller, the uncached keys are only
+        present if the file was parsed.
+        """
+        file_path = os.path.abspath(file_path)
+        st = os.stat(file_path)
+        entry = self._entries.get(file_path)
+        self._used.add(file_path)
+
+        if entry is not None:
+            if entry["mtime_ns"] == st.st_mtime_ns and \
+               entry["size"] == st.st_size:
+                return copy.deepcopy(entry["spec"])
+
+            file_hash = sha256sum(file_path)
+            if entry["sha256"] == file_hash:
+                entry["mtime_ns"] = st.st_mtime_ns
+                entry["size"] = st.st_size
+                self._dirty = True
+                return copy.deepcopy(entry["spec"])
+        else:
+            file_hash = sha256sum(file_path)
+
+        logging.debug("Parsing machine file '%s'" % file_path)
+        spec = parse_func(file_path)
+        cached_spec = {key: value for key, value in spec.items()
+                       if key not in self._uncached_keys}
+        self._entries[file_path] = {"mtime_ns": st.st_mtime_ns,
+                                    "size": st.st_size,
+                                    "sha256": file_hash,
+                                    "spec": cached_spec}
+        self._dirty = True
+        return copy.deepcopy(spec)
+
+    def save(self):
+        """Writes the cache, entries of files that no longer exist are
+        dropped"""
+        if not self._path:
+            return
+
+        for file_path in list(self._entries.keys()):
+            if file_path not in self._used and not os.path.isfile(file_path):
+                del self._entries[file_path]
+                self._dirty = True
+
+        if not self._dirty:
+            return
+
+        tmp_path = "%s.%d.tmp" % (self._path, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                         0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump({"version": str(lnst_version),
+                           "entries": self._entries}, f)
+            os.replace(tmp_path, self._path)
+        except OSError as e:
+            logging.debug("Couldn't write pool cache '%s': %s" %
+                          (self._path, e))
+            return
+        self._dirty = False
@@ -19,20 +19,46 @@ import errno
 import re
 import socket
 import select
+import threading
 from lnst.Common.NetUtils import normalize_hwaddr
 from lnst.Controller.Common import ControllerError
 from lnst.Controller.Machine import Machine
 from lnst.Controller.AgentMachineParser import AgentMachineParser
+from lnst.Controller.AgentPoolCache import AgentPoolCache
 from lnst.Common.Colours import decorate_with_preset
 from lnst.Common.Utils import check_process_running
 
 class PoolManagerError(ControllerError):
     pass
 
+class MachinePool(dict):
+    """Machines of a pool that are created on first access
+
+    Creating a Machine connects to its agent so only the machines that are
+    actually mapped are created.
+    """
+    def __init__(self, create_machine):
+        super(MachinePool, self).__init__()
+        self._create_machine = create_machine
+
+    def __missing__(self, m_id):
+        machine = self[m_id] = self._create_machine(m_id)
+        return machine
+
 class AgentPoolManager(object):
     """
     This class is responsible for managing test machines that
     are available at the controler and can be used for testing.
+
+    The parsed machine files are cached (see the 'pool_cache' option) and
+    the availability of machines is checked only when the mapper asks for
+    it using the check_availability method.
+
+    Unlike when all the machines were checked while loading the pools,
+    machines that are DOWN stay in the pools returned by get_pools, only
+    their 'available' item is False. The mapper skips them. For the same
+    reason a pool is dropped only when it has no machines at all, not when
+    all of its machines are DOWN.
     """
     def __init__(self, pools, msg_dispatcher, ctl_config, pool_checks=True):
         self._map = {}
@@ -43,41 +69,62 @@ class AgentPoolManager(object):
 
         self._allow_virt = ctl_config.get_option("environment",
                                                  "allow_virtual")
-        self._allow_virt &= check_process_running("libvirtd")
+        # scanning the processes is slow, skip it when not needed
+        self._allow_virt = (self._allow_virt and
+                            check_process_running("libvirtd"))
         self._pool_checks = pool_checks
-
-        logging.info("Checking machine pool availability.")
+        self._parser = None
+        self._parser_lock = threading.Lock()
+        self._machine_files = {}
+        # the agent passwords aren't stored in the cache file
+        self._cache = AgentPoolCache(ctl_config.get_option("environment",
+                                                           "pool_cache"),
+                                     uncached_keys=("security",))
+
+        logging.info("Loading machine pools.")
         for pool_name, pool_dir in list(pools.items()):
             self._pools[pool_name] = {}
             self.add_dir(pool_name, pool_dir)
             if len(self._pools[pool_name]) == 0:
                 del self._pools[pool_name]
+        self._cache.save()
 
         self._machines = {}
-        for pool_name, machines in list(self._pools.items()):
-            pool = self._machines[pool_name] = {}
-            for m_id, m_spec in list(machines.items()):
-                params = m_spec["params"]
+        for pool_name in self._pools.keys():
+            self._machines[pool_name] = MachinePool(
+                lambda m_id, pool_name=pool_name:
+                    self._create_machine(pool_name, m_id))
 
-                hostname = params["hostname"]
+        logging.info("Finished loading pools.")
 
-                if "libvirt_domain" in params:
-                    libvirt_domain = params["libvirt_domain"]
-                else:
-                    libvirt_domain = None
+    def _create_machine(self, pool_name, m_id):
+        m_spec = self._pools[pool_name][m_id]
+        params = m_spec["params"]
 
-                if "rpc_port" in params:
-                    rpc_port = params["rpc_port"]
-                else:
-                    rpc_port = None
+        hostname = params["hostname"]
 
-                pool[m_id] = Machine(m_id, hostname, self._msg_dispatcher,
-                                     ctl_config, libvirt_domain, rpc_port,
-                                     m_spec["security"], params)
-                pool[m_id].init_connection()
-                #TODO check if all described devices are available
+        if "libvirt_domain" in params:
+            libvirt_domain = params["libvirt_domain"]
+        else:
+            libvirt_domain = None
 
-        logging.info("Finished loading pools.")
+        if "rpc_port" in params:
+            rpc_port = params["rpc_port"]
+        else:
+            rpc_port = None
+
+        if "security" not in m_spec:
+            # specs loaded from the pool cache miss the security section
+            filepath = self._machine_files[pool_name, m_id]
+            m_spec["security"] = self._parse_machine_file(m_id,
+                                                          filepath)["security"]
+
+        machine = Machine(m_id, hostname, self._msg_dispatcher,
+                          self._ctl_config, libvirt_domain, rpc_port,
+                          m_spec["security"], params)
+        machine.init_connection()
+        #TODO check if all described devices are available
+        return machine
 
     def get_pools(self):
         return self._pools
@@ -114,63 +161,90 @@ class AgentPoolManager(object):
                                                                    (pool_name,
                                                                     dir_path))
 
-        max_len = 0
-        for m_id in list(pool.keys()):
-            if len(m_id) > max_len:
-                max_len = len(m_id)
+        for m_id in sorted(pool.keys()):
+            if not self._pool_checks:
+                pool[m_id]["available"] = True
+            elif "available" not in pool[m_id]:
+                pool[m_id]["available"] = None
+            logging.debug("Found machine '%s'" % m_id)
 
-        if self._pool_checks:
-            check_sockets = {}
-            for m_id, m in sorted(pool.items()):
-                hostname = m["params"]["hostname"]
-                if "rpc_port" in m["params"]:
-                    port = int(m["params"]["rpc_port"])
-                else:
-                    port = self._ctl_config.get_option('environment', 'rpcport')
+    def check_availability(self, pool_name, m_ids):
+        """Checks which of the pool machines are online
 
-                logging.debug("Querying machine '%s': %s:%s" %\
-                                                (m_id, hostname, port))
+        Only machines that weren't checked before are queried, all of them
+        at the same time. The result is stored as the 'available' item of
+        the machine spec, machines that are DOWN aren't removed from the
+        pool as the mapper may be iterating over it.
+
+        Returns:
+            dictionary mapping the machine ids to True or False
+        """
+        pool = self._pools[pool_name]
+        unknown = sorted([m_id for m_id in m_ids
+                          if pool[m_id]["available"] is None])
 
-                s = socket.socket()
-                s.settimeout(0)
+        if len(unknown) > 0:
+            self._probe_machines(pool, unknown)
+            self._log_availability(pool, unknown)
+
+        return {m_id: pool[m_id]["available"] for m_id in m_ids}
+
+    def _probe_machines(self, pool, m_ids):
+        check_sockets = {}
+        for m_id in m_ids:
+            m = pool[m_id]
+            hostname = m["params"]["hostname"]
+            if "rpc_port" in m["params"]:
+                port = int(m["params"]["rpc_port"])
+            else:
+                port = self._ctl_config.get_option('environment', 'rpcport')
+
+            logging.debug("Querying machine '%s': %s:%s" %\
+                                            (m_id, hostname, port))
+
+            s = socket.socket()
+            s.settimeout(0)
+            try:
+                s.connect((hostname, port))
+            except socket.error as msg:
+                # if the error is other than EINPROGRESS, e.g. the stack
+                # could not resolve name, the machine should become unavailable
                 try:
-                    s.connect((hostname, port))
-                except socket.error as msg:
-                    # if the error is other than EINPROGRESS, e.g. the stack
-                    # could not resolve name, the machine should become unavailable
-                    try:
-                        en = msg.errno
-                    except AttributeError:
-                        en = 0
-
-                    if en != errno.EINPROGRESS:
-                        pool[m_id]["available"] = False
-                        s.close()
-                        logging.debug("Bypassing machine '%s' (%s)" %
-                            (m_id, msg))
-                        continue
-
-                check_sockets[s] = m_id
-
-            while len(check_sockets) > 0:
-                rl, wl, el = select.select([], list(check_sockets.keys()), [])
-                for s in wl:
-                    err = s.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
-                    m_id = check_sockets[s]
-                    if err == 0:
-                        pool[m_id]["available"] = True
-                        s.shutdown(socket.SHUT_RDWR)
-                        s.close()
-                        del check_sockets[s]
-                    else:
-                        pool[m_id]["available"] = False
-                        s.close()
-                        del check_sockets[s]
-        else:
-            for m_id in list(pool.keys()):
-                pool[m_id]["available"] = True
+                    en = msg.errno
+                except AttributeError:
+                    en = 0
+
+                if en != errno.EINPROGRESS:
+                    pool[m_id]["available"] = False
+                    s.close()
+                    logging.debug("Bypassing machine '%s' (%s)" %
+                        (m_id, msg))
+                    continue
+
+            check_sockets[s] = m_id
+
+        while len(check_sockets) > 0:
+            rl, wl, el = select.select([], list(check_sockets.keys()), [])
+            for s in wl:
+                err = s.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                m_id = check_sockets[s]
+                if err == 0:
+                    pool[m_id]["available"] = True
+                    s.shutdown(socket.SHUT_RDWR)
+                    s.close()
+                    del check_sockets[s]
+                else:
+                    pool[m_id]["available"] = False
+                    s.close()
+                    del check_sockets[s]
+
+    def _log_availability(self, pool, m_ids):
+        max_len = 0
+        for m_id in m_ids:
+            if len(m_id) > max_len:
+                max_len = len(m_id)
 
-        for m_id in sorted(list(pool.keys())):
+        for m_id in m_ids:
             m = pool[m_id]
             if m["available"]:
                 if 'libvirt_domain' in m['params']:
@@ -184,7 +258,6 @@ class AgentPoolManager(object):
             else:
                 msg = "%s%s [%s]" % (m_id, (max_len - len(m_id)) * " ",
                                      decorate_with_preset("DOWN", "fail"))
-                del pool[m_id]
 
             logging.info(msg)
 
@@ -195,9 +268,9 @@ class AgentPoolManager(object):
             dirname, basename = os.path.split(filepath)
             m_id = re.sub("\.[xX][mM][lL]$", "", basename)
 
-            parser = AgentMachineParser(filepath, self._ctl_config)
-            xml_data = parser.parse()
-            machine_spec = self._process_machine_xml_data(m_id, xml_data)
+            machine_spec = self._cache.get(
+                filepath, lambda path: self._parse_machine_file(m_id, path))
+            self._machine_files[pool_name, m_id] = filepath
 
             if 'libvirt_domain' in machine_spec['params'] and \
                not self._allow_virt:
@@ -225,6 +298,15 @@ class AgentPoolManager(object):
             return (m_id, machine_spec)
         return (None, None)
 
+    def _parse_machine_file(self, m_id, filepath):
+        with self._parser_lock:
+            if self._parser is None:
+                # loading the schema is expensive, the parser is reused
+                self._parser = AgentMachineParser(filepath, self._ctl_config)
+            self._parser.set_path(filepath)
+            xml_data = self._parser.parse()
+        return self._process_machine_xml_data(m_id, xml_data)
+
     def _process_machine_xml_data(self, m_id, machine_xml_data):
         machine_spec = {"interfaces": {}, "params":{}, "security": {}}
 
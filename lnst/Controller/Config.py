@@ -61,6 +61,20 @@ class CtlConfig(Config):
                 "action" : self.optionBool,
                 "name" : "allow_virtual"
                 }
+        self._options['environment']['machine_parallelism'] = {
+                "value" : 8,
+                "additive" : False,
+                "action" : self.optionInt,
+                "name" : "machine_parallelism"
+                }
+        # parsed machine files, the security sections (agent passwords) are
+        # left out and read from the machine files when the machine is used
+        self._options['environment']['pool_cache'] = {
+                "value" : os.path.expanduser("~/.lnst/pool_cache.json"),
+                "additive" : False,
+                "action" : self.optionPath,
+                "name" : "pool_cache"
+                }
 
         self._options['pools'] = dict()
 
@@ -1,6 +1,10 @@
 import subprocess
 import logging
+import os
+import fcntl
 import socket
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from time import sleep
 from json import loads
 from lnst.Controller.AgentPoolManager import PoolManagerError
@@ -38,10 +42,37 @@ class ContainerPoolManager(object):
     :param image:
         Mandatory parameter
     :type image: str
+
+    :param warm_pool:
+        if True, agent containers and networks are kept between runs. At
+        cleanup the containers are disconnected from the recipe networks
+        and left running, the next run reuses them after a health check
+        instead of creating new ones. Containers that are not in a clean
+        state are removed. A container is claimed by an exclusive lock of
+        its file in `WARM_POOL_LOCK_DIR` while a run uses it, concurrent runs
+        only use and remove the containers they claimed.
+    :type warm_pool: boolean (default False)
+
+    :param warm_pool_size:
+        number of running containers the warm pool is topped up to at
+        cleanup, so that the next run doesn't have to wait for them. The
+        containers used by the run are always kept.
+    :type warm_pool_size: int (default 0)
     """
 
+    WARM_POOL_LABEL = "lnst.warm_pool"
+    WARM_POOL_LOCK_DIR = "/run/lnst/warm_pool"
+
     def __init__(
-        self, pools, msg_dispatcher, ctl_config, podman_uri, image, pool_checks=True
+        self,
+        pools,
+        msg_dispatcher,
+        ctl_config,
+        podman_uri,
+        image,
+        pool_checks=True,
+        warm_pool=False,
+        warm_pool_size=0,
     ):
         self._import_optionals()
         self._pool = {}
@@ -60,6 +91,13 @@ class ContainerPoolManager(object):
         self._start_timeout = 5
         self._pool_check = pool_checks
 
+        self._warm_pool = warm_pool
+        self._warm_pool_size = warm_pool_size
+        self._claims = {}
+        self._parallelism = ctl_config.get_option(
+            "environment", "machine_parallelism"
+        )
+
     @property
     def image(self):
         return self._image
@@ -123,7 +161,9 @@ class ContainerPoolManager(object):
 
     def _check_machine(self, machine: Machine):
         """Method checks if the agent process inside of the container is running."""
-        hostname = machine.get_hostname()
+        self._check_agent(machine.get_hostname(), machine._port)
+
+    def _check_agent(self, hostname: str, port: int):
         logging.debug(f"Checking connection with machine {hostname}")
         connection = socket.socket()
         connection.settimeout(self._start_timeout)
@@ -131,9 +171,9 @@ class ContainerPoolManager(object):
         retry_counter = 5
 
         for i in range(retry_counter):
-            logging.debug(f"Connecting to {machine.get_hostname()}, retry counter: {i}")
+            logging.debug(f"Connecting to {hostname}, retry counter: {i}")
             try:
-                connection.connect((hostname, machine._port))
+                connection.connect((hostname, port))
             except (ConnectionRefusedError, ConnectionAbortedError):
                 sleep(1)
                 continue
@@ -141,6 +181,7 @@ class ContainerPoolManager(object):
             logging.debug(f"Connected to agent process at machine {hostname}")
             break  # successfully connected
         else:
+            connection.close()
             raise PoolManagerError(f"Could not connect to machine {hostname}")
 
         err = connection.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
@@ -153,20 +194,135 @@ class ContainerPoolManager(object):
 
         logging.info(f"Agent process is running at {hostname}")
 
+    def _run_parallel(self, func, items):
+        """Calls func for every item, at most `machine_parallelism` calls
+        run at the same time. Returns the results in the order of items, the
+        first exception raised by a call is re-raised once all calls finished.
+        """
+        items = list(items)
+        if len(items) <= 1:
+            return [func(item) for item in items]
+
+        with ThreadPoolExecutor(max_workers=self._parallelism) as executor:
+            futures = [executor.submit(func, item) for item in items]
+        return [future.result() for future in futures]
+
+    @staticmethod
+    def _container_address(container: "Container"):
+        return container.attrs["NetworkSettings"]["Networks"]["podman"]["IPAddress"]
+
     @staticmethod
-    def _start_container(container: "Container", machine: Machine):
+    def _container_interfaces(container: "Container"):
+        return loads(
+            subprocess.check_output(
+                ["podman", "exec", container.name, "ip", "-j", "a"]
+            ).decode("utf-8")
+        )
+
+    def _is_clean(self, container: "Container"):
+        """A clean container has no interfaces except the loopback and the
+        one connected to the default podman network.
+        """
+        address = self._container_address(container)
+        for interface in self._container_interfaces(container):
+            if "LOOPBACK" in interface.get("flags", []):
+                continue
+
+            addresses = [addr.get("local") for addr in interface.get("addr_info", [])]
+            if address not in addresses:
+                return False
+        return True
+
+    @classmethod
+    def _start_container(cls, container: "Container", machine: Machine = None):
         logging.debug("Starting container " + container.name)
         container.start()
 
         container.reload()
         container.wait(condition="running")
-        machine._hostname = container.attrs["NetworkSettings"]["Networks"]["podman"][
-            "IPAddress"
-        ]
+        if machine is not None:
+            machine._hostname = cls._container_address(container)
 
-    def _create_container(self, name: str, reqs: dict):
-        logging.info("Creating container " + name)
+    @staticmethod
+    def _remove_container(container: "Container"):
+        logging.debug("Removing container " + container.name)
+        try:
+            container.stop()
+            container.remove(force=True)
+        except APIError as e:
+            logging.error(f"Could not remove container {container.name}: {e}")
 
+    def _claim_path(self, name: str):
+        return os.path.join(self.WARM_POOL_LOCK_DIR, name + ".lock")
+
+    def _claim(self, name: str):
+        """Claims the warm container for this run, returns False if another
+        run (or this one) already claimed it. The claim is released when the
+        process exits.
+        """
+        path = self._claim_path(name)
+        try:
+            os.makedirs(self.WARM_POOL_LOCK_DIR, exist_ok=True)
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        except OSError as e:
+            raise PoolManagerError(f"Could not claim container {name}: {e}")
+
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # the lock file is removed together with its container, the
+            # lock of a removed file doesn't count
+            if os.fstat(fd).st_ino != os.stat(path).st_ino:
+                raise FileNotFoundError(path)
+        except (BlockingIOError, FileNotFoundError):
+            os.close(fd)
+            return False
+
+        self._claims[name] = fd
+        return True
+
+    def _unclaim(self, name: str, removed: bool = False):
+        fd = self._claims.pop(name, None)
+        if fd is None:
+            return
+
+        if removed:
+            try:
+                os.unlink(self._claim_path(name))
+            except FileNotFoundError:
+                pass
+        os.close(fd)
+
+    def _remove_claimed_container(self, container: "Container"):
+        self._remove_container(container)
+        self._unclaim(container.name, removed=True)
+
+    def _new_container(self, name: str):
+        if not self._warm_pool:
+            return self._podman_client.containers.create(
+                self.image, hostname=name, privileged=True
+            )
+
+        # warm containers outlive the run, they are named after themselves
+        # and labeled with the image so that other images don't reuse them,
+        # the claim keeps other runs away until the container is released
+        container_name = "lnst_warm_" + uuid.uuid4().hex[:8]
+        self._claim(container_name)
+        try:
+            return self._podman_client.containers.create(
+                self.image,
+                name=container_name,
+                hostname=container_name,
+                privileged=True,
+                labels={self.WARM_POOL_LABEL: self.image},
+            )
+        except:
+            self._unclaim(container_name, removed=True)
+            raise
+
+    def _create_container(self, name: str, reqs: dict, container: "Container" = None):
+        """Creates and starts a new container for the machine or uses
+        the already running container passed in.
+        """
         if "rpc_port" in reqs:
             rpc_port = reqs["rpc_port"]
         else:
@@ -179,13 +335,6 @@ class ContainerPoolManager(object):
             "available": True,
         }
 
-        try:
-            container = self._podman_client.containers.create(
-                self.image, hostname=name, privileged=True
-            )
-        except APIError as e:
-            raise PoolManagerError(f"Could not create container {name}: {e}")
-
         machine = Machine(
             name,
             "",
@@ -197,7 +346,18 @@ class ContainerPoolManager(object):
             reqs,
         )  # to get hostname the container needs to run
 
-        self._start_container(container, machine)
+        if container is None:
+            logging.info("Creating container " + name)
+            try:
+                container = self._new_container(name)
+            except APIError as e:
+                raise PoolManagerError(f"Could not create container {name}: {e}")
+
+            self._start_container(container, machine)
+        else:
+            logging.info(f"Using warm container {container.name} for {name}")
+            machine._hostname = self._container_address(container)
+
         if self._pool_check:
             self._check_machine(
                 machine
@@ -207,6 +367,101 @@ class ContainerPoolManager(object):
 
         return container, machine
 
+    def _warm_pool_containers(self):
+        try:
+            return self._podman_client.containers.list(
+                all=True, filters={"label": f"{self.WARM_POOL_LABEL}={self.image}"}
+            )
+        except APIError as e:
+            raise PoolManagerError(f"Could not list warm pool containers: {e}")
+
+    def _is_reusable(self, container: "Container", rpc_port: int):
+        try:
+            container.reload()
+            if container.status != "running":
+                logging.debug(f"Warm container {container.name} is not running")
+                return False
+
+            if not self._is_clean(container):
+                logging.debug(f"Warm container {container.name} is not clean")
+                return False
+
+            self._check_agent(self._container_address(container), rpc_port)
+        except (APIError, PoolManagerError, KeyError, ValueError,
+                subprocess.CalledProcessError) as e:
+            logging.debug(f"Warm container {container.name} is not usable: {e}")
+            return False
+        return True
+
+    def _acquire_warm_containers(self, rpc_ports: dict):
+        """Claims health-checked containers of the warm pool
+
+        Args:
+            rpc_ports -- dictionary mapping machine ids to the rpc ports
+                their agents are expected to listen on
+
+        Returns dictionary mapping machine ids to the containers acquired
+        for them. Containers claimed by other runs are skipped, claimed
+        containers that failed the check are removed.
+        """
+        candidates = [
+            container
+            for container in self._warm_pool_containers()
+            if self._claim(container.name)
+        ]
+
+        acquired = {}
+        pending = list(rpc_ports)
+        while pending and candidates:
+            batch = list(zip(candidates, pending))
+            candidates = candidates[len(batch):]
+            reusable = self._run_parallel(
+                lambda item: self._is_reusable(item[0], rpc_ports[item[1]]),
+                batch,
+            )
+            for (container, m_id), usable in zip(batch, reusable):
+                if usable:
+                    acquired[m_id] = container
+                    pending.remove(m_id)
+                else:
+                    self._remove_claimed_container(container)
+
+        for container in candidates:
+            self._unclaim(container.name)
+
+        logging.info(f"Reusing {len(acquired)} containers of the warm pool")
+        return acquired
+
+    def prewarm(self, size: int = None):
+        """Starts new containers in parallel until the warm pool has at least
+        `size` running containers, `warm_pool_size` is used by default.
+        """
+        if size is None:
+            size = self._warm_pool_size
+
+        running = [
+            container
+            for container in self._warm_pool_containers()
+            if container.status == "running"
+        ]
+        missing = size - len(running)
+        if missing <= 0:
+            return
+
+        logging.info(f"Starting {missing} containers of the warm pool")
+
+        def start_warm_container(_):
+            try:
+                container = self._new_container("")
+            except APIError as e:
+                raise PoolManagerError(f"Could not create warm container: {e}")
+            try:
+                self._start_container(container)
+            finally:
+                self._unclaim(container.name)
+
+        self._run_parallel(start_warm_container, range(missing))
+
     def _create_network(self, network_name: str):
         """Networks are created "manually" because podman does not
         support creating L2 [1] networks. IPs in these networks are managed
@@ -218,6 +473,12 @@ class ContainerPoolManager(object):
         if name in self._networks:
             return self._networks[name]
 
+        if self._warm_pool:
+            network = self._warm_network(name)
+            if network is not None:
+                self._networks[name] = network
+                return network
+
         logging.info(f"Creating network {name}")
         try:
             with open(f"/etc/cni/net.d/{name}.conflist", "w") as config:
@@ -249,7 +510,18 @@ class ContainerPoolManager(object):
 
         return network
 
-    def _connect_to_network(self, container: "Container", network: "Network"):
+    def _warm_network(self, name: str):
+        """Returns network kept by the warm pool or None"""
+        try:
+            if not self._podman_client.networks.exists(name):
+                return None
+            logging.debug(f"Using warm network {name}")
+            return self._podman_client.networks.get(name)
+        except APIError as e:
+            logging.debug(f"Could not get warm network {name}: {e}")
+            return None
+
+    def _connect_to_network(self, m_id: str, container: "Container", network: "Network"):
         """There is no way to get MAC address of remote interface except
         executing "ip l" inside container.
         """
@@ -266,11 +538,7 @@ class ContainerPoolManager(object):
         logging.debug(
             f"Getting MAC address of remote interface at {container.name} for {network.name}"
         )
-        interfaces = loads(
-            subprocess.check_output(
-                ["podman", "exec", "-it", container.name, "ip", "-j", "a"]
-            ).decode("utf-8")
-        )
+        interfaces = self._container_interfaces(container)
         interface = max(
             interfaces, key=(lambda inf: inf["ifindex"])
         )  # get interface with highest index
@@ -279,7 +547,7 @@ class ContainerPoolManager(object):
         if "link_index" in interface:
             eth += f"@{interface['link_index']}"
 
-        machine = self._pool[container.attrs["Config"]["Hostname"]]
+        machine = self._pool[m_id]
         machine["interfaces"][eth] = {
             "params": {"hwaddr": interface["address"], "driver": "veth"},
             "network": network.name,
@@ -287,45 +555,136 @@ class ContainerPoolManager(object):
 
         return True
 
-    def _connect_to_networks(self, container: "Container", network_reqs: dict):
+    def _connect_to_networks(self, m_id: str, container: "Container", network_reqs: dict):
         for _, params in network_reqs["interfaces"].items():
             name = params["network"]
             logging.debug(f"Connecting {container.name} to {name}")
 
             network = self._create_network(name)
 
-            self._connect_to_network(container, network)
+            self._connect_to_network(m_id, container, network)
 
     def process_reqs(self, mreqs: dict):
         """This method is called by :py:class:`lnst.Controller.MachineMapper.ContainerMapper`,
         it is responsible for creating containers and networks.
+
+        Networks are created first, then the containers are created (or taken
+        from the warm pool) and connected to the networks in parallel.
         """
-        for m_id, m_reqs in mreqs.items():
-            container, machine = self._create_container(m_id, m_reqs)
-            self._connect_to_networks(container, m_reqs)
+        for m_reqs in mreqs.values():
+            for params in m_reqs["interfaces"].values():
+                self._create_network(params["network"])
+
+        warm_containers = {}
+        if self._warm_pool:
+            default_port = self._ctl_config.get_option("environment", "rpcport")
+            warm_containers = self._acquire_warm_containers(
+                {
+                    m_id: m_reqs.get("rpc_port") or default_port
+                    for m_id, m_reqs in mreqs.items()
+                }
+            )
 
-            self._machines[m_id] = machine
+        def setup_machine(m_id):
+            m_reqs = mreqs[m_id]
+            container, machine = self._create_container(
+                m_id, m_reqs, warm_containers.get(m_id)
+            )
             self._containers[m_id] = container
-            machine.init_connection()
+            self._connect_to_networks(m_id, container, m_reqs)
+            self._machines[m_id] = machine
+
+        self._run_parallel(setup_machine, mreqs.keys())
+
+        for m_id in mreqs.keys():
+            self._machines[m_id].init_connection()
+
+    def _release_container(self, m_id: str, container: "Container"):
+        """Returns the container to the warm pool, it's disconnected from
+        the recipe networks. A container that isn't clean afterwards, e.g.
+        because of devices the recipe left behind, is removed.
+        """
+        logging.debug(f"Returning container {container.name} to the warm pool")
+        try:
+            for interface in self._pool[m_id]["interfaces"].values():
+                network = self._networks[interface["network"]]
+                network.disconnect(container, force=True)
+
+            container.reload()
+            clean = container.status == "running" and self._is_clean(container)
+        except (APIError, KeyError, subprocess.CalledProcessError) as e:
+            logging.debug(f"Could not reset container {container.name}: {e}")
+            clean = False
+
+        if clean:
+            self._unclaim(container.name)
+        else:
+            self._remove_claimed_container(container)
 
     def cleanup_containers(self):
         logging.info("Cleaning containers")
 
-        for m_id, container in self._containers.items():
-            logging.debug("Stopping container " + m_id)
-            container.stop()
+        if self._warm_pool:
+            self._run_parallel(
+                lambda item: self._release_container(*item),
+                list(self._containers.items()),
+            )
+        else:
+            for m_id, container in self._containers.items():
+                logging.debug("Stopping container " + m_id)
+                container.stop()
 
-            logging.debug("Removing container " + m_id)
-            container.remove()
+                logging.debug("Removing container " + m_id)
+                container.remove()
+
+        self._containers = {}
+        self._machines = {}
+        self._pool = {}
 
     def cleanup_networks(self):
-        for name, network in self._networks.items():
-            logging.debug("Removing network " + name)
-            try:
-                network.remove(force=True)
-            except APIError as e:
-                logging.error(f"Could not remove network {name}: {e}")
+        if not self._warm_pool:
+            for name, network in self._networks.items():
+                logging.debug("Removing network " + name)
+                try:
+                    network.remove(force=True)
+                except APIError as e:
+                    logging.error(f"Could not remove network {name}: {e}")
+
+        self._networks = {}
 
     def cleanup(self):
         self.cleanup_containers()
         self.cleanup_networks()
+
+        if self._warm_pool:
+            self.prewarm()
+
+    def cleanup_warm_pool(self):
+        """Removes all containers and networks kept by the warm pool
+
+        Containers used by other runs are kept.
+        """
+        logging.info("Removing warm pool")
+
+        def remove_warm_container(container):
+            if container.name in self._claims or self._claim(container.name):
+                self._remove_claimed_container(container)
+            else:
+                logging.info(f"Keeping container {container.name} used by "
+                             "another run")
+
+        self._run_parallel(remove_warm_container, self._warm_pool_containers())
+
+        try:
+            networks = self._podman_client.networks.list()
+        except APIError as e:
+            raise PoolManagerError(f"Could not list networks: {e}")
+
+        for network in networks:
+            if not network.name.startswith(self._network_prefix):
+                continue
+            logging.debug("Removing network " + network.name)
+            try:
+                network.remove(force=True)
+            except APIError as e:
+                logging.error(f"Could not remove network {network.name}: {e}")
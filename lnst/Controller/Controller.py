@@ -13,7 +13,9 @@ import sys
 from typing import Union
 import datetime
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from lnst.Common.Logs import LoggingCtl, log_exc_traceback
+from lnst.Common.LoggingHandler import ThreadLogBuffer
 from lnst.Common.NetUtils import MacPool
 from lnst.Common.Utils import mkdir_p
 from lnst.Devices.VirtualDevice import VirtualDevice
@@ -165,10 +167,13 @@ class Controller(object):
 
             for line in format_match_description(match).split('\n'):
                 logging.info(line)
+            run = None
+            self._msg_dispatcher.rpc_stats.reset()
             try:
                 self._map_match(match, req, recipe)
-                recipe._init_run(RecipeRun(recipe, match, log_dir=self._log_ctl.get_recipe_log_path(),
-                                           log_list=self._log_ctl.get_recipe_log_list()))
+                run = RecipeRun(recipe, match, log_dir=self._log_ctl.get_recipe_log_path(),
+                                log_list=self._log_ctl.get_recipe_log_list())
+                recipe._init_run(run)
                 recipe.test()
             except Exception as exc:
                 if recipe.current_run:
@@ -178,6 +183,10 @@ class Controller(object):
                 raise
             finally:
                 self._cleanup_agents()
+                if run is not None:
+                    run.rpc_stats = self._msg_dispatcher.rpc_stats.snapshot()
+                    logging.debug("Remote method call statistics:\n{}".format(
+                        run.rpc_stats.format()))
 
     def _map_match(self, match, requested, recipe):
         self._machines = {}
@@ -187,25 +196,33 @@ class Controller(object):
             machine = self._machines[m_id] = pool[m["target"]]
 
             setattr(self._hosts, m_id, Host(machine))
-            host = getattr(self._hosts, m_id)
 
             machine.set_id(m_id)
             machine.set_mapped(True)
-            self._prepare_machine(machine)
+
+        self._raise_machine_errors(
+            "preparation", self._run_machine_phase(self._prepare_machine))
+
+        for m_id, m in list(match["machines"].items()):
+            host = getattr(self._hosts, m_id)
 
             for if_id, i in list(m["interfaces"].items()):
                 host.map_device(if_id, i)
 
             if match["virtual"]:
                 req_host = getattr(requested, m_id)
+                virt_devs = {}
                 for name, dev in req_host:
-                    new_virt_dev = VirtualDevice(network=dev.label,
+                    virt_devs[name] = VirtualDevice(network=dev.label,
                                     driver=getattr(dev.params, "driver", None),
                                     hwaddr=getattr(dev.params, "hwaddr", None))
-                    setattr(host, name, new_virt_dev)
+                host._create_virtual_devices(virt_devs)
+                for new_virt_dev in virt_devs.values():
                     new_virt_dev._enable()
 
-            machine.start_recipe(recipe)
+        self._raise_machine_errors(
+            "recipe start", self._run_machine_phase(
+                lambda machine: machine.start_recipe(recipe)))
 
     def _prepare_machine(self, machine):
         self._log_ctl.add_agent(machine.get_id())
@@ -214,26 +231,92 @@ class Controller(object):
 
         machine.prepare_machine()
 
+    def _run_machine_phase(self, func):
+        """Calls func for all mapped machines concurrently
+
+        At most 'machine_parallelism' (ctl config) machines are handled at
+        the same time. The log records of each machine are emitted together
+        once all of them are done, in the order of machine ids. This includes
+        the records sent by the agents of the machines meanwhile.
+
+        Returns a dictionary mapping machine ids to the exceptions raised
+        for them, the exceptions are logged already.
+        """
+        machines = sorted(self._machines.items())
+        parallelism = min(len(machines), self._config.get_option(
+            "environment", "machine_parallelism"))
+
+        def run(machine):
+            try:
+                func(machine)
+            except Exception as exc:
+                log_exc_traceback()
+                return exc
+            return None
+
+        if parallelism <= 1:
+            errors = {m_id: run(machine) for m_id, machine in machines}
+            return {m_id: exc for m_id, exc in errors.items() if exc}
+
+        log_buffer = ThreadLogBuffer()
+
+        def run_buffered(machine):
+            log_buffer.start_buffering(machine.get_id())
+            try:
+                return run(machine)
+            finally:
+                records[machine.get_id()] = log_buffer.stop_buffering(
+                    machine.get_id())
+
+        records = {}
+        log_buffer.install()
+        try:
+            with ThreadPoolExecutor(max_workers=parallelism) as executor:
+                futures = [(m_id, executor.submit(run_buffered, machine))
+                           for m_id, machine in machines]
+                errors = {m_id: future.result() for m_id, future in futures}
+        finally:
+            log_buffer.uninstall()
+            for m_id, _ in machines:
+                log_buffer.emit_records(records.get(m_id, []))
+
+        return {m_id: exc for m_id, exc in errors.items() if exc}
+
+    @staticmethod
+    def _raise_machine_errors(phase, errors):
+        if len(errors) == 1:
+            raise list(errors.values())[0]
+        elif errors:
+            msg = "Machine {} failed on {}".format(phase, ", ".join(
+                "{} ({})".format(m_id, exc) for m_id, exc in errors.items()))
+            raise ControllerError(msg)
+
     def _cleanup_agents(self):
         if self._machines == None:
             return
 
-        for m_id, machine in list(self._machines.items()):
+        def cleanup_machine(machine):
             try:
                 machine.cleanup()
-            except:
-                #TODO report errors during deconfiguration as FAIL!!
-                log_exc_traceback()
             finally:
                 machine.stop_recipe()
-                for dev in list(machine._device_database.values()):
-                    if isinstance(dev, VirtualDevice):
-                        dev._destroy()
+                virt_devs = [dev
+                             for ns_devs in machine._device_database.values()
+                             for dev in ns_devs.values()
+                             if isinstance(dev, VirtualDevice)]
+                if virt_devs:
+                    VirtualDevice._destroy_many(virt_devs)
 
                 #clean-up agent logger
-                self._log_ctl.remove_agent(m_id)
+                self._log_ctl.remove_agent(machine.get_id())
                 machine.set_mapped(False)
 
+        errors = self._run_machine_phase(cleanup_machine)
+        #TODO report errors during deconfiguration as FAIL!!
+        if errors:
+            logging.error("Cleanup failed on machines: {}".format(
+                ", ".join(sorted(errors))))
+
         self._machines.clear()
 
         # remove dynamically created bridges
@@ -13,12 +13,41 @@ olichtne@redhat.com (Ondrej Lichtner)
 
 import logging
 import signal
+from collections import deque
 from lnst.Common.JobError import JobError
+from lnst.Common.Logs import log_exc_traceback
 from lnst.Tests.BaseTestModule import BaseTestModule
 from lnst.Controller.RecipeResults import ResultLevel, ResultType
 
 DEFAULT_TIMEOUT = 60
 
+# number of the most recent interim records kept by a Job
+INTERIM_HISTORY = 1024
+
+class ShellBatch(object):
+    """Ordered list of shell commands run on the agent by a single Job
+
+    Args:
+        commands -- list of shell command strings
+        fail_fast -- default 'True'. When True, no further commands are
+            started after the first command fails, when False all commands
+            are run regardless of failures.
+        parallel -- maximum number of commands running at the same time.
+            Default is 1, the commands are run sequentially in order.
+    """
+    def __init__(self, commands, fail_fast=True, parallel=1):
+        if parallel < 1:
+            raise JobError("Batch parallelism must be a positive integer")
+
+        self.commands = [str(cmd) for cmd in commands]
+        self.fail_fast = fail_fast
+        self.parallel = parallel
+
+    def __repr__(self):
+        return "ShellBatch({!r}, fail_fast={}, parallel={})".format(
+            self.commands, self.fail_fast, self.parallel
+        )
+
 class Job(object):
     """Tester facing Job API
 
@@ -40,6 +69,10 @@ class Job(object):
         self._level = level
 
         self._res = None
+        self._bg = False
+
+        self._interim_handlers = []
+        self._interim_results = deque(maxlen=INTERIM_HISTORY)
 
         if self.type == "unknown":
             raise JobError("Unable to run '%s'" % str(what))
@@ -72,6 +105,8 @@ class Job(object):
             return "module"
         elif isinstance(self.what, str):
             return "shell"
+        elif isinstance(self.what, ShellBatch):
+            return "shell_batch"
         return "unknown"
 
     @property
@@ -116,12 +151,48 @@ class Job(object):
             depends on the type of the job. For python modules it is whatever
             the module sets as the _res_data attribute.
             For shell commands it is a dictionary with stdout and stderr.
+            For shell batches it is a dictionary with a "results" list
+            containing a dictionary with command, stdout, stderr and retval
+            for each command of the batch, in order. retval is None for
+            commands that weren't run.
         """
         try:
             return self._res["res_data"]
         except:
             return None
 
+    @property
+    def interim_results(self):
+        """the most recent interim records streamed by the running Job
+
+        Type: list, at most INTERIM_HISTORY records are kept, older ones are
+        only passed to the interim handlers.
+        """
+        return list(self._interim_results)
+
+    def add_interim_handler(self, handler):
+        """registers a callable receiving the interim records of the Job
+
+        Only applicable for Jobs running a python module. The module streams
+        records emitted with its emit_interim method only to Jobs with at
+        least one handler, so handlers have to be added before the Job is
+        started. The handler is called with the record as the only argument
+        from the Controller's message processing, so it should return
+        quickly.
+        """
+        if self._id is not None:
+            raise JobError("Interim handlers have to be added before the "
+                           "Job is started")
+        self._interim_handlers.append(handler)
+
+    def _interim_received(self, record):
+        self._interim_results.append(record)
+        for handler in self._interim_handlers:
+            try:
+                handler(record)
+            except Exception:
+                log_exc_traceback()
+
     @property
     def level(self):
         return self._level
@@ -160,6 +231,7 @@ class Job(object):
             return False
 
     def start(self, bg=False, timeout=DEFAULT_TIMEOUT):
+        self._bg = bg
         self._netns._machine.run_job(self)
 
         if not bg:
@@ -214,8 +286,17 @@ class Job(object):
              "json": self._json}
         if self.type == "shell":
             d["command"] = self._what
+            # short foreground commands can be run by a warm agent worker
+            # instead of a freshly forked process
+            d["pooled"] = not self._bg
+        elif self.type == "shell_batch":
+            d["commands"] = self._what.commands
+            d["fail_fast"] = self._what.fail_fast
+            d["parallel"] = self._what.parallel
+            d["pooled"] = not self._bg
         elif self.type == "module":
             d["module"] = self._what
+            d["interim"] = len(self._interim_handlers) > 0
         else:
             raise JobError("Unknown Job type %s" % self.type)
         return d
@@ -240,4 +321,5 @@ class Job(object):
         #TODO figure out better place holder values
         state = self.__dict__.copy()
         state['_netns'] = None
+        state['_interim_handlers'] = []
         return state
@@ -15,21 +15,15 @@ import logging
 import socket
 import sys
 from lnst.Common.Utils import sha256sum
-from lnst.Common.Utils import check_process_running
 from lnst.Common.Version import lnst_version
 from lnst.Controller.Common import ControllerError
 from lnst.Controller.CtlSecSocket import CtlSecSocket
 from lnst.Controller.RecipeResults import JobStartResult, JobFinishResult, DeviceCreateResult, DeviceMethodCallResult, DeviceAttrSetResult, ResultType
 from lnst.Controller.AgentProxyObject import AgentProxyObject
-from lnst.Devices import device_classes
 from lnst.Devices.Device import Device
 from lnst.Devices.RemoteDevice import RemoteDevice
 from lnst.Devices.LoopbackDevice import LoopbackDevice
 
-# conditional support for libvirt
-if check_process_running("libvirtd"):
-    from lnst.Controller.VirtDomainCtl import VirtDomainCtl
-
 class MachineError(ControllerError):
     pass
 
@@ -65,6 +59,8 @@ class Machine(object):
         self._network_bridges = None
         self._libvirt_domain = libvirt_domain
         if libvirt_domain:
+            # libvirt is needed only by the virtual machines
+            from lnst.Controller.VirtDomainCtl import VirtDomainCtl
             self._domain_ctl = VirtDomainCtl(libvirt_domain)
 
         if rpcport:
@@ -84,6 +80,7 @@ class Machine(object):
         self._job_id_seq = 0
 
         self._device_database = {}
+        self._mapped_device_classes = {}
         self._tmp_device_database = []
         self._netns_moved_devices = {}
 
@@ -109,6 +106,7 @@ class Machine(object):
         dev._machine = self
 
     def remote_device_create(self, dev, netns=None):
+        self._map_device_class(dev._dev_cls, netns)
         dev_clsname = dev._dev_cls.__name__
         dev_args = dev._dev_args
         dev_kwargs = dev._dev_kwargs
@@ -129,6 +127,7 @@ class Machine(object):
         self._add_device_to_database(ret["ifindex"], dev, netns)
 
     def remote_device_set_netns(self, dev, dst, src):
+        self._map_device_class(dev._dev_cls, dst)
         self._add_device_to_netns_moved_devices(dev, dst, src)
         self.rpc_call("set_dev_netns", dev, dst.name, netns=src)
         dev_clsname = dev._dev_cls.__name__
@@ -169,6 +168,7 @@ class Machine(object):
             raise
         finally:
             self._add_recipe_result(config_res)
+            self._drop_device_snapshot(index, netns)
         return res
 
     def remote_device_setattr(self, index, attr_name, value, netns):
@@ -189,11 +189,52 @@ class Machine(object):
         except:
             config_res.result = ResultType.FAIL
             raise
+        finally:
+            self._drop_device_snapshot(index, netns)
         return res
 
     def remote_device_getattr(self, index, attr_name, netns):
+        snapshot = self._get_device_snapshot(index, netns)
+        if snapshot is not None and attr_name in snapshot:
+            value = snapshot[attr_name]
+            # the caller may modify the returned value
+            return list(value) if isinstance(value, list) else value
         return self.rpc_call("dev_getattr", index, attr_name, netns=netns)
 
+    def _get_device_snapshot(self, ifindex, netns):
+        """Returns the cached attributes of the device
+
+        The snapshots of all the devices of the namespace that don't have a
+        valid one are fetched together. The Agent invalidates them with
+        dev_updated messages when it receives a netlink event for the device.
+        """
+        # the messages that already arrived may invalidate the snapshot
+        self._msg_dispatcher.poll_messages()
+
+        devices = self._device_database.get(netns, {})
+        dev = devices.get(ifindex)
+        if dev is None:
+            return None
+
+        if dev._snapshot is None:
+            missing = [idx for idx, d in devices.items() if d._snapshot is None]
+            snapshots = self.rpc_call("get_device_snapshots", missing,
+                                      netns=netns)
+            for idx, snapshot in snapshots.items():
+                if idx in devices:
+                    devices[idx]._snapshot = snapshot
+        return dev._snapshot
+
+    def _drop_device_snapshot(self, ifindex, netns):
+        dev = self._device_database.get(netns, {}).get(ifindex)
+        if dev is not None:
+            dev._snapshot = None
+
+    def device_updated(self, dev_data, netns=None):
+        ns_instance = self._get_netns_by_name(netns)
+        for ifindex in dev_data["ifindexes"]:
+            self._drop_device_snapshot(ifindex, ns_instance)
+
     def device_created(self, dev_data, netns=None):
         ns_instance = self._get_netns_by_name(netns)
         ifindex = dev_data["ifindex"]
@@ -363,7 +404,11 @@ class Machine(object):
     def prepare_machine(self):
         self.rpc_call("prepare_machine")
         self._device_database = {self._initns: {}}
-        self._send_device_classes()
+        self._mapped_device_classes = {None: set()}
+        # only the classes of the devices found by the agent are needed now,
+        # the other ones are sent when a device of the class is created
+        self._map_device_class(Device)
+        self._map_device_class(LoopbackDevice)
         self.rpc_call("init_if_manager")
 
         devices = self.rpc_call("get_devices")
@@ -382,13 +427,19 @@ class Machine(object):
         if self._recipe:
             self._recipe.current_run.add_result(result)
 
-    def _send_device_classes(self):
-        for cls_name, cls in device_classes:
-            self.send_class(cls)
+    def _map_device_class(self, cls, netns=None):
+        if netns not in self._namespaces.values():
+            # root namespace, passed as None or as the Host object
+            netns = None
 
-        for cls_name, cls in device_classes:
-            module_name = cls.__module__
-            self.rpc_call("map_device_class", cls_name, module_name)
+        mapped =self._mapped_device_classes.setdefault(netns, set())
+        if cls in mapped:
+            return
+
+        self.send_class(cls, netns=netns)
+        self.rpc_call("map_device_class", cls.__name__, cls.__module__,
+                      netns=netns)
+        mapped.add(cls)
 
     def send_class(self, cls, netns=None):
         classes = [cls]
@@ -545,6 +596,11 @@ class Machine(object):
         job._res = msg["result"]
         self._add_recipe_result(JobFinishResult(job))
 
+    def job_interim(self, msg):
+        job = self._jobs.get(msg["job_id"])
+        if job is not None:
+            job._interim_received(msg["data"])
+
     def kill(self, job, signal):
         if job.id not in self._jobs:
             raise MachineError("No job '%s' running on Machine %s" %
@@ -592,23 +648,50 @@ class Machine(object):
 
         return self._domain_ctl
 
-    def start_packet_capture(self):
-        namespaces = set()
-        for iface in self._interfaces:
-            namespaces.add(iface.get_netns())
-
-        tmp = {}
-        for netns in namespaces:
-            tmp.update(self.rpc_call("start_packet_capture", "", netns=netns))
-        return tmp
-
-    def stop_packet_capture(self):
-        namespaces = set()
-        for iface in self._interfaces:
-            namespaces.add(iface.get_netns())
-
-        for netns in namespaces:
-            self.rpc_call("stop_packet_capture", netns=netns)
+    def start_packet_capture(self, netns, devices=None, filt="",
+                             **capture_opts):
+        ifindexes = None
+        if devices is not None:
+            ifindexes = [dev.ifindex for dev in devices]
+        return self.rpc_call("start_packet_capture", filt, ifindexes,
+                             netns=netns, **capture_opts)
+
+    def packet_capture_stats(self, netns):
+        return self._map_capture_stats(
+            self.rpc_call("packet_capture_stats", netns=netns), netns)
+
+    def stop_packet_capture(self, netns):
+        stats = self._map_capture_stats(
+            self.rpc_call("stop_packet_capture", netns=netns), netns)
+
+        for dev, dev_stats in stats.items():
+            if dev_stats["drops"]:
+                logging.warning("Packet capture on %s of machine %s dropped "
+                                "%d packets", dev_stats["ifname"],
+                                self.get_id(), dev_stats["drops"])
+        return stats
+
+    def get_packet_capture(self, netns, dev, local_path, start=None, end=None,
+                           max_packets=None):
+        remote_path = self.rpc_call("get_packet_capture", dev.ifindex, start,
+                                    end, max_packets, netns=netns)
+        self._copy_opened_file_from(remote_path, local_path, netns)
+
+    def get_cpu_topology(self):
+        return self.rpc_call("get_cpu_topology")
+
+    def get_devices_locality(self, netns, devices):
+        locality = self.rpc_call("get_devices_locality",
+                                 [dev.ifindex for dev in devices],
+                                 netns=netns)
+        return {dev: locality[dev.ifindex] for dev in devices}
+
+    def _map_capture_stats(self, stats, netns):
+        result = {}
+        for ifindex, dev_stats in stats.items():
+            dev = self.dev_db_get_ifindex(ifindex, netns.name)
+            result[dev if dev is not None else ifindex] = dev_stats
+        return result
 
     def copy_file_to_machine(self, local_path, remote_path=None, netns=None):
         remote_path = self.rpc_call("start_copy_to", remote_path, netns=netns)
@@ -632,17 +715,21 @@ class Machine(object):
             raise MachineError("The requested file cannot be transfered." \
                        "It does not exist on machine %s" % self.get_id())
 
+        self._copy_opened_file_from(remote_path, local_path)
+
+    def _copy_opened_file_from(self, remote_path, local_path, netns=None):
         local_file = open(local_path, "wb")
 
         buf_size = 1024*1024 # 1MB buffer
         while True:
-            data: bytes = self.rpc_call("copy_part_from", remote_path, buf_size)
+            data: bytes = self.rpc_call("copy_part_from", remote_path, buf_size,
+                                        netns=netns)
             if not data:
                 break
             local_file.write(data)
 
         local_file.close()
-        self.rpc_call("finish_copy_from", remote_path)
+        self.rpc_call("finish_copy_from", remote_path, netns=netns)
 
     def sync_resource(self, res_name, file_path, netns=None):
         digest = sha256sum(file_path)
@@ -672,7 +759,11 @@ class Machine(object):
     def add_netns(self, netns):
         self._namespaces[netns.name] = netns
         self._device_database[netns] = {}
-        return self.rpc_call("add_namespace", netns.name)
+        # the new namespace inherits the device classes of the root one
+        self._mapped_device_classes[netns] = set(
+            self._mapped_device_classes.get(None, ()))
+        return self.rpc_call("add_namespace", netns.name,
+                             lightweight=netns._lightweight)
 
     def del_netns(self, netns):
         return self.rpc_call("del_namespace", netns.name)
@@ -709,6 +800,7 @@ class Machine(object):
         if not netns in self._device_database:
             self._device_database[netns] = {}
 
+        dev._snapshot = None
         self._device_database[netns][ifindex] = dev
 
     def _get_device_from_database(self, ifindex, netns=None):
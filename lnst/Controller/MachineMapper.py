@@ -46,6 +46,7 @@ class MachineMapper(object):
     define the required API. ABC?
     """
     def __init__(self):
+        self._pools_manager = None
         self._pools = {}
         self._pool_stack = []
         self._pool = {}
@@ -69,10 +70,12 @@ class MachineMapper(object):
     def set_pools_manager(self, pools_manager):
         """set the pools manager to be used by the matching algorithm
 
-        This class does not use pools manager anymore. Method just gets the pools.
-        This needs to be a specially formatted dictionary returned by get_pools
-        method of a AgentPoolManager class.
+        The pools are a specially formatted dictionary returned by get_pools
+        method of a AgentPoolManager class. The pools manager is also asked
+        to check availability of the machines that are considered for
+        matching.
         """
+        self._pools_manager = pools_manager
         self._pools = pools_manager.get_pools()
 
     def reset_match_state(self):
@@ -261,6 +264,12 @@ class MachineMapper(object):
         machine_match["remaining_matches"] = list(self._unmatched_pool_machines)
         machine_match["if_stack"] = []
 
+        # query all the candidates at once instead of one by one during
+        # the matching
+        self._check_availability(
+            [pool_id for pool_id in machine_match["remaining_matches"]
+             if self._check_machine_params(machine_match["m_id"], pool_id)])
+
         machine = self._mreqs[machine_match["m_id"]]
         machine_match["unmatched_ifs"] = sorted(list(machine["interfaces"].keys()),
                                                 reverse=True)
@@ -289,7 +298,22 @@ class MachineMapper(object):
         if_stack_top = m_stack_top["if_stack"].pop()
         m_stack_top["unmatched_ifs"].append(if_stack_top["if_id"])
 
+    def _check_availability(self, pool_ids):
+        """asks the pools manager to check the machines that weren't
+        checked yet"""
+        unknown = [pool_id for pool_id in pool_ids
+                   if self._pool[pool_id].get("available", True) is None]
+        if len(unknown) > 0:
+            self._pools_manager.check_availability(self._pool_name, unknown)
+
     def _check_machine_compatibility(self, req_id, pool_id):
+        if not self._check_machine_params(req_id, pool_id):
+            return False
+
+        self._check_availability([pool_id])
+        return bool(self._pool[pool_id].get("available", True))
+
+    def _check_machine_params(self, req_id, pool_id):
         req_machine = self._mreqs[req_id]
         pool_machine = self._pool[pool_id]
         for param, value in list(req_machine["params"].items()):
@@ -16,12 +16,14 @@ olichtne@redhat.com (Ondrej Lichtner)
 
 import logging
 import copy
-import signal
+import threading
+import time
 from lnst.Common.ConnectionHandler import send_data
-from lnst.Common.ConnectionHandler import ConnectionHandler
+from lnst.Common.ConnectionHandler import ConnectionHandler, WakeupEvent
 from lnst.Common.Parameters import Parameters
 from lnst.Common.DeviceRef import DeviceRef
 from lnst.Controller.Common import ControllerError
+from lnst.Controller.RpcStats import RpcStats
 from lnst.Devices.RemoteDevice import RemoteDevice
 from lnst.Tests.BaseTestModule import BaseTestModule
 
@@ -89,107 +91,256 @@ class ConnectionError(ControllerError):
 class WaitTimeoutError(ControllerError):
     pass
 
-def _timeout_handler(signum, frame):
-    msg = "Timeout expired"
-    raise WaitTimeoutError(msg)
-
 class MessageDispatcher(ConnectionHandler):
+    """Multiplexes the connections to all Agents
+
+    send_message and wait_for_condition can be called from several threads
+    at once (send_message each for a different machine), e.g. to prepare
+    machines concurrently. Only one of the waiting threads receives and
+    processes messages at a time, results and exceptions are handed over to
+    the thread waiting for them and the other threads re-evaluate their
+    conditions after each processed batch of messages. Timeouts are
+    measured against time.monotonic deadlines, no signals are used, so
+    waiting works from any thread with sub-second precision.
+
+    The latency and transmitted bytes of every call are recorded in the
+    rpc_stats attribute (:any:`RpcStats`).
+    """
     def __init__(self, log_ctl):
         super(MessageDispatcher, self).__init__()
         self._log_ctl = log_ctl
         self._machines = dict()
 
+        self._send_lock = threading.Lock()
+        self._recv_cond = threading.Condition()
+        self._receiving = False
+        self._receiver = None
+        self._recv_generation = 0
+        self._wakeup = WakeupEvent()
+        self._waiting = set()
+        self._replies = {}
+
+        self.rpc_stats = RpcStats()
+
     def add_agent(self, machine, connection):
         self._machines[machine] = machine
         self.add_connection(machine, connection)
+        # the receiving thread has to include the new connection
+        self.wakeup()
 
-    def send_message(self, machine, data):
-        soc = self.get_connection(machine)
-        data = remote_device_to_deviceref(data)
-
-        if send_data(soc, data) == False:
-            msg = "Connection error from agent %s" % machine.get_id()
-            raise ConnectionError(msg)
+    def wakeup(self):
+        """Makes all waiting threads re-evaluate their conditions
 
-        result = None
-        while True:
-            connected_agents = list(self._connection_mapping.keys())
-
-            messages = self.check_connections()
-            for msg in messages:
-                if msg[1]["type"] == "result" and msg[0] == machine:
-                    if result is not None:
-                        msg = ("Multiple result messages from the same agent "
-                               "'{}'".format(machine.get_id()))
-                        raise ConnectionError(msg)
-                    result = msg[1]
-                else:
-                    self._process_message(msg)
-
-            remaining_agents = list(self._connection_mapping.keys())
-            if connected_agents != remaining_agents:
-                self._handle_disconnects(set(connected_agents)-
-                                         set(remaining_agents))
+        Only needed when a condition depends on something else than the
+        messages from the agents, e.g. state changed by another thread.
+        """
+        self._wakeup.set()
 
-            if result is not None:
-                netns = data.get("netns", None)
-                return deviceref_to_remote_device(machine, result["result"], netns)
+    def send_message(self, machine, data):
+        start = time.perf_counter()
+        soc = self.get_connection(machine)
+        sent_before = getattr(soc, "bytes_sent", 0)
+        received_before = getattr(soc, "bytes_received", 0)
+        send_time = 0.0
+        error = True
 
-    def wait_for_condition(self, condition_check, timeout=0):
-        res = True
-        prev_handler = signal.signal(signal.SIGALRM, _timeout_handler)
+        try:
+            data = remote_device_to_deviceref(data)
 
-        def condition_wrapper():
-            res = condition_check()
-            if res:
-                signal.alarm(0)
-                signal.signal(signal.SIGALRM, prev_handler)
-                logging.debug("Condition passed, disabling timeout alarm")
-            return res
+            with self._recv_cond:
+                if machine in self._waiting:
+                    msg = ("Agent '{}' is already waiting for a result"
+                           .format(machine.get_id()))
+                    raise ConnectionError(msg)
+                self._waiting.add(machine)
 
+            try:
+                with self._send_lock:
+                    sent = send_data(soc, data)
+                send_time = time.perf_counter() - start
+                if sent == False:
+                    msg = "Connection error from agent %s" % machine.get_id()
+                    raise ConnectionError(msg)
+
+                reply = self._wait_for_reply(machine)
+            finally:
+                with self._recv_cond:
+                    self._waiting.discard(machine)
+                    self._replies.pop(machine, None)
+
+            if reply["type"] == "exception":
+                raise reply["Exception"]
+
+            netns = data.get("netns", None)
+            result = deviceref_to_remote_device(machine, reply["result"], netns)
+            error = False
+            return result
+        finally:
+            self._record_rpc(machine, data, time.perf_counter() - start,
+                             send_time,
+                             getattr(soc, "bytes_sent", 0) - sent_before,
+                             getattr(soc, "bytes_received", 0) - received_before,
+                             error)
+
+    def _record_rpc(self, machine, data, duration, send_time, bytes_sent,
+                    bytes_received, error):
+        netns = data.get("netns")
+        command = data.get("data", data) if netns is not None else data
+        method = command.get("method_name", command.get("type"))
+        self.rpc_stats.record(machine.get_id(), netns, method, duration,
+                              send_time, bytes_sent, bytes_received, error)
+
+    def _wait_for_reply(self, machine):
+        self._wait(lambda: machine in self._replies)
+        with self._recv_cond:
+            return self._replies.pop(machine)
+
+    def _wait(self, condition_check, deadline=None, interval=None):
+        """Processes messages until condition_check returns True
+
+        Returns False if the deadline (a time.monotonic value) passes first.
+        The condition is evaluated after every batch of processed messages,
+        either by this thread or by the thread that is currently receiving,
+        and at least every interval seconds if it's not None.
+        """
+        while True:
+            with self._recv_cond:
+                generation = self._recv_generation
+
+            if condition_check():
+                return True
+
+            if deadline is None:
+                timeout = interval
+            else:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    # the condition may have become true at the deadline
+                    return bool(condition_check())
+                if interval is not None:
+                    timeout = min(timeout, interval)
+
+            with self._recv_cond:
+                if self._recv_generation != generation:
+                    # messages were processed since the condition check
+                    continue
+                if self._receiving:
+                    self._recv_cond.wait(timeout)
+                    continue
+                self._start_receiving()
+
+            self._receive_as_receiver(timeout)
+
+    def poll_messages(self):
+        """Processes the messages that already arrived without blocking
+
+        If another thread is receiving messages at the moment, its wait is
+        interrupted and this waits until a receive that started after this
+        call finished, so the messages that arrived before the call are
+        processed when this returns.
+        """
+        with self._recv_cond:
+            if self._receiver == threading.get_ident():
+                # called while processing messages, e.g. by a job callback
+                return
+
+            generation = self._recv_generation
+            while self._receiving:
+                # the current receive may have selected the connections
+                # before the call, the next one can't have
+                if self._recv_generation - generation >= 2:
+                    return
+                self._wakeup.set()
+                self._recv_cond.wait()
+            self._start_receiving()
+
+        self._receive_as_receiver(0)
+
+    def _start_receiving(self):
+        self._receiving = True
+        self._receiver = threading.get_ident()
+
+    def _receive_as_receiver(self, timeout):
         try:
-            signal.alarm(timeout)
-
-            wait = True
-            while wait:
-                connected_agents = list(self._connection_mapping.keys())
-                messages = self.check_connections(timeout=1)
-                for msg in messages:
-                    try:
-                        self._process_message(msg)
-                        wait = wait and not condition_wrapper()
-                    except WaitTimeoutError as exc:
-                        logging.error("Waiting for condition timed out!")
-                        res = False
-                        wait = False
-
-                wait = wait and not condition_wrapper()
-
-                remaining_agents = list(self._connection_mapping.keys())
-                if connected_agents != remaining_agents:
-                    self._handle_disconnects(set(connected_agents)-
-                                             set(remaining_agents))
-        except WaitTimeoutError as exc:
-            logging.error("Waiting for condition timed out!")
-            res = False
+            self._receive_messages(timeout)
         finally:
-            signal.alarm(0)
-            signal.signal(signal.SIGALRM, prev_handler)
-
-        return res
+            with self._recv_cond:
+                self._receiving = False
+                self._receiver = None
+                self._recv_generation += 1
+                self._recv_cond.notify_all()
 
-    def handle_messages(self):
+    def _receive_messages(self, timeout=None):
         connected_agents = list(self._connection_mapping.keys())
 
-        messages = self.check_connections()
+        messages = self.check_connections(timeout, wakeup=self._wakeup)
+        self._process_messages(connected_agents, messages)
+
+    def _process_messages(self, connected_agents, messages):
+        """Processes a batch of messages and the disconnects seen with it
 
+        All the messages are processed even if some of them fail, so that
+        the replies other threads wait for aren't lost, the first exception
+        is raised afterwards.
+        """
+        errors = []
         for msg in messages:
-            self._process_message(msg)
+            try:
+                self._process_message(msg)
+            except Exception as exc:
+                errors.append(exc)
 
         remaining_agents = list(self._connection_mapping.keys())
         if connected_agents != remaining_agents:
-            self._handle_disconnects(set(connected_agents)-
-                                     set(remaining_agents))
+            try:
+                self._handle_disconnects(set(connected_agents)-
+                                         set(remaining_agents))
+            except ConnectionError as exc:
+                errors.append(exc)
+
+        for exc in errors[1:]:
+            logging.error("Failed to process agent message: {}".format(exc))
+        if errors:
+            raise errors[0]
+
+    def _store_reply(self, message):
+        """hands a result or exception over to the thread waiting for it
+
+        Returns False if nobody is waiting for a reply from the agent.
+        """
+        machine = message[0]
+        with self._recv_cond:
+            if machine not in self._waiting:
+                return False
+            if machine in self._replies:
+                msg = ("Multiple result messages from the same agent "
+                       "'{}'".format(machine.get_id()))
+                raise ConnectionError(msg)
+            self._replies[machine] = message[1]
+            self._recv_cond.notify_all()
+        return True
+
+    def wait_for_condition(self, condition_check, timeout=0, interval=1):
+        """Processes messages until condition_check returns True
+
+        :param timeout: seconds, can be fractional, 0 waits indefinitely
+        :param interval: the condition is re-evaluated at least this often
+            (seconds) also when no messages arrive
+        :return: False if the timeout expired, True otherwise
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        if self._wait(condition_check, deadline, interval):
+            logging.debug("Condition passed")
+            return True
+
+        logging.error("Waiting for condition timed out!")
+        return False
+
+    def handle_messages(self):
+        connected_agents = list(self._connection_mapping.keys())
+
+        messages = self.check_connections()
+        self._process_messages(connected_agents, messages)
         return True
 
     def _process_message(self, message):
@@ -197,8 +348,9 @@ class MessageDispatcher(ConnectionHandler):
             record = message[1]["record"]
             self._log_ctl.add_client_log(message[0].get_id(), record)
         elif message[1]["type"] == "result":
-            msg = "Received result message from different agent %s" % message[0].get_id()
-            logging.debug(msg)
+            if not self._store_reply(message):
+                msg = "Received result message from different agent %s" % message[0].get_id()
+                logging.debug(msg)
         elif message[1]["type"] == "dev_created":
             machine = self._machines[message[0]]
             try:
@@ -213,6 +365,13 @@ class MessageDispatcher(ConnectionHandler):
             except KeyError:
                 netns = None
             machine.device_delete(message[1], netns)
+        elif message[1]["type"] == "dev_updated":
+            machine = self._machines[message[0]]
+            try:
+                netns = message[1]["netns"]
+            except KeyError:
+                netns = None
+            machine.device_updated(message[1], netns)
         elif message[1]["type"] == "dev_netns_changed":
             machine = self._machines[message[0]]
             try:
@@ -221,10 +380,14 @@ class MessageDispatcher(ConnectionHandler):
                 netns = None
             machine.device_netns_change(message[1], netns)
         elif message[1]["type"] == "exception":
-            raise message[1]["Exception"]
+            if not self._store_reply(message):
+                raise message[1]["Exception"]
         elif message[1]["type"] == "job_finished":
             machine = self._machines[message[0]]
             machine.job_finished(message[1])
+        elif message[1]["type"] == "job_interim":
+            machine = self._machines[message[0]]
+            machine.job_interim(message[1])
         else:
             msg = "Unknown message type: %s" % message[1]["type"]
             raise ConnectionError(msg)
@@ -237,9 +400,23 @@ class MessageDispatcher(ConnectionHandler):
                              "controller.".format(agent.get_id()))
                 disconnected_agents.remove(agent)
 
-        if len(disconnected_agents) > 0:
-            disconnected_names = [x.get_id()
-                                  for x in disconnected_agents]
+        # the threads waiting for a reply of a disconnected agent get the
+        # error as the reply, only the disconnects nobody waits for are
+        # raised by the receiving thread
+        unnoticed = []
+        with self._recv_cond:
+            for agent in sorted(disconnected_agents, key=lambda x: x.get_id()):
+                if agent not in self._waiting:
+                    unnoticed.append(agent)
+                elif agent not in self._replies:
+                    msg = ("Agent {} hard-disconnected from the controller."
+                           .format(agent.get_id()))
+                    self._replies[agent] = {"type": "exception",
+                                            "Exception": ConnectionError(msg)}
+            self._recv_cond.notify_all()
+
+        if len(unnoticed) > 0:
+            disconnected_names = [x.get_id() for x in unnoticed]
             msg = "Agents " + str(list(disconnected_names)) + \
                   " hard-disconnected from the controller."
             raise ConnectionError(msg)
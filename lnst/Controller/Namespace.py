@@ -15,6 +15,7 @@ olichtne@redhat.com (Ondrej Lichtner)
 """
 
 import logging
+from time import sleep
 from typing import Optional
 from lnst.Controller.Job import DEFAULT_TIMEOUT
 from lnst.Devices.Device import Device
@@ -22,7 +23,7 @@ from lnst.Devices.LoopbackDevice import LoopbackDevice
 from lnst.Devices.VirtualDevice import VirtualDevice
 from lnst.Devices.RemoteDevice import RemoteDevice
 from lnst.Controller.Common import ControllerError
-from lnst.Controller.Job import Job
+from lnst.Controller.Job import Job, ShellBatch
 from lnst.Controller.RecipeResults import ResultLevel
 
 class HostError(ControllerError):
@@ -38,7 +39,6 @@ class Namespace(object):
         m1.bond0 = Bond() # to create a new bond device
         m1.run("ip a") # to run a shell command"""
 
-    #TODO add packet capture options
     def __init__(self, machine):
         #storage for mapped objects (Devices, Namespaces...)
         self._objects = {}
@@ -129,6 +129,105 @@ class Namespace(object):
         job.start(bg, timeout)
         return job
 
+    def run_batch(self, commands, fail_fast=True, parallel=1, fail=False,
+                  desc=None, job_level=ResultLevel.IMPORTANT, bg=False,
+                  timeout=DEFAULT_TIMEOUT):
+        """
+        Runs a list of shell commands on the Host using a single Job.
+
+        Args:
+            commands (mandatory) -- list of shell command strings, run in
+                the given order
+            fail_fast -- default 'True'. If True, no further commands are
+                started once a command fails. If False, all commands are run.
+            parallel -- maximum number of commands running concurrently on
+                the Agent. Default 1, i.e. the commands are run sequentially.
+            The remaining arguments have the same meaning as for the 'run'
+            method.
+
+        Returns:
+            a Job object, the per command stdout, stderr and return values are
+            available as the "results" list of the Job.result dictionary.
+        """
+        batch = ShellBatch(commands, fail_fast=fail_fast, parallel=parallel)
+        return self.run(batch, fail=fail, desc=desc, job_level=job_level,
+                        bg=bg, timeout=timeout)
+
+    def start_packet_capture(self, devices=None, pcap_filter="",
+                             **capture_opts):
+        """
+        Starts capturing packets on the Agent.
+
+        All the captured devices are served by a single capture thread of the
+        Agent, packets are filtered in the kernel and stored in pcap files
+        that are rotated to limit the used disk space.
+
+        Args:
+            devices -- list of Devices to capture on, default None means all
+                devices of the Namespace
+            pcap_filter -- pcap-filter(7) expression (compiled on the Agent
+                with libpcap) or a compiled BPF program as a list of
+                (code, jt, jf, k) tuples, e.g. from 'tcpdump -dd'
+            capture_opts -- ring_size, rotate_size (bytes), rotate_time
+                (seconds), rotate_count and snaplen of the capture
+
+        Returns dictionary of ifindex to the list of capture files on the
+        Agent.
+        """
+        return self._machine.start_packet_capture(self, devices, pcap_filter,
+                                                  **capture_opts)
+
+    def packet_capture_stats(self):
+        """
+        Returns dictionary of Device to the capture counters, the "drops"
+        counter is the number of packets lost because the capture ring was
+        full.
+        """
+        return self._machine.packet_capture_stats(self)
+
+    def stop_packet_capture(self):
+        """
+        Stops the packet capture, the captured packets can still be
+        retrieved with get_packet_capture until the next capture is started.
+
+        Returns the final capture counters, see packet_capture_stats.
+        """
+        return self._machine.stop_packet_capture(self)
+
+    def get_packet_capture(self, device, local_path, start=None, end=None,
+                           max_packets=None):
+        """
+        Stores the packets captured on a device in a local pcap file.
+
+        Args:
+            device -- the captured Device
+            local_path -- path of the pcap file to create
+            start, end -- unix timestamps (Agent clock) limiting the time
+                window of the packets, default None means unlimited
+            max_packets -- maximum number of packets to retrieve
+        """
+        self._machine.get_packet_capture(self, device, local_path, start, end,
+                                         max_packets)
+        return local_path
+
+    def get_cpu_topology(self):
+        """
+        Returns the CPU topology of the Agent host as a dictionary of cpu
+        id to {"node", "package", "core", "siblings"} items.
+        """
+        return self._machine.get_cpu_topology()
+
+    def get_devices_locality(self, devices):
+        """
+        Returns dictionary of Device to its NUMA locality with a single
+        request. The values contain "numa_node" (-1 if unknown),
+        "local_cpus", "rx_queues" and "tx_queues" items.
+
+        Args:
+            devices -- list of Devices of this Namespace
+        """
+        return self._machine.get_devices_locality(self, devices)
+
     def __getattr__(self, name):
         """direct access to Device objects
 
@@ -182,14 +281,7 @@ class Namespace(object):
                     # msg = "Creating VirtualDevices in recipe execution is "\
                           # "not supported right now."
                     # raise HostError(msg)
-                    if self.name is not None:
-                        raise HostError("Can't create VirtualDevice in a netns")
-
-                    value._machine = self._machine
-                    value.netns = self
-                    self._machine.add_tmp_device(value)
-                    value._create()
-                    self._machine.wait_for_tmp_devices(DEFAULT_TIMEOUT)
+                    self._create_virtual_devices({name: value})
                 elif isinstance(value, LoopbackDevice):
                     search = [d for d in self.device_database if d.driver == "loopback"]
                     if len(search) == 0:
@@ -209,6 +301,35 @@ class Namespace(object):
         else:
             return False
 
+    def _create_virtual_devices(self, devices):
+        """creates several VirtualDevices at once
+
+        All the interfaces are attached to the libvirt domain with one
+        VirtDomainCtl.attach_interfaces call and then the Agent is waited
+        for to report all of them.
+
+        Args:
+            devices -- dictionary mapping names to VirtualDevice objects
+        """
+        if self.name is not None:
+            raise HostError("Can't create VirtualDevice in a netns")
+
+        interfaces = []
+        for name, dev in devices.items():
+            dev._id = name
+            dev._machine = self._machine
+            dev.netns = self
+            self._machine.add_tmp_device(dev)
+            interfaces.append(dev._prepare())
+
+        self._machine.get_domain_ctl().attach_interfaces(interfaces)
+        # udev sometimes renames the newly created devices
+        sleep(1)
+        self._machine.wait_for_tmp_devices(DEFAULT_TIMEOUT)
+
+        for name, dev in devices.items():
+            self._objects[name] = dev
+
     def __setattr__(self, name, value):
         """allows for dynamic creation of devices
 
@@ -18,9 +18,14 @@ class NetNamespace(Namespace):
 
     Created by the tester, should be assigned to a Host object which will
     perform the namespace creation. After that the tester uses it the same
-    way."""
-    def __init__(self, name):
+    way.
+
+    With lightweight=True the Agent serves the namespace from a thread of
+    its root process instead of forking a complete Agent process for it,
+    which is much cheaper when creating a large number of namespaces."""
+    def __init__(self, name, lightweight=False):
         super(NetNamespace, self).__init__(None)
 
         self._name = name
+        self._lightweight = lightweight
         #self.jobs = None #TODO
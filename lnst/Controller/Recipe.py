@@ -180,6 +180,7 @@ class RecipeRun(object):
         self._datetime = datetime.datetime.now()
         self._environ = os.environ.copy()
         self._exception = None
+        self._rpc_stats = None
 
     def add_result(self, result):
         if not isinstance(result, BaseResult):
@@ -253,6 +254,19 @@ class RecipeRun(object):
     def exception(self, exception):
         self._exception = exception
 
+    @property
+    def rpc_stats(self):
+        """Statistics of the remote method calls made during the run
+
+        :any:`RpcStats` instance, None until the run finishes
+        """
+        # runs exported by older versions don't have the attribute
+        return getattr(self, "_rpc_stats", None)
+
+    @rpc_stats.setter
+    def rpc_stats(self, rpc_stats):
+        self._rpc_stats = rpc_stats
+
 def export_recipe_run(run: RecipeRun, export_dir: str = None, name: str = None) -> str:
     """
     Export a recipe run to a file. :py:class:`RecipeRun` is pickled and compressed.
@@ -14,16 +14,16 @@ class RecipeControl(object):
         return self._controller._hosts
 
     def wait(self, sec):
-        finish_time = time.time() + sec
+        finish_time = time.monotonic() + sec
         logging.info("Suspending recipe execution for {} seconds, "
                      "messages from agent will still be processed.".
                      format(sec))
 
         def condition():
-            return time.time() > finish_time
+            return time.monotonic() >= finish_time
 
         msg_dispatcher = self._controller._msg_dispatcher
-        msg_dispatcher.wait_for_condition(condition)
+        msg_dispatcher.wait_for_condition(condition, sec)
 
     def wait_for_condition(self, condition, timeout=0):
         #TODO add descriptions to conditions?
@@ -0,0 +1,175 @@
+"""
+Statistics of the remote method calls made by the Controller
+
+The MessageDispatcher records the latency and the amount of transmitted data
+of every remote method call. The statistics are kept per machine, network
+namespace and method, the latencies in a histogram with fixed, roughly
+logarithmic buckets, so that recording a call is cheap and the memory used
+doesn't depend on the number of calls.
+"""
+
+import bisect
+import copy
+import threading
+
+# upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS = [0.0001, 0.00025, 0.0005,
+                   0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0,
+                   10.0, 30.0, 60.0, float("inf")]
+
+
+class RpcMethodStats(object):
+    """Statistics of a single remote method of a machine/namespace
+
+    :ivar count: number of calls
+    :ivar errors: number of calls that raised an exception
+    :ivar total_time: sum of the call latencies in seconds
+    :ivar send_time: part of total_time spent converting, pickling,
+        encrypting and sending the requests
+    :ivar histogram: list of call counts, one per LATENCY_BUCKETS item
+    :ivar bytes_sent: bytes of the requests sent to the agent
+    :ivar bytes_received: bytes received from the agent while the calls were
+        waiting for their results, these include the log records and other
+        messages the agent sent at the same time
+    """
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.send_time = 0.0
+        self.min_time = None
+        self.max_time = None
+        self.histogram = [0] * len(LATENCY_BUCKETS)
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def record(self, duration, send_time, bytes_sent, bytes_received,
+               error=False):
+        self.count += 1
+        self.errors += int(error)
+        self.total_time += duration
+        self.send_time += send_time
+        if self.min_time is None or duration < self.min_time:
+            self.min_time = duration
+        if self.max_time is None or duration > self.max_time:
+            self.max_time = duration
+        self.histogram[bisect.bisect_left(LATENCY_BUCKETS, duration)] += 1
+        self.bytes_sent += bytes_sent
+        self.bytes_received += bytes_received
+
+    @property
+    def average_time(self):
+        return self.total_time / self.count if self.count else 0.0
+
+    def percentile(self, percent):
+        """Estimates the latency percentile, returns the upper bound of the
+        histogram bucket containing it (limited by the maximum latency)"""
+        if not self.count:
+            return 0.0
+        threshold = self.count * percent / 100.0
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.histogram):
+            cumulative += count
+            if cumulative >= threshold:
+                return min(bound, self.max_time)
+        return self.max_time
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total_time": self.total_time,
+            "send_time": self.send_time,
+            "average_time": self.average_time,
+            "min_time": self.min_time,
+            "max_time": self.max_time,
+            "p50_time": self.percentile(50),
+            "p99_time": self.percentile(99),
+            "histogram": {
+                str(bound): count
+                for bound, count in zip(LATENCY_BUCKETS, self.histogram)
+                if count
+            },
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+        }
+
+
+class RpcStats(object):
+    """Thread safe collection of :any:`RpcMethodStats`
+
+    The instances can be pickled, e.g. as part of an exported RecipeRun.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._methods = {}
+
+    def __getstate__(self):
+        with self._lock:
+            state = self.__dict__.copy()
+            state["_methods"] = copy.deepcopy(self._methods)
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def record(self, machine_id, netns, method, duration, send_time=0.0,
+               bytes_sent=0, bytes_received=0, error=False):
+        key = (machine_id, netns, method)
+        with self._lock:
+            try:
+                stats = self._methods[key]
+            except KeyError:
+                stats = self._methods[key] = RpcMethodStats()
+            stats.record(duration, send_time, bytes_sent, bytes_received,
+                         error)
+
+    def reset(self):
+        with self._lock:
+            self._methods = {}
+
+    def snapshot(self):
+        """Returns a copy of the current statistics"""
+        return copy.deepcopy(self)
+
+    def items(self):
+        """Returns list of ((machine_id, netns, method), RpcMethodStats)
+        sorted by the total time spent in the calls"""
+        with self._lock:
+            items = list(self._methods.items())
+        return sorted(items, key=lambda item: item[1].total_time,
+                      reverse=True)
+
+    def __len__(self):
+        return len(self._methods)
+
+    def to_list(self):
+        return [dict(machine=machine_id, netns=netns, method=method,
+                     **stats.to_dict())
+                for (machine_id, netns, method), stats in self.items()]
+
+    def format(self, limit=None):
+        """Returns the statistics as a table, most expensive methods first"""
+        lines = ["{:<16} {:<12} {:<28} {:>7} {:>9} {:>9} {:>9} {:>9} "
+                 "{:>11} {:>11}".format(
+                     "machine", "netns", "method", "calls", "total[s]",
+                     "avg[ms]", "p99[ms]", "send[ms]", "sent[B]",
+                     "recv[B]")]
+        items = self.items()
+        if limit is not None:
+            items = items[:limit]
+        for (machine_id, netns, method), stats in items:
+            lines.append("{:<16} {:<12} {:<28} {:>7} {:>9.3f} {:>9.3f} "
+                         "{:>9.3f} {:>9.3f} {:>11} {:>11}".format(
+                             str(machine_id), netns or "-", method,
+                             stats.count, stats.total_time,
+                             stats.average_time * 1000,
+                             stats.percentile(99) * 1000,
+                             stats.send_time / stats.count * 1000,
+                             stats.bytes_sent, stats.bytes_received))
+        return "\n".join(lines)
@@ -121,6 +121,12 @@ class HumanReadableRunSummaryFormatter(RunSummaryFormatter):
             if res.data_level <= self._level:
                 output_lines.extend(self._format_data(res.data))
 
+        if run.rpc_stats and self._level >= ResultLevel.NORMAL:
+            output_lines.append("Remote method calls:")
+            output_lines.extend(indent(run.rpc_stats.format(
+                limit=None if self._level >= ResultLevel.DEBUG else 10), 4
+            ).split("\n"))
+
         output_lines.append("Overall result of this Run: {}".
                             format(self._format_result(run.overall_result)))
 
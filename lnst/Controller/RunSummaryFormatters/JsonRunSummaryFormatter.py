@@ -17,9 +17,16 @@ from .RunSummaryFormatter import RunSummaryFormatter
 
 
 class JsonRunSummaryFormatter(RunSummaryFormatter):
-    def __init__(self, pretty: bool = False):
+    """Formats the results of a run as a JSON list
+
+    With rpc_stats=True the output is an object instead, the list of the
+    results is its "results" item and the remote method call statistics of
+    the run are its "rpc_stats" item.
+    """
+    def __init__(self, pretty: bool = False, rpc_stats: bool = False):
         super().__init__()
         self.pretty = pretty
+        self.rpc_stats = rpc_stats
 
     def format_run(self, run: RecipeRun) -> str:
         recipe_results = [
@@ -36,8 +43,15 @@ class JsonRunSummaryFormatter(RunSummaryFormatter):
             }
             recipe_results.append(exception_result)
 
+        output = recipe_results
+        if self.rpc_stats:
+            output = {
+                "results": recipe_results,
+                "rpc_stats": run.rpc_stats.to_list() if run.rpc_stats else [],
+            }
+
         return json.dumps(
-            recipe_results,
+            output,
             indent=4 if self.pretty else None,
         )
 
@@ -46,11 +60,18 @@ class JsonRunSummaryFormatter(RunSummaryFormatter):
             "result": str(result.result),
         }
         if isinstance(result, JobResult):
-            if isinstance(result.job.what, str):
+            if result.job.type == "shell":
                 job_info = {
                     "type": "shell",
                     "command": result.job.what,
                 }
+            elif result.job.type == "shell_batch":
+                job_info = {
+                    "type": "shell_batch",
+                    "commands": result.job.what.commands,
+                    "fail_fast": result.job.what.fail_fast,
+                    "parallel": result.job.what.parallel,
+                }
             else:
                 job_info = {
                     "type": "module",
@@ -12,28 +12,21 @@ rpazdera@redhat.com (Radek Pazdera)
 """
 
 import logging
+from xml.etree import ElementTree
 from lnst.Controller.Common import ControllerError
-from lnst.Common.DependencyError import DependencyError
-
-#this is a global object because opening the connection to libvirt in every
-#object instance that uses it sometimes fails - the libvirt server probably
-#can't handle that many connections at a time
-_libvirt_conn = None
-
-def init_libvirt_con():
-    try:
-        import libvirt
-    except ModuleNotFoundError as e:
-        raise DependencyError(e)
-
-    global _libvirt_conn
-    if _libvirt_conn is None:
-        _libvirt_conn = libvirt.open(None)
+from lnst.Common.LibvirtConnection import get_libvirt_connection
+from lnst.Common.LibvirtConnection import LibvirtConnectionError
+from lnst.Common.LibvirtConnection import DEFAULT_EVENT_TIMEOUT
 
 class VirtDomainCtlError(ControllerError):
     pass
 
 class VirtDomainCtl(object):
+    """Controls a libvirt domain using the shared libvirt connection
+
+    Operations that libvirt finishes asynchronously (domain start, reboot,
+    device hotplug and unplug) wait for the matching libvirt event.
+    """
     _net_device_template = """
     <interface type='network'>
         <mac address='{0}'/>
@@ -51,52 +44,156 @@ class VirtDomainCtl(object):
         self._name = domain_name
         self._created_interfaces = {}
 
-        init_libvirt_con()
+        self._libvirt = get_libvirt_connection()
 
         try:
-            self._domain = _libvirt_conn.lookupByName(domain_name)
+            self._domain = self._libvirt.conn.lookupByName(domain_name)
         except:
             raise VirtDomainCtlError("Domain '%s' doesn't exist!" % domain_name)
 
-    def start(self):
-        self._domain.create()
+    def _wait_for_events(self, mark, expected, timeout, failures=None):
+        try:
+            self._libvirt.wait_for_events(mark, expected, timeout, failures)
+        except LibvirtConnectionError as e:
+            raise VirtDomainCtlError(str(e))
+
+    def start(self, timeout=DEFAULT_EVENT_TIMEOUT):
+        mark = self._libvirt.event_mark()
+        self._call(self._domain.create)
+        self._wait_for_events(mark, [("lifecycle", self._name, "started")],
+                              timeout)
 
-    def stop(self):
-        self._domain.destroy()
+    def stop(self, timeout=DEFAULT_EVENT_TIMEOUT):
+        mark = self._libvirt.event_mark()
+        self._call(self._domain.destroy)
+        self._wait_for_events(mark, [("lifecycle", self._name, "stopped")],
+                              timeout)
 
-    def restart(self):
-        self._domain.reboot()
+    def restart(self, timeout=DEFAULT_EVENT_TIMEOUT):
+        mark = self._libvirt.event_mark()
+        self._call(self._domain.reboot)
+        self._wait_for_events(mark, [("reboot", self._name, None)], timeout)
 
-    def attach_interface(self, hw_addr, net_name, driver="virtio"):
+    def _call(self, method, *args):
         try:
-            device_xml = self._net_device_template.format(hw_addr,
-                                                          net_name,
-                                                          driver)
-            self._domain.attachDevice(device_xml)
+            return method(*args)
+        except self._libvirt.libvirt.libvirtError as e:
+            raise VirtDomainCtlError(str(e))
+
+    def _interface_aliases(self, hw_addrs):
+        """maps the hwaddrs to device aliases in the live domain XML"""
+        hw_addrs = [str(hw_addr).lower() for hw_addr in hw_addrs]
+        root = ElementTree.fromstring(self._call(self._domain.XMLDesc, 0))
+        aliases = {}
+        for iface in root.findall("./devices/interface"):
+            mac = iface.find("mac")
+            alias = iface.find("alias")
+            if mac is None or alias is None:
+                continue
+            hw_addr = mac.get("address", "").lower()
+            if hw_addr in hw_addrs:
+                aliases[hw_addr] = alias.get("name")
+        return aliases
+
+    def _update_persistent_interfaces(self, add=None, remove=None):
+        """adds and removes interfaces with a single domain definition"""
+        add = add or []
+        remove = remove or []
+        flags = self._libvirt.libvirt.VIR_DOMAIN_XML_INACTIVE
+        root = ElementTree.fromstring(self._call(self._domain.XMLDesc, flags))
+        devices = root.find("devices")
+
+        remove = [str(hw_addr).lower() for hw_addr in remove]
+        for iface in devices.findall("interface"):
+            mac = iface.find("mac")
+            if mac is not None and mac.get("address", "").lower() in remove:
+                devices.remove(iface)
+
+        for device_xml in add:
+            devices.append(ElementTree.fromstring(device_xml))
+
+        self._domain = self._call(self._libvirt.conn.defineXML,
+                                  ElementTree.tostring(root, encoding="unicode"))
+
+    def attach_interface(self, hw_addr, net_name, driver="virtio"):
+        return self.attach_interfaces([(hw_addr, net_name, driver)])
+
+    def attach_interfaces(self, interfaces, timeout=DEFAULT_EVENT_TIMEOUT):
+        """Attaches several network interfaces to the domain
+
+        Args:
+            interfaces -- list of (hw_addr, net_name, driver) tuples
+
+        A domain that isn't running is updated with a single new domain
+        definition. A running domain gets all the hotplug requests first,
+        then all the device added events are awaited together.
+        """
+        device_xmls = {}
+        for hw_addr, net_name, driver in interfaces:
+            device_xmls[str(hw_addr)] = self._net_device_template.format(
+                hw_addr, net_name, driver)
+
+        if not self._call(self._domain.isActive):
+            self._update_persistent_interfaces(add=device_xmls.values())
+        else:
+            mark = self._libvirt.event_mark()
+            for hw_addr, device_xml in device_xmls.items():
+                self._call(self._domain.attachDevice, device_xml)
+
+            aliases = self._interface_aliases(device_xmls.keys())
+            self._wait_for_events(
+                mark,
+                [("device-added", self._name, alias)
+                 for alias in aliases.values()],
+                timeout)
+
+        self._created_interfaces.update(device_xmls)
+        for hw_addr, net_name, driver in interfaces:
             logging.debug("libvirt device with hwaddr '%s' "
                           "driver '%s' attached" % (hw_addr, driver))
-            self._created_interfaces[str(hw_addr)] = device_xml
-            return True
-        except libvirtError as e:
-            raise VirtDomainCtlError(str(e))
+        return True
 
     def detach_interface(self, hw_addr):
-        if str(hw_addr) in self._created_interfaces:
-            device_xml = self._created_interfaces[str(hw_addr)]
-        else:
-            device_xml = self._net_device_bare_template.format(hw_addr)
+        return self.detach_interfaces([hw_addr])
 
-        try:
-            self._domain.detachDevice(device_xml)
+    def detach_interfaces(self, hw_addrs, timeout=DEFAULT_EVENT_TIMEOUT):
+        """Detaches several network interfaces from the domain
+
+        The unplug requests of a running domain are all sent first, the
+        detach is finished when the guest releases the devices which is
+        reported by the device removed events.
+        """
+        hw_addrs = [str(hw_addr) for hw_addr in hw_addrs]
+
+        if not self._call(self._domain.isActive):
+            self._update_persistent_interfaces(remove=hw_addrs)
+        else:
+            aliases = self._interface_aliases(hw_addrs)
+            mark = self._libvirt.event_mark()
+            for hw_addr in hw_addrs:
+                if hw_addr in self._created_interfaces:
+                    device_xml = self._created_interfaces[hw_addr]
+                else:
+                    device_xml = self._net_device_bare_template.format(hw_addr)
+                self._call(self._domain.detachDevice, device_xml)
+
+            self._wait_for_events(
+                mark,
+                [("device-removed", self._name, alias)
+                 for alias in aliases.values()],
+                timeout,
+                failures=[("device-removal-failed", self._name, alias)
+                          for alias in aliases.values()])
+
+        for hw_addr in hw_addrs:
+            self._created_interfaces.pop(hw_addr, None)
             logging.debug("libvirt device with hwaddr '%s' detached" % hw_addr)
-            return True
-        except libvirtError as e:
-            raise VirtDomainCtlError(str(e))
+        return True
 
     @classmethod
     def domain_exist(cls, domain_name):
         try:
-            _libvirt_conn.lookupByName(domain_name)
+            get_libvirt_connection().conn.lookupByName(domain_name)
             return True
         except:
             return False
@@ -12,25 +12,63 @@ olichtne@redhat.com (Ondrej Lichtner)
 """
 
 import re
-import ethtool
-import pyroute2
+import errno
 import logging
 import pprint
 import time
 from abc import ABCMeta
-from pyroute2.netlink.rtnl import ifinfmsg
+from contextlib import contextmanager
 from lnst.Common.Logs import log_exc_traceback
-from lnst.Common.ExecCmd import exec_cmd, ExecCmdFail
+from lnst.Common.ExecCmd import exec_cmd
 from lnst.Common.DeviceError import DeviceError, DeviceDeleted, DeviceDisabled
 from lnst.Common.DeviceError import DeviceConfigError, DeviceConfigValueError
 from lnst.Common.DeviceError import DeviceFeatureNotSupported
 from lnst.Common.IpAddress import ipaddress, AF_INET
 from lnst.Common.HWAddress import hwaddress
-from lnst.Common.Utils import wait_for_condition
-
-from pyroute2.netlink.rtnl import RTM_NEWLINK
-from pyroute2.netlink.rtnl import RTM_NEWADDR
-from pyroute2.netlink.rtnl import RTM_DELADDR
+from lnst.Common.DeviceRef import DeviceRef
+from lnst.Common.Utils import wait_for_condition, not_imported
+
+# the netlink and ethtool libraries are only used by the Agent, the Controller
+# imports the Device classes just to describe the remote devices and loading
+# pyroute2 is expensive, the Device constructor imports them
+ethtool = not_imported
+pyroute2 = not_imported
+ifinfmsg = not_imported
+NetlinkError = not_imported
+RTM_NEWLINK = not_imported
+RTM_NEWADDR = not_imported
+RTM_DELADDR = not_imported
+COALESCE_SETTINGS = not_imported
+expand_feature_names = not_imported
+normalize_settings = not_imported
+netlink_imported = False
+def netlink_imports():
+    global netlink_imported
+    if netlink_imported:
+        return
+
+    global ethtool
+    global pyroute2
+    global ifinfmsg
+    global NetlinkError
+    global RTM_NEWLINK
+    global RTM_NEWADDR
+    global RTM_DELADDR
+    global COALESCE_SETTINGS
+    global expand_feature_names
+    global normalize_settings
+
+    import ethtool
+    import pyroute2
+    from pyroute2.netlink.rtnl import ifinfmsg
+    from pyroute2.netlink.exceptions import NetlinkError
+    from pyroute2.netlink.rtnl import RTM_NEWLINK
+    from pyroute2.netlink.rtnl import RTM_NEWADDR
+    from pyroute2.netlink.rtnl import RTM_DELADDR
+    from lnst.Common.EthtoolNetlink import COALESCE_SETTINGS
+    from lnst.Common.EthtoolNetlink import expand_feature_names
+    from lnst.Common.EthtoolNetlink import normalize_settings
+    netlink_imported = True
 
 TOGGLE_STATE_TIMEOUT = 15 + 3  # as a reserve
 
@@ -54,7 +92,13 @@ class Device(object, metaclass=DeviceMeta):
     as a tester facing API.
     """
 
+    # read only methods that the RemoteDevice evaluates on the Controller,
+    # the attributes they read come from the device snapshot there
+    _controller_methods = ("ips_filter",)
+
     def __init__(self, if_manager):
+        netlink_imports()
+
         self.ifindex = None
         self._nl_msg = None
         self._devlink = None
@@ -67,6 +111,10 @@ class Device(object, metaclass=DeviceMeta):
         self._nl_link_update = {}
         self._bulk_enabled = False
 
+        self._modify_depth = 0
+        self._modify_prev_bulk = False
+        self._modify_ops = []
+
         self._cleanup_data = None
 
     def _set_nl_attr(self, msg, value, name):
@@ -136,6 +184,167 @@ class Device(object, metaclass=DeviceMeta):
                         .format(obj_name, op_name, self.name, str(e)))
         return ret_val
 
+    @contextmanager
+    def modify(self):
+        """gathers link, linkinfo and address changes into a single commit
+
+        Any attribute set and any call of up(), down(), ip_add() and ip_del()
+        inside the with block is only recorded. When the block exits the
+        changes are applied in the order they were made, all over a single
+        netlink socket, and the device is rescanned once. If any of the
+        messages fails the already applied changes are reverted and
+        DeviceConfigError is raised.
+
+        The link and linkinfo attributes set between two calls of up(),
+        down(), ip_add() or ip_del() are sent as one RTM_SETLINK message, the
+        kernel applies the attributes of a message in its own order. Every
+        up() and down() is sent as a separate message so that e.g. changes
+        requiring the device to be down can be made after down() and before
+        up() of the same block.
+
+        Settings not configured through rtnetlink (e.g. the ethtool based
+        ones) are applied immediately. Attributes read inside the block
+        return the values from before the block. Blocks can be nested, the
+        changes are committed by the outermost one.
+
+        Example:
+            with bond.modify():
+                bond.mode = "active-backup"
+                bond.miimon = 100
+                bond.mtu = 9000
+                bond.ip_add("192.168.1.1/24")
+                bond.up()
+        """
+        if self._modify_depth == 0 and self._bulk_enabled:
+            # the device isn't created yet, the changes are already gathered
+            # for the creation message
+            yield self
+            return
+
+        if self._modify_depth == 0:
+            self._modify_prev_bulk = self._bulk_enabled
+            self._bulk_enabled = True
+        self._modify_depth += 1
+        try:
+            yield self
+        except:
+            if self._modify_depth == 1:
+                self._nl_link_update = {}
+                self._modify_ops = []
+            raise
+        finally:
+            self._modify_depth -= 1
+            if self._modify_depth == 0:
+                self._bulk_enabled = self._modify_prev_bulk
+
+        if self._modify_depth == 0:
+            self._commit_modifications()
+
+    def apply_modifications(self, operations):
+        """applies a list of changes within a single modify() block
+
+        Used by the Controller to send all changes recorded by a modify()
+        block of a RemoteDevice at once.
+
+        Args:
+            operations -- list of ("setattr", name, value) and
+                          ("call", name, args, kwargs) tuples applied in order
+        """
+        with self.modify():
+            for operation in operations:
+                if operation[0] == "setattr":
+                    _, name, value = operation
+                    setattr(self, name, value)
+                elif operation[0] == "call":
+                    _, name, args, kwargs = operation
+                    getattr(self, name)(*args, **kwargs)
+                else:
+                    raise DeviceConfigError("Unknown modification {}"
+                                            .format(operation[0]))
+
+    def _flush_link_update(self):
+        if self._nl_link_update:
+            self._modify_ops.append(("link", self._nl_link_update))
+            self._nl_link_update = {}
+
+    def _record_modification(self, op_name, data):
+        # the link attributes set so far are applied before this change
+        self._flush_link_update()
+        self._modify_ops.append((op_name, data))
+
+    def _snapshot_link_attrs(self, update, path=()):
+        snapshot = {}
+        for key, value in update.items():
+            if isinstance(value, dict):
+                nested = self._snapshot_link_attrs(value["attrs"], path + (key,))
+                snapshot[key] = {"attrs": nested}
+            elif key == "IFLA_INFO_KIND":
+                snapshot[key] = value
+            elif key == "state":
+                snapshot[key] = "up" if "up" in self.state else "down"
+            else:
+                old_value = self._nl_msg.get_nested(*(path + (key,)))
+                if old_value is None and key == "IFLA_MASTER":
+                    old_value = 0
+                if old_value is not None:
+                    snapshot[key] = old_value
+        return snapshot
+
+    def _commit_modifications(self):
+        self._flush_link_update()
+        ops, self._modify_ops = self._modify_ops, []
+        if not ops:
+            return
+
+        logging.debug("Committing modifications of link {}".format(self.name))
+        logging.debug("{}".format(pprint.pformat(ops)))
+
+        applied = []
+        with pyroute2.IPRoute() as ipr:
+            try:
+                for op_name, data in ops:
+                    if op_name == "link":
+                        # the device isn't rescanned until the end, so the
+                        # snapshot holds the values from before the block
+                        applied.append(
+                            ("link", self._snapshot_link_attrs(data))
+                        )
+                        ipr.link("set", index=self.ifindex,
+                                 **self._process_nested_nl_attrs(data))
+                    else:
+                        ipr.addr(op_name, **data)
+                        applied.append((op_name, data))
+            except Exception as e:
+                log_exc_traceback()
+                self._rollback_modifications(ipr, applied)
+                self._if_manager.rescan_devices()
+                raise DeviceConfigError("Modification of link {} failed: {}"
+                                        .format(self.name, str(e)))
+        self._if_manager.rescan_devices()
+
+        for op_name, data in ops:
+            if op_name != "add":
+                continue
+            addr = "{}/{}".format(data["local"], data["mask"])
+            if ipaddress(addr) not in self.ips:
+                self._wait_for_ip(addr)
+
+    def _rollback_modifications(self, ipr, applied):
+        for op_name, data in reversed(applied):
+            try:
+                if op_name == "link":
+                    ipr.link("set", index=self.ifindex,
+                             **self._process_nested_nl_attrs(data))
+                elif op_name == "add":
+                    ipr.addr("del", index=data["index"],
+                             address=data["local"], mask=data["mask"])
+                else:
+                    ipr.addr("add", **data)
+            except Exception:
+                logging.warning("Failed to revert {} change of link {}"
+                                .format(op_name, self.name))
+                log_exc_traceback()
+
     def _enable(self):
         """Enables the Device object"""
         self._enabled = True
@@ -242,6 +451,20 @@ class Device(object, metaclass=DeviceMeta):
             if addr in self._ip_addrs:
                 self._ip_addrs.remove(addr)
 
+    def _get_snapshot(self):
+        """Returns the attributes that the Controller caches until a netlink
+        event updates the device, see RemoteDevice"""
+        master_ifindex = self._nl_msg.get_attr("IFLA_MASTER")
+        return {"name": self.name,
+                "hwaddr": self.hwaddr,
+                "link_header_type": self.link_header_type,
+                "state": self.state,
+                "ips": list(self.ips),
+                "mtu": self.mtu,
+                "master": DeviceRef(master_ifindex)
+                          if master_ifindex is not None else None,
+                "driver": self.driver}
+
     def _get_if_data(self):
         if_data = {"ifindex": self.ifindex,
                    "hwaddr": self.hwaddr,
@@ -307,13 +530,6 @@ class Device(object, metaclass=DeviceMeta):
                 "mtu": self.mtu,
                 "name": self.name,
                 "hwaddr": self.hwaddr}
-        try:
-            ad_rx_coal, ad_tx_coal = self._read_adaptive_coalescing()
-        except DeviceError:
-            ad_rx_coal, ad_tx_coal = None, None
-        self._cleanup_data["adaptive_rx_coalescing"] = ad_rx_coal
-        self._cleanup_data["adaptive_tx_coalescing"] = ad_tx_coal
-
         try:
             rx_pause, tx_pause = self._read_pause_frames()
         except DeviceError:
@@ -439,79 +655,147 @@ class Device(object, metaclass=DeviceMeta):
     @property
     def adaptive_rx_coalescing(self):
         try:
-            res = self._read_adaptive_coalescing()
+            return self._read_adaptive_coalescing()[0]
         except DeviceFeatureNotSupported:
             return False
-        return res[0] == 'on'
 
     @adaptive_rx_coalescing.setter
     def adaptive_rx_coalescing(self, value):
-        rx_val = 'off'
-        if value:
-            rx_val = 'on'
-        tx_val = self._read_adaptive_coalescing()[1]
-        self._write_adaptive_coalescing(rx_val, tx_val)
+        self._write_coalescing_settings({"adaptive-rx": value})
 
     @property
     def adaptive_tx_coalescing(self):
         try:
-            res = self._read_adaptive_coalescing()
+            return self._read_adaptive_coalescing()[1]
         except DeviceFeatureNotSupported:
             return False
-        return res[1] == 'on'
-
 
     @adaptive_tx_coalescing.setter
     def adaptive_tx_coalescing(self, value):
-        tx_val = 'off'
-        if value:
-            tx_val = 'on'
-        rx_val = self._read_adaptive_coalescing()[0]
-        self._write_adaptive_coalescing(rx_val, tx_val)
+        self._write_coalescing_settings({"adaptive-tx": value})
 
     @property
     def coalescing_rx_usecs(self):
-        try:
-            return self._read_coalescing_settings()["rx-usecs"]
-        except KeyError:
-            return None
+        return self._read_coalescing_settings().get("rx-usecs")
 
     @coalescing_rx_usecs.setter
     def coalescing_rx_usecs(self, value):
-        self._write_coalescing_setting("rx-usecs", value)
+        self._write_coalescing_settings({"rx-usecs": value})
 
     @property
     def coalescing_tx_usecs(self):
-        try:
-            return self._read_coalescing_settings()["tx-usecs"]
-        except KeyError:
-            return None
+        return self._read_coalescing_settings().get("tx-usecs")
 
     @coalescing_tx_usecs.setter
     def coalescing_tx_usecs(self, value):
-        self._write_coalescing_setting("tx-usecs", value)
+        self._write_coalescing_settings({"tx-usecs": value})
 
     @property
     def coalescing_rx_frames(self):
-        try:
-            return self._read_coalescing_settings()["rx-frames"]
-        except KeyError:
-            return None
+        return self._read_coalescing_settings().get("rx-frames")
 
     @coalescing_rx_frames.setter
     def coalescing_rx_frames(self, value):
-        self._write_coalescing_setting("rx-frames", value)
+        self._write_coalescing_settings({"rx-frames": value})
 
     @property
     def coalescing_tx_frames(self):
-        try:
-            return self._read_coalescing_settings()["tx-frames"]
-        except KeyError:
-            return None
+        return self._read_coalescing_settings().get("tx-frames")
 
     @coalescing_tx_frames.setter
     def coalescing_tx_frames(self, value):
-        self._write_coalescing_setting("tx-frames", value)
+        self._write_coalescing_settings({"tx-frames": value})
+
+    @property
+    def offload_features(self):
+        """offload features attribute
+
+        Returns dictionary mapping the kernel feature names (as listed by
+        'ethtool -k') of the device to bool.
+        """
+        return self._ethtool_request("get_features")[0]
+
+    def set_offload_features(self, settings):
+        """change several offload features at once
+
+        All the features are changed with a single request.
+
+        Args:
+            settings -- dictionary of feature name to value, accepts the
+                names and 'on'/'off' values of 'ethtool -K' as well as the
+                kernel feature names and bools
+
+        Returns dictionary of the resulting state of the changed features.
+        Raises DeviceConfigError when the kernel rejects the request, none
+        of the features are changed then. Otherwise it is raised when none
+        of the features of a setting ended up in the requested state, the
+        other settings are applied in that case.
+        """
+        _, changeable = self._ethtool_request("get_features")
+        known = [name for name, value in changeable.items() if value]
+        try:
+            groups = {
+                setting: expand_feature_names({setting: value}, known)
+                for setting, value in settings.items()
+            }
+        except ValueError as e:
+            raise DeviceConfigValueError(str(e))
+
+        features = {}
+        for group in groups.values():
+            features.update(group)
+        self._ethtool_request("set_features", features)
+
+        # the kernel resolves conflicts between features (e.g. the
+        # tx-checksum-* group), so only complain about settings where none
+        # of the features ended up in the requested state
+        active = self.offload_features
+        result = {name: active.get(name) for name in features}
+        unchanged = [
+            setting for setting, group in groups.items()
+            if not any(result[name] == value for name, value in group.items())
+        ]
+        if unchanged:
+            raise DeviceConfigError("Could not change offload features {} of {}"
+                                    .format(", ".join(unchanged), self.name))
+        return result
+
+    @property
+    def ring_sizes(self):
+        """ring sizes attribute
+
+        Returns dictionary {"preset": maximums, "current": settings} with the
+        setting names used by 'ethtool -g'.
+        """
+        return self._ethtool_request("get_rings")
+
+    def set_ring_sizes(self, settings):
+        """change ring sizes with a single request
+
+        Args:
+            settings -- dictionary in the 'ethtool -G' format, e.g.
+                {"rx": 4096, "tx": 4096}
+        """
+        self._ethtool_request("set_rings", settings)
+
+    @property
+    def channels(self):
+        """channels attribute
+
+        Returns dictionary {"preset": maximums, "current": counts} of the
+        rx, tx, other and combined channels. Unsupported channel types have
+        None values.
+        """
+        return self._ethtool_request("get_channels")
+
+    def set_channels(self, settings):
+        """change channel counts with a single request
+
+        Args:
+            settings -- dictionary in the 'ethtool -L' format, e.g.
+                {"combined": 8}
+        """
+        self._ethtool_request("set_channels", settings)
 
     @property
     def state(self):
@@ -644,8 +928,18 @@ class Device(object, metaclass=DeviceMeta):
             if peer:
                 kwargs['address'] = str(ipaddress(peer))
 
+            if self._modify_depth:
+                self._record_modification("add", kwargs)
+                return
+
             self._ipr_wrapper("addr", "add", **kwargs)
+        elif self._modify_depth:
+            return
+
+        self._wait_for_ip(addr)
 
+    def _wait_for_ip(self, addr):
+        ip = ipaddress(addr)
         for i in range(5):
             logging.debug("Waiting for ip address to be added {} of 5".format(i))
             time.sleep(1)
@@ -663,8 +957,13 @@ class Device(object, metaclass=DeviceMeta):
         """
         ip = ipaddress(addr)
         if ip in self.ips:
-            self._ipr_wrapper("addr", "del", index=self.ifindex,
-                              address=str(ip), mask=ip.prefixlen)
+            kwargs = dict(index=self.ifindex, address=str(ip),
+                          mask=ip.prefixlen)
+            if self._modify_depth:
+                self._record_modification("del", kwargs)
+                return
+
+            self._ipr_wrapper("addr", "del", **kwargs)
 
     def ip_flush(self, scope=0):
         """flush all ip addresses of the device"""
@@ -687,11 +986,17 @@ class Device(object, metaclass=DeviceMeta):
 
     def up(self):
         """set device up"""
+        if self._modify_depth:
+            self._record_modification("link", {"state": "up"})
+            return
         self._nl_link_update["state"] = "up"
         self._nl_link_sync("set")
 
     def down(self):
         """set device down"""
+        if self._modify_depth:
+            self._record_modification("link", {"state": "down"})
+            return
         self._nl_link_update["state"] = "down"
         self._nl_link_sync("set")
 
@@ -728,60 +1033,65 @@ class Device(object, metaclass=DeviceMeta):
         """disable automatic negotiation of speed for this device"""
         exec_cmd("ethtool -s %s autoneg off" % self.name)
 
-    def _read_adaptive_coalescing(self):
-        res, _ = exec_cmd("ethtool -c %s" % self.name, die_on_err=False)
-
-        regex = "Adaptive RX: (on|off)  TX: (on|off)"
+    def _ethtool_request(self, op_name, *args):
+        ethtool_nl = self._if_manager.get_ethtool()
         try:
-            res = re.search(regex, res).groups()
-        except AttributeError:
-            raise DeviceFeatureNotSupported(
-                "No values for coalescence of %s." % self.name
+            return getattr(ethtool_nl, op_name)(self.ifindex, *args)
+        except ValueError as e:
+            raise DeviceConfigValueError(str(e))
+        except NetlinkError as e:
+            if e.code == errno.EOPNOTSUPP:
+                raise DeviceFeatureNotSupported(
+                    "Ethtool operation {} not supported on {}."
+                    .format(op_name, self.name)
+                )
+            log_exc_traceback()
+            raise DeviceConfigError(
+                "Ethtool operation {} on {} failed: {}"
+                .format(op_name, self.name, str(e))
             )
-        return list(res)
 
-    def _write_adaptive_coalescing(self, rx_val, tx_val):
-        if self._read_adaptive_coalescing() == [rx_val, tx_val]:
-            return
+    def _read_adaptive_coalescing(self):
+        settings = self._read_coalescing_settings()
         try:
-            exec_cmd("ethtool -C %s adaptive-rx %s adaptive-tx %s" %
-                     (self.name, rx_val, tx_val))
-        except:
+            return [settings["adaptive-rx"], settings["adaptive-tx"]]
+        except KeyError:
             raise DeviceFeatureNotSupported(
-                "Not allowed to modify coalescence settings for %s." % self.name
+                "No values for coalescence of %s." % self.name
             )
 
     def restore_coalescing(self):
-        for setting, value in self._cleanup_data["coalescing_settings"].items():
-            if value != 'n/a':
-                self._write_coalescing_setting(setting, value)
-
-        rx_val = self._cleanup_data["adaptive_rx_coalescing"]
-        tx_val = self._cleanup_data["adaptive_tx_coalescing"]
-        if (rx_val, tx_val) != (None, None):
-            self._write_adaptive_coalescing(rx_val, tx_val)
+        self._write_coalescing_settings(
+            self._cleanup_data["coalescing_settings"]
+        )
 
     def _read_coalescing_settings(self):
-        settings = {}
-        output, _ = exec_cmd("ethtool -c %s" % self.name, die_on_err=False)
-
-        regex = re.compile("^([a-z-]+): (n/a|\d+)$")
-
-        for line in output.split('\n'):
-            if not (m := regex.match(line)):
-                continue
-            setting = m.group(1)
-            value = m.group(2)
-            settings[setting] = value
+        try:
+            return self._ethtool_request("get_coalesce")
+        except DeviceError:
+            return {}
 
-        return settings
+    def _write_coalescing_settings(self, settings):
+        try:
+            settings = normalize_settings(settings, COALESCE_SETTINGS)
+        except ValueError as e:
+            raise DeviceConfigValueError(str(e))
+
+        current = self._read_coalescing_settings()
+        changes = {
+            setting: value
+            for setting, value in settings.items()
+            if current.get(setting) != value
+        }
+        if not changes:
+            return
 
-    def _write_coalescing_setting(self, setting, value):
         try:
-            exec_cmd(f"ethtool -C {self.name} {setting} {value}")
-        except:
+            self._ethtool_request("set_coalesce", changes)
+        except DeviceError:
             raise DeviceFeatureNotSupported(
-                f"Not allowed to modify coalescence settings {setting} for {self.name}."
+                "Not allowed to modify coalescence settings {} for {}."
+                .format(", ".join(changes), self.name)
             )
 
     @property
@@ -812,47 +1122,40 @@ class Device(object, metaclass=DeviceMeta):
 
     def _read_pause_frames(self):
         try:
-            res, _ = exec_cmd("ethtool -a %s" % self.name)
-        except:
+            res = self._ethtool_request("get_pause")
+        except DeviceError:
             raise DeviceFeatureNotSupported(
                 "No values for pause frames of %s." % self.name
                 )
 
         # TODO: add autonegotiate
-        pause_settings = []
-        regex = "(RX|TX):.*(on|off)"
-
-        for line in res.split('\n'):
-            m = re.search(regex, line)
-            if m:
-                setting = True if m.group(2) == 'on' else False
-                pause_settings.append(setting)
-
-        if len(pause_settings) != 2:
-            raise Exception("Could not fetch pause frame settings. %s" % res)
-
-        return pause_settings
+        try:
+            return [res["rx"], res["tx"]]
+        except KeyError:
+            raise DeviceFeatureNotSupported(
+                "No values for pause frames of %s." % self.name
+                )
 
     def _write_pause_frames(self, rx_val, tx_val):
-        ethtool_cmd = "ethtool -A {}".format(self.name)
-        ethtool_opts = ""
-
+        settings = {}
         for feature, value in [('rx', rx_val), ('tx', tx_val)]:
             if value is None:
                 continue
+            settings[feature] = bool(value)
 
-            ethtool_opts += " {} {}".format(feature, 'on' if value else 'off')
-
-        if len(ethtool_opts) == 0:
+        if len(settings) == 0:
             return
 
         try:
-            exec_cmd(ethtool_cmd + ethtool_opts)
-        except ExecCmdFail as e:
-            if e.get_retval() == 79:
-                raise DeviceConfigError(
-                    "Could not modify pause settings for %s." % self.name
-                )
+            self._ethtool_request("set_pause", settings)
+        except DeviceConfigValueError:
+            # the request wasn't sent, the state check below reports it
+            pass
+        except (DeviceConfigError, DeviceFeatureNotSupported):
+            # the kernel rejected the request
+            raise DeviceConfigError(
+                "Could not modify pause settings for %s." % self.name
+            )
 
         timeout=5
         while timeout > 0:
@@ -10,8 +10,6 @@ __author__ = """
 jtluka@redhat.com (Jan Tluka)
 """
 
-from pyroute2.netlink import NetlinkError
-from pyroute2.netlink.generic.l2tp import L2tp
 from lnst.Common.DeviceError import DeviceError, DeviceConfigError
 from lnst.Devices.Device import Device
 
@@ -72,6 +70,9 @@ class L2TPSessionDevice(Device):
         super(L2TPSessionDevice, self).__init__(ifmanager)
 
     def _create(self):
+        from pyroute2.netlink import NetlinkError
+        from pyroute2.netlink.generic.l2tp import L2tp
+
         try:
             self._l2tp_api = L2tp()
         except NetlinkError:
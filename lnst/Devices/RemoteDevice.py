@@ -12,7 +12,9 @@ olichtne@redhat.com (Ondrej Lichtner)
 """
 
 import logging
+import functools
 from copy import deepcopy
+from contextlib import contextmanager
 from lnst.Devices.Device import Device
 from lnst.Common.DeviceError import DeviceDeleted, DeviceReadOnly
 from lnst.Common.DeviceError import DeviceFeatureNotSupported
@@ -43,6 +45,11 @@ class RemoteDevice(object):
         self._cache = {}
         self._cached = False
 
+        # attributes fetched in bulk by the Machine, dropped on changes
+        self._snapshot = None
+
+        self._modifications = None
+
         self._inited = True
 
     def __deepcopy__(self, memo):
@@ -117,6 +124,33 @@ class RemoteDevice(object):
 
         return None
 
+    @contextmanager
+    def modify(self):
+        """records changes of the device and applies them all at once
+
+        Attribute assignments and method calls made inside the with block
+        are sent to the Agent in a single message when the block exits,
+        where they are applied within Device.modify() - all the link and
+        address changes are committed together and reverted if any of them
+        fails. Method calls inside the block return None, attribute reads
+        are passed to the Agent directly and return the current values.
+        """
+        if self._modifications is not None:
+            yield self
+            return
+
+        self._modifications = []
+        try:
+            yield self
+            operations = self._modifications
+        finally:
+            self._modifications = None
+
+        if operations:
+            self._machine.remote_device_method(
+                    self.ifindex, "apply_modifications", (operations,), {},
+                    self.netns)
+
     def __dir__(self):
         return dir(self._dev_cls)
 
@@ -132,10 +166,16 @@ class RemoteDevice(object):
             raise DeviceDeleted("This device was deleted on the agent and does not exist anymore.")
 
         if callable(attr):
+            if name in getattr(self._dev_cls, "_controller_methods", ()):
+                return functools.partial(attr, self)
+
             if self._cached:
                 raise DeviceReadOnly("Can't call methods when in ReadOnly cache mode.")
 
             def dev_method(*args, **kwargs):
+                if self._modifications is not None:
+                    self._modifications.append(("call", name, args, kwargs))
+                    return None
                 return self._machine.remote_device_method(
                         self.ifindex, name, args, kwargs, self.netns)
             return dev_method
@@ -157,6 +197,10 @@ class RemoteDevice(object):
         if self._cached:
             raise DeviceReadOnly("Can't set attributes when in ReadOnly cache mode.")
 
+        if self._modifications is not None:
+            self._modifications.append(("setattr", name, value))
+            return
+
         return self._machine.remote_device_setattr(self.ifindex, name, value, netns=self.netns)
 
     def __iter__(self):
@@ -12,17 +12,27 @@ olichtne@redhat.com (Ondrej Lichtner)
 import json
 from lnst.Common.ExecCmd import exec_cmd
 from lnst.Common.DeviceError import DeviceConfigError
+from lnst.Common.TeamdControl import TeamdControl, TeamdControlError
+from lnst.Common.TeamdControl import TeamdDbusControl, teamd_kill
 from lnst.Devices.MasterDevice import MasterDevice
 
 
 # TODO Rework with pyroute2 if thats possible.
 # See https://github.com/svinota/pyroute2/issues/699#issuecomment-615367686
 class TeamDevice(MasterDevice):
+    """Team device managed by a teamd daemon
+
+    The daemon is started when the device is created, all later operations
+    are requests sent over a persistent connection to the control socket of
+    teamd instead of running teamdctl. With the dbus option the requests are
+    sent over D-Bus using teamdctl.
+    """
     _name_template = "t_team"
 
     def __init__(self, ifmanager, *args, **kwargs):
         self._config = {}
         self._dbus = False
+        self._teamd = None
         super(TeamDevice, self).__init__(ifmanager, *args, **kwargs)
 
     @property
@@ -45,6 +55,27 @@ class TeamDevice(MasterDevice):
             raise DeviceConfigError("team dbus setting must be bool")
         self._dbus = v
 
+    @property
+    def teamd_config(self):
+        """the actual configuration of teamd including the port configs"""
+        return self._teamd_request("config_dump")
+
+    @property
+    def teamd_state(self):
+        """the state of teamd as reported by its StateDump method"""
+        return self._teamd_request("state_dump")
+
+    def _teamd_request(self, op_name, *args):
+        if self._teamd is None:
+            if self.dbus:
+                self._teamd = TeamdDbusControl(self.name)
+            else:
+                self._teamd = TeamdControl(self.name)
+        try:
+            return getattr(self._teamd, op_name)(*args)
+        except TeamdControlError as e:
+            raise DeviceConfigError(str(e))
+
     def _create(self):
         teamd_json = json.dumps(self.config)
         cmd = f"teamd -r -d -c '{teamd_json}' -t {self.name}"
@@ -52,21 +83,62 @@ class TeamDevice(MasterDevice):
             cmd += " -D"
         exec_cmd(cmd)
 
-        retry = 0
-        while self._nl_msg is None and retry < 5:
-            retry += 1
-            self._if_manager.rescan_devices()
+        # teamd -d returns once the daemon is initialized, the control
+        # socket is connected right away to report a broken daemon here
+        self._teamd_request("connect")
 
     def destroy(self):
+        if self._teamd is not None:
+            self._teamd.close()
+        try:
+            if teamd_kill(self.name):
+                return True
+        except TeamdControlError as e:
+            raise DeviceConfigError(str(e))
         exec_cmd("teamd -k -t %s" % self.name)
+        return True
 
-    def slave_add(self, dev, port_config={}):
+    def _port_requests(self, dev, port_config):
         if not isinstance(port_config, dict):
             raise DeviceConfigError(f"team link {dev.name} port config must be dict")
 
-        port_json = json.dumps(port_config)
-        opts = "-D" if self.dbus else ""
-        exec_cmd(f"teamdctl {opts} {self.name} port config "
-                 f"update {dev.name} '{port_json}'")
+        return [("PortConfigUpdate", dev.name, json.dumps(port_config)),
+                ("PortAdd", dev.name)]
+
+    def slave_add(self, dev, port_config={}):
+        self.slaves_add([(dev, port_config)])
+
+    def slaves_add(self, ports):
+        """add several ports with a single request to teamd
+
+        Args:
+            ports -- list of Device objects or (Device, port_config) tuples
+        """
+        requests = []
+        for port in ports:
+            if isinstance(port, (tuple, list)):
+                dev, port_config = port
+            else:
+                dev, port_config = port, {}
+            requests.extend(self._port_requests(dev, port_config))
+
+        self._teamd_request("call_many", requests)
+        self._if_manager.rescan_devices()
+
+    def slave_del(self, dev):
+        self.slaves_del([dev])
+
+    def slaves_del(self, devs):
+        """remove several ports with a single request to teamd"""
+        self._teamd_request("call_many",
+                            [("PortRemove", dev.name) for dev in devs])
+        self._if_manager.rescan_devices()
+
+    def port_config_update(self, dev, port_config):
+        """change the teamd config of a port without re-adding it"""
+        requests = self._port_requests(dev, port_config)[:1]
+        self._teamd_request("call_many", requests)
 
-        dev.master = self
+    def port_config(self, dev):
+        """the teamd config of a port"""
+        return self._teamd_request("port_config_dump", dev.name)
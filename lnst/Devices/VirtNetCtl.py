@@ -13,22 +13,7 @@ olichtne@redhat.com (Ondrej Lichtner)
 
 import logging
 from lnst.Common.LnstError import LnstError
-from lnst.Common.DependencyError import DependencyError
-
-#this is a global object because opening the connection to libvirt in every
-#object instance that uses it sometimes fails - the libvirt server probably
-#can't handle that many connections at a time
-_libvirt_conn = None
-
-def init_libvirt_con():
-    try:
-        import libvirt
-    except ModuleNotFoundError as e:
-        raise DependencyError(e)
-
-    global _libvirt_conn
-    if _libvirt_conn is None:
-        _libvirt_conn = libvirt.open(None)
+from lnst.Common.LibvirtConnection import get_libvirt_connection
 
 class VirtNetCtlError(LnstError):
     pass
@@ -43,14 +28,14 @@ class VirtNetCtl(object):
     """
 
     def __init__(self, name=None):
-        init_libvirt_con()
+        self._libvirt = get_libvirt_connection()
 
         if not name:
             name = self._generate_name()
         self._name = name
 
     def _generate_name(self):
-        devs = _libvirt_conn.listNetworks()
+        devs = self._libvirt.conn.listNetworks()
 
         index = 0
         while True:
@@ -65,25 +50,25 @@ class VirtNetCtl(object):
     def init(self):
         try:
             network_xml = self._network_template.format(self._name)
-            _libvirt_conn.networkCreateXML(network_xml)
+            self._libvirt.conn.networkCreateXML(network_xml)
             logging.debug("libvirt network '%s' created" % self._name)
             return True
-        except libvirtError as e:
+        except self._libvirt.libvirt.libvirtError as e:
             raise VirtNetCtlError(str(e))
 
     def cleanup(self):
         try:
-            network = _libvirt_conn.networkLookupByName(self._name)
+            network = self._libvirt.conn.networkLookupByName(self._name)
             network.destroy()
             logging.debug("libvirt network '%s' destroyed" % self._name)
             return True
-        except libvirtError as e:
+        except self._libvirt.libvirt.libvirtError as e:
             raise VirtNetCtlError(str(e))
 
     @classmethod
     def network_exist(cls, net_name):
         try:
-            _libvirt_conn.networkLookupByName(net_name)
+            get_libvirt_connection().conn.networkLookupByName(net_name)
             return True
         except:
             return False
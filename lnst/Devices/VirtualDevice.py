@@ -12,16 +12,11 @@ olichtne@redhat.com (Ondrej Lichtner)
 
 import logging
 from time import sleep
-from lnst.Common.Utils import check_process_running
 from lnst.Common.HWAddress import hwaddress
 from lnst.Common.DeviceError import DeviceError
 from lnst.Devices.Device import Device
 from lnst.Devices.RemoteDevice import RemoteDevice
 
-# conditional support for libvirt
-if check_process_running("libvirtd"):
-    from lnst.Devices.VirtNetCtl import VirtNetCtl
-
 class VirtualDevice(RemoteDevice):
     """Remote eth device created on the controller through libvirt
 
@@ -57,9 +52,12 @@ class VirtualDevice(RemoteDevice):
 
         return super(VirtualDevice, self)._match_update_data(data)
 
-    def _create(self):
-        domain_ctl = self._machine.get_domain_ctl()
+    def _prepare(self):
+        """assigns the hwaddr and the libvirt network of the device
 
+        Returns the (hwaddr, network name, driver) tuple describing the
+        interface for VirtDomainCtl.attach_interfaces.
+        """
         if self.orig_hwaddr:
             if self._machine.get_dev_by_hwaddr(self.orig_hwaddr):
                 msg = "Device with hwaddr %s already exists" % self.orig_hwaddr
@@ -76,17 +74,19 @@ class VirtualDevice(RemoteDevice):
         if self.network in bridges:
             net_ctl = bridges[self.network]
         else:
+            # libvirt is needed only by the virtual matches
+            from lnst.Devices.VirtNetCtl import VirtNetCtl
             bridges[self.network] = net_ctl = VirtNetCtl()
             net_ctl.init()
 
-        net_name = net_ctl.get_name()
-
         logging.info("Creating virtual device with hwaddr='%s' on machine %s",
                      self.orig_hwaddr, self._machine.get_id())
 
-        domain_ctl.attach_interface(self.orig_hwaddr,
-                                    net_name,
-                                    self.virt_driver)
+        return (self.orig_hwaddr, net_ctl.get_name(), self.virt_driver)
+
+    def _create(self):
+        domain_ctl = self._machine.get_domain_ctl()
+        domain_ctl.attach_interfaces([self._prepare()])
         # The sleep here is necessary, because udev sometimes renames the
         # newly created device
         sleep(1)
@@ -96,5 +96,18 @@ class VirtualDevice(RemoteDevice):
                      self.orig_hwaddr, self._machine.get_id())
 
         domain_ctl = self._machine.get_domain_ctl()
-        domain_ctl.detach_interface(self.orig_hwaddr)
+        domain_ctl.detach_interfaces([self.orig_hwaddr])
         self.deleted = True
+
+    @staticmethod
+    def _destroy_many(devices):
+        """detaches VirtualDevices of one machine with a single request"""
+        machine = devices[0]._machine
+        for dev in devices:
+            logging.info("Destroying virtual device with hwaddr='%s' on machine %s",
+                         dev.orig_hwaddr, machine.get_id())
+
+        domain_ctl = machine.get_domain_ctl()
+        domain_ctl.detach_interfaces([dev.orig_hwaddr for dev in devices])
+        for dev in devices:
+            dev.deleted = True
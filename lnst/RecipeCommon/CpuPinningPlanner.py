@@ -0,0 +1,229 @@
+"""
+Topology aware CPU pinning
+
+The planner reads the CPU, NUMA and SMT topology of an Agent host and the
+NUMA locality and queue counts of its test devices, then assigns CPUs to the
+device IRQs, to the processes of the performance measurement tools and to the
+CPU stat measurement so that:
+
+* IRQs and perf tool processes run on the NUMA node of the devices, the other
+  nodes are used only when the local node doesn't have enough cores
+* IRQs and perf tool processes never share a physical core, i.e. a perf tool
+  isn't placed on the SMT sibling of an IRQ CPU
+* the CPU stat monitor and other housekeeping runs on separate cores
+
+Example::
+
+    plan = CpuPinningPlanner(host, [host.eth0], perf_processes=2).plan()
+    pin_dev_interrupts(host.eth0, plan.irq_cpus[host.eth0])
+    flow.generator_cpupin = plan.perf_cpupin(0)
+"""
+
+import logging
+from collections import Counter
+from lnst.Controller.Recipe import RecipeError
+
+
+class CpuPinningPlan(object):
+    """Result of :any:`CpuPinningPlanner.plan`
+
+    :ivar host: the planned host
+    :ivar irq_cpus: dictionary of Device to the list of CPUs for its IRQs
+    :ivar perf_cpus: list of CPUs, one per perf tool process
+    :ivar housekeeping_cpus: list of CPUs for the CPU stat monitor and other
+        auxiliary processes
+    :ivar node: NUMA node the plan is local to
+    """
+    def __init__(self, host, node, irq_cpus, perf_cpus, housekeeping_cpus):
+        self.host = host
+        self.node = node
+        self.irq_cpus = irq_cpus
+        self.perf_cpus = perf_cpus
+        self.housekeeping_cpus = housekeeping_cpus
+
+    def perf_cpupin(self, process_no):
+        """CPU pinning of the perf tool process with index process_no
+
+        Returns a list with a single CPU in the format used by the
+        generator_cpupin/receiver_cpupin attributes of perf flows, processes
+        beyond the planned count wrap around.
+        """
+        if not self.perf_cpus:
+            return None
+        return [self.perf_cpus[process_no % len(self.perf_cpus)]]
+
+    def describe(self):
+        desc = ["{} cpu pinning plan local to numa node {}".format(
+            self.host.hostid, self.node)]
+        desc += ["{}.{} irqs bound to cpus {}".format(
+            dev.host.hostid, dev._id, cpus)
+            for dev, cpus in self.irq_cpus.items()]
+        desc.append("{} perf tool processes bound to cpus {}".format(
+            self.host.hostid, self.perf_cpus))
+        desc.append("{} housekeeping cpus {}".format(
+            self.host.hostid, self.housekeeping_cpus))
+        return desc
+
+
+class CpuPinningPlanner(object):
+    """Creates a :any:`CpuPinningPlan` for a host
+
+    :param host: the Agent host to plan for
+    :param devices: test devices of the host whose IRQs should be pinned
+    :param perf_processes: number of perf tool processes that will run on
+        the host
+    :param irq_cpus_per_device: maximum number of CPUs for the IRQs of a
+        device, by default one CPU per device queue
+    :param housekeeping_cores: number of physical cores reserved for the CPU
+        stat monitor and the rest of the system, the cores of CPU 0 come first
+    :param share_smt: if True, the SMT siblings of the perf tool CPUs may be
+        used by other perf tool processes when there aren't enough cores, by
+        default only one thread of each physical core is used
+    """
+    def __init__(self, host, devices, perf_processes=1,
+                 irq_cpus_per_device=None, housekeeping_cores=1,
+                 share_smt=False):
+        self._host = host
+        self._devices = list(devices)
+        self._perf_processes = perf_processes
+        self._irq_cpus_per_device = irq_cpus_per_device
+        self._housekeeping_cores = housekeeping_cores
+        self._share_smt = share_smt
+
+    def plan(self):
+        topology = self._host.get_cpu_topology()
+        locality = self._get_locality()
+
+        cores = self._group_cores(topology)
+        free = list(cores)
+
+        housekeeping = free[:self._housekeeping_cores]
+        free = free[self._housekeeping_cores:]
+        if not free:
+            # tiny machines, everything has to share the cores
+            free = list(cores)
+
+        node = self._preferred_node(topology, locality)
+
+        irq_cpus = {}
+        irq_cores = []
+        for dev in self._devices:
+            dev_node = locality[dev]["numa_node"]
+            if dev_node < 0:
+                dev_node = node
+            count = self._irq_cpu_count(locality[dev])
+
+            dev_cores = self._take_cores(free, dev_node, count, topology)
+            if len(dev_cores) < count:
+                # IRQs of a device can share CPUs, reuse the IRQ cores
+                dev_cores += irq_cores[:count - len(dev_cores)]
+            if not dev_cores:
+                dev_cores = self._take_cores(list(cores), dev_node, 1,
+                                             topology)
+            irq_cores += [core for core in dev_cores if core not in irq_cores]
+            irq_cpus[dev] = [core[0] for core in dev_cores]
+
+        # with share_smt the siblings of local cores are preferred over
+        # the cores of other nodes
+        perf_cores = self._take_cores(free, node, self._perf_processes,
+                                      topology, local_only=self._share_smt)
+        perf_cpus = [core[0] for core in perf_cores]
+        if self._share_smt:
+            for core in perf_cores:
+                missing = self._perf_processes - len(perf_cpus)
+                if missing <= 0:
+                    break
+                perf_cpus += core[1:1 + missing]
+
+            missing = self._perf_processes - len(perf_cpus)
+            if missing > 0:
+                perf_cpus += [core[0] for core in
+                              self._take_cores(free, node, missing, topology)]
+
+        if len(perf_cpus) < self._perf_processes:
+            logging.warning("{} doesn't have enough cores for {} perf tool "
+                            "processes, {} cpus will be shared".format(
+                                self._host.hostid, self._perf_processes,
+                                perf_cpus))
+
+        if any(topology[cpu]["node"] != node for cpu in perf_cpus):
+            logging.warning("{} perf tool processes don't fit numa node {}, "
+                            "using cpus {}".format(self._host.hostid, node,
+                                                   perf_cpus))
+
+        return CpuPinningPlan(
+            self._host, node, irq_cpus, perf_cpus,
+            [cpu for core in housekeeping for cpu in core])
+
+    def _get_locality(self):
+        locality = {}
+        by_netns = {}
+        for dev in self._devices:
+            by_netns.setdefault(dev.netns, []).append(dev)
+        for netns, devices in by_netns.items():
+            locality.update(netns.get_devices_locality(devices))
+        return locality
+
+    @staticmethod
+    def _group_cores(topology):
+        """Returns list of physical cores as tuples of sibling cpus, ordered
+        by the first cpu"""
+        cores = []
+        seen = set()
+        for cpu in sorted(topology.keys()):
+            if cpu in seen:
+                continue
+            core = tuple(sorted(c for c in topology[cpu]["siblings"]
+                                if c in topology))
+            if cpu not in core:
+                core = (cpu,)
+            seen.update(core)
+            cores.append(core)
+        return cores
+
+    @staticmethod
+    def _preferred_node(topology, locality):
+        nodes = Counter(info["numa_node"] for info in locality.values()
+                        if info["numa_node"] >= 0)
+        if nodes:
+            return nodes.most_common(1)[0][0]
+        return min(info["node"] for info in topology.values())
+
+    def _irq_cpu_count(self, dev_locality):
+        count = max(dev_locality["rx_queues"], dev_locality["tx_queues"], 1)
+        if self._irq_cpus_per_device is not None:
+            count = min(count, self._irq_cpus_per_device)
+        return count
+
+    @staticmethod
+    def _take_cores(free, node, count, topology, local_only=False):
+        """Removes up to count cores from free, cores of the node first"""
+        local = [core for core in free if topology[core[0]]["node"] == node]
+        remote = [core for core in free if topology[core[0]]["node"] != node]
+        if local_only:
+            remote = []
+        taken = (local + remote)[:count]
+        for core in taken:
+            free.remove(core)
+        return taken
+
+
+def plan_cpu_pinning(devices, perf_processes=1, **kwargs):
+    """Creates CPU pinning plans for all hosts of the devices
+
+    :param devices: test devices, possibly of different hosts
+    :param perf_processes: number of perf tool processes per host
+    :param kwargs: other :any:`CpuPinningPlanner` parameters
+
+    :return: dictionary of host to :any:`CpuPinningPlan`
+    """
+    if perf_processes < 1:
+        raise RecipeError("perf_processes has to be at least 1")
+
+    hosts = {}
+    for dev in devices:
+        hosts.setdefault(dev.host, []).append(dev)
+
+    return {host: CpuPinningPlanner(host, host_devices, perf_processes,
+                                    **kwargs).plan()
+            for host, host_devices in hosts.items()}
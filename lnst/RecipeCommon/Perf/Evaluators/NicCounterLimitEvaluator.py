@@ -0,0 +1,47 @@
+import fnmatch
+from typing import Any, Dict, List
+
+from lnst.Controller import BaseRecipe
+from lnst.Controller.RecipeResults import ResultType
+from lnst.RecipeCommon.BaseResultEvaluator import BaseResultEvaluator
+from lnst.RecipeCommon.Perf.Measurements.Results.NicCounterMeasurementResults import NicCounterMeasurementResults
+
+
+class NicCounterLimitEvaluator(BaseResultEvaluator):
+    """Fails when a counter grows more than allowed
+
+    :param limits: dictionary of fnmatch pattern of counter names to the
+        maximum allowed increase of the matching counters per iteration,
+        e.g. {"stats64.*dropped": 0, "cpu*.softnet.dropped": 0}
+    """
+
+    def __init__(self, limits: Dict[str, int]):
+        super().__init__()
+        self._limits = limits
+
+    def evaluate_results(
+            self,
+            recipe: BaseRecipe,
+            recipe_conf: Any,
+            results: List[NicCounterMeasurementResults]
+    ):
+        for result in results:
+            iterations = getattr(result, "individual_results", [result])
+            result_text = [
+                f"NicCounterLimit evaluation of host {result.host.hostid} {result.source} counters",
+            ]
+            rtype = ResultType.PASS
+            for pattern, limit in self._limits.items():
+                for i, iteration in enumerate(iterations):
+                    for name, counter in sorted(iteration.counters.items()):
+                        if not fnmatch.fnmatchcase(name, pattern):
+                            continue
+                        if counter.value > limit:
+                            rtype = ResultType.FAIL
+                            result_text.append(
+                                f"FAIL: iteration {i} counter '{name}' increased by {counter.value} > {limit}"
+                            )
+            if rtype == ResultType.PASS:
+                result_text.append(f"PASS: all counters within limits {self._limits}")
+
+            recipe.add_result(rtype, "\n".join(result_text))
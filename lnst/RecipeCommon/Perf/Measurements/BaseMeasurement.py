@@ -23,6 +23,23 @@ class BaseMeasurement(object):
     def collect_results(self):
         raise NotImplementedError()
 
+    def process_interim_result(self, job, record):
+        """Consumes one interim record streamed by a running job
+
+        Derived classes override this to process results incrementally,
+        while the measurement is running. Jobs are only streamed after they
+        are passed to _stream_interim_results before being started.
+        """
+        pass
+
+    def _stream_interim_results(self, job):
+        if (type(self).process_interim_result is
+                BaseMeasurement.process_interim_result):
+            return
+        job.add_interim_handler(
+            lambda record: self.process_interim_result(job, record)
+        )
+
     @classmethod
     def report_results(cls, recipe, results):
         raise NotImplementedError()
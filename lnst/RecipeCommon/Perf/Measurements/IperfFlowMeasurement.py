@@ -184,16 +184,17 @@ class IperfFlowMeasurement(BaseFlowMeasurement):
         if not job.passed:
             result.append(PerfInterval(0, 0, "bits", time.time()))
         else:
-            for i in job.result["data"]["end"]["streams"]:
-                result.append(SequentialPerfResult())
-
+            samples = job.result["samples"]
             job_start = job.result["data"]["start"]["timestamp"]["timesecs"]
-            for interval in job.result["data"]["intervals"]:
-                interval_start = interval["sum"]["start"]
-                for i, stream in enumerate(interval["streams"]):
-                    result[i].append(PerfInterval(stream["bytes"] * 8,
-                                                  stream["seconds"],
-                                                  "bits", job_start + interval_start))
+            for stream in samples["streams"]:
+                stream_result = SequentialPerfResult()
+                for interval_start, stream_bytes, seconds in zip(
+                    samples["start"], stream["bytes"], stream["seconds"]
+                ):
+                    stream_result.append(PerfInterval(stream_bytes * 8,
+                                                      seconds,
+                                                      "bits", job_start + interval_start))
+                result.append(stream_result)
         return result
 
     def _parse_job_cpu(self, job):
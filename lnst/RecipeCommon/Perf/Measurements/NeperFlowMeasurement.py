@@ -1,8 +1,8 @@
 import time
-from typing import List, Dict, Tuple
+from typing import List, Tuple
 from lnst.Common.IpAddress import ipaddress
 from lnst.Controller.Job import Job
-from lnst.Common.Utils import pairwise
+from lnst.Common.Samples import Columns, columns_len
 from lnst.Controller.Recipe import RecipeError
 from lnst.Controller.RecipeResults import ResultLevel
 from lnst.RecipeCommon.Perf.Measurements.BaseFlowMeasurement import BaseFlowMeasurement, NetworkFlowTest, Flow
@@ -155,6 +155,8 @@ class NeperFlowMeasurement(BaseFlowMeasurement):
         """
         each perfinterval is samples.csv line #2 (l2) - line #1 (l1) to get # transactions and duration
         timestamp is time of l1, but we need to convert it from CLOCK_MONOTONIC time to unix time.
+        The agent returns the time, transactions, utime and stime columns
+        of samples.csv in the columnar encoding of lnst.Common.Samples.
         samples.csv looks like this:
         ```
         tid,flow_id,time,transactions,utime,stime,maxrss,minflt,majflt,nvcsw,nivcsw,latency_min,latency_mean,latency_max,latency_stddev
@@ -186,10 +188,10 @@ class NeperFlowMeasurement(BaseFlowMeasurement):
         else:
             job_start = job.result['start_time']
             samples = job.result['samples']
-            if samples is not None:
-                neper_start_time = float(samples[0]['time'])
-                for s_start, s_end in pairwise(samples):
-                    flow, cpu = get_interval(s_start, s_end,
+            if samples is not None and columns_len(samples) > 0:
+                neper_start_time = samples['time'][0]
+                for i in range(1, columns_len(samples)):
+                    flow, cpu = get_interval(samples, i - 1, i,
                                              job_start, neper_start_time)
                     results.append(flow)
                     cpu_results.append(cpu)
@@ -204,17 +206,17 @@ class NeperFlowMeasurement(BaseFlowMeasurement):
         return p_results, p_cpu_results
 
 
-def get_interval(s_start: Dict, s_end: Dict, job_start: float,
+def get_interval(samples: Columns, start: int, end: int, job_start: float,
                  neper_start: float) -> Tuple[PerfInterval, PerfInterval]:
 
-    transactions = int(s_end['transactions']) - int(s_start['transactions'])
-    s_start_time = float(s_start['time'])
-    s_start_utime = float(s_start['utime'])
-    s_start_stime = float(s_start['stime'])
+    transactions = int(samples['transactions'][end] - samples['transactions'][start])
+    s_start_time = samples['time'][start]
+    s_start_utime = samples['utime'][start]
+    s_start_stime = samples['stime'][start]
 
-    s_end_time = float(s_end['time'])
-    s_end_utime = float(s_end['utime'])
-    s_end_stime = float(s_end['stime'])
+    s_end_time = samples['time'][end]
+    s_end_utime = samples['utime'][end]
+    s_end_stime = samples['stime'][end]
 
     # cpu_usage_percent = (utime_delta + stime_delta) / duration
     utime_delta = s_end_utime - s_start_utime
@@ -0,0 +1,181 @@
+import signal
+
+from lnst.Controller.RecipeResults import MeasurementResult, ResultLevel
+from lnst.RecipeCommon.Perf.Results import PerfInterval
+from lnst.RecipeCommon.Perf.Measurements.BaseMeasurement import BaseMeasurement
+from lnst.RecipeCommon.Perf.Measurements.MeasurementError import MeasurementError
+from lnst.RecipeCommon.Perf.Measurements.Results import (
+    NicCounterMeasurementResults,
+    AggregatedNicCounterMeasurementResults,
+)
+
+from lnst.Tests.NicCounterMonitor import NicCounterMonitor
+
+
+class NicCounterMeasurement(BaseMeasurement):
+    """Samples hardware and software counters of network devices
+
+    A :any:`NicCounterMonitor` job runs in each network namespace of the
+    devices and samples the IFLA_STATS64 and the driver (ethtool -S)
+    counters of the devices and the softnet statistics of the host. The
+    results contain the per sample counter deltas as :any:`PerfInterval`
+    series, one :any:`NicCounterMeasurementResults` per device and one per
+    host for the softnet counters.
+
+    :param devices: list of the measured devices
+    :param interval: sampling interval in milliseconds
+    :param counters: optional list of fnmatch patterns of the counter names
+        to collect, e.g. ["stats64.*drop*", "ethtool.rx_queue_*_packets"]
+    :param ethtool_stats: whether to sample the driver statistics
+    :param softnet_stats: whether to sample the softnet statistics
+    :param cpu_bind: optional dictionary of host to the list of cpus the
+        monitors of the host should be pinned to
+    """
+    def __init__(self, devices, interval=1000, counters=None,
+                 ethtool_stats=True, softnet_stats=True, cpu_bind=None,
+                 recipe_conf=None):
+        super(NicCounterMeasurement, self).__init__(recipe_conf)
+        self._devices = list(devices)
+        self._interval = interval
+        self._counters = counters
+        self._ethtool_stats = ethtool_stats
+        self._softnet_stats = softnet_stats
+        self._cpu_bind = cpu_bind if cpu_bind is not None else {}
+        self._running_measurements = []
+        self._finished_measurements = []
+        self._job_devices = {}
+
+    @property
+    def version(self):
+        return "1"
+
+    @property
+    def devices(self):
+        return self._devices
+
+    @property
+    def hosts(self):
+        hosts = []
+        for device in self.devices:
+            if device.host not in hosts:
+                hosts.append(device.host)
+        return hosts
+
+    def start(self):
+        if len(self._running_measurements) > 0:
+            raise MeasurementError("Measurement already running!")
+
+        devices_by_netns = {}
+        for device in self.devices:
+            devices_by_netns.setdefault(device.netns, []).append(device)
+
+        jobs = []
+        softnet_hosts = set()
+        for netns, devices in devices_by_netns.items():
+            host = devices[0].host
+            monitor_params = {
+                "devices": [device.name for device in devices],
+                "interval": self._interval,
+                "ethtool_stats": self._ethtool_stats,
+                # softnet_stat isn't namespaced, sample it once per host
+                "softnet_stats": (self._softnet_stats and
+                                  host not in softnet_hosts),
+            }
+            softnet_hosts.add(host)
+            if self._counters:
+                monitor_params["counters"] = self._counters
+            if self._cpu_bind.get(host):
+                monitor_params["cpu_bind"] = self._cpu_bind[host]
+
+            job = netns.prepare_job(
+                NicCounterMonitor(**monitor_params),
+                job_level=ResultLevel.NORMAL,
+            )
+            self._job_devices[job] = devices
+            jobs.append(job.start(bg=True))
+        self._running_measurements = jobs
+
+    def finish(self):
+        jobs = self._running_measurements
+        try:
+            for job in jobs:
+                job.kill(signal.SIGINT)
+                job.wait()
+        finally:
+            for job in jobs:
+                job.kill()
+
+        self._running_measurements = []
+        self._finished_measurements = jobs
+
+    def collect_results(self):
+        results = []
+        for job in self._finished_measurements:
+            results.extend(self._process_job(job))
+        self._job_devices = {}
+        return results
+
+    def _process_job(self, job):
+        job_devices = self._job_devices[job]
+        devices = {device.name: device for device in job_devices}
+        host = job_devices[0].host
+
+        job_results = {}
+        for sample in job.result["data"]:
+            duration = sample["duration"]
+            timestamp = sample["timestamp"]
+
+            sources = [(devices[name], counters)
+                       for name, counters in sample["devices"].items()]
+            for cpu, counters in sample["softnet"].items():
+                sources.append((None, {
+                    "%s.%s" % (cpu, name): value
+                    for name, value in counters.items()
+                }))
+
+            for device, counters in sources:
+                if device not in job_results:
+                    job_results[device] = NicCounterMeasurementResults(
+                        self, host, device)
+                job_results[device].update_intervals({
+                    name: PerfInterval(value, duration, "count", timestamp)
+                    for name, value in counters.items()
+                })
+
+        return list(job_results.values())
+
+    @classmethod
+    def report_results(cls, recipe, results):
+        for result in results:
+            recipe.add_custom_result(
+                MeasurementResult(
+                    "nic_counters",
+                    description=result.describe(),
+                    data={
+                        "host": result.host.hostid,
+                        "source": result.source,
+                        "counters": result.counters,
+                    },
+                )
+            )
+
+    def aggregate_results(self, old, new):
+        aggregated = []
+        if old is None:
+            old = [None] * len(new)
+        elif len(old) != len(new):
+            raise MeasurementError(
+                "Aggregating NIC counter results of different devices")
+        for old_result, new_result in zip(old, new):
+            if (old_result is not None and
+                    (old_result.host is not new_result.host or
+                     old_result.device is not new_result.device)):
+                raise MeasurementError(
+                    "Aggregating incompatible NIC counter results")
+
+            aggregated_result = AggregatedNicCounterMeasurementResults(
+                self, new_result.host, new_result.device)
+            aggregated_result.add_results(old_result)
+            aggregated_result.add_results(new_result)
+            aggregated.append(aggregated_result)
+        return aggregated
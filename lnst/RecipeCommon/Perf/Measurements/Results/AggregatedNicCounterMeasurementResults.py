@@ -0,0 +1,34 @@
+from lnst.RecipeCommon.Perf.Results import SequentialPerfResult
+from lnst.RecipeCommon.Perf.Measurements.Results.NicCounterMeasurementResults import NicCounterMeasurementResults
+from lnst.RecipeCommon.Perf.Measurements.MeasurementError import MeasurementError
+
+
+class AggregatedNicCounterMeasurementResults(NicCounterMeasurementResults):
+    def __init__(self, measurement, host, device=None):
+        super(AggregatedNicCounterMeasurementResults, self).__init__(
+            measurement, host, device)
+        self._individual_results = []
+
+    @property
+    def individual_results(self):
+        return self._individual_results
+
+    @property
+    def counters(self):
+        names = []
+        for result in self.individual_results:
+            names.extend(name for name in result.counters if name not in names)
+        return {name: SequentialPerfResult([i.counters[name]
+                                            for i in self.individual_results
+                                            if name in i.counters])
+                for name in names}
+
+    def add_results(self, results):
+        if results is None:
+            return
+        elif isinstance(results, AggregatedNicCounterMeasurementResults):
+            self.individual_results.extend(results.individual_results)
+        elif isinstance(results, NicCounterMeasurementResults):
+            self.individual_results.append(results)
+        else:
+            raise MeasurementError("Adding incorrect results.")
@@ -0,0 +1,77 @@
+from lnst.RecipeCommon.Perf.Results import SequentialPerfResult
+from lnst.RecipeCommon.Perf.Measurements.Results.BaseMeasurementResults import (
+    BaseMeasurementResults,
+)
+
+
+class NicCounterMeasurementResults(BaseMeasurementResults):
+    """Counter deltas of a device, or the host wide softnet counters
+
+    :ivar counters: dictionary of counter name (e.g. "stats64.rx_dropped")
+        to the :any:`SequentialPerfResult` of its per sample deltas
+    """
+    def __init__(self, measurement, host, device=None):
+        super(NicCounterMeasurementResults, self).__init__(measurement)
+        self._host = host
+        self._device = device
+        self._counters = {}
+
+    @property
+    def host(self):
+        return self._host
+
+    @property
+    def device(self):
+        """The measured device, None for the softnet counters"""
+        return self._device
+
+    @property
+    def source(self):
+        return self.device.name if self.device is not None else "softnet"
+
+    @property
+    def counters(self):
+        return self._counters
+
+    def update_intervals(self, intervals):
+        for key, interval in list(intervals.items()):
+            if key not in self._counters:
+                self._counters[key] = SequentialPerfResult()
+            self._counters[key].append(interval)
+
+    @property
+    def start_timestamp(self):
+        return min([item.start_timestamp for item in self.counters.values()])
+
+    @property
+    def end_timestamp(self):
+        return max([item.end_timestamp for item in self.counters.values()])
+
+    def time_slice(self, start, end):
+        result_copy = NicCounterMeasurementResults(
+                self.measurement,
+                self.host,
+                self.device
+                )
+        for name, intervals in self._counters.items():
+            result_copy._counters[name] = intervals.time_slice(start, end)
+        return result_copy
+
+    def describe(self):
+        desc = []
+        for name, counter in sorted(self.counters.items()):
+            if not counter.value:
+                continue
+            desc.append("host {host} {source} counter '{name}': {total} "
+                        "({average:.2f} +-{deviation:.2f} per second)".format(
+                            host=self.host.hostid,
+                            source=self.source,
+                            name=name,
+                            total=counter.value,
+                            average=counter.average,
+                            deviation=counter.std_deviation,
+                        ))
+        if not desc:
+            desc.append("host {host} {source} counters: no changes".format(
+                host=self.host.hostid, source=self.source))
+        return "\n".join(desc)
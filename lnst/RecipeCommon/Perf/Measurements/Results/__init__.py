@@ -9,6 +9,9 @@ from lnst.RecipeCommon.Perf.Measurements.Results.BaseMeasurementResults import B
 from lnst.RecipeCommon.Perf.Measurements.Results.CPUMeasurementResults import CPUMeasurementResults
 from lnst.RecipeCommon.Perf.Measurements.Results.FlowMeasurementResults import FlowMeasurementResults
 from lnst.RecipeCommon.Perf.Measurements.Results.LinuxPerfMeasurementResults import LinuxPerfMeasurementResults
+from lnst.RecipeCommon.Perf.Measurements.Results.NicCounterMeasurementResults import NicCounterMeasurementResults
+from lnst.RecipeCommon.Perf.Measurements.Results.AggregatedNicCounterMeasurementResults import \
+    AggregatedNicCounterMeasurementResults
 from lnst.RecipeCommon.Perf.Measurements.Results.RDMABandwidthMeasurementResults import RDMABandwidthMeasurementResults
 from lnst.RecipeCommon.Perf.Measurements.Results.StatCPUMeasurementResults import StatCPUMeasurementResults
 from lnst.RecipeCommon.Perf.Measurements.Results.TcRunMeasurementResults import TcRunMeasurementResults
@@ -9,11 +9,18 @@ from lnst.Tests.CPUStatMonitor import CPUStatMonitor
 
 
 class StatCPUMeasurement(BaseCPUMeasurement):
-    def __init__(self, hosts, recipe_conf=None):
+    def __init__(self, hosts, recipe_conf=None, cpu_bind=None):
+        """
+        :param cpu_bind: optional dictionary of host to the list of cpus the
+            CPUStatMonitor of the host should be pinned to
+        """
         super(StatCPUMeasurement, self).__init__(recipe_conf)
         self._hosts = hosts
+        self._cpu_bind = cpu_bind if cpu_bind is not None else {}
         self._running_measurements = []
         self._finished_measurements = []
+        self._interim_results = {}
+        self._interim_sample_counts = {}
 
     @property
     def version(self):
@@ -26,13 +33,17 @@ class StatCPUMeasurement(BaseCPUMeasurement):
     def start(self):
         jobs = []
         for host in sorted(self.hosts, key=lambda x: x.hostid):
-            jobs.append(
-                host.run(
-                    CPUStatMonitor(interval=1000),
-                    bg=True,
-                    job_level=ResultLevel.NORMAL,
-                )
+            monitor_params = {"interval": 1000}
+            if self._cpu_bind.get(host):
+                monitor_params["cpu_bind"] = self._cpu_bind[host]
+            job = host.prepare_job(
+                CPUStatMonitor(**monitor_params),
+                job_level=ResultLevel.NORMAL,
             )
+            self._interim_results[job] = {}
+            self._interim_sample_counts[job] = 0
+            self._stream_interim_results(job)
+            jobs.append(job.start(bg=True))
         self._running_measurements = jobs
 
     def finish(self):
@@ -56,20 +67,31 @@ class StatCPUMeasurement(BaseCPUMeasurement):
 
         return results
 
-    def _process_job(self, job):
-        host = job.host
-        job_results = {}
-        for sample in job.result["data"]:
-            parsed_sample = self._parse_sample(sample)
+    def process_interim_result(self, job, record):
+        self._add_sample(job.host, self._interim_results[job], record)
+        self._interim_sample_counts[job] += 1
 
-            for cpu, cpu_intervals in list(parsed_sample.items()):
-                if cpu not in job_results:
-                    job_results[cpu] = StatCPUMeasurementResults(self, host, cpu)
-                cpu_results = job_results[cpu]
-                cpu_results.update_intervals(cpu_intervals)
+    def _process_job(self, job):
+        # the samples streamed while the monitor was running are used unless
+        # some of them were lost
+        job_results = self._interim_results.pop(job, {})
+        sample_count = self._interim_sample_counts.pop(job, 0)
+        if sample_count != len(job.result["data"]):
+            job_results = {}
+            for sample in job.result["data"]:
+                self._add_sample(job.host, job_results, sample)
 
         return list(job_results.values())
 
+    def _add_sample(self, host, job_results, sample):
+        parsed_sample = self._parse_sample(sample)
+
+        for cpu, cpu_intervals in list(parsed_sample.items()):
+            if cpu not in job_results:
+                job_results[cpu] = StatCPUMeasurementResults(self, host, cpu)
+            cpu_results = job_results[cpu]
+            cpu_results.update_intervals(cpu_intervals)
+
     def _parse_sample(self, sample):
         result = {}
         duration = sample["duration"]
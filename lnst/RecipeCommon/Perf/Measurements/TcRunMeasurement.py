@@ -1,14 +1,11 @@
-import logging
-from tempfile import NamedTemporaryFile
 from typing import Optional
 
-from lnst.Common.NetUtils import MacPool
 from lnst.Controller import BaseRecipe
 from lnst.Controller.RecipeResults import MeasurementResult, ResultLevel, ResultType
 from lnst.RecipeCommon.Perf.Measurements.MeasurementError import MeasurementError
 from lnst.RecipeCommon.Perf.Measurements.Results.AggregatedTcRunMeasurementResults import AggregatedTcRunMeasurementResults
 from lnst.RecipeCommon.Perf.Measurements.Results.TcRunMeasurementResults import TcRunMeasurementResults
-from lnst.RecipeCommon.Perf.Results import PerfInterval, ParallelPerfResult
+from lnst.RecipeCommon.Perf.Results import PerfInterval, ParallelPerfResult, SequentialPerfResult
 from lnst.Tests.TrafficControl import TrafficControlRunner
 from lnst.Controller.Job import Job
 from lnst.Controller.Namespace import Device, Namespace
@@ -22,9 +19,6 @@ class TcRunInstance:
         self._device = device
         self._num_rules = num_rules
         self._instance_id = instance_id
-
-        if batchfile_path is None:
-            batchfile_path = self._generate_batchfile()
         self._batchfile_path = batchfile_path
 
         self.validate()
@@ -67,32 +61,19 @@ class TcRunInstance:
     def end_mac(self) -> str:
         return f"{self.pool_oui}:ff:ff:ff"
 
-    def _generate_batchfile(self) -> str:
-        logging.info(f"Generating tc batchfile for {self.device.name} instance {self._instance_id} num_rules={self.num_rules}")
-        rules = self.generate_rules()
-        with NamedTemporaryFile(
-                'w', suffix=".batch", prefix="tc-rules-", delete=True,
-        ) as f:
-            for r in rules:
-                f.write(r)
-
-            remote_path = self.host.copy_file_to_machine(f.name)
-        logging.info(f"tc batchfile written to {self.host.hostname}:{remote_path}")
-        return remote_path
-
-    def generate_rules(self):
-        mac_pool = MacPool(self.start_mac, self.end_mac)
-        iface = self.device.name
-
-        for i in range(self.num_rules):
-            a = i & 0xff
-            b = (i & 0xff00) >> 8
-            c = (i & 0xff0000) >> 16
-            src_mac = mac_pool.get_addr()
-            dst_mac = mac_pool.get_addr()
-            yield f"filter add dev {iface} parent ffff: protocol ip prio 1 flower " \
-                  f"src_mac {src_mac} dst_mac {dst_mac} " \
-                  f"src_ip 56.{a}.{b}.{c} dst_ip 55.{c}.{b}.{a} action drop\n"
+    @property
+    def rule_set(self) -> dict:
+        """Declarative description of the rules of the instance, expanded
+        to the actual rules by the agent, see :mod:`lnst.Common.TcRules`"""
+        return dict(
+            dev=self.device.name,
+            count=self.num_rules,
+            src_mac=self.start_mac,
+            dst_mac=f"{self.pool_oui}:80:00:00",
+            src_ip="56.0.0.0",
+            dst_ip="55.0.0.0",
+            action="drop",
+        )
 
 
 class TcRunMeasurement(BaseMeasurement):
@@ -105,6 +86,8 @@ class TcRunMeasurement(BaseMeasurement):
             timeout: int = 120,
             cpu_bind: Optional[list[int]] = None,
             cpu_bind_policy: str = "round-robin",
+            mode: str = "batch",
+            netlink_batch_size: int = 1000,
             parent_recipe_conf=None,
     ):
         super().__init__(recipe_conf=parent_recipe_conf)
@@ -116,6 +99,8 @@ class TcRunMeasurement(BaseMeasurement):
         self._timeout = timeout
         self._cpu_bind = cpu_bind
         self._cpu_bind_policy = cpu_bind_policy
+        self._mode = mode
+        self._netlink_batch_size = netlink_batch_size
         self.instance_configs = self._make_instances_cfgs()
 
     @property
@@ -152,9 +137,13 @@ class TcRunMeasurement(BaseMeasurement):
             self._running_jobs.append(job)
 
     def _prepare_jobs(self) -> list[Job]:
-        params: dict = {
-            "batchfiles": [i.batchfile_path for i in self.instance_configs],
-        }
+        params: dict = {"mode": self._mode}
+        if all(i.batchfile_path is not None for i in self.instance_configs):
+            params["batchfiles"] = [i.batchfile_path for i in self.instance_configs]
+        else:
+            params["rule_sets"] = [i.rule_set for i in self.instance_configs]
+        if self._mode == "netlink":
+            params["netlink_batch_size"] = self._netlink_batch_size
         if self._cpu_bind is not None:
             params["cpu_bind"] = self._cpu_bind
             params["cpu_bind_policy"] = self._cpu_bind_policy
@@ -206,6 +195,18 @@ class TcRunMeasurement(BaseMeasurement):
         return [run_result]
 
     def _get_instance_interval(self, instance_data: dict):
+        if instance_data.get("batches"):
+            # netlink mode, time series of the batch insertion rates
+            batches = SequentialPerfResult()
+            for batch in instance_data["batches"]:
+                batches.append(PerfInterval(
+                    value=batch["rules"],
+                    duration=batch["duration"],
+                    unit='rules',
+                    timestamp=batch["timestamp"],
+                ))
+            return batches
+
         return PerfInterval(
             value=self._rules_per_instance,
             duration=instance_data['time_taken'],
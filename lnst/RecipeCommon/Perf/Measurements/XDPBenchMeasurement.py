@@ -27,6 +27,7 @@ class XDPBenchMeasurement(BaseFlowMeasurement):
         self._flows = flows
         self._running_measurements = []
         self._finished_measurements = []
+        self._interim_receiver_results = {}
 
         self.command = xdp_command
 
@@ -55,9 +56,20 @@ class XDPBenchMeasurement(BaseFlowMeasurement):
         }
         bench = XDPBench(**params)
         job = flow.receiver.prepare_job(bench)
+        self._interim_receiver_results[job] = SequentialPerfResult()
+        self._stream_interim_results(job)
 
         return job
 
+    def process_interim_result(self, job, record):
+        self._interim_receiver_results[job].append(self._receiver_interval(record))
+
+    @staticmethod
+    def _receiver_interval(sample: dict) -> PerfInterval:
+        return PerfInterval(
+            sample["rx"], sample["duration"], "packets", sample["timestamp"]
+        )
+
     def _prepare_client(self, flow: Flow):
         params = {
             "src_if": flow.generator_nic,
@@ -138,13 +150,13 @@ class XDPBenchMeasurement(BaseFlowMeasurement):
         result = (
             ParallelPerfResult()
         )  # just a placeholder to keep data structure same as other Measurements
-        results = SequentialPerfResult()  # single instance of xdp-bench
 
-        for sample in job.result:
-            results.append(
-                PerfInterval(
-                    sample["rx"], sample["duration"], "packets", sample["timestamp"]
-                )
+        # single instance of xdp-bench, the samples streamed while it was
+        # running are used unless some of them were lost
+        results = self._interim_receiver_results.pop(job, SequentialPerfResult())
+        if len(results) != len(job.result):
+            results = SequentialPerfResult(
+                [self._receiver_interval(sample) for sample in job.result]
             )
 
         result.append(results)
@@ -7,3 +7,4 @@ from lnst.RecipeCommon.Perf.Measurements.LinuxPerfMeasurement import LinuxPerfMe
 from lnst.RecipeCommon.Perf.Measurements.RDMABandwidthMeasurement import RDMABandwidthMeasurement
 from lnst.RecipeCommon.Perf.Measurements.XDPBenchMeasurement import XDPBenchMeasurement
 
+from lnst.RecipeCommon.Perf.Measurements.NicCounterMeasurement import NicCounterMeasurement
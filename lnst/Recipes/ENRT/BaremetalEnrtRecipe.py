@@ -14,10 +14,12 @@ from lnst.Recipes.ENRT.MeasurementGenerators.FlowEndpointsStatCPUMeasurementGene
     FlowEndpointsStatCPUMeasurementGenerator,
 )
 from lnst.Recipes.ENRT.MeasurementGenerators.LinuxPerfMeasurementGenerator import LinuxPerfMeasurementGenerator
+from lnst.Recipes.ENRT.MeasurementGenerators.NicCounterMeasurementGenerator import NicCounterMeasurementGenerator
 
 
 class BaremetalEnrtMeasurementGenerators(
     FlowEndpointsStatCPUMeasurementGenerator,
+    NicCounterMeasurementGenerator,
     LinuxPerfMeasurementGenerator,
     FlowMeasurementGenerator,
 ):
@@ -198,16 +198,21 @@ class BaseEnrtRecipe(
 
         * creating the combined sub configuration of all available SubConfig
           Mixin classes via :any:`generate_sub_configurations`
-        * applying the generated sub configuration via the :any:`_sub_context`
-          context manager method
+        * switching from the previous sub configuration to the generated one
+          via the :any:`_switch_sub_configuration` method, only the settings
+          that differ are changed
         * running tests
-        * removing the current sub configuration via the :any:`_sub_context`
-          context manager method
+
+        The last sub configuration is removed after the loop, also if any
+        exception is raised.
         """
         with self._test_wide_context() as main_config:
-            for sub_config in self.generate_sub_configurations(main_config):
-                with self._sub_context(sub_config) as recipe_config:
-                    self.do_tests(recipe_config)
+            try:
+                for sub_config in self.generate_sub_configurations(main_config):
+                    self._switch_sub_configuration(sub_config)
+                    self.do_tests(sub_config)
+            finally:
+                self._switch_sub_configuration(None)
 
     @contextmanager
     def _test_wide_context(self):
@@ -309,14 +314,43 @@ class BaseEnrtRecipe(
             )
         ]
 
-    @contextmanager
-    def _sub_context(self, config):
-        self.apply_sub_configuration(config)
-        self.describe_sub_configuration(config)
+    _applied_sub_config = None
+
+    def _switch_sub_configuration(self, config):
+        """Replaces the applied sub configuration with *config*
+
+        The applied sub configuration is removed with *config* as the
+        :any:`next_sub_configuration` and *config* is then applied with the
+        removed one as the :any:`previous_sub_configuration`, so that the
+        SubConfig Mixin classes can change only the settings that differ.
+        None removes the applied sub configuration and restores the original
+        state.
+
+        If removing the applied sub configuration fails it stays applied and
+        if applying *config* fails it is considered applied, it took over the
+        settings kept from the removed one, so the next call with None still
+        restores the original state.
+        """
+        previous = self._applied_sub_config
+        if previous is not None:
+            self._next_sub_config = config
+            try:
+                self.remove_sub_configuration(previous)
+            finally:
+                self._next_sub_config = None
+                if config is None:
+                    self._applied_sub_config = None
+
+        if config is None:
+            return
+
+        self._applied_sub_config = config
+        self._previous_sub_config = previous
         try:
-            yield config
+            self.apply_sub_configuration(config)
         finally:
-            self.remove_sub_configuration(config)
+            self._previous_sub_config = None
+        self.describe_sub_configuration(config)
 
     def describe_sub_configuration(self, config):
         description = self.generate_sub_configuration_description(config)
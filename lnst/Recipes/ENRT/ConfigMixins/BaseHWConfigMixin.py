@@ -2,11 +2,24 @@ from lnst.Recipes.ENRT.ConfigMixins.BaseSubConfigMixin import BaseSubConfigMixin
 
 class BaseHWConfigMixin(BaseSubConfigMixin):
     def apply_sub_configuration(self, config):
+        previous_config = self.previous_sub_configuration
+        if previous_config is not None and hasattr(previous_config, "hw_config"):
+            # the hw configuration depends only on the recipe parameters so
+            # it was kept applied from the previous sub configuration, it's
+            # taken over first to be removed with this one even if applying
+            # the rest fails
+            config.hw_config = previous_config.hw_config
+
         super().apply_sub_configuration(config)
-        self.hw_config(config)
+
+        if not hasattr(config, "hw_config"):
+            self.hw_config(config)
 
     def remove_sub_configuration(self, config):
-        self.hw_deconfig(config)
+        # not set if applying the sub configuration failed before
+        if (self.next_sub_configuration is None and
+                hasattr(config, "hw_config")):
+            self.hw_deconfig(config)
         return super().remove_sub_configuration(config)
 
     def generate_sub_configuration_description(self, config):
@@ -29,8 +42,7 @@ class BaseHWConfigMixin(BaseSubConfigMixin):
             attr_cfg = hw_config.setdefault(attr_name + "_configuration", {})
 
         for dev in dev_list:
-            attr_cfg[dev] = {}
-            attr_cfg[dev]["original"] = getattr(dev, attr_name)
+            attr_cfg[dev] = {"original": getattr(dev, attr_name)}
             setattr(dev, attr_name, value)
             attr_cfg[dev]["configured"] = getattr(dev, attr_name)
 
@@ -43,6 +55,9 @@ class BaseHWConfigMixin(BaseSubConfigMixin):
             return
 
         for dev in dev_list:
+            if dev not in attr_cfg:
+                # configuring failed before reaching the device
+                continue
             value = attr_cfg[dev]["original"]
             setattr(dev, attr_name, value)
             del attr_cfg[dev]
@@ -1,5 +1,4 @@
 import logging
-import requests
 
 from lnst.Common.LnstError import LnstError
 from lnst.Common.Parameters import BoolParam, StrParam
@@ -13,6 +12,9 @@ class BaseRESTConfigMixin:
 
     @staticmethod
     def __get_request_function(method: str):
+        # requests is slow to import and only few recipes use the REST API
+        import requests
+
         try:
             return getattr(requests, method)
         except AttributeError:
@@ -2,8 +2,39 @@ class BaseSubConfigMixin(object):
     """
     This is a base class that defines common API for specific *sub*
     configuration mixin classes.
+
+    Consecutive *sub* configurations often differ only in a few settings, so
+    when switching from one to the next, the applied one is removed with
+    :attr:`next_sub_configuration` set and the next one is applied with
+    :attr:`previous_sub_configuration` set. A child class can use them to
+    keep the settings both configurations share and change only the
+    differing ones. The original state is restored only when the last *sub*
+    configuration is removed.
     """
 
+    _previous_sub_config = None
+    _next_sub_config = None
+
+    @property
+    def previous_sub_configuration(self):
+        """
+        The *sub* configuration that was applied before the one currently
+        being applied by :meth:`apply_sub_configuration`, None if the original
+        state is in place. It was removed with the current one as the
+        :attr:`next_sub_configuration`, so the settings it shares with the
+        current one can still be applied.
+        """
+        return self._previous_sub_config
+
+    @property
+    def next_sub_configuration(self):
+        """
+        The *sub* configuration that will be applied right after the one
+        currently being removed by :meth:`remove_sub_configuration`, None if
+        the original state should be restored.
+        """
+        return self._next_sub_config
+
     def generate_sub_configurations(self, config):
         """
         A child class should override this method to extend the *test_wide*
@@ -24,6 +55,10 @@ class BaseSubConfigMixin(object):
         do the configuration should be added to *config* through the
         :meth:`generate_sub_configurations`.
 
+        Settings that are the same in :attr:`previous_sub_configuration` may
+        be skipped if the child class kept them applied in
+        :meth:`remove_sub_configuration`.
+
         The child class must include a :py:func:`super` call of this method so
         that all other mixin classes do their part of cooperative inheritance.
         """
@@ -47,6 +82,10 @@ class BaseSubConfigMixin(object):
         Any data required to cleanup the configuration should be added to *config*
         through the :meth:`generate_sub_configurations`.
 
+        Settings that :attr:`next_sub_configuration` will apply again may be
+        kept, if it is None the original state must be restored. This is also
+        called for a *sub* configuration that failed to apply completely.
+
         The child class must include a :py:func:`super` call of this
         method so that all other mixin classes do their part of cooperative
         inheritance.
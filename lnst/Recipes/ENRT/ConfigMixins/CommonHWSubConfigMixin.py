@@ -1,8 +1,8 @@
 from lnst.Recipes.ENRT.ConfigMixins.ParallelStreamQDiscHWConfigMixin import (
     ParallelStreamQDiscHWConfigMixin,
 )
-from lnst.Recipes.ENRT.ConfigMixins.DevInterruptHWConfigMixin import (
-    DevInterruptHWConfigMixin,
+from lnst.Recipes.ENRT.ConfigMixins.CpuPinningPlannerMixin import (
+    CpuPinningPlannerMixin,
 )
 from lnst.Recipes.ENRT.ConfigMixins.CoalescingHWConfigMixin import (
     CoalescingHWConfigMixin,
@@ -16,7 +16,7 @@ from lnst.Recipes.ENRT.ConfigMixins.PauseFramesHWConfigMixin import (
 class CommonHWSubConfigMixin(
     PauseFramesHWConfigMixin,
     ParallelStreamQDiscHWConfigMixin,
-    DevInterruptHWConfigMixin,
+    CpuPinningPlannerMixin,
     CoalescingHWConfigMixin,
     MTUHWConfigMixin,
 ):
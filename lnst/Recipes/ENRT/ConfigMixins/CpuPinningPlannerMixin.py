@@ -0,0 +1,138 @@
+from lnst.Common.Parameters import BoolParam, IntParam
+from lnst.Controller.Recipe import RecipeError
+from lnst.RecipeCommon.CpuPinningPlanner import plan_cpu_pinning
+from lnst.Recipes.ENRT.ConfigMixins.DevInterruptHWConfigMixin import (
+    DevInterruptHWConfigMixin,
+)
+from lnst.Recipes.ENRT.ConfigMixins.DevInterruptTools import pin_dev_interrupts
+
+
+class CpuPinningPlannerMixin(DevInterruptHWConfigMixin):
+    """
+    This class is an extension to the :any:`DevInterruptHWConfigMixin` class
+    that computes the CPU pinning instead of using hand written CPU lists.
+
+    The CPU, NUMA and SMT topology of the hosts and the NUMA locality and
+    queue counts of the devices defined by the
+    :attr:`dev_interrupt_hw_config_dev_list` property are read from the
+    Agents, then the :any:`CpuPinningPlanner` assigns non-conflicting CPUs of
+    the devices' NUMA node to the device IRQs, the perf tool processes of the
+    flow measurements and the CPU stat measurement monitor.
+
+     .. note::
+        Note that this Mixin also stops the irqbalance service.
+
+    :param cpu_pinning_planner:
+        (optional test parameter) enables the planner, can't be combined
+        with the `dev_intr_cpu` and `perf_tool_cpu` parameters
+
+    :param cpu_pinning_irq_cpus:
+        (optional test parameter) maximum number of CPUs used for the IRQs
+        of each device, by default one CPU per device queue
+
+    :param cpu_pinning_housekeeping_cores:
+        (optional test parameter) number of physical cores reserved for the
+        CPU stat monitor and the rest of the system, default 1
+
+    :param cpu_pinning_share_smt:
+        (optional test parameter) allows perf tool processes to use the SMT
+        siblings of other perf tool CPUs when there aren't enough cores on
+        the local NUMA node, default False
+    """
+
+    cpu_pinning_planner = BoolParam(default=False)
+    cpu_pinning_irq_cpus = IntParam(mandatory=False)
+    cpu_pinning_housekeeping_cores = IntParam(default=1)
+    cpu_pinning_share_smt = BoolParam(default=False)
+
+    def hw_config(self, config):
+        # checked before the parent classes pin the IRQs and stop irqbalance
+        if self.params.cpu_pinning_planner:
+            for conflict in ["dev_intr_cpu", "perf_tool_cpu",
+                             "perf_tool_generator_cpu",
+                             "perf_tool_receiver_cpu"]:
+                if conflict in self.params:
+                    raise RecipeError(
+                        "cpu_pinning_planner can't be combined with {}".format(
+                            conflict))
+
+        super().hw_config(config)
+
+        self._cpu_pinning_plans = {}
+        if not self.params.cpu_pinning_planner:
+            return
+
+        devices = self.dev_interrupt_hw_config_dev_list
+        perf_processes = self.params.get("perf_parallel_processes", 1)
+        host_devices = {}
+        for dev in devices:
+            host_devices.setdefault(dev.host, []).append(dev)
+
+        plans = {}
+        for host, dev_list in host_devices.items():
+            plans.update(plan_cpu_pinning(
+                dev_list,
+                perf_processes * len(dev_list),
+                irq_cpus_per_device=self.params.get("cpu_pinning_irq_cpus",
+                                                    None),
+                housekeeping_cores=self.params.cpu_pinning_housekeeping_cores,
+                share_smt=self.params.cpu_pinning_share_smt,
+            ))
+
+        hw_config = config.hw_config
+        intr_cfg = hw_config["dev_intr_cpu_configuration"] = {}
+        intr_cfg["irq_devs"] = {}
+        intr_cfg["irqbalance_hosts"] = []
+        for host in plans.keys():
+            host.run("service irqbalance stop")
+            intr_cfg["irqbalance_hosts"].append(host)
+
+        for plan in plans.values():
+            for dev, cpus in plan.irq_cpus.items():
+                pin_dev_interrupts(dev, cpus, "round-robin")
+                intr_cfg["irq_devs"][dev] = cpus
+
+        hw_config["cpu_pinning_plans"] = plans
+        self._cpu_pinning_plans = plans
+
+    def hw_deconfig(self, config):
+        self._cpu_pinning_plans = {}
+        super().hw_deconfig(config)
+
+    def describe_hw_config(self, config):
+        desc = super().describe_hw_config(config)
+
+        for plan in config.hw_config.get("cpu_pinning_plans", {}).values():
+            desc += plan.describe()
+        return desc
+
+    def _create_perf_flows(self, endpoint_pairs, perf_test, msg_size):
+        flows = super()._create_perf_flows(endpoint_pairs, perf_test, msg_size)
+
+        plans = getattr(self, "_cpu_pinning_plans", {})
+        if not plans:
+            return flows
+
+        # processes of all the parallel flows on a host get different cpus
+        process_counters = {}
+        for flow in flows:
+            for side in ["generator", "receiver"]:
+                nic = getattr(flow, side + "_nic")
+                plan = plans.get(getattr(nic, "host", None))
+                if plan is None:
+                    continue
+                process_no = process_counters.get(plan.host, 0)
+                process_counters[plan.host] = process_no + 1
+                setattr(flow, side + "_cpupin", plan.perf_cpupin(process_no))
+        return flows
+
+    def cpu_measurement_cpupin(self, hosts):
+        plans = getattr(self, "_cpu_pinning_plans", {})
+        cpu_bind = {
+            host: plans[host].housekeeping_cpus
+            for host in hosts
+            if host in plans
+        }
+        if cpu_bind:
+            return cpu_bind
+        return super().cpu_measurement_cpupin(hosts)
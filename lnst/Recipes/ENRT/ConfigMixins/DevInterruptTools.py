@@ -9,18 +9,19 @@ def pin_dev_interrupts(dev, cpus, policy=None):
 
     intrs = get_dev_interrupts(dev)
 
+    commands = []
     for i, intr in enumerate(intrs):
-        try:
-            if policy in [ "round-robin", None ]:
-                cpu = cpus[i % len(cpus)]
-            elif policy == "all":
-                cpu = ",".join([str(cpu) for cpu in cpus])
+        if policy in [ "round-robin", None ]:
+            cpu = cpus[i % len(cpus)]
+        elif policy == "all":
+            cpu = ",".join([str(cpu) for cpu in cpus])
 
-            netns.run(
-                "echo -n {} > /proc/irq/{}/smp_affinity_list".format(cpu, intr)
-            )
-        except ValueError:
-            pass
+        commands.append(
+            "echo -n {} > /proc/irq/{}/smp_affinity_list".format(cpu, intr)
+        )
+
+    if commands:
+        netns.run_batch(commands, fail_fast=False)
 
 def check_cpu_validity(host, cpus):
     cpu_info = host.run("lscpu", job_level=ResultLevel.DEBUG).stdout
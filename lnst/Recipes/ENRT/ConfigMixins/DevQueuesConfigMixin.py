@@ -17,20 +17,13 @@ class DevQueuesConfigMixin(BaseHWConfigMixin):
         device_settings = self._parse_device_settings(self.params.dev_queues)
         for device, dev_queues in device_settings.items():
             # TODO: handle netlink error: Operation not supported
-            ethtool_job = device.host.run(f"ethtool -l {device.name}")
-            original_queues = process_queues_output(ethtool_job.stdout)
+            original_queues = device.channels
 
             hw_config["dev_queues"][device] = {
                 "original": original_queues["current"],
             }
 
-            device.host.run(
-                f"ethtool -L {device.name} "
-                + " ".join(
-                    queue_name + " " + str(queue_setting)
-                    for queue_name, queue_setting in dev_queues.items()
-                )
-            )
+            device.set_channels(dev_queues)
 
             hw_config["dev_queues"][device]["configured"] = dev_queues
 
@@ -39,13 +32,12 @@ class DevQueuesConfigMixin(BaseHWConfigMixin):
         for dev, dev_queues in dev_queues_config.items():
             configured_queues = dev_queues.get("configured", {})
             original_queues = dev_queues.get("original", {})
-            dev.host.run(
-                f"ethtool -L {dev.name} "
-                + " ".join(
-                    queue_name + " " + str(queue_setting)
+            dev.set_channels(
+                {
+                    queue_name: queue_setting
                     for queue_name, queue_setting in original_queues.items()
                     if queue_name in configured_queues
-                )
+                }
             )
 
         super().hw_deconfig(config)
@@ -69,43 +61,3 @@ class DevQueuesConfigMixin(BaseHWConfigMixin):
 
         return desc
 
-
-def process_queues_output(output):
-    # format of ethtool -l:
-    #
-    # Channel parameters for ens7f0:
-    # Pre-set maximums:
-    # RX:		n/a
-    # TX:		n/a
-    # Other:		n/a
-    # Combined:	32
-    # Current hardware settings:
-    # RX:		n/a
-    # TX:		n/a
-    # Other:		n/a
-    # Combined:	16
-
-    result = {
-        "preset": {},
-        "current": {},
-    }
-
-    key = None
-    for line in output.split("\n")[1:]:
-        if not line:
-            continue
-
-        if line == "Pre-set maximums:":
-            key = "preset"
-        elif line == "Current hardware settings:":
-            key = "current"
-        else:
-            queue_name, queue_setting = line.split(":")
-            queue_name = queue_name.lower()
-            queue_setting = queue_setting.strip()
-            if queue_setting == "n/a":
-                queue_setting = None
-
-            result[key][queue_name] = queue_setting
-
-    return result
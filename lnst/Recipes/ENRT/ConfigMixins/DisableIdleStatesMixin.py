@@ -31,7 +31,8 @@ class DisableIdleStatesMixin(BaseSubConfigMixin):
         super().apply_sub_configuration(config)
 
         latency = getattr(self.params, "minimal_idlestates_latency", None)
-        if latency is not None:
+        # kept disabled from the previous sub configuration
+        if latency is not None and self.previous_sub_configuration is None:
             for host in self.disable_idlestates_host_list:
                 # TODO: save previous state
                 host.run("cpupower idle-set -D {}".format(latency))
@@ -51,7 +52,8 @@ class DisableIdleStatesMixin(BaseSubConfigMixin):
         return description
 
     def remove_sub_configuration(self, config):
-        for host in self.disable_idlestates_host_list:
-            host.run("cpupower idle-set -E")
+        if self.next_sub_configuration is None:
+            for host in self.disable_idlestates_host_list:
+                host.run("cpupower idle-set -E")
 
         return super().remove_sub_configuration(config)
@@ -39,7 +39,9 @@ class DisableTurboboostMixin(BaseSubConfigMixin):
     def apply_sub_configuration(self, config):
         super().apply_sub_configuration(config)
 
-        if self.params.disable_turboboost:
+        # kept disabled from the previous sub configuration
+        if (self.params.disable_turboboost and
+                self.previous_sub_configuration is None):
             for host in self.disable_turboboost_host_list:
                 if self._is_turboboost_supported(host):
                     # TODO: save previous state
@@ -62,7 +64,8 @@ class DisableTurboboostMixin(BaseSubConfigMixin):
         return description
 
     def remove_sub_configuration(self, config):
-        if self.params.disable_turboboost:
+        if (self.params.disable_turboboost and
+                self.next_sub_configuration is None):
             for host in self.disable_turboboost_host_list:
                 if self._is_turboboost_supported(host):
                     # TODO: restore previous state
@@ -1,6 +1,7 @@
 import copy
 
 from lnst.Common.Parameters import Param
+from lnst.Common.DeviceError import DeviceError
 from lnst.Controller.RecipeResults import ResultLevel
 from lnst.Recipes.ENRT.ConfigMixins.BaseSubConfigMixin import BaseSubConfigMixin
 
@@ -43,15 +44,18 @@ class OffloadSubConfigMixin(BaseSubConfigMixin):
 
         offload_settings = getattr(config, "offload_settings", None)
         if offload_settings:
-            ethtool_offload_string = ""
-            for name, value in list(offload_settings.items()):
-                ethtool_offload_string += " %s %s" % (name, value)
-
-            for nic in self.offload_nics:
-                nic.netns.run(
-                    "ethtool -K {} {}".format(nic.name, ethtool_offload_string),
-                    job_level=ResultLevel.NORMAL,
-                )
+            # features with the same value were kept from the previous
+            # sub configuration
+            previous_settings = getattr(
+                self.previous_sub_configuration, "offload_settings", None
+            ) or {}
+            changed_settings = {
+                name: value
+                for name, value in offload_settings.items()
+                if previous_settings.get(name) != value
+            }
+            if changed_settings:
+                self._set_offload_features(changed_settings)
 
     def generate_sub_configuration_description(self, config):
         description = super().generate_sub_configuration_description(config)
@@ -74,19 +78,41 @@ class OffloadSubConfigMixin(BaseSubConfigMixin):
     def remove_sub_configuration(self, config):
         offload_settings = getattr(config, "offload_settings", None)
         if offload_settings:
-            ethtool_offload_string = ""
-            for name, value in list(offload_settings.items()):
-                ethtool_offload_string += " %s %s" % (name, "on")
-
-            for nic in self.offload_nics:
-                # set all the offloads back to 'on' state
-                nic.netns.run(
-                    "ethtool -K {} {}".format(nic.name, ethtool_offload_string),
-                    job_level=ResultLevel.NORMAL,
-                )
+            # set the offloads back to 'on' state, except those the next
+            # sub configuration sets anyway
+            next_settings = getattr(
+                self.next_sub_configuration, "offload_settings", None
+            ) or {}
+            revert_settings = {
+                name: "on"
+                for name in offload_settings
+                if name not in next_settings
+            }
+            if revert_settings:
+                self._set_offload_features(revert_settings)
 
         return super().remove_sub_configuration(config)
 
+    def _set_offload_features(self, offload_settings):
+        settings_string = " ".join(
+            "{} {}".format(name, value)
+            for name, value in offload_settings.items()
+        )
+        for nic in self.offload_nics:
+            description = "Setting offload features of {}: {}".format(
+                nic.name, settings_string
+            )
+            try:
+                nic.set_offload_features(offload_settings)
+            except DeviceError as e:
+                self.add_result(
+                    False,
+                    "{} failed: {}".format(description, e),
+                    level=ResultLevel.NORMAL,
+                )
+            else:
+                self.add_result(True, description, level=ResultLevel.NORMAL)
+
     def generate_flow_combinations(self, config):
         for flows in super().generate_flow_combinations(config):
             if self._check_test_offload_conflicts(config, flows):
@@ -116,8 +116,8 @@ class IpsecEspAhCompRecipe(CommonHWSubConfigMixin, BaremetalEnrtRecipe,
     def remove_sub_configuration(self, config):
         ns1, ns2 = config.endpoint1.netns, config.endpoint2.netns
         for ns in (ns1, ns2):
-            ns.run("ip xfrm policy flush")
-            ns.run("ip xfrm state flush")
+            ns.run_batch(["ip xfrm policy flush", "ip xfrm state flush"],
+                         fail_fast=False)
         super().remove_sub_configuration(config)
 
     def generate_ping_configurations(self, config):
@@ -12,9 +12,22 @@ class FlowEndpointsStatCPUMeasurementGenerator(BaseMeasurementGenerator):
         combinations = super().generate_perf_measurements_combinations(config)
         for combination in combinations:
             cpu_measurement_hosts = self.extract_endpoints(config, combination)
-            yield [
-                self.params.cpu_perf_tool(cpu_measurement_hosts)
-            ] + combination
+            cpu_bind = self.cpu_measurement_cpupin(cpu_measurement_hosts)
+            if cpu_bind:
+                cpu_measurement = self.params.cpu_perf_tool(
+                    cpu_measurement_hosts, cpu_bind=cpu_bind
+                )
+            else:
+                cpu_measurement = self.params.cpu_perf_tool(cpu_measurement_hosts)
+            yield [cpu_measurement] + combination
+
+    def cpu_measurement_cpupin(self, hosts):
+        """
+        This method returns a dictionary of host to list of cpus the CPU
+        measurement tool of the host should be pinned to, None means no
+        pinning. The method can be overridden by a derived class.
+        """
+        return None
 
     def extract_endpoints(self, config, measurements):
         endpoints = set()
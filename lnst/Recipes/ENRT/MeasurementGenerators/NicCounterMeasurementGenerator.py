@@ -0,0 +1,85 @@
+from lnst.Common.Parameters import BoolParam, IntParam, ListParam, StrParam, DictParam
+
+from lnst.RecipeCommon.Perf.Evaluators import NicCounterLimitEvaluator
+from lnst.RecipeCommon.Perf.Measurements.BaseFlowMeasurement import BaseFlowMeasurement
+from lnst.RecipeCommon.Perf.Measurements.NicCounterMeasurement import NicCounterMeasurement
+
+from lnst.Recipes.ENRT.MeasurementGenerators.BaseMeasurementGenerator import BaseMeasurementGenerator
+
+
+class NicCounterMeasurementGenerator(BaseMeasurementGenerator):
+    """
+    Adds a :any:`NicCounterMeasurement` of the flow endpoint devices to every
+    measurement combination.
+
+    :param do_nic_counter_measurement:
+        (optional test parameter) enables the measurement, default False
+
+    :param nic_counter_interval:
+        (optional test parameter) sampling interval in milliseconds
+
+    :param nic_counters:
+        (optional test parameter) list of fnmatch patterns of the counters to
+        collect, all counters by default
+
+    :param nic_counter_limits:
+        (optional test parameter) dictionary of counter name patterns to the
+        maximum allowed increase per iteration evaluated by the
+        :any:`NicCounterLimitEvaluator`, e.g. {"stats64.rx_dropped": 0}
+    """
+    do_nic_counter_measurement = BoolParam(default=False)
+    nic_counter_interval = IntParam(default=1000)
+    nic_counters = ListParam(type=StrParam(), mandatory=False)
+    nic_counter_limits = DictParam(mandatory=False)
+
+    def generate_perf_measurements_combinations(self, config):
+        combinations = super().generate_perf_measurements_combinations(config)
+
+        if not self.params.do_nic_counter_measurement:
+            yield from combinations
+            return
+
+        for combination in combinations:
+            devices = self.extract_endpoint_devices(config, combination)
+            if not devices:
+                yield combination
+                continue
+
+            measurement = NicCounterMeasurement(
+                devices,
+                interval=self.params.nic_counter_interval,
+                counters=self.params.get("nic_counters", None),
+                cpu_bind=self.nic_counter_cpupin(devices),
+                recipe_conf=config,
+            )
+            yield [measurement] + combination
+
+    def nic_counter_cpupin(self, devices):
+        """
+        Returns a dictionary of host to list of cpus the counter monitors of
+        the host should be pinned to, by default the same cpus as the CPU
+        measurement tool. The method can be overridden by a derived class.
+        """
+        hosts = set(device.host for device in devices)
+        if hasattr(self, "cpu_measurement_cpupin"):
+            return self.cpu_measurement_cpupin(hosts)
+        return None
+
+    def extract_endpoint_devices(self, config, measurements):
+        devices = []
+        for measurement in measurements:
+            if not isinstance(measurement, BaseFlowMeasurement):
+                continue
+            for flow in measurement.flows:
+                for nic in [flow.generator_nic, flow.receiver_nic]:
+                    if hasattr(nic, "netns") and nic not in devices:
+                        devices.append(nic)
+        return devices
+
+    def evaluator_by_measurement(self, measurement):
+        if isinstance(measurement, NicCounterMeasurement):
+            if (self.params.perf_evaluation_strategy == "none" or
+                    not self.params.get("nic_counter_limits")):
+                return []
+            return [NicCounterLimitEvaluator(self.params.nic_counter_limits)]
+        return super().evaluator_by_measurement(measurement)
@@ -185,13 +185,14 @@ class OvSDPDKPvPRecipe(BasePvPRecipe):
             log_exc_traceback()
 
         try:
-            config.dut.host.run("ovs-ofctl del-flows br0")
+            commands = ["ovs-ofctl del-flows br0"]
             for vm_port, port_id in config.dut.vm_ports:
-                config.dut.host.run("ovs-vsctl del-port br0 {}".format(vm_port))
+                commands.append("ovs-vsctl del-port br0 {}".format(vm_port))
             for dpdk_port, port_id in config.dut.dpdk_ports:
-                config.dut.host.run("ovs-vsctl del-port br0 {}".format(dpdk_port))
-            config.dut.host.run("ovs-vsctl del-br br0")
-            config.dut.host.run("service openvswitch restart")
+                commands.append("ovs-vsctl del-port br0 {}".format(dpdk_port))
+            commands.append("ovs-vsctl del-br br0")
+            commands.append("service openvswitch restart")
+            config.dut.host.run_batch(commands, fail_fast=False)
 
             self.base_dpdk_deconfiguration(config.dut, ["openvswitch"])
         except:
@@ -285,12 +286,13 @@ class OvSDPDKPvPRecipe(BasePvPRecipe):
 
     def ovs_dpdk_bridge_flow_configuration(self, host_conf):
         host = host_conf.host
-        host.run("ovs-ofctl del-flows br0")
+        commands = ["ovs-ofctl del-flows br0"]
         for dpdk_port, vm_port in zip(host_conf.dpdk_ports, host_conf.vm_ports):
-            host.run("ovs-ofctl add-flow br0 in_port={},action={}"
-                     .format(dpdk_port[1], vm_port[1]))
-            host.run("ovs-ofctl add-flow br0 in_port={},action={}"
-                     .format(vm_port[1], dpdk_port[1]))
+            commands.append("ovs-ofctl add-flow br0 in_port={},action={}"
+                            .format(dpdk_port[1], vm_port[1]))
+            commands.append("ovs-ofctl add-flow br0 in_port={},action={}"
+                            .format(vm_port[1], dpdk_port[1]))
+        host.run_batch(commands, fail_fast=False)
 
     def guest_vfio_modprobe(self, guest_conf):
         guest = guest_conf.host
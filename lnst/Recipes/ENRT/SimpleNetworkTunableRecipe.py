@@ -12,6 +12,9 @@ from lnst.Recipes.ENRT.MeasurementGenerators.FlowEndpointsStatCPUMeasurementGene
 from lnst.Recipes.ENRT.MeasurementGenerators.LinuxPerfMeasurementGenerator import (
     LinuxPerfMeasurementGenerator,
 )
+from lnst.Recipes.ENRT.MeasurementGenerators.NicCounterMeasurementGenerator import (
+    NicCounterMeasurementGenerator,
+)
 
 from lnst.Recipes.ENRT.ConfigMixins.MultiCoalescingHWConfigMixin import (
     MultiCoalescingHWConfigMixin,
@@ -49,6 +52,7 @@ class SimpleNetworkTunableRecipe(
     BaseSimpleNetworkRecipe,
     BaremetalEnrtCommonMixins,
     FlowEndpointsStatCPUMeasurementGenerator,
+    NicCounterMeasurementGenerator,
     LinuxPerfMeasurementGenerator,
     FlowMeasurementMultiCpupinGenerator,
     BaseEnrtRecipe,
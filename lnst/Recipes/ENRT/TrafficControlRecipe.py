@@ -22,6 +22,11 @@ class TrafficControlRecipe(PerfRecipe):
     Recipe to evaluate the performance of `tc filter` rule installs
 
     Primarily targeted towards testing mlx cards which support hardware and software steering
+
+    The rules are generated on the agent and installed either with `tc -b`
+    (`insert_mode` "batch") or directly through netlink in batches of
+    `netlink_batch_size` rules (`insert_mode` "netlink"), which also reports
+    the insertion rate of every batch.
     """
 
     driver = StrParam(default="mlx5_core")
@@ -33,6 +38,8 @@ class TrafficControlRecipe(PerfRecipe):
     parallel_instances = IntParam(default=4)
     cpu_bind = ListParam(type=IntParam())
     cpu_bind_policy = ChoiceParam(type=StrParam, choices={"all", "round-robin"}, default="round-robin")
+    insert_mode = ChoiceParam(type=StrParam, choices={"batch", "netlink"}, default="batch")
+    netlink_batch_size = IntParam(default=1000)
 
     steering_mode = ChoiceParam(
         type=StrParam,
@@ -63,6 +70,8 @@ class TrafficControlRecipe(PerfRecipe):
             rules_per_instance=self.params.num_rules,
             cpu_bind=self.params.cpu_bind,
             cpu_bind_policy=self.params.cpu_bind_policy,
+            mode=self.params.insert_mode,
+            netlink_batch_size=self.params.netlink_batch_size,
         )
         config = TcRecipeConfiguration(
            measurements=[cpu_measurement, measurement],
@@ -200,10 +200,12 @@ class VhostNetPvPRecipe(BasePvPRecipe):
                 """     pidstring = sprintf("%s,%s", pidstring, $1) """
                 """ }}; """
                 """ END{ print pidstring }'""")
+        commands = []
         for pid, cpu in zip(vhost_pids.stdout.strip().split(','),
                             self.params.vhost_cpus.split(',')):
             mask = 1 << int(cpu)
-            host_conf.host.run('taskset -p {:x} {}'.format(mask, pid))
+            commands.append('taskset -p {:x} {}'.format(mask, pid))
+        host_conf.host.run_batch(commands, fail_fast=False)
 
     def host_forwarding_vm_deconfiguration(self, host_conf, guest_conf):
         """
@@ -82,10 +82,31 @@ class BaseTestModule(object):
                 raise TestModuleError("Unknown parameter {}".format(name))
 
         self._res_data = None
+        self._interim_sender = None
 
     def run(self):
         raise NotImplementedError("Method 'run' MUST be defined")
 
+    @property
+    def interim_enabled(self):
+        """True when the Job running the module streams interim records"""
+        return getattr(self, "_interim_sender", None) is not None
+
+    def emit_interim(self, record):
+        """sends an interim record to the Controller while the module runs
+
+        The record (any picklable object) is delivered to the interim
+        handlers of the Job on the Controller as soon as it's received. It's
+        only sent when the Controller enabled streaming for the Job, modules
+        can check interim_enabled to avoid preparing records nobody reads.
+        The final result of the module is not affected.
+        """
+        if self.interim_enabled:
+            self._interim_sender(record)
+
+    def _set_interim_sender(self, sender):
+        self._interim_sender = sender
+
     def wait_for_interrupt(self):
         def handler(signum, frame):
             raise InterruptException()
@@ -1,8 +1,9 @@
+import os
 import re
 import time
 import signal
 from time import sleep
-from lnst.Common.Parameters import IntParam
+from lnst.Common.Parameters import IntParam, ListParam
 from lnst.Tests.BaseTestModule import BaseTestModule, InterruptException
 
 def sigint_handler(signum, frame):
@@ -11,10 +12,16 @@ def sigint_handler(signum, frame):
 class CPUStatMonitor(BaseTestModule):
     #number of miliseconds to sleep between each sample
     interval = IntParam(default=1000)
+    #cpus the monitor process should run on, e.g. housekeeping cpus that
+    #aren't measured
+    cpu_bind = ListParam(type=IntParam())
 
     def run(self):
         self._res_data = {}
 
+        if "cpu_bind" in self.params and len(self.params.cpu_bind):
+            os.sched_setaffinity(0, self.params.cpu_bind)
+
         raw_samples = []
         old_handler = None
         try:
@@ -28,6 +35,9 @@ class CPUStatMonitor(BaseTestModule):
                         "timestamp": timestamp,
                         "stat": stat_lines
                         })
+                    if self.interim_enabled and len(raw_samples) > 1:
+                        self.emit_interim(
+                            self._process_samples(raw_samples[-2:])[0])
                     sleep(self.params.interval / float(1000))
         except InterruptException:
             pass
@@ -11,6 +11,7 @@ from lnst.Common.Parameters import (
 )
 from lnst.Common.Parameters import HostnameOrIpParam
 from lnst.Common.Utils import is_installed
+from lnst.Common.Samples import new_columns
 from lnst.Tests.BaseTestModule import BaseTestModule, TestModuleError
 
 
@@ -57,6 +58,9 @@ class IperfBase(BaseTestModule):
             logging.error(self._res_data["msg"])
             return False
 
+        self._res_data["samples"] = self._intervals_to_columns(
+            self._res_data["data"].pop("intervals")
+        )
         self._res_data["stderr"] = stderr
 
         if stderr != "":
@@ -72,6 +76,27 @@ class IperfBase(BaseTestModule):
 
         return True
 
+    def _intervals_to_columns(self, intervals):
+        """Converts the iperf "intervals" list to the lnst.Common.Samples
+        encoding
+
+        Returns a dictionary with the "start" column holding the start of each
+        interval relative to the test start and a "streams" list containing
+        "bytes" and "seconds" columns for each stream.
+        """
+        samples = new_columns(["start"])
+        samples["streams"] = [
+            new_columns(["bytes", "seconds"])
+            for _ in intervals[0]["streams"]
+        ]
+
+        for interval in intervals:
+            samples["start"].append(interval["sum"]["start"])
+            for columns, stream in zip(samples["streams"], interval["streams"]):
+                columns["bytes"].append(stream["bytes"])
+                columns["seconds"].append(stream["seconds"])
+        return samples
+
     def _check_json_sanity(self):
         data = self._res_data["data"]
         if "start" not in data:
@@ -9,10 +9,13 @@ from typing import Dict, TextIO, Union
 
 from lnst.Common.Parameters import HostnameOrIpParam, StrParam, IntParam, IpParam, ChoiceParam
 from lnst.Common.Utils import nullcontext
+from lnst.Common.Samples import rows_to_columns
 from lnst.Tests.BaseTestModule import BaseTestModule
 
 NEPER_OUT_RE = re.compile(r"^(?P<key>.*)=(?P<value>.*)$", flags=re.M)
 NEPER_PATH = pathlib.Path('/root/neper')
+# samples.csv columns needed by the controller, see lnst.Common.Samples
+NEPER_SAMPLE_COLUMNS = ("time", "transactions", "utime", "stime")
 
 
 class NeperBase(BaseTestModule):
@@ -88,7 +91,9 @@ class NeperBase(BaseTestModule):
                 return False
 
             if not self.is_crr_server():
-                self._res_data["samples"] = [r for r in csv.DictReader(sf)]
+                self._res_data["samples"] = rows_to_columns(
+                    csv.DictReader(sf), NEPER_SAMPLE_COLUMNS
+                )
 
         return True
 
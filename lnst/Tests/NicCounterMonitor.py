@@ -0,0 +1,161 @@
+import os
+import time
+import logging
+import signal
+import fnmatch
+from time import sleep
+from lnst.Common.Parameters import IntParam, ListParam, StrParam, BoolParam
+from lnst.Tests.BaseTestModule import BaseTestModule, InterruptException
+
+def sigint_handler(signum, frame):
+    raise InterruptException()
+
+class NicCounterMonitor(BaseTestModule):
+    """Samples network interface counters until interrupted by SIGINT
+
+    Each sample reads the IFLA_STATS64 counters of all the devices with a
+    single netlink dump, the driver statistics (ethtool -S, including the per
+    queue counters) of each device and the per cpu softnet statistics. The
+    result data is the list of counter deltas between consecutive samples.
+    """
+    devices = ListParam(type=StrParam(), mandatory=True)
+    #number of miliseconds to sleep between each sample
+    interval = IntParam(default=1000)
+    ethtool_stats = BoolParam(default=True)
+    softnet_stats = BoolParam(default=True)
+    #fnmatch patterns of counter names ("stats64.rx_dropped",
+    #"ethtool.rx_queue_*", "softnet.dropped", ...) to report, all by default
+    counters = ListParam(type=StrParam())
+    cpu_bind = ListParam(type=IntParam())
+
+    def run(self):
+        # pyroute2 is imported here so that the Controller doesn't have to
+        # load it with the measurement
+        from pyroute2 import IPRoute
+
+        self._res_data = {}
+
+        if "cpu_bind" in self.params and len(self.params.cpu_bind):
+            os.sched_setaffinity(0, self.params.cpu_bind)
+
+        samples = []
+        intervals = []
+        old_handler = None
+        self._ethtool = {}
+        self._ipr = IPRoute()
+        try:
+            old_handler = signal.signal(signal.SIGINT, sigint_handler)
+            while True:
+                samples.append(self._sample())
+                if len(samples) > 1:
+                    intervals.append(self._process_samples(*samples[-2:]))
+                    samples.pop(0)
+                    if self.interim_enabled:
+                        self.emit_interim(intervals[-1])
+                sleep(self.params.interval / float(1000))
+        except InterruptException:
+            pass
+        finally:
+            if old_handler is not None:
+                signal.signal(signal.SIGINT, old_handler)
+            self._ipr.close()
+            for ethtool in self._ethtool.values():
+                if ethtool is not None:
+                    ethtool.close()
+
+        self._res_data["data"] = intervals
+
+        return True
+
+    def _sample(self):
+        timestamp = time.time()
+        devices = {ifname: {} for ifname in self.params.devices}
+
+        for link in self._ipr.get_links():
+            ifname = link.get_attr("IFLA_IFNAME")
+            if ifname not in devices:
+                continue
+            stats = link.get_attr("IFLA_STATS64")
+            if stats is not None:
+                devices[ifname].update(
+                    self._filter("stats64", dict(stats)))
+
+        if self.params.ethtool_stats:
+            for ifname in devices:
+                devices[ifname].update(self._filter(
+                    "ethtool", self._ethtool_stats(ifname)))
+
+        softnet = {}
+        if self.params.softnet_stats:
+            softnet = self._softnet_stats()
+
+        return {"timestamp": timestamp, "devices": devices,
+                "softnet": softnet}
+
+    def _ethtool_stats(self, ifname):
+        from pyroute2.ethtool.ioctl import IoctlEthtool, NotSupportedError
+
+        if ifname in self._ethtool and self._ethtool[ifname] is None:
+            return {}
+
+        try:
+            if ifname not in self._ethtool:
+                self._ethtool[ifname] = IoctlEthtool(ifname)
+            return dict(self._ethtool[ifname].get_statistics())
+        except (OSError, NotSupportedError) as e:
+            # no driver statistics, e.g. loopback or removed device
+            logging.debug("No driver statistics of {}: {}".format(ifname, e))
+            ethtool = self._ethtool.get(ifname)
+            if ethtool is not None:
+                ethtool.close()
+            self._ethtool[ifname] = None
+            return {}
+
+    def _softnet_stats(self):
+        result = {}
+        with open("/proc/net/softnet_stat") as f:
+            for i, line in enumerate(f):
+                fields = [int(x, 16) for x in line.split()]
+                cpu = fields[12] if len(fields) > 12 else i
+                result["cpu%d" % cpu] = self._filter("softnet", {
+                    "processed": fields[0],
+                    "dropped": fields[1],
+                    "time_squeeze": fields[2],
+                })
+        return result
+
+    def _filter(self, source, counters):
+        result = {}
+        patterns = self.params.get("counters")
+        for name, value in counters.items():
+            key = "%s.%s" % (source, name)
+            if patterns and not any(fnmatch.fnmatchcase(key, p)
+                                    for p in patterns):
+                continue
+            result[key] = value
+        return result
+
+    def _process_samples(self, prev_sample, sample):
+        return {
+            "timestamp": prev_sample["timestamp"],
+            "duration": sample["timestamp"] - prev_sample["timestamp"],
+            "devices": self._subtract_nested_dicts(sample["devices"],
+                                                   prev_sample["devices"]),
+            "softnet": self._subtract_nested_dicts(sample["softnet"],
+                                                   prev_sample["softnet"]),
+        }
+
+    def _subtract_nested_dicts(self, first, second):
+        result = {}
+        for key, val in list(first.items()):
+            if key not in second:
+                continue
+            if isinstance(val, dict):
+                result[key] = self._subtract_nested_dicts(val, second[key])
+            else:
+                delta = val - second[key]
+                if delta < 0:
+                    # counter wrapped, softnet counters are 32 bit
+                    delta += 2**32 if second[key] < 2**32 else 2**64
+                result[key] = delta
+        return result
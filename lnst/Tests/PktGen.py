@@ -1,9 +1,11 @@
+import os
 import re
+import math
 import time
 import logging
 from subprocess import Popen
 from threading import Thread
-from typing import Iterator, Union
+from typing import Optional, Union
 
 from lnst.Common.Utils import kmod_loaded
 from lnst.Common.IpAddress import Ip4Address
@@ -12,100 +14,88 @@ from lnst.Common.Parameters import IntParam, IpParam, StrParam, ListParam, Devic
 
 
 class PktGenResultsSampler:
-    def __init__(self, devs: list[str], duration: int) -> None:
+    SOFAR_RE = re.compile(rb"sofar:\s*(\d+)\s+errors:\s*(\d+)")
+
+    def __init__(self, devs: list[str], duration: int, interval: float = 1.0) -> None:
         """
-        PktGen output is just a table with current stats of devices. Therefore,
-        each device has a separate thread that captures current status of device
-        each second for `duration`.
+        PktGen output is just a table with current stats of devices. A single
+        thread reads the current status of all devices every `interval`
+        seconds for `duration`. The ticks are scheduled on absolute deadlines
+        of the monotonic clock, so the sampling doesn't drift.
         """
         self._devs = devs
         self._duration = duration
+        self._interval = interval
 
-        self._sampling_threads: list[Thread] = []
-        self._raw_samples = {}
+        self._sampling_thread: Optional[Thread] = None
+        # device -> list of (timestamp, packets sofar, errors)
+        self._raw_samples: dict[str, list[tuple[float, int, int]]] = {}
 
     def start_sampling(self):
         """
         This is a separate method just to emphasize that pktgen
         needs to be started immediately after the start of sampling.
         """
-        self._setup_capturing()
-
-        for thread in self._sampling_threads:
-            thread.start()
-
-    def _setup_capturing(self):
-        for device in self._devs:
-            thread = Thread(target=self._read_dev_samples, args=(device,))
-            self._sampling_threads.append(thread)
-
-    def _read_dev_samples(self, device: str):
-        self._raw_samples[device] = []
-
-        for _ in range(0, self._duration + 1):  # +1 because first sample is "empty"
-            with open(f"/proc/net/pktgen/{device}", "r") as file:
-                self._raw_samples[device].append((time.time(), file.read()))
-                # TODO: ^^^ when upgrading to python interpreter without GIL check thread safety
-                # NOTE: samples are saved at it's end => the timestamp represents ending time, not the start
-            time.sleep(1)
+        self._raw_samples = {device: [] for device in self._devs}
+        self._sampling_thread = Thread(target=self._read_samples)
+        self._sampling_thread.start()
+
+    def _read_samples(self):
+        fds = {device: os.open(f"/proc/net/pktgen/{device}", os.O_RDONLY) for device in self._devs}
+        try:
+            # wall clock time of the monotonic clock start, samples get precise
+            # timestamps without reading both clocks on every tick
+            start = time.monotonic()
+            wall_start = time.time()
+            end = start + self._duration
+            tick = 0
+
+            while True:
+                for device, fd in fds.items():
+                    now = time.monotonic()
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    match = self.SOFAR_RE.search(os.read(fd, 8192))
+                    if not match:
+                        raise TestModuleError(f"Could not parse pktgen device {device} output")
+                    self._raw_samples[device].append(
+                        (wall_start + now - start, int(match.group(1)), int(match.group(2)))
+                    )
+
+                now = time.monotonic()
+                if now >= end:
+                    break
+                tick = max(tick + 1, math.ceil((now - start) / self._interval))
+                deadline = min(start + tick * self._interval, end)
+                time.sleep(deadline - now)
+        finally:
+            for fd in fds.values():
+                os.close(fd)
 
     @property
-    def device_samples(self) -> dict[str, list[dict[str, Union[float, int, dict]]]]:
-        for thread in self._sampling_threads:
-            thread.join(timeout=2)
+    def device_samples(self) -> dict[str, list[dict[str, Union[float, int]]]]:
+        if self._sampling_thread is not None:
+            self._sampling_thread.join(timeout=self._interval + 1)
 
         samples = {}
         for device in self._devs:
             samples[device] = []
-            packets_sofar = 0
-            start_timestamp = self._raw_samples[device][0][0]  # first "empty" sample
-            # NOTE: sample's timestamp represent the end of sampling
-            # so each sample actually starts at the timestamp of previous sample
-
-            for timestamp, raw_sample in self._raw_samples[device][
-                1:
-            ]:  # ignore first empty sample
-                params, current = self._split_output(raw_sample)
-                current = self._parse_values(current)
-
-                packets = int(current["sofar"]) - packets_sofar
-
+            raw_samples = self._raw_samples.get(device, [])
+            # first sample is "empty", each sample starts at the timestamp of
+            # the previous one
+            for (start_timestamp, start_sofar, _), (timestamp, sofar, errors) in zip(
+                raw_samples, raw_samples[1:]
+            ):
                 samples[device].append(
                     {
                         "timestamp": start_timestamp,
                         "duration": timestamp - start_timestamp,
-                        "packets": packets,
-                        "errors": int(current["errors"]),
-                        "params": params,
+                        "packets": sofar - start_sofar,
+                        "errors": errors,
                     }
                 )
-                packets_sofar += packets
-                start_timestamp = timestamp
 
         return samples
 
-    def _read_dev_outputs(self) -> Iterator[tuple[str, str]]:
-        for device in self._devs:
-            output = ""
-            with open(f"/proc/net/pktgen/{device}", "r") as f:
-                output = f.readlines()
-            yield device, "\n".join(output)
-
-    def _split_output(self, output: str) -> tuple:
-        match = re.search(r"Params:(.+)Current:(.+)Result:\s(?:\w+)", output, re.DOTALL)
-        if not match:
-            raise TestModuleError(f"Could not parse pktgen devide output: {output}")
-
-        return match.groups()
-
-    def _parse_values(self, params) -> dict[str, str]:
-        values = {}
-
-        for key, value in re.findall(r"(\w+):?\s(\S+)", params, re.MULTILINE):
-            values[key.lower()] = value
-
-        return values
-
 
 class PktGen(BaseTestModule):
     """
@@ -129,6 +119,8 @@ class PktGen(BaseTestModule):
     burst = IntParam(default=8)
 
     duration = IntParam(default=60)
+    # number of miliseconds between the samples of device statistics
+    sample_interval = IntParam(default=1000)
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -145,7 +137,9 @@ class PktGen(BaseTestModule):
         self._pg_ctrl("reset")
         self._configure_generator()
 
-        output_parser = PktGenResultsSampler(self._devices, self.params.duration)
+        output_parser = PktGenResultsSampler(
+            self._devices, self.params.duration, self.params.sample_interval / 1000
+        )
         output_parser.start_sampling()
 
         logging.debug("Starting generator")
@@ -1,19 +1,42 @@
 import itertools
 import logging
+import os
 import shutil
 import asyncio
+import tempfile
 import time
 from typing import Iterator, Optional
 
-from lnst.Common.Parameters import ChoiceParam, IntParam, StrParam, ListParam
-from lnst.Tests.BaseTestModule import BaseTestModule
+from lnst.Common.Parameters import ChoiceParam, DictParam, IntParam, StrParam, ListParam
+from lnst.Common.TcRules import FlowerRuleInserter, TcRulesError, write_batchfile
+from lnst.Tests.BaseTestModule import BaseTestModule, TestModuleError
 
 
 class TrafficControlRunner(BaseTestModule):
-    batchfiles = ListParam(type=StrParam(), mandatory=True)
+    """Installs tc filter rules with parallel instances
+
+    Each instance either runs `tc -b` with one of the `batchfiles` or
+    installs one of the `rule_sets` (see :mod:`lnst.Common.TcRules`). Rule
+    sets are expanded on the agent, in the "batch" mode to a temporary batch
+    file for `tc -b`, in the "netlink" mode directly to netlink messages that
+    are sent in batches of `netlink_batch_size` rules, the result of such an
+    instance then contains the insertion time of every batch.
+    """
+    batchfiles = ListParam(type=StrParam())
+    rule_sets = ListParam(type=DictParam())
+    mode = ChoiceParam(type=StrParam, choices={"batch", "netlink"}, default="batch")
+    netlink_batch_size = IntParam(default=1000)
     cpu_bind = ListParam(type=IntParam())
     cpu_bind_policy = ChoiceParam(type=StrParam, choices={"all", "round-robin"}, default="round-robin")
 
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+
+        if ("batchfiles" in self.params) == ("rule_sets" in self.params):
+            raise TestModuleError("Exactly one of batchfiles and rule_sets is required")
+        if self.params.mode == "netlink" and "rule_sets" not in self.params:
+            raise TestModuleError("The netlink mode requires rule_sets")
+
     def run(self) -> bool:
         self._res_data = {}
         instance_results = asyncio.run(self.run_instances())
@@ -24,7 +47,10 @@ class TrafficControlRunner(BaseTestModule):
         msgs = []
         for result in instance_results:
             if not result["success"]:
-                msg = f"tc -b {result['batchfile']} failed"
+                if result.get("batchfile"):
+                    msg = f"tc -b {result['batchfile']} failed"
+                else:
+                    msg = f"netlink rule insertion on {result['dev']} failed"
                 logging.warning(msg)
                 logging.error(result["stderr"])
                 msgs.append(msg)
@@ -34,16 +60,77 @@ class TrafficControlRunner(BaseTestModule):
         return all_success
 
     async def run_instances(self) -> list[dict]:
-        tc_exec = shutil.which("tc")
         cpu_bind_gen = self._get_cpu_bind_generator()
 
-        instances = [
-            self.run_tc(tc_exec, bf, cpu_bind=next(cpu_bind_gen))
-            for bf in self.params.batchfiles
-        ]
-        results = await asyncio.gather(*instances)
+        if self.params.mode == "netlink":
+            instances = [
+                asyncio.to_thread(self.run_netlink, rule_set, cpu_bind=next(cpu_bind_gen))
+                for rule_set in self.params.rule_sets
+            ]
+            return await asyncio.gather(*instances)
+
+        tc_exec = shutil.which("tc")
+        batchfiles = self.params.get("batchfiles")
+        tmp_files = []
+        if batchfiles is None:
+            batchfiles = tmp_files = [self._write_batchfile(rule_set) for rule_set in self.params.rule_sets]
+
+        try:
+            instances = [
+                self.run_tc(tc_exec, bf, cpu_bind=next(cpu_bind_gen))
+                for bf in batchfiles
+            ]
+            results = await asyncio.gather(*instances)
+        finally:
+            for path in tmp_files:
+                os.unlink(path)
         return results
 
+    @staticmethod
+    def _write_batchfile(rule_set: dict) -> str:
+        fd, path = tempfile.mkstemp(suffix=".batch", prefix="tc-rules-")
+        os.close(fd)
+        logging.debug(f"Writing {rule_set['count']} tc rules for {rule_set['dev']} to {path}")
+        return write_batchfile(rule_set, path)
+
+    def run_netlink(
+        self,
+        rule_set: dict,
+        cpu_bind: Optional[list[int]] = None,
+    ) -> dict[str]:
+        if cpu_bind is not None:
+            # applies to the calling thread only
+            os.sched_setaffinity(0, cpu_bind)
+
+        start_timestamp = time.time()
+        start_time = time.perf_counter()
+        try:
+            with FlowerRuleInserter(self.params.netlink_batch_size) as inserter:
+                batches = inserter.insert(rule_set)
+            stderr = ""
+        except (TcRulesError, OSError) as e:
+            batches = []
+            stderr = str(e)
+        elapsed = time.perf_counter() - start_time
+
+        errors = {}
+        for batch in batches:
+            for name, count in batch["errors"].items():
+                errors[name] = errors.get(name, 0) + count
+        if errors:
+            stderr = ", ".join(f"{count} rules failed with {name}" for name, count in errors.items())
+
+        return dict(
+            time_taken=elapsed,
+            start_timestamp=start_timestamp,
+            success=not stderr,
+            stdout="",
+            stderr=stderr,
+            batchfile=None,
+            dev=rule_set.get("dev"),
+            batches=batches,
+        )
+
     async def run_tc(
         self,
         tc_exec: str,
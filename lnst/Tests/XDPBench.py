@@ -4,6 +4,7 @@ import signal
 import logging
 from subprocess import Popen, PIPE
 from threading import Thread
+from typing import Callable, Optional
 from lnst.Devices.Device import Device
 
 from lnst.Tests.BaseTestModule import BaseTestModule, TestModuleError
@@ -16,54 +17,66 @@ from lnst.Common.Parameters import (
 
 
 class XDPBenchOutputParser:
-    def __init__(self, process: Popen):
+    LINE_RE = re.compile(r"Summary\s+([\d,]+)\srx/s\s+([\d,]+)\serr/s?")
+
+    def __init__(self, process: Popen, sample_callback: Optional[Callable[[dict], None]] = None):
+        """
+        The output of xdp-bench is parsed line by line as it's printed, only
+        the numeric values of the samples are kept. The sample_callback is
+        called with every parsed sample.
+        """
         self._process = process
-        self._raw_samples = []
-        self._capturing_start = 0
+        self._sample_callback = sample_callback
+        # list of (timestamp, duration, rx, err)
+        self._samples: list[tuple[float, float, int, int]] = []
+        self._thread: Optional[Thread] = None
 
     def start_sampling(self):
-        thread = Thread(target=self._capture_output)
-        thread.start()
-        self._capturing_start = time.time()
+        self._thread = Thread(target=self._capture_output)
+        self._thread.start()
 
     def _capture_output(self):
+        # each sample covers the time since the previous line, the timestamps
+        # are derived from the monotonic clock
+        start = time.monotonic()
+        wall_start = time.time()
+        previous = start
         try:
-            for sample in iter(self._process.stdout.readline, ""):
-                self._raw_samples.append((time.time(), sample.decode()))
+            for line in iter(self._process.stdout.readline, b""):
+                now = time.monotonic()
+                try:
+                    rx, err = self._parse_line(line.decode())
+                except ValueError:
+                    if line.strip():  # ignore empty lines
+                        logging.error(f"Could not parse line: '{line.decode()}'")
+                    continue
+
+                sample = (wall_start + previous - start, now - previous, rx, err)
+                self._samples.append(sample)
+                previous = now
+
+                if self._sample_callback is not None:
+                    self._sample_callback(self._sample_to_dict(sample))
         except ValueError:
             pass  # .readline raises exception on killing xdp-bench subprocess
 
     def parse_output(self) -> list[dict]:
-        _, stderr = self._process.communicate()
+        self._process.wait()
+        if self._thread is not None:
+            self._thread.join()
 
-        logging.debug("Stderr of xdp-bench:")
-        logging.debug(str(stderr))
-
-        results = []
-        previous_timestamp = self._capturing_start
-
-        for timestamp, sample in self._raw_samples:
-            try:
-                rx, err = self._parse_line(sample)
-            except ValueError:
-                if sample:  # ignore empty lines
-                    logging.error(f"Could not parse line: '{sample}'")
-                continue
-
-            duration = timestamp - previous_timestamp
-            results.append(
-                {"rx": rx, "err": err, "duration": duration, "timestamp": timestamp}
-            )
-
-            previous_timestamp = timestamp
-
-        if not results:
+        if not self._samples:
             raise TestModuleError("Could not get xdp-bench output")
 
-        return results
+        return [self._sample_to_dict(sample) for sample in self._samples]
+
+    @staticmethod
+    def _sample_to_dict(sample: tuple[float, float, int, int]) -> dict:
+        timestamp, duration, rx, err = sample
+        return {"rx": rx, "err": err, "duration": duration, "timestamp": timestamp}
 
     def _parse_line(self, line: str) -> tuple:
-        match = re.search(r"Summary\s+([\d,]+)\srx/s\s+([\d,]+)\serr/s?", line)
+        match = self.LINE_RE.search(line)
 
         if not match:  # skip summary line at the end + corrupted lines
             raise ValueError("Invalid line format")
@@ -130,7 +143,9 @@ class XDPBench(BaseTestModule):
         command = self._prepare_command()
 
         bench = Popen(command, stdout=PIPE)
-        output_parser = XDPBenchOutputParser(bench)
+        output_parser = XDPBenchOutputParser(
+            bench, self.emit_interim if self.interim_enabled else None
+        )
         output_parser.start_sampling()
         time.sleep(self.params.duration)
 
@@ -0,0 +1,41 @@
+import os
+import time
+import threading
+from unittest import TestCase
+
+from lnst.Agent.ForkGuard import fork_guard
+
+
+class ForkGuardTest(TestCase):
+    def fork_and_wait(self):
+        pid = os.fork()
+        if pid == 0:
+            # the guard is usable in the child
+            with fork_guard.section():
+                pass
+            os._exit(0)
+        os.waitpid(pid, 0)
+
+    def test_fork_waits_for_section(self):
+        events = []
+        entered = threading.Event()
+
+        def hold_section():
+            with fork_guard.section():
+                events.append("enter")
+                entered.set()
+                time.sleep(0.2)
+                events.append("leave")
+
+        holder = threading.Thread(target=hold_section)
+        holder.start()
+        entered.wait()
+        self.fork_and_wait()
+        events.append("forked")
+        holder.join()
+
+        self.assertEqual(events, ["enter", "leave", "forked"])
+
+    def test_fork_in_own_section(self):
+        with fork_guard.section():
+            self.fork_and_wait()
@@ -0,0 +1,152 @@
+import os
+import signal
+import logging
+from unittest import TestCase
+
+from lnst.Agent.Job import Job, JobWorkerPool, ShellBatchJob
+
+
+class FakeLogCtl(object):
+    transmit_handler = None
+
+    def disable_logging(self):
+        pass
+
+    def set_connection(self, target):
+        self.transmit_handler = logging.Handler()
+
+
+class JobWorkerPoolTest(TestCase):
+    def setUp(self):
+        self.pool = JobWorkerPool(FakeLogCtl())
+        self.job_ids = iter(range(1, 100))
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def start_job(self, command):
+        what = {"job_id": next(self.job_ids), "type": "shell",
+                "command": command, "json": False, "pooled": True}
+        job = Job(what, FakeLogCtl(), self.pool)
+        job.run()
+        return job
+
+    def wait_started(self, job):
+        msg = job.get_parent_pipe().recv()
+        self.assertEqual(msg["type"], "job_started")
+        self.assertEqual(msg["job_id"], job.get_id())
+        job.set_started(msg["pid"])
+        return msg["pid"]
+
+    def wait_finished(self, job):
+        msg = job.get_parent_pipe().recv()
+        self.assertEqual(msg["type"], "job_finished")
+        self.assertEqual(msg["job_id"], job.get_id())
+        job.set_finished(msg["result"])
+        return msg["result"]
+
+    def run_job(self, command):
+        job = self.start_job(command)
+        pid = self.wait_started(job)
+        return job, pid, self.wait_finished(job)
+
+    def test_worker_reused(self):
+        job1, pid1, res1 = self.run_job("echo 1")
+        job2, pid2, res2 = self.run_job("echo 2")
+
+        self.assertTrue(res1["passed"])
+        self.assertEqual(res2["res_data"]["stdout"], "2\n")
+        self.assertIs(job1._worker, job2._worker)
+        # every job gets its own process
+        self.assertNotEqual(pid1, pid2)
+        self.assertNotIn(job1._worker.pid, (pid1, pid2))
+
+    def test_concurrent_jobs(self):
+        long_job = self.start_job("sleep 0.5")
+        self.wait_started(long_job)
+        _, _, res = self.run_job("echo 2")
+
+        self.assertTrue(res["passed"])
+        self.assertFalse(long_job._finished)
+        self.assertEqual(len(self.pool._workers), 2)
+
+        self.assertTrue(self.wait_finished(long_job)["passed"])
+        # only one idle worker is kept
+        self.assertEqual(len(self.pool._workers), 1)
+
+    def test_kill_job_only(self):
+        job = self.start_job("sleep 30")
+        self.wait_started(job)
+        worker = job._worker
+
+        self.assertTrue(job.kill(signal.SIGINT))
+        res = self.wait_finished(job)
+
+        self.assertFalse(res["passed"])
+        self.assertEqual(res["res_data"],
+                         "Job killed by signal %d" % signal.SIGINT)
+        self.assertTrue(worker.is_alive())
+        next_job, _, res = self.run_job("echo 2")
+        self.assertIs(next_job._worker, worker)
+        self.assertTrue(res["passed"])
+
+    def test_kill_before_started(self):
+        job = self.start_job("sleep 30")
+        self.assertTrue(job.kill(signal.SIGKILL))
+        self.wait_started(job)
+        res = self.wait_finished(job)
+
+        self.assertEqual(res["res_data"],
+                         "Job killed by signal %d" % signal.SIGKILL)
+        self.assertTrue(job._worker.is_alive())
+
+    def test_inherited_workers_dropped(self):
+        job, _, _ = self.run_job("true")
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                if self.pool.acquire() is not job._worker:
+                    status = 0
+            finally:
+                os._exit(status)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.WEXITSTATUS(status), 0)
+
+
+class ShellBatchJobTest(TestCase):
+    def run_batch(self, commands, fail_fast=True, parallel=1):
+        job = ShellBatchJob({"type": "shell_batch", "commands": commands,
+                             "fail_fast": fail_fast, "parallel": parallel})
+        job.run()
+        return job.get_result()
+
+    def test_sequential(self):
+        res = self.run_batch(["echo 1", "echo 2"])
+
+        self.assertTrue(res["passed"])
+        self.assertEqual([(r["stdout"], r["retval"])
+                          for r in res["res_data"]["results"]],
+                         [("1\n", 0), ("2\n", 0)])
+
+    def test_fail_fast(self):
+        res = self.run_batch(["echo 1", "exit 3", "echo 2"])
+
+        self.assertFalse(res["passed"])
+        self.assertEqual([r["retval"] for r in res["res_data"]["results"]],
+                         [0, 3, None])
+
+    def test_run_all(self):
+        res = self.run_batch(["exit 3", "echo 2"], fail_fast=False)
+
+        self.assertFalse(res["passed"])
+        self.assertEqual([r["retval"] for r in res["res_data"]["results"]],
+                         [3, 0])
+
+    def test_parallel(self):
+        res = self.run_batch(["sleep 0.3; echo %d" % i for i in range(4)],
+                             parallel=4)
+
+        self.assertTrue(res["passed"])
+        self.assertEqual([r["stdout"] for r in res["res_data"]["results"]],
+                         ["%d\n" % i for i in range(4)])
@@ -0,0 +1,91 @@
+import os
+import errno
+import ctypes
+import threading
+from unittest import TestCase, skipUnless
+from unittest.mock import patch
+
+from lnst.Agent import NetNamespace
+from lnst.Agent.NetNamespace import (
+    enter_new_netns,
+    remove_netns,
+    netns_path,
+    CLONE_NEWNS,
+)
+
+
+class FailingLibc(object):
+    def __init__(self, libc, flags):
+        self._libc = libc
+        self._flags = flags
+
+    def __getattr__(self, name):
+        return getattr(self._libc, name)
+
+    def unshare(self, flags):
+        if flags == self._flags:
+            ctypes.set_errno(errno.EPERM)
+            return -1
+        return self._libc.unshare(flags)
+
+
+@skipUnless(os.geteuid() == 0, "creating network namespaces requires root")
+class NetNamespaceTest(TestCase):
+    def setUp(self):
+        self.netns = "lnst-test-%d" % os.getpid()
+
+    def tearDown(self):
+        if os.path.exists(netns_path(self.netns)):
+            remove_netns(self.netns)
+
+    def run_in_thread(self, func):
+        res = {}
+
+        def run():
+            try:
+                enter_new_netns(self.netns, thread=True)
+                res["result"] = func()
+            except Exception as e:
+                res["exception"] = e
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+        return res
+
+    def thread_state(self):
+        return (os.readlink("/proc/thread-self/ns/net"),
+                sorted(os.listdir("/sys/class/net")))
+
+    def test_thread_netns(self):
+        root_state = self.thread_state()
+        res = self.run_in_thread(self.thread_state)
+
+        self.assertNotIn("exception", res)
+        netns_link, devices = res["result"]
+        self.assertNotEqual(netns_link, root_state[0])
+        self.assertEqual(devices, ["lo"])
+        # only the thread was moved
+        self.assertEqual(self.thread_state(), root_state)
+        self.assertTrue(os.path.exists(netns_path(self.netns)))
+
+        remove_netns(self.netns)
+        self.assertFalse(os.path.exists(netns_path(self.netns)))
+
+    def test_existing_netns(self):
+        self.run_in_thread(lambda: None)
+        res = self.run_in_thread(lambda: None)
+
+        self.assertIn("already exists", str(res["exception"]))
+
+    def test_unshare_failure(self):
+        root_state = self.thread_state()
+        libc = NetNamespace._libc()
+        with patch.object(NetNamespace, "_libc",
+                          lambda: FailingLibc(libc, CLONE_NEWNS)):
+            res = self.run_in_thread(lambda: None)
+
+        self.assertIsInstance(res["exception"], OSError)
+        self.assertEqual(res["exception"].errno, errno.EPERM)
+        self.assertFalse(os.path.exists(netns_path(self.netns)))
+        self.assertEqual(self.thread_state(), root_state)
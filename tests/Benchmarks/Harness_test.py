@@ -0,0 +1,61 @@
+from unittest import TestCase
+
+from lnst.Benchmarks.Harness import BaseBenchmark, BenchmarkResult
+from lnst.Benchmarks.Harness import BenchmarkRunner, compare_results
+
+
+class CountingBenchmark(BaseBenchmark):
+    name = "counting"
+
+    def setup(self):
+        self.count = 0
+        self.torn_down = False
+
+    def run(self):
+        self.count += 1
+
+    def teardown(self):
+        self.torn_down = True
+
+
+class BenchmarkRunnerTest(TestCase):
+    def test_run(self):
+        benchmark = CountingBenchmark()
+        result = BenchmarkRunner(repeat=3, min_time=0.001).run(benchmark)
+
+        self.assertEqual(len(result.samples), 3)
+        self.assertGreaterEqual(benchmark.count, 3 * result.number)
+        self.assertTrue(benchmark.torn_down)
+
+
+class CompareResultsTest(TestCase):
+    def result(self, median, spread=0.0):
+        return BenchmarkResult("bench", [median - spread, median,
+                                         median + spread], 1)
+
+    def status(self, current, reference, **kwargs):
+        comparisons = compare_results({"bench": current},
+                                      {"bench": reference}, **kwargs)
+        return comparisons[0].status
+
+    def test_regression(self):
+        self.assertEqual(self.status(self.result(1.5), self.result(1.0)),
+                         "regression")
+
+    def test_improvement(self):
+        self.assertEqual(self.status(self.result(0.5), self.result(1.0)),
+                         "improvement")
+
+    def test_within_threshold(self):
+        self.assertEqual(self.status(self.result(1.05), self.result(1.0)),
+                         "unchanged")
+
+    def test_within_noise(self):
+        self.assertEqual(self.status(self.result(1.5, 0.5), self.result(1.0)),
+                         "unchanged")
+
+    def test_new_and_missing(self):
+        comparisons = compare_results({"new": self.result(1.0)},
+                                      {"old": self.result(1.0)})
+        self.assertEqual([(c.name, c.status) for c in comparisons],
+                         [("new", "new"), ("old", "missing")])
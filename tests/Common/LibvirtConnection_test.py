@@ -0,0 +1,109 @@
+import sys
+import threading
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import patch
+
+from lnst.Common import LibvirtConnection as libvirt_connection
+from lnst.Common.LibvirtConnection import (
+    LibvirtConnection,
+    LibvirtConnectionError,
+    get_libvirt_connection,
+)
+
+
+class FakeConnect(object):
+    def __init__(self):
+        self.domain_callbacks = {}
+        self.network_callbacks = {}
+
+    def domainEventRegisterAny(self, dom, event_id, callback, opaque):
+        self.domain_callbacks[event_id] = callback
+
+    def networkEventRegisterAny(self, net, event_id, callback, opaque):
+        self.network_callbacks[event_id] = callback
+
+
+def fake_libvirt():
+    stop = threading.Event()
+    return SimpleNamespace(
+        virEventRegisterDefaultImpl=lambda: None,
+        virEventRunDefaultImpl=lambda: stop.wait(),
+        open=lambda uri: FakeConnect(),
+        VIR_DOMAIN_EVENT_ID_LIFECYCLE=0,
+        VIR_DOMAIN_EVENT_ID_REBOOT=1,
+        VIR_DOMAIN_EVENT_ID_DEVICE_ADDED=2,
+        VIR_DOMAIN_EVENT_ID_DEVICE_REMOVED=3,
+        VIR_DOMAIN_EVENT_ID_DEVICE_REMOVAL_FAILED=4,
+        VIR_NETWORK_EVENT_ID_LIFECYCLE=0,
+        VIR_DOMAIN_EVENT_STARTED=2,
+        VIR_DOMAIN_EVENT_STOPPED=5,
+        VIR_NETWORK_EVENT_DEFINED=0,
+        VIR_NETWORK_EVENT_UNDEFINED=1,
+        VIR_NETWORK_EVENT_STARTED=2,
+        VIR_NETWORK_EVENT_STOPPED=3,
+    )
+
+
+class LibvirtConnectionTest(TestCase):
+    def setUp(self):
+        modules_patch = patch.dict(sys.modules, {"libvirt": fake_libvirt()})
+        modules_patch.start()
+        self.addCleanup(modules_patch.stop)
+        self.conn = LibvirtConnection()
+        self.fake_conn = self.conn.conn
+
+    def domain_event(self, event_id, name, *args):
+        callback = self.fake_conn.domain_callbacks[event_id]
+        dom = SimpleNamespace(name=lambda: name)
+        callback(self.fake_conn, dom, *args)
+
+    def test_wait_for_events(self):
+        mark = self.conn.event_mark()
+        self.domain_event(0, "guest1", 2, 0, None)
+        self.domain_event(2, "guest1", "net1", None)
+
+        self.conn.wait_for_events(mark, [("lifecycle", "guest1", "started"),
+                                         ("device-added", "guest1", None)],
+                                  timeout=1)
+
+    def test_wait_from_other_thread(self):
+        mark = self.conn.event_mark()
+        timer = threading.Timer(0.1, self.domain_event,
+                                (3, "guest1", "net1", None))
+        timer.start()
+        self.conn.wait_for_events(mark, [("device-removed", "guest1", "net1")],
+                                  timeout=5)
+        timer.join()
+
+    def test_events_before_mark_ignored(self):
+        self.domain_event(1, "guest1", None)
+        mark = self.conn.event_mark()
+
+        with self.assertRaises(LibvirtConnectionError):
+            self.conn.wait_for_events(mark, [("reboot", "guest1", None)],
+                                      timeout=0.1)
+
+    def test_failure_event(self):
+        mark = self.conn.event_mark()
+        self.domain_event(4, "guest1", "net1", None)
+
+        with self.assertRaises(LibvirtConnectionError):
+            self.conn.wait_for_events(
+                mark, [("device-removed", "guest1", "net1")], timeout=1,
+                failures=[("device-removal-failed", "guest1", "net1")])
+
+    def test_network_events(self):
+        mark = self.conn.event_mark()
+        callback = self.fake_conn.network_callbacks[0]
+        callback(self.fake_conn, SimpleNamespace(name=lambda: "net1"), 3, 0,
+                 None)
+
+        self.conn.wait_for_events(
+            mark, [("network-lifecycle", "net1", "stopped")], timeout=1)
+
+    def test_shared_connection(self):
+        with patch.object(libvirt_connection, "_connection", None):
+            conn = get_libvirt_connection()
+            self.assertIsInstance(conn, LibvirtConnection)
+            self.assertIs(get_libvirt_connection(), conn)
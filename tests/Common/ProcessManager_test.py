@@ -0,0 +1,87 @@
+import os
+import threading
+from unittest import TestCase
+
+from lnst.Common.ProcessManager import ProcessManager
+
+
+def spawn(exit_code):
+    pid = os.fork()
+    if pid == 0:
+        os._exit(exit_code)
+    return pid
+
+
+class ProcessManagerTest(TestCase):
+    def register(self, pid):
+        codes = []
+        handled = threading.Event()
+
+        def handler(code):
+            codes.append(code)
+            handled.set()
+
+        ProcessManager.register_pid(pid, handler)
+        return codes, handled
+
+    def test_exit_status(self):
+        pid = spawn(3)
+        codes, handled = self.register(pid)
+
+        self.assertTrue(handled.wait(5))
+        self.assertEqual(codes, [3])
+        waited, status = os.waitpid(pid, 0)
+        self.assertEqual(waited, pid)
+        self.assertEqual(os.WEXITSTATUS(status), 3)
+        self.assertNotIn(pid, ProcessManager.pids)
+
+    def test_nohang_wait(self):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(write_fd)
+            os.read(read_fd, 1)
+            os._exit(0)
+        os.close(read_fd)
+        codes, handled = self.register(pid)
+
+        self.assertEqual(os.waitpid(pid, os.WNOHANG), (0, None))
+        os.close(write_fd)
+        self.assertTrue(handled.wait(5))
+        self.assertEqual(os.waitpid(pid, os.WNOHANG)[0], pid)
+
+    def test_collected_elsewhere(self):
+        pid = spawn(0)
+        ProcessManager.std_waitpid(pid, 0)
+        codes, handled = self.register(pid)
+
+        # the status is lost, the handler isn't called but waiting works
+        self.assertEqual(os.waitpid(pid, 0), (pid, None))
+        self.assertFalse(handled.is_set())
+        self.assertEqual(codes, [])
+
+    def test_use_after_fork(self):
+        parent_pid = spawn(0)
+        self.register(parent_pid)
+        os.waitpid(parent_pid, 0)
+        parent_reaper = ProcessManager._get_reaper()
+
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                reaper = ProcessManager._get_reaper()
+                child = spawn(5)
+                codes, handled = self.register(child)
+                if (reaper is not parent_reaper and
+                        reaper.owner == os.getpid() and
+                        list(ProcessManager.pids) == [child] and
+                        handled.wait(5) and codes == [5] and
+                        os.WEXITSTATUS(os.waitpid(child, 0)[1]) == 5):
+                    status = 0
+            finally:
+                os._exit(status)
+
+        _, status = ProcessManager.std_waitpid(pid, 0)
+        self.assertEqual(os.WEXITSTATUS(status), 0)
+        self.assertIs(ProcessManager._get_reaper(), parent_reaper)
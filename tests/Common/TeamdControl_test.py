@@ -0,0 +1,127 @@
+import os
+import socket
+import tempfile
+import threading
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import patch
+from pyroute2.netlink.rtnl.ifinfmsg import ifinfmsg
+
+from lnst.Common import TeamdControl as teamd_control
+from lnst.Common.DeviceError import DeviceConfigError
+from lnst.Common.ExecCmd import ExecCmdFail
+from lnst.Devices.TeamDevice import TeamDevice
+
+
+class FakeTeamd(object):
+    """Answers the requests sent to the control socket of a team"""
+    def __init__(self, run_dir, team_name):
+        self.requests = []
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self._sock.bind(os.path.join(run_dir, "{}.sock".format(team_name)))
+        self._sock.listen(1)
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        conn, _ = self._sock.accept()
+        with conn:
+            while True:
+                data = conn.recv(65536)
+                if not data:
+                    return
+                _, method, *args = data.decode().rstrip("\n").split("\n")
+                self.requests.append([method] + args)
+                if method == "PortRemove":
+                    reply = "REPLY_ERROR\nNoSuchDev\nNo such port.\n"
+                else:
+                    reply = "REPLY_SUCCESS\n{}\n".format(method)
+                conn.sendall(reply.encode())
+
+    def close(self):
+        self._sock.close()
+
+
+class FakeTeamdctl(object):
+    """Replaces exec_cmd, records the teamdctl commands"""
+    def __init__(self):
+        self.commands = []
+
+    def __call__(self, cmd, log_outputs=True):
+        self.commands.append(cmd)
+        if " port remove " in cmd:
+            raise ExecCmdFail(cmd, 1, ["", "No such port.\n"])
+        return "{}\n", ""
+
+
+class TeamDeviceTransportTest(TestCase):
+    def setUp(self):
+        self.run_dir = tempfile.TemporaryDirectory()
+        run_dir_patch = patch.object(teamd_control, "TEAMD_RUN_DIR",
+                                     self.run_dir.name)
+        run_dir_patch.start()
+        self.addCleanup(run_dir_patch.stop)
+        self.addCleanup(self.run_dir.cleanup)
+
+        self.teamdctl = FakeTeamdctl()
+        exec_cmd_patch = patch.object(teamd_control, "exec_cmd",
+                                      self.teamdctl)
+        exec_cmd_patch.start()
+        self.addCleanup(exec_cmd_patch.stop)
+
+        self.rescans = []
+        self.ports = [SimpleNamespace(name="eth1"),
+                      SimpleNamespace(name="eth2")]
+
+    def make_team(self, dbus):
+        nl_msg = ifinfmsg()
+        nl_msg["attrs"] = [["IFLA_IFNAME", "t_team0"]]
+        team = TeamDevice.__new__(TeamDevice)
+        team._nl_msg = nl_msg
+        team._if_manager = SimpleNamespace(
+            rescan_devices=lambda: self.rescans.append(True)
+        )
+        team._enabled = True
+        team._deleted = False
+        team._dbus = dbus
+        team._teamd = None
+        return team
+
+    def test_usock(self):
+        teamd = FakeTeamd(self.run_dir.name, "t_team0")
+        self.addCleanup(teamd.close)
+        team = self.make_team(dbus=False)
+
+        team.slaves_add([self.ports[0], (self.ports[1], {"prio": 10})])
+        with self.assertRaises(DeviceConfigError):
+            team.slave_del(self.ports[0])
+
+        self.assertEqual(teamd.requests, [
+            ["PortConfigUpdate", "eth1", "{}"],
+            ["PortAdd", "eth1"],
+            ["PortConfigUpdate", "eth2", '{"prio": 10}'],
+            ["PortAdd", "eth2"],
+            ["PortRemove", "eth1"],
+        ])
+        self.assertEqual(self.teamdctl.commands, [])
+        self.assertEqual(len(self.rescans), 1)
+
+    def test_dbus(self):
+        team = self.make_team(dbus=True)
+
+        team.slaves_add([self.ports[0], (self.ports[1], {"prio": 10})])
+        self.assertEqual(team.port_config(self.ports[1]), {})
+        with self.assertRaises(DeviceConfigError):
+            team.slave_del(self.ports[0])
+
+        self.assertEqual(self.teamdctl.commands, [
+            "teamdctl -D t_team0 port config update eth1 '{}'",
+            "teamdctl -D t_team0 port add eth1",
+            "teamdctl -D t_team0 port config update eth2 '{\"prio\": 10}'",
+            "teamdctl -D t_team0 port add eth2",
+            "teamdctl -D t_team0 port config dump eth2",
+            "teamdctl -D t_team0 port remove eth1",
+        ])
+        # the control socket isn't used at all
+        self.assertEqual(os.listdir(self.run_dir.name), [])
+        self.assertEqual(len(self.rescans), 1)
@@ -0,0 +1,143 @@
+import os
+import fcntl
+import tempfile
+from types import SimpleNamespace
+from unittest import TestCase
+
+from lnst.Controller.ContainerPoolManager import ContainerPoolManager
+
+
+class FakeContainer(object):
+    def __init__(self, name, status="running"):
+        self.name = name
+        self.status = status
+        self.removed = False
+
+    def reload(self):
+        pass
+
+    def stop(self):
+        self.status = "exited"
+
+    def remove(self, force=False):
+        self.removed = True
+
+
+class FakeConfig(object):
+    def get_option(self, section, option):
+        return {"rpcport": 9999, "machine_parallelism": 4}[option]
+
+
+class WarmPoolTest(TestCase):
+    def setUp(self):
+        lock_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(lock_dir.cleanup)
+
+        self.manager = ContainerPoolManager.__new__(ContainerPoolManager)
+        self.manager.WARM_POOL_LOCK_DIR = lock_dir.name
+        self.manager._claims = {}
+        self.manager._ctl_config = FakeConfig()
+        self.manager._parallelism = 4
+        self.addCleanup(self.release_claims)
+
+        self.containers = []
+        self.manager._warm_pool_containers = lambda: list(self.containers)
+        self.manager._is_clean = lambda container: True
+        self.manager._container_address = lambda container: container.name
+        self.checked = []
+        self.manager._check_agent = (
+            lambda hostname, port: self.checked.append((hostname, port))
+        )
+        self.other_run_claims = []
+
+    def release_claims(self):
+        for name in list(self.manager._claims):
+            self.manager._unclaim(name)
+        for fd in self.other_run_claims:
+            os.close(fd)
+
+    def claim_by_other_run(self, name):
+        fd = os.open(self.manager._claim_path(name), os.O_RDWR | os.O_CREAT)
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self.other_run_claims.append(fd)
+
+    def claimable(self, name):
+        fd = os.open(self.manager._claim_path(name), os.O_RDWR | os.O_CREAT)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        finally:
+            os.close(fd)
+        return True
+
+    def test_reuse(self):
+        self.containers = [FakeContainer("w1"), FakeContainer("w2"),
+                           FakeContainer("w3")]
+        os.makedirs(self.manager.WARM_POOL_LOCK_DIR, exist_ok=True)
+        self.claim_by_other_run("w1")
+
+        acquired = self.manager._acquire_warm_containers({"m1": 9999,
+                                                          "m2": 1234})
+
+        self.assertEqual({m_id: c.name for m_id, c in acquired.items()},
+                         {"m1": "w2", "m2": "w3"})
+        # the container used by the other run isn't touched at all
+        self.assertEqual(self.checked, [("w2", 9999), ("w3", 1234)])
+        self.assertFalse(self.containers[0].removed)
+        self.assertEqual(sorted(self.manager._claims), ["w2", "w3"])
+        self.assertFalse(self.claimable("w2"))
+
+        # a second run doesn't get the claimed containers
+        other = ContainerPoolManager.__new__(ContainerPoolManager)
+        other.WARM_POOL_LOCK_DIR = self.manager.WARM_POOL_LOCK_DIR
+        other._claims = {}
+        other._parallelism = 4
+        other._warm_pool_containers = lambda: list(self.containers)
+        self.assertEqual(other._acquire_warm_containers({"m1": 9999}), {})
+
+    def test_surplus_released(self):
+        self.containers = [FakeContainer("w1"), FakeContainer("w2")]
+
+        acquired = self.manager._acquire_warm_containers({"m1": 9999})
+
+        self.assertEqual(acquired["m1"].name, "w1")
+        self.assertEqual(list(self.manager._claims), ["w1"])
+        self.assertTrue(self.claimable("w2"))
+        self.assertEqual(self.checked, [("w1", 9999)])
+
+    def test_broken_removed(self):
+        self.containers = [FakeContainer("w1", status="exited"),
+                           FakeContainer("w2")]
+
+        acquired = self.manager._acquire_warm_containers({"m1": 9999})
+
+        self.assertEqual(acquired["m1"].name, "w2")
+        self.assertTrue(self.containers[0].removed)
+        self.assertFalse(os.path.exists(self.manager._claim_path("w1")))
+        self.assertNotIn("w1", self.manager._claims)
+
+    def test_cleanup_keeps_claimed(self):
+        self.containers = [FakeContainer("w1"), FakeContainer("w2")]
+        os.makedirs(self.manager.WARM_POOL_LOCK_DIR, exist_ok=True)
+        self.claim_by_other_run("w1")
+        self.manager._podman_client = SimpleNamespace(
+            networks=SimpleNamespace(list=lambda: [])
+        )
+
+        self.manager.cleanup_warm_pool()
+
+        self.assertFalse(self.containers[0].removed)
+        self.assertTrue(self.containers[1].removed)
+        self.assertEqual(self.manager._claims, {})
+
+    def test_removed_lock_file(self):
+        self.assertTrue(self.manager._claim("w1"))
+        path = self.manager._claim_path("w1")
+        stale_fd = os.open(path, os.O_RDWR)
+        self.addCleanup(os.close, stale_fd)
+        self.manager._unclaim("w1", removed=True)
+
+        # a lock taken on the file of a removed container isn't a claim
+        fcntl.flock(stale_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self.assertTrue(self.manager._claim("w1"))
@@ -0,0 +1,108 @@
+import logging
+import threading
+from types import SimpleNamespace
+from unittest import TestCase
+
+from lnst.Controller.Controller import Controller
+from lnst.Controller.Common import ControllerError
+
+
+class FakeConfig(object):
+    def __init__(self, parallelism):
+        self._parallelism = parallelism
+
+    def get_option(self, section, option):
+        return self._parallelism
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class RunMachinePhaseTest(TestCase):
+    def setUp(self):
+        self.handler = RecordingHandler()
+        self.root = logging.getLogger()
+        self.prev_level = self.root.level
+        self.root.setLevel(logging.INFO)
+        self.root.addHandler(self.handler)
+
+    def tearDown(self):
+        self.root.removeHandler(self.handler)
+        self.root.setLevel(self.prev_level)
+
+    def make_controller(self, machine_ids, parallelism):
+        ctl = Controller.__new__(Controller)
+        ctl._config = FakeConfig(parallelism)
+        ctl._machines = {m_id: SimpleNamespace(get_id=lambda m_id=m_id: m_id)
+                         for m_id in machine_ids}
+        return ctl
+
+    def agent_record(self, agent_id, msg):
+        # the way LoggingCtl.add_client_log passes on agent records
+        record = logging.makeLogRecord({"msg": msg, "levelno": logging.INFO,
+                                        "levelname": "INFO",
+                                        "address": agent_id})
+        logging.getLogger().handle(record)
+
+    def test_records_grouped(self):
+        ctl = self.make_controller(["m1", "m2"], parallelism=2)
+        barrier = threading.Barrier(2)
+
+        def func(machine):
+            m_id = machine.get_id()
+            logging.info("%s first", m_id)
+            barrier.wait()
+            # records of an agent received by the thread of another machine
+            other = "m2" if m_id == "m1" else "m1"
+            self.agent_record(other, "%s agent" % other)
+            barrier.wait()
+            logging.info("%s second", m_id)
+
+        errors = ctl._run_machine_phase(func)
+
+        self.assertEqual(errors, {})
+        self.assertEqual(self.handler.messages[:3],
+                         ["m1 first", "m1 agent", "m1 second"])
+        self.assertEqual(self.handler.messages[3:],
+                         ["m2 first", "m2 agent", "m2 second"])
+
+    def test_records_after_phase(self):
+        ctl = self.make_controller(["m1", "m2"], parallelism=2)
+        ctl._run_machine_phase(lambda machine: None)
+
+        self.agent_record("m1", "late")
+        logging.info("controller")
+        self.assertEqual(self.handler.messages, ["late", "controller"])
+
+    def test_errors(self):
+        for parallelism in [1, 3]:
+            ctl = self.make_controller(["m1", "m2", "m3"], parallelism)
+            exceptions = {"m1": Exception("m1 failed"),
+                          "m3": KeyError("m3")}
+
+            def func(machine):
+                if machine.get_id() in exceptions:
+                    raise exceptions[machine.get_id()]
+
+            errors = ctl._run_machine_phase(func)
+            self.assertEqual(errors, exceptions)
+
+    def test_raise_machine_errors(self):
+        exc = Exception("m1 failed")
+        with self.assertRaises(Exception) as cm:
+            Controller._raise_machine_errors("preparation", {"m1": exc})
+        self.assertIs(cm.exception, exc)
+
+        with self.assertRaises(ControllerError) as cm:
+            Controller._raise_machine_errors(
+                "preparation", {"m1": exc, "m2": Exception("m2 failed")})
+        self.assertIn("m1 (m1 failed)", str(cm.exception))
+        self.assertIn("m2 (m2 failed)", str(cm.exception))
+
+        Controller._raise_machine_errors("preparation", {})
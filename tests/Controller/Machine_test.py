@@ -0,0 +1,96 @@
+from socket import AF_INET
+from unittest import TestCase
+
+from lnst.Common.IpAddress import ipaddress
+from lnst.Controller.Machine import Machine
+from lnst.Devices.Device import Device
+from lnst.Devices.RemoteDevice import RemoteDevice
+
+
+class FakeDispatcher(object):
+    def __init__(self):
+        self.polls = 0
+
+    def poll_messages(self):
+        self.polls += 1
+
+
+class DeviceSnapshotTest(TestCase):
+    def setUp(self):
+        self.machine = Machine.__new__(Machine)
+        self.machine._initns = None
+        self.machine._namespaces = {}
+        self.machine._device_database = {None: {}}
+        self.machine._msg_dispatcher = FakeDispatcher()
+        self.machine._add_recipe_result = lambda result: None
+        self.machine.rpc_call = self.rpc_call
+
+        self.calls = []
+        self.snapshots = {
+            1: {"name": "eth1", "mtu": 1500,
+                "ips": [ipaddress("192.168.1.1/24"),
+                        ipaddress("fe80::1/64")]},
+            2: {"name": "eth2", "ips": []},
+        }
+        self.devices = {ifindex: self.add_device(ifindex)
+                        for ifindex in self.snapshots}
+
+    def rpc_call(self, method_name, *args, **kwargs):
+        self.calls.append((method_name,) + args)
+        if method_name == "get_device_snapshots":
+            return {idx: dict(self.snapshots[idx]) for idx in args[0]}
+        return "{}-result".format(method_name)
+
+    def add_device(self, ifindex):
+        dev = RemoteDevice(Device)
+        dev._machine = self.machine
+        dev.ifindex = ifindex
+        self.machine._add_device_to_database(ifindex, dev)
+        return dev
+
+    def test_fill(self):
+        self.assertEqual(self.devices[1].name, "eth1")
+        self.assertEqual(self.devices[2].name, "eth2")
+
+        # all the devices without a snapshot are fetched by a single call
+        self.assertEqual(self.calls, [("get_device_snapshots", [1, 2])])
+        self.assertEqual(self.machine._msg_dispatcher.polls, 2)
+
+        # the returned lists are copies
+        self.devices[1].ips.append("dummy")
+        self.assertEqual(len(self.devices[1].ips), 2)
+
+    def test_missing_attribute(self):
+        self.assertEqual(self.devices[1].driver, "dev_getattr-result")
+        self.assertEqual(self.calls, [("get_device_snapshots", [1, 2]),
+                                      ("dev_getattr", 1, "driver")])
+
+    def test_invalidation(self):
+        self.devices[1].name
+        self.snapshots[1]["name"] = "renamed"
+
+        self.machine.device_updated({"ifindexes": [1]})
+        self.assertEqual(self.devices[1].name, "renamed")
+        self.assertEqual(self.devices[2].name, "eth2")
+
+        self.devices[2].up()
+        self.assertEqual(self.devices[2].name, "eth2")
+
+        self.devices[1].mtu = 9000
+        self.assertEqual(self.devices[1].name, "renamed")
+
+        self.assertEqual(self.calls, [
+            ("get_device_snapshots", [1, 2]),
+            ("get_device_snapshots", [1]),
+            ("dev_method", 2, "up", (), {}),
+            ("get_device_snapshots", [2]),
+            ("dev_setattr", 1, "mtu", 9000),
+            ("get_device_snapshots", [1]),
+        ])
+
+    def test_controller_methods(self):
+        ips = self.devices[1].ips_filter(family=AF_INET)
+
+        self.assertEqual(ips, [ipaddress("192.168.1.1/24")])
+        # evaluated on the controller using the snapshot
+        self.assertEqual(self.calls, [("get_device_snapshots", [1, 2])])
@@ -0,0 +1,149 @@
+import time
+import socket
+import threading
+from unittest import TestCase
+from unittest.mock import Mock
+
+from lnst.Common.SecureSocket import SecureSocket
+from lnst.Controller.MessageDispatcher import MessageDispatcher, ConnectionError
+
+
+class MachineMock(Mock):
+    def __init__(self, machine_id):
+        super().__init__()
+        self.machine_id = machine_id
+        self.finished_jobs = set()
+
+    def get_id(self):
+        return self.machine_id
+
+    def get_mapped(self):
+        return True
+
+    def job_finished(self, msg):
+        self.finished_jobs.add(msg["job_id"])
+
+
+class MessageDispatcherTest(TestCase):
+    def setUp(self):
+        self.dispatcher = MessageDispatcher(Mock())
+        self.machines = []
+        self.agent_sockets = []
+        for machine_id in ["m1", "m2"]:
+            ctl_end, agent_end = socket.socketpair()
+            machine = MachineMock(machine_id)
+            self.dispatcher.add_agent(machine, SecureSocket(ctl_end))
+            self.machines.append(machine)
+            self.agent_sockets.append(SecureSocket(agent_end))
+
+    def tearDown(self):
+        for soc in self.agent_sockets:
+            soc.close()
+
+    def finish_job(self, index, job_id, delay):
+        def send():
+            time.sleep(delay)
+            self.agent_sockets[index].send_msg({"type": "job_finished",
+                                                "job_id": job_id})
+        thread = threading.Thread(target=send)
+        thread.start()
+        return thread
+
+    def test_subsecond_timeout(self):
+        start = time.monotonic()
+        res = self.dispatcher.wait_for_condition(lambda: False, 0.2)
+        duration = time.monotonic() - start
+
+        self.assertFalse(res)
+        self.assertGreaterEqual(duration, 0.2)
+        self.assertLess(duration, 0.9)
+
+    def test_condition(self):
+        sender = self.finish_job(0, 1, 0.1)
+        res = self.dispatcher.wait_for_condition(
+            lambda: 1 in self.machines[0].finished_jobs, 5)
+        sender.join()
+
+        self.assertTrue(res)
+
+    def test_concurrent_waits(self):
+        results = {}
+
+        def wait(index, job_id, timeout):
+            machine = self.machines[index]
+            results[job_id] = self.dispatcher.wait_for_condition(
+                lambda: job_id in machine.finished_jobs, timeout)
+
+        waiters = [threading.Thread(target=wait, args=(0, 1, 5)),
+                   threading.Thread(target=wait, args=(1, 2, 5)),
+                   threading.Thread(target=wait, args=(1, 3, 0.3))]
+        for waiter in waiters:
+            waiter.start()
+        senders = [self.finish_job(1, 2, 0.1), self.finish_job(0, 1, 0.5)]
+        for thread in waiters + senders:
+            thread.join()
+
+        self.assertEqual(results, {1: True, 2: True, 3: False})
+
+    def test_disconnect_while_waiting(self):
+        results = {}
+
+        def call(index):
+            try:
+                results[index] = self.dispatcher.send_message(
+                    self.machines[index], {"type": "command"})
+            except Exception as exc:
+                results[index] = exc
+
+        callers = [threading.Thread(target=call, args=(i,)) for i in [0, 1]]
+        for caller in callers:
+            caller.start()
+        # both calls are sent, so both threads wait for their reply
+        for soc in self.agent_sockets:
+            soc.recv_msg()
+
+        self.agent_sockets[0].close()
+        time.sleep(0.2)
+        self.agent_sockets[1].send_msg({"type": "result", "result": 42})
+        for caller in callers:
+            caller.join(5)
+
+        self.assertFalse(any(caller.is_alive() for caller in callers))
+        self.assertIsInstance(results[0], ConnectionError)
+        self.assertIn("m1", str(results[0]))
+        self.assertEqual(results[1], 42)
+
+    def test_batch_processed_after_error(self):
+        self.agent_sockets[0].send_msg({"type": "unknown"})
+        self.agent_sockets[0].send_msg({"type": "job_finished", "job_id": 1})
+        time.sleep(0.1)
+
+        with self.assertRaises(ConnectionError):
+            self.dispatcher.handle_messages()
+        self.assertEqual(self.machines[0].finished_jobs, {1})
+
+    def test_poll_while_receiving(self):
+        machine = self.machines[0]
+        processing = threading.Event()
+        job_finished = machine.job_finished
+
+        def slow_job_finished(msg):
+            if msg["job_id"] == 1:
+                processing.set()
+                time.sleep(0.3)
+            job_finished(msg)
+        machine.job_finished = slow_job_finished
+
+        waiter = threading.Thread(
+            target=self.dispatcher.wait_for_condition,
+            args=(lambda: 2 in machine.finished_jobs, 5))
+        waiter.start()
+        self.agent_sockets[0].send_msg({"type": "job_finished", "job_id": 1})
+        self.assertTrue(processing.wait(5))
+        # arrives while the other thread processes the previous batch
+        self.agent_sockets[0].send_msg({"type": "job_finished", "job_id": 2})
+        time.sleep(0.05)
+
+        self.dispatcher.poll_messages()
+        self.assertEqual(machine.finished_jobs, {1, 2})
+        waiter.join()
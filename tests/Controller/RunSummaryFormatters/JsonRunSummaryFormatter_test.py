@@ -0,0 +1,70 @@
+import json
+from unittest import TestCase
+from unittest.mock import Mock
+
+from lnst.Controller.Job import Job, ShellBatch
+from lnst.Controller.Recipe import RecipeRun
+from lnst.Controller.RecipeResults import (
+    JobStartResult,
+    JobFinishResult,
+    ResultType,
+)
+from lnst.Controller.RpcStats import RpcStats
+from lnst.Controller.RunSummaryFormatters import JsonRunSummaryFormatter
+
+
+class JsonRunSummaryFormatterTest(TestCase):
+    def setUp(self):
+        self.netns = Mock()
+        self.netns.initns.hostid = "host1"
+        self.netns.name = None
+        self.run = RecipeRun(Mock(), None)
+
+    def format_run(self, **kwargs):
+        formatter = JsonRunSummaryFormatter(**kwargs)
+        return json.loads(formatter.format_run(self.run))
+
+    def test_shell_job(self):
+        job = Job(self.netns, "ls /")
+        self.run.add_result(JobStartResult(job, ResultType.PASS))
+
+        self.assertEqual(self.format_run()[0], {
+            "result": "PASS",
+            "type": "job",
+            "action": "start",
+            "job": {"type": "shell", "command": "ls /"},
+        })
+
+    def test_shell_batch_job(self):
+        job = Job(self.netns, ShellBatch(["true", "false"], fail_fast=False))
+        job._res = {"passed": False, "res_data": {"results": []}}
+        self.run.add_result(JobStartResult(job, ResultType.PASS))
+        self.run.add_result(JobFinishResult(job))
+
+        start, finish = self.format_run()
+        self.assertEqual(start["job"], {
+            "type": "shell_batch",
+            "commands": ["true", "false"],
+            "fail_fast": False,
+            "parallel": 1,
+        })
+        self.assertEqual(finish["action"], "end")
+        self.assertEqual(finish["result"], "FAIL")
+        self.assertEqual(finish["job"]["type"], "shell_batch")
+
+    def test_rpc_stats(self):
+        job = Job(self.netns, "ls /")
+        self.run.add_result(JobStartResult(job, ResultType.PASS))
+        stats = RpcStats()
+        stats.record("host1", None, "run_job", 0.5)
+        self.run.rpc_stats = stats
+
+        # the statistics aren't reported as a result
+        results = self.format_run()
+        self.assertEqual([r["type"] for r in results], ["job"])
+
+        output = self.format_run(rpc_stats=True)
+        self.assertEqual(output["results"], results)
+        self.assertEqual([(s["machine"], s["method"])
+                          for s in output["rpc_stats"]],
+                         [("host1", "run_job")])
@@ -0,0 +1,118 @@
+import sys
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import patch
+from pyroute2.netlink.rtnl.ifinfmsg import ifinfmsg
+
+from lnst.Common.DeviceError import DeviceConfigError
+from lnst.Common.IpAddress import ipaddress
+from lnst.Devices.Device import Device, netlink_imports
+
+device_module = sys.modules[Device.__module__]
+
+
+class FakeIPRoute(object):
+    def __init__(self, device, calls, fail_at=None):
+        self._device = device
+        self._calls = calls
+        self._fail_at = fail_at
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def _call(self, call):
+        self._calls.append(call)
+        if len(self._calls) == self._fail_at:
+            raise Exception("request failed")
+
+    def link(self, op, **kwargs):
+        self._call(("link", op, kwargs))
+
+    def addr(self, op, **kwargs):
+        self._call(("addr", op, kwargs["address"]))
+        ip = ipaddress("{}/{}".format(kwargs["address"], kwargs["mask"]))
+        if op == "add":
+            self._device._ip_addrs.append(ip)
+        elif ip in self._device._ip_addrs:
+            self._device._ip_addrs.remove(ip)
+
+
+class DeviceModifyTest(TestCase):
+    def setUp(self):
+        netlink_imports()
+        nl_msg = ifinfmsg()
+        nl_msg["index"] = 5
+        nl_msg["flags"] = 0
+        nl_msg["attrs"] = [["IFLA_IFNAME", "test0"], ["IFLA_MTU", 1500]]
+
+        self.rescans = []
+        if_manager = SimpleNamespace(
+            rescan_devices=lambda: self.rescans.append(True)
+        )
+        self.dev = Device(if_manager)
+        self.dev._init_netlink(nl_msg)
+        self.calls = []
+
+    def modify(self, fail_at=None):
+        ipr = FakeIPRoute(self.dev, self.calls, fail_at)
+        fake_pyroute2 = SimpleNamespace(IPRoute=lambda: ipr)
+        return patch.object(device_module, "pyroute2", fake_pyroute2)
+
+    def test_operation_order(self):
+        with self.modify():
+            with self.dev.modify():
+                self.dev.down()
+                self.dev.mtu = 9000
+                self.dev.ip_add("192.168.1.1/24")
+                self.dev.up()
+
+        self.assertEqual(self.calls, [
+            ("link", "set", {"index": 5, "state": "down"}),
+            ("link", "set", {"index": 5, "IFLA_MTU": 9000}),
+            ("addr", "add", "192.168.1.1"),
+            ("link", "set", {"index": 5, "state": "up"}),
+        ])
+        self.assertEqual(len(self.rescans), 1)
+
+    def test_attributes_batched(self):
+        with self.modify():
+            with self.dev.modify():
+                self.dev.mtu = 9000
+                with self.dev.modify():
+                    self.dev.mtu = 1400
+                self.assertEqual(self.calls, [])
+
+        self.assertEqual(self.calls, [
+            ("link", "set", {"index": 5, "IFLA_MTU": 1400}),
+        ])
+
+    def test_rollback(self):
+        with self.modify(fail_at=3):
+            with self.assertRaises(DeviceConfigError):
+                with self.dev.modify():
+                    self.dev.mtu = 9000
+                    self.dev.ip_add("192.168.1.1/24")
+                    self.dev.up()
+
+        # the failed link request may have been applied partially
+        self.assertEqual(self.calls[3:], [
+            ("link", "set", {"index": 5, "state": "down"}),
+            ("addr", "del", "192.168.1.1"),
+            ("link", "set", {"index": 5, "IFLA_MTU": 1500}),
+        ])
+        self.assertEqual(self.dev.ips, [])
+
+    def test_exception_in_block(self):
+        with self.modify():
+            with self.assertRaises(ValueError):
+                with self.dev.modify():
+                    self.dev.mtu = 9000
+                    raise ValueError()
+            self.dev.up()
+
+        self.assertEqual(self.calls, [
+            ("link", "set", {"index": 5, "state": "up"}),
+        ])
@@ -0,0 +1,33 @@
+from unittest import TestCase
+from unittest.mock import Mock
+
+from lnst.Controller.Recipe import RecipeError
+from lnst.Recipes.ENRT.BaseEnrtRecipe import BaseEnrtRecipe
+from lnst.Recipes.ENRT.ConfigMixins.CpuPinningPlannerMixin import (
+    CpuPinningPlannerMixin,
+)
+
+
+class PlannerRecipe(CpuPinningPlannerMixin, BaseEnrtRecipe):
+    def __init__(self, nic, **kwargs):
+        super().__init__(**kwargs)
+        self.nic = nic
+
+    @property
+    def dev_interrupt_hw_config_dev_list(self):
+        return [self.nic]
+
+
+class CpuPinningPlannerMixinTest(TestCase):
+    def test_conflict_checked_first(self):
+        nic = Mock()
+        recipe = PlannerRecipe(nic, cpu_pinning_planner=True,
+                               dev_intr_cpu=[0])
+        config = Mock(hw_config={})
+
+        with self.assertRaises(RecipeError):
+            recipe.hw_config(config)
+
+        # nothing was configured before the error
+        nic.host.run.assert_not_called()
+        self.assertEqual(config.hw_config, {})
@@ -0,0 +1,116 @@
+from unittest import TestCase
+from unittest.mock import Mock, call
+
+from lnst.Common.DeviceError import DeviceConfigError
+from lnst.Recipes.ENRT.BaseEnrtRecipe import BaseEnrtRecipe
+from lnst.Recipes.ENRT.ConfigMixins.MTUHWConfigMixin import MTUHWConfigMixin
+from lnst.Recipes.ENRT.ConfigMixins.OffloadSubConfigMixin import OffloadSubConfigMixin
+
+
+class OffloadRecipe(OffloadSubConfigMixin, MTUHWConfigMixin, BaseEnrtRecipe):
+    def __init__(self, nic, fail_on=None, **kwargs):
+        super().__init__(**kwargs)
+        self.nic = nic
+        self.fail_on = fail_on
+        self.tested = []
+        self.results = []
+
+    @property
+    def offload_nics(self):
+        return [self.nic]
+
+    @property
+    def mtu_hw_config_dev_list(self):
+        return [self.nic]
+
+    def add_result(self, result, description="", *args, **kwargs):
+        self.results.append((result, description))
+
+    def do_tests(self, recipe_config):
+        self.tested.append((dict(recipe_config.offload_settings),
+                            self.nic.mtu))
+        if recipe_config.offload_settings == self.fail_on:
+            raise Exception("test failed")
+
+
+class OffloadSubConfigMixinTest(TestCase):
+    combinations = [
+        dict(gro="on", gso="on"),
+        dict(gro="off", gso="on"),
+        dict(gro="off", gso="off"),
+    ]
+
+    def setUp(self):
+        self.nic = Mock(mtu=1500)
+
+    def offload_calls(self):
+        return [c for c in self.nic.mock_calls
+                if c[0] == "set_offload_features"]
+
+    def test_differential_offloads(self):
+        recipe = OffloadRecipe(self.nic, offload_combinations=self.combinations,
+                               mtu=9000)
+        recipe.test()
+
+        self.assertEqual(recipe.tested,
+                         [(settings, 9000) for settings in self.combinations])
+        self.assertEqual(self.offload_calls(), [
+            call.set_offload_features(dict(gro="on", gso="on")),
+            call.set_offload_features(dict(gro="off")),
+            call.set_offload_features(dict(gso="off")),
+            call.set_offload_features(dict(gro="on", gso="on")),
+        ])
+        self.assertEqual(self.nic.mtu, 1500)
+
+    def test_revert_on_failure(self):
+        recipe = OffloadRecipe(self.nic, offload_combinations=self.combinations,
+                               fail_on=self.combinations[1], mtu=9000)
+        with self.assertRaises(Exception):
+            recipe.test()
+
+        self.assertEqual(len(recipe.tested), 2)
+        self.assertEqual(self.offload_calls()[-1],
+                         call.set_offload_features(dict(gro="on", gso="on")))
+        self.assertEqual(self.nic.mtu, 1500)
+
+    def test_failed_offloads_result(self):
+        self.nic.set_offload_features.side_effect = [
+            None, DeviceConfigError("Could not change offload features gro"),
+            None, None,
+        ]
+        recipe = OffloadRecipe(self.nic, offload_combinations=self.combinations,
+                               mtu=9000)
+        recipe.test()
+
+        offload_results = [result for result, description in recipe.results
+                           if description.startswith("Setting offload")]
+        self.assertEqual(offload_results, [True, False, True, True])
+        self.assertEqual(len(recipe.tested), 3)
+
+    def test_revert_on_apply_failure(self):
+        self.nic.set_offload_features.side_effect = [
+            None, Exception("apply failed"), None,
+        ]
+        recipe = OffloadRecipe(self.nic, offload_combinations=self.combinations,
+                               mtu=9000)
+        with self.assertRaises(Exception):
+            recipe.test()
+
+        self.assertEqual(len(recipe.tested), 1)
+        self.assertEqual(self.offload_calls()[-1],
+                         call.set_offload_features(dict(gro="on", gso="on")))
+        self.assertEqual(self.nic.mtu, 1500)
+
+    def test_first_apply_failure(self):
+        self.nic.set_offload_features.side_effect = [
+            Exception("apply failed"), None,
+        ]
+        recipe = OffloadRecipe(self.nic, offload_combinations=self.combinations,
+                               mtu=9000)
+        with self.assertRaises(Exception):
+            recipe.test()
+
+        self.assertEqual(recipe.tested, [])
+        self.assertEqual(self.offload_calls()[-1],
+                         call.set_offload_features(dict(gro="on", gso="on")))
+        self.assertEqual(self.nic.mtu, 1500)
@@ -0,0 +1,14 @@
+from unittest import TestCase
+
+from lnst.Tests.NicCounterMonitor import NicCounterMonitor
+
+
+class NicCounterMonitorTest(TestCase):
+    def test_missing_device(self):
+        monitor = NicCounterMonitor(devices=["lnst-missing0"])
+        monitor._ethtool = {}
+
+        self.assertEqual(monitor._ethtool_stats("lnst-missing0"), {})
+        # the device isn't queried again
+        self.assertIsNone(monitor._ethtool["lnst-missing0"])
+        self.assertEqual(monitor._ethtool_stats("lnst-missing0"), {})